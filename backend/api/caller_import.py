@@ -0,0 +1,230 @@
+""" Module for bulk caller import. """
+
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import AsyncIterator
+
+from pydantic import TypeAdapter, ValidationError
+from structlog import get_logger
+
+from backend.api import main, provider
+from backend.api.entities import (
+    CallerImportErrorModel,
+    CallerImportModel,
+    CallerImportReportModel,
+)
+from backend.api.enum import CallerImportFormat
+from backend.api.lib import parse_strenum_from_string
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+_CALLERS_ADAPTER = TypeAdapter(list[CallerImportModel])
+
+
+class CallerImport:
+    """Class for bulk caller import.
+
+    Input is fed a line at a time and written a chunk at a time, each chunk being
+    validated together and upserted as one transaction, so memory stays flat for
+    any input size. CSV input starts with a header line naming the columns, JSONL
+    input holds one object per line. Rows that fail are reported by line number
+    and do not stop the import.
+    """
+
+    def __init__(
+        self, import_format: CallerImportFormat, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ):
+        self.import_format = import_format
+        self.chunk_size = chunk_size
+        self.report = CallerImportReportModel()
+        self._line_number = 0
+        self._header: list[str] = None
+        self._rows: list[tuple[int, dict]] = []
+
+    def add_line(self, line: bytes) -> bool:
+        """Add input line, true once a full chunk is waiting to be flushed."""
+
+        self._line_number += 1
+        try:
+            row = self._parse_line(line)
+        except (UnicodeDecodeError, ValueError, csv.Error) as error:
+            self.report.rows += 1
+            self._reject(self._line_number, f"unable to parse line - {error}")
+            return False
+        if row is not None:
+            self.report.rows += 1
+            self._rows.append((self._line_number, row))
+        return len(self._rows) >= self.chunk_size
+
+    def flush(self) -> None:
+        """Validate and upsert the waiting rows."""
+
+        rows, self._rows = self._rows, []
+        if not rows:
+            return
+
+        logger = get_logger().bind(
+            first_line=rows[0][0], last_line=rows[-1][0], count=len(rows)
+        )
+        logger.info("Starting flush caller import chunk")
+
+        # later rows win over earlier ones for the same idp id, while an email
+        # already taken by another idp id in the chunk is rejected
+        callers: dict[str, tuple[int, CallerImportModel]] = {}
+        email_idp_ids: dict[str, str] = {}
+        for line_number, caller in self._validate(rows):
+            if email_idp_ids.setdefault(caller.email, caller.idp_id) != caller.idp_id:
+                self._reject(line_number, "email duplicated in input")
+                continue
+            if caller.idp_id in callers:
+                # the superseded row is never written
+                self.report.unchanged += 1
+            callers[caller.idp_id] = (line_number, caller)
+
+        if callers:
+            upserted, conflicting_idp_ids = (
+                provider.PROVIDERS.data_repository.upsert_callers(
+                    [caller.model_dump() for _, caller in callers.values()]
+                )
+            )
+            for idp_id in conflicting_idp_ids:
+                self._reject(callers[idp_id][0], "email belongs to another caller")
+            self.report.upserted += upserted
+            self.report.unchanged += len(callers) - len(conflicting_idp_ids) - upserted
+
+        logger.info("Completed flush caller import chunk")
+
+    def _parse_line(self, line: bytes) -> dict | None:
+        text = line.decode("utf-8")
+        if self._line_number == 1:
+            text = text.removeprefix("\ufeff")
+        if not text.strip():
+            return None
+
+        match self.import_format:
+            case CallerImportFormat.CSV:
+                values = next(csv.reader([text]))
+                if self._header is None:
+                    self._header = [value.strip() for value in values]
+                    return None
+                if len(values) != len(self._header):
+                    raise ValueError(
+                        f"expected {len(self._header)} values, got {len(values)}"
+                    )
+                return dict(zip(self._header, values))
+            case CallerImportFormat.JSONL:
+                row = json.loads(text)
+                if not isinstance(row, dict):
+                    raise ValueError("expected a json object")
+                return row
+
+    def _validate(
+        self, rows: list[tuple[int, dict]]
+    ) -> list[tuple[int, CallerImportModel]]:
+        # the whole chunk is validated in one call, only a chunk holding invalid
+        # rows is validated again without them
+        try:
+            callers = _CALLERS_ADAPTER.validate_python([row for _, row in rows])
+        except ValidationError as error:
+            invalid_rows = {}
+            for detail in error.errors(include_url=False):
+                index, *location = detail["loc"]
+                invalid_rows.setdefault(
+                    index, f"{'.'.join(map(str, location))} - {detail['msg']}"
+                )
+            for index, message in invalid_rows.items():
+                self._reject(rows[index][0], message)
+            rows = [row for index, row in enumerate(rows) if index not in invalid_rows]
+            callers = _CALLERS_ADAPTER.validate_python([row for _, row in rows])
+        return [
+            (line_number, caller) for (line_number, _), caller in zip(rows, callers)
+        ]
+
+    def _reject(self, line_number: int, error: str) -> None:
+        self.report.rejected += 1
+        if len(self.report.errors) < MAX_REPORTED_ERRORS:
+            self.report.errors.append(
+                CallerImportErrorModel(line=line_number, error=error)
+            )
+
+
+async def iterate_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Iterate lines of a byte stream such as a request body."""
+
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+def import_callers_from_file(
+    path: str,
+    import_format: CallerImportFormat,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> CallerImportReportModel:
+    """Import callers from a csv or jsonl file."""
+
+    logger = get_logger().bind(path=path, import_format=import_format)
+    logger.info("Starting import callers from file")
+
+    caller_import = CallerImport(import_format, chunk_size)
+    with open(path, "rb") as file:
+        for line in file:
+            if caller_import.add_line(line):
+                caller_import.flush()
+    caller_import.flush()
+
+    logger.info(
+        "Completed import callers from file",
+        **caller_import.report.model_dump(exclude={"errors"}),
+    )
+    return caller_import.report
+
+
+def get_import_format(path: str) -> CallerImportFormat:
+    """Get import format from the file suffix."""
+
+    match os.path.splitext(path)[1].lower():
+        case ".csv":
+            return CallerImportFormat.CSV
+        case ".jsonl" | ".ndjson":
+            return CallerImportFormat.JSONL
+        case _:
+            return None
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Bulk caller import")
+    parser.add_argument("path", help="CSV with a header line or JSONL file of callers")
+    parser.add_argument(
+        "--import-format", help="Import format: 'csv' or 'jsonl', from file suffix"
+    )
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    # any other arguments configure the data repository as they do for the api
+    args, sys.argv[1:] = parser.parse_known_args()
+
+    import_format = (
+        parse_strenum_from_string(CallerImportFormat, args.import_format)
+        if args.import_format
+        else get_import_format(args.path)
+    )
+    if import_format is None:
+        parser.error(f"unable to tell import format of {args.path}")
+
+    main.init()
+    report = import_callers_from_file(args.path, import_format, args.chunk_size)
+    print(report.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,428 @@
+""" Module for caller memory, facts about each caller remembered across sessions. """
+
+import collections
+import hashlib
+import os
+import queue
+import re
+import threading
+import time
+import zlib
+from typing import Callable
+from uuid import UUID, uuid4
+
+import numpy as np
+from structlog import get_logger
+
+from backend.api import metrics
+from backend.api.data_repository import DataRepository
+from backend.api.entities import CallerFact
+from backend.api.enum import InferencePriority, InferenceTier
+from backend.api.inference_router import InferenceRouter
+from backend.api.prompt_template_registry import PromptTemplateRegistry
+from backend.api.shared_store import SharedStore
+
+# longer lines of an extraction are rambling rather than a fact
+MAX_FACT_CHARACTERS = 300
+
+_TOKEN = re.compile(r"\w+")
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+# words every fact shares, they would make unrelated facts look alike
+_STOP_WORDS = frozenset(
+    "a an and are as at be been but by client for from has have he her his i in is "
+    "it its my of on or she that the their they this to was were will with".split()
+)
+
+
+class CallerFactIndex:
+    """Class for the facts of a caller with their embeddings as one matrix, a row
+    per fact most recently seen first, so a lookup is one matrix vector product."""
+
+    def __init__(self, caller_facts: list[CallerFact], dimensions: int, version: str):
+        self.caller_facts = tuple(caller_facts)
+        self.version = version
+        self.caller_facts_by_key = {
+            caller_fact.fact_key: caller_fact for caller_fact in caller_facts
+        }
+        self.matrix = get_fact_embeddings(caller_facts, dimensions)
+
+    def top_k(
+        self, query: np.ndarray, k: int, min_score: float
+    ) -> list[tuple[CallerFact, float]]:
+        """Get the k facts most similar to the query embedding scoring at least the
+        min score, most similar first and most recently seen first among equals."""
+
+        if not self.caller_facts or k <= 0:
+            return []
+        scores = self.matrix @ query
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [
+            (self.caller_facts[row], float(scores[row]))
+            for row in candidates
+            if scores[row] >= min_score
+        ]
+
+    def find_duplicate(
+        self, fact_key: str, embedding: np.ndarray, min_score: float
+    ) -> CallerFact | None:
+        """Find the fact a new fact repeats, by its normalised text or by scoring at
+        least the min score against it, none if it is new."""
+
+        caller_fact = self.caller_facts_by_key.get(fact_key)
+        if caller_fact is not None or not self.caller_facts:
+            return caller_fact
+        scores = self.matrix @ embedding
+        row = int(np.argmax(scores))
+        return self.caller_facts[row] if scores[row] >= min_score else None
+
+
+class CallerMemory:
+    """Class for memory of facts about each caller, extracted from their chats off
+    the request path and looked up for every chat.
+
+    Each caller's facts are kept as an index in a least recently used cache, so a
+    lookup reads the database only when the caller is not cached or their facts
+    have changed. Changes are seen across workers through a version in the shared
+    store, replaced whenever facts are saved.
+
+    Messages of a caller are queued once their chats complete and extracted by a
+    background thread, those queued meanwhile being extracted together. Extracted
+    facts repeating a known fact, word for word or by embedding similarity, mark it
+    as seen again instead of being stored twice. Messages still queued at shutdown
+    are not extracted.
+    """
+
+    def __init__(
+        self,
+        data_repository: DataRepository,
+        inference_router: InferenceRouter,
+        prompt_template_registry: PromptTemplateRegistry,
+        get_shared_store: Callable[[], SharedStore],
+        prompt_template_name: str,
+        top_k: int,
+        min_score: float,
+        duplicate_score: float,
+        max_facts: int,
+        dimensions: int,
+        cache_size: int,
+        parallelism: int,
+    ):
+        self.data_repository = data_repository
+        self.inference_router = inference_router
+        self.prompt_template_registry = prompt_template_registry
+        # the shared store is replaced in each worker, so it is looked up on use
+        self.get_shared_store = get_shared_store
+        self.prompt_template_name = prompt_template_name
+        self.top_k = top_k
+        self.min_score = min_score
+        self.duplicate_score = duplicate_score
+        self.max_facts = max_facts
+        self.dimensions = dimensions
+        self.cache_size = cache_size
+        self.parallelism = parallelism
+        self._start()
+        # a forked worker inherits the queue but not the threads draining it,
+        # messages queued before the fork are left to the parent
+        os.register_at_fork(after_in_child=self._start_after_fork)
+
+    def retrieve(self, caller_id: UUID, query_text: str) -> list[CallerFact]:
+        """Retrieve the facts of a caller most relevant to the query text."""
+
+        query = embed_texts([query_text], self.dimensions)[0]
+        return [
+            caller_fact
+            for caller_fact, _ in self.get_index(caller_id).top_k(
+                query, self.top_k, self.min_score
+            )
+        ]
+
+    def get_index(self, caller_id: UUID) -> CallerFactIndex:
+        """Get the fact index of a caller, from the cache unless their facts have
+        changed since it was loaded."""
+
+        version = self._get_version(caller_id)
+        with self._cache_lock:
+            index = self._cache.get(caller_id)
+            # a cached index is kept while the shared store cannot be reached
+            if index is not None and (version is None or index.version == version):
+                self._cache.move_to_end(caller_id)
+                metrics.CALLER_MEMORY_LOOKUPS_TOTAL.labels("hit").inc()
+                return index
+        metrics.CALLER_MEMORY_LOOKUPS_TOTAL.labels("miss").inc()
+
+        index = CallerFactIndex(
+            self.data_repository.load_caller_facts(caller_id, self.max_facts),
+            self.dimensions,
+            version,
+        )
+        with self._cache_lock:
+            self._cache[caller_id] = index
+            self._cache.move_to_end(caller_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return index
+
+    def submit(self, caller_id: UUID, chat_id: UUID, caller_chat_text: str) -> None:
+        """Queue a message of a caller to have facts extracted from it."""
+
+        with self._lock:
+            if self._closed:
+                return
+            pending = self._pending.get(caller_id)
+            if pending is not None:
+                pending.append((chat_id, caller_chat_text))
+                return
+            self._pending[caller_id] = [(chat_id, caller_chat_text)]
+        self._queue.put(caller_id)
+
+    def extract(self, caller_id: UUID, messages: list[tuple[UUID, str]]) -> int:
+        """Extract facts from messages of a caller and save those not yet known,
+        returning how many were new."""
+
+        logger = get_logger().bind(caller_id=caller_id, messages=len(messages))
+        logger.info("Starting extract caller facts")
+
+        index = self.get_index(caller_id)
+        prompt_template = self.prompt_template_registry.get(self.prompt_template_name)
+        prompt_text = prompt_template.render(
+            caller_facts=(
+                "".join(
+                    f"- {caller_fact.fact_text}\n" for caller_fact in index.caller_facts
+                )
+                or "None yet.\n"
+            ),
+            caller_chat_texts="".join(
+                f"Client: {caller_chat_text.strip()}\n\n"
+                for _, caller_chat_text in messages
+            ),
+        )
+        with self.inference_router.schedule(
+            InferenceTier.SMALL, InferencePriority.BULK
+        ):
+            start = time.perf_counter()
+            response_text = self.inference_router.get_wrapper(
+                InferenceTier.SMALL
+            ).request_for_inference(
+                f"caller-facts-{caller_id}-{messages[-1][0]}",
+                [],
+                prompt_text,
+                affinity_key=f"{caller_id}/facts",
+            )
+        metrics.CALLER_FACT_EXTRACTION_DURATION_SECONDS.observe(
+            time.perf_counter() - start
+        )
+
+        fact_texts = parse_facts(response_text)
+        new_caller_facts: list[CallerFact] = []
+        new_embeddings: list[np.ndarray] = []
+        seen_caller_fact_ids: set[UUID] = set()
+        for fact_text, embedding in zip(
+            fact_texts, embed_texts(fact_texts, self.dimensions)
+        ):
+            fact_key = get_fact_key(fact_text)
+            duplicate = index.find_duplicate(fact_key, embedding, self.duplicate_score)
+            if duplicate is not None:
+                seen_caller_fact_ids.add(duplicate.caller_fact_id)
+                continue
+            if any(
+                caller_fact.fact_key == fact_key
+                or float(other @ embedding) >= self.duplicate_score
+                for caller_fact, other in zip(new_caller_facts, new_embeddings)
+            ):
+                continue
+            new_caller_facts.append(
+                CallerFact(
+                    caller_id=caller_id,
+                    prompt_template_id=prompt_template.prompt_template_id,
+                    # the latest of the chats the facts were extracted from
+                    chat_id=messages[-1][0],
+                    fact_key=fact_key,
+                    fact_text=fact_text,
+                    embedding=embedding.tobytes(),
+                )
+            )
+            new_embeddings.append(embedding)
+        metrics.CALLER_FACTS_TOTAL.labels("new").inc(len(new_caller_facts))
+        metrics.CALLER_FACTS_TOTAL.labels("duplicate").inc(
+            len(fact_texts) - len(new_caller_facts)
+        )
+
+        forgotten = 0
+        if new_caller_facts or seen_caller_fact_ids:
+            forgotten = self.data_repository.upsert_caller_facts(
+                caller_id, new_caller_facts, seen_caller_fact_ids, self.max_facts
+            )
+            self._expire(caller_id)
+        metrics.CALLER_FACT_EXTRACTIONS_TOTAL.labels("success").inc()
+
+        logger.info(
+            "Completed extract caller facts",
+            extracted=len(fact_texts),
+            new=len(new_caller_facts),
+            forgotten=forgotten,
+        )
+        return len(new_caller_facts)
+
+    def shutdown(self) -> None:
+        """Stop the background threads once the extractions they are running are
+        done."""
+
+        with self._lock:
+            self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _get_version(self, caller_id: UUID) -> str | None:
+        key = f"caller_memory_version:{caller_id}"
+        try:
+            shared_store = self.get_shared_store()
+            version = shared_store.get(key)
+            if version is None:
+                version = uuid4().hex
+                shared_store.set(key, version)
+        except OSError as error:
+            get_logger().warning(
+                "Unable to get caller memory version from shared store",
+                caller_id=caller_id,
+                error=str(error),
+            )
+            return None
+        return version
+
+    def _expire(self, caller_id: UUID) -> None:
+        with self._cache_lock:
+            self._cache.pop(caller_id, None)
+        try:
+            self.get_shared_store().delete(f"caller_memory_version:{caller_id}")
+        except OSError as error:
+            get_logger().warning(
+                "Unable to expire caller memory version in shared store",
+                caller_id=caller_id,
+                error=str(error),
+            )
+
+    def _start_after_fork(self) -> None:
+        if not self._closed:
+            self._start()
+
+    def _start(self) -> None:
+        self._closed = False
+        self._lock = threading.Lock()
+        self._pending: dict[UUID, list[tuple[UUID, str]]] = {}
+        self._queue = queue.SimpleQueue()
+        self._cache_lock = threading.Lock()
+        self._cache: collections.OrderedDict[UUID, CallerFactIndex] = (
+            collections.OrderedDict()
+        )
+        self._threads = [
+            threading.Thread(
+                target=self._work, name=f"caller-memory-{index}", daemon=True
+            )
+            for index in range(self.parallelism)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self) -> None:
+        while True:
+            caller_id = self._queue.get()
+            if caller_id is None:
+                return
+            # taken before extracting, so a chat completing meanwhile queues the
+            # caller again
+            with self._lock:
+                messages = self._pending.pop(caller_id)
+            try:
+                self.extract(caller_id, messages)
+            except Exception as error:
+                metrics.CALLER_FACT_EXTRACTIONS_TOTAL.labels("failure").inc()
+                get_logger().warning(
+                    "Unable to extract caller facts",
+                    caller_id=caller_id,
+                    error=repr(error),
+                )
+
+
+def embed_texts(texts: list[str], dimensions: int) -> np.ndarray:
+    """Embed texts as unit rows of a matrix by hashing their words into signed
+    buckets, so texts sharing words score a high dot product. Hashes are stable
+    across processes, unlike the builtin hash."""
+
+    buckets, signs = [], []
+    for row, text in enumerate(texts):
+        offset = row * dimensions
+        for word in _TOKEN.findall(text.lower()):
+            if word in _STOP_WORDS:
+                continue
+            digest = zlib.crc32(word.encode())
+            buckets.append(offset + digest % dimensions)
+            signs.append(-1.0 if digest & 0x80000000 else 1.0)
+
+    matrix = (
+        np.bincount(buckets, signs, len(texts) * dimensions)
+        .astype(np.float32)
+        .reshape(len(texts), dimensions)
+    )
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def get_fact_embeddings(caller_facts: list[CallerFact], dimensions: int) -> np.ndarray:
+    """Get embeddings of facts as a matrix from those saved with them, embedding
+    again only facts saved with none or with other dimensions."""
+
+    matrix = np.empty((len(caller_facts), dimensions), dtype=np.float32)
+    saved, missing = [], []
+    for row, caller_fact in enumerate(caller_facts):
+        embedding = caller_fact.embedding
+        if embedding is not None and len(embedding) == dimensions * 4:
+            saved.append(row)
+        else:
+            missing.append(row)
+    if saved:
+        matrix[saved] = np.frombuffer(
+            b"".join(caller_facts[row].embedding for row in saved), dtype=np.float32
+        ).reshape(len(saved), dimensions)
+    if missing:
+        matrix[missing] = embed_texts(
+            [caller_facts[row].fact_text for row in missing], dimensions
+        )
+    return matrix
+
+
+def get_fact_key(fact_text: str) -> str:
+    """Get the key of a fact, the digest of its words in lower case, so facts
+    differing only in case and punctuation share it."""
+
+    normalised = " ".join(_TOKEN.findall(fact_text.lower()))
+    return hashlib.sha256(normalised.encode()).hexdigest()
+
+
+def parse_facts(response_text: str) -> list[str]:
+    """Parse facts from an extraction, one per line with any bullet removed."""
+
+    facts = []
+    for line in response_text.splitlines():
+        fact = _BULLET.sub("", line).strip()
+        if (
+            fact
+            and len(fact) <= MAX_FACT_CHARACTERS
+            and fact.rstrip(".").lower() != "none"
+        ):
+            facts.append(fact)
+    return facts
+
+
+def render_caller_facts(caller_facts: list[CallerFact]) -> str:
+    """Render facts about a caller for a chat prompt, nothing if there are none."""
+
+    if not caller_facts:
+        return ""
+    lines = "".join(f"- {caller_fact.fact_text}\n" for caller_fact in caller_facts)
+    return f"What you know about the client from earlier consultations:\n{lines}\n"
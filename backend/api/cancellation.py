@@ -0,0 +1,103 @@
+""" Module for chat cancellation. """
+
+import threading
+import time
+from typing import Callable
+
+from backend.api.enum import CancellationReason
+
+
+class ChatCancelledError(Exception):
+    """Class for error of a chat cancelled before its response was complete."""
+
+    def __init__(self, reason: CancellationReason):
+        super().__init__(f"Chat cancelled - {reason}")
+        self.reason = reason
+
+
+class Cancellation:
+    """Class for cancellation of a chat, by its deadline passing or by its client
+    going away.
+
+    Inference wrappers check it while they wait on a provider and stop the upstream
+    job once it is cancelled, so no provider time is spent on an answer nobody will
+    read. It may be cancelled from any thread, such as the event loop noticing the
+    client has disconnected while the chat is processed on the threadpool.
+    """
+
+    def __init__(self, deadline: float = None):
+        # monotonic time the chat is cancelled at, none for no deadline
+        self.deadline = deadline
+        self.reason: CancellationReason | None = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: list[Callable[[], None]] = []
+
+    @classmethod
+    def after(cls, seconds: float | None) -> "Cancellation":
+        """Create cancellation with a deadline the given seconds from now."""
+
+        return cls(None if seconds is None else time.monotonic() + seconds)
+
+    def cancel(self, reason: CancellationReason) -> None:
+        """Cancel, the first reason given is kept."""
+
+        with self._lock:
+            if self.reason is None:
+                self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Add callback called on the cancelling thread once cancelled, or at once
+        if already cancelled, returning a function that removes it.
+
+        The deadline passing calls no callback, as it is only noticed when checked,
+        so waits are expected to time out at the deadline by themselves.
+        """
+
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def is_cancelled(self) -> bool:
+        """Check whether cancelled, cancelling if the deadline has passed."""
+
+        if (
+            not self._event.is_set()
+            and self.deadline is not None
+            and time.monotonic() >= self.deadline
+        ):
+            self.cancel(CancellationReason.DEADLINE_EXCEEDED)
+        return self._event.is_set()
+
+    def get_remaining_seconds(self) -> float | None:
+        """Get seconds left until the deadline, none for no deadline."""
+
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        """Raise chat cancelled error if cancelled."""
+
+        if self.is_cancelled():
+            raise ChatCancelledError(self.reason)
+
+    def _remove_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def sleep(self, seconds: float) -> None:
+        """Sleep for the given seconds, raising chat cancelled error as soon as
+        cancelled."""
+
+        remaining = self.get_remaining_seconds()
+        self._event.wait(seconds if remaining is None else min(seconds, remaining))
+        self.check()
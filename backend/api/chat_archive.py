@@ -0,0 +1,70 @@
+""" Module for chat archive, moving old chats out of the data repository. """
+
+import argparse
+import json
+import sys
+from datetime import timedelta
+
+from structlog import get_logger
+
+from backend.api import config, main, provider
+from backend.api.lib import now_utc
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def archive_chats(
+    max_age_days: float = None, batch_size: int = DEFAULT_BATCH_SIZE
+) -> int:
+    """Archive chats older than max age down to stub rows, returning the count."""
+
+    max_age_days = max_age_days or config.CONFIG.chat_archive_max_age_days
+    archived_before = now_utc() - timedelta(days=max_age_days)
+    logger = get_logger().bind(archived_before=archived_before)
+    logger.info("Starting archive chats")
+
+    result = provider.PROVIDERS.data_repository.archive_chats(
+        archived_before, batch_size
+    )
+
+    logger.info("Completed archive chats", count=result)
+    return result
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Chat archive")
+    parser.add_argument(
+        "--max-age-days", type=float, help="Archive chats older than this"
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--unindex",
+        action="store_true",
+        help=(
+            "Remove archived chats from the search index, which keeps its own copy "
+            "of their text, so they are no longer found by search"
+        ),
+    )
+    parser.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="Vacuum the database afterwards to reclaim the freed space",
+    )
+    # any other arguments configure the data repository as they do for the api
+    args, sys.argv[1:] = parser.parse_known_args()
+
+    main.init()
+    result = {"archived": archive_chats(args.max_age_days, args.batch_size)}
+    if args.unindex:
+        result["unindexed"] = provider.PROVIDERS.data_repository.unindex_archived_chats(
+            args.batch_size
+        )
+    if args.vacuum:
+        provider.PROVIDERS.data_repository.vacuum()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,105 @@
+""" Module for chat archive store, compressed files holding archived chats. """
+
+import base64
+import functools
+import json
+import os
+from datetime import datetime
+from uuid import UUID, uuid4
+
+import zstandard
+
+from backend.api.entities import Chat, ChatRow
+
+# fields of an archived chat kept only in the archive, the stub row left in the
+# chat table holds everything else
+ARCHIVED_FIELDS = (
+    "caller_chat_text",
+    "caller_attachment_bytes",
+    "response_chat_text",
+    "response_attachment_bytes",
+)
+COMPRESSION_LEVEL = 9
+DEFAULT_CACHE_SIZE = 8
+
+
+class ChatArchiveStore:
+    """Class for chat archive store.
+
+    Archived chats are written whole as zstd compressed jsonl, partitioned into a
+    directory per caller and month. Each archive run adds new part files rather
+    than appending to old ones, and a part file is written under a temporary name
+    and renamed into place, so part files never change once visible and the most
+    recently read ones are kept parsed in memory.
+    """
+
+    def __init__(self, directory: str, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self._read_part = functools.lru_cache(maxsize=cache_size)(self._read_part)
+
+    def write(self, chats: list[Chat]) -> dict[UUID, str]:
+        """Write chats into a new part file per partition, returning the path of
+        each chat's part file relative to the archive directory."""
+
+        partitions: dict[str, list[Chat]] = {}
+        for chat in chats:
+            partitions.setdefault(_get_partition(chat), []).append(chat)
+
+        compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+        result = {}
+        for partition, partition_chats in partitions.items():
+            path = f"{partition}/part-{uuid4().hex}.jsonl.zst"
+            full_path = os.path.join(self.directory, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            data = "".join(
+                json.dumps(_get_record(chat)) + "\n" for chat in partition_chats
+            ).encode()
+            # the part file is on disk before any stub row points at it
+            with open(f"{full_path}.tmp", "wb") as file:
+                file.write(compressor.compress(data))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(f"{full_path}.tmp", full_path)
+            result.update({chat.chat_id: path for chat in partition_chats})
+        return result
+
+    def load(self, chats: list[Chat | ChatRow]) -> None:
+        """Load archived fields of stub chats back from their part files."""
+
+        for chat in chats:
+            if chat.archive_path is None:
+                continue
+            record = self._read_part(chat.archive_path)[chat.chat_id.hex]
+            # a chat row only gets back the archived fields it selects
+            fields = getattr(chat, "__slots__", ARCHIVED_FIELDS)
+            for field in ARCHIVED_FIELDS:
+                if field not in fields:
+                    continue
+                value = record[field]
+                if value is not None and field.endswith("_bytes"):
+                    value = base64.b64decode(value)
+                setattr(chat, field, value)
+
+    def _read_part(self, path: str) -> dict[str, dict]:
+        with open(os.path.join(self.directory, path), "rb") as file:
+            data = zstandard.ZstdDecompressor().decompress(file.read())
+        records = (json.loads(line) for line in data.splitlines())
+        return {record["chat_id"]: record for record in records}
+
+
+def _get_partition(chat: Chat) -> str:
+    return f"caller_id={chat.caller_id.hex}/month={chat.first_created:%Y-%m}"
+
+
+def _get_record(chat: Chat) -> dict:
+    record = {}
+    for column in Chat.__table__.columns:
+        value = getattr(chat, column.key)
+        if isinstance(value, UUID):
+            value = value.hex
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, bytes):
+            value = base64.b64encode(value).decode("ascii")
+        record[column.key] = value
+    return record
@@ -0,0 +1,279 @@
+""" Module for offline chat batches. """
+
+import argparse
+import asyncio
+import json
+import sys
+from typing import AsyncIterator, Iterable
+from uuid import UUID
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from structlog import get_logger
+
+from backend.api import config, main, provider
+from backend.api.caller_import import iterate_lines
+from backend.api.entities import (
+    Caller,
+    Chat,
+    ChatBatch,
+    ChatBatchChatRow,
+    ChatInputModel,
+)
+from backend.api.enum import ChatBatchStatus
+
+
+def start_chat_batch(caller: Caller, chat_batch_id: UUID = None) -> ChatBatch:
+    """Start a new chat batch, or resume one of the caller's, none if not found."""
+
+    logger = get_logger().bind(chat_batch_id=chat_batch_id)
+    logger.info("Starting start chat batch")
+
+    data_repository = provider.PROVIDERS.data_repository
+    if chat_batch_id is None:
+        chat_batch = ChatBatch(caller_id=caller.caller_id)
+    else:
+        chat_batch = data_repository.load_chat_batch(chat_batch_id, caller.caller_id)
+        if chat_batch is None:
+            logger.warning("Unable to find chat batch to resume")
+            return None
+    chat_batch.status = ChatBatchStatus.RUNNING
+    chat_batch = data_repository.save_chat_batch(chat_batch)
+
+    logger.info("Completed start chat batch", chat_batch_id=chat_batch.chat_batch_id)
+    return chat_batch
+
+
+async def run_chat_batch(
+    chunks: AsyncIterator[bytes],
+    caller: Caller,
+    chat_batch: ChatBatch,
+    parallelism: int = None,
+    micro_batch_size: int = None,
+) -> AsyncIterator[bytes]:
+    """Run chat batch over a jsonl stream of chat inputs, yielding a jsonl result
+    line per item as soon as it is known.
+
+    Items are numbered by their position among the non blank input lines. Items
+    answered by an earlier run of the batch are not sent to inference again, so
+    resuming means posting the same input with the batch id. Up to parallelism
+    micro batches are in flight at once and reading the input pauses while they
+    are, so neither the input nor the results are ever held as a whole.
+    """
+
+    parallelism = parallelism or config.CONFIG.chat_batch_parallelism
+    micro_batch_size = micro_batch_size or config.CONFIG.chat_batch_micro_batch_size
+    chat_batch_id = chat_batch.chat_batch_id
+    logger = get_logger().bind(chat_batch_id=chat_batch_id)
+    logger.info("Starting run chat batch")
+
+    data_repository = provider.PROVIDERS.data_repository
+    answered_item_indexes = await run_in_threadpool(
+        data_repository.load_chat_batch_item_indexes, chat_batch_id
+    )
+    pending: set[asyncio.Future] = set()
+    micro_batch: list[tuple[int, ChatInputModel]] = []
+    resumed_item_indexes: list[int] = []
+    item_count = 0
+    failed_item_count = 0
+    finished = False
+
+    def collect(futures: Iterable[asyncio.Future]) -> list[dict]:
+        nonlocal failed_item_count
+        results = []
+        for future in futures:
+            for result in future.result():
+                failed_item_count += "error" in result
+                results.append(result)
+        return results
+
+    def submit_micro_batch() -> None:
+        nonlocal micro_batch
+        if micro_batch:
+            pending.add(
+                asyncio.ensure_future(
+                    run_in_threadpool(
+                        _process_micro_batch, micro_batch, caller, chat_batch_id
+                    )
+                )
+            )
+            micro_batch = []
+
+    def submit_resumed() -> None:
+        nonlocal resumed_item_indexes
+        if resumed_item_indexes:
+            pending.add(
+                asyncio.ensure_future(
+                    run_in_threadpool(
+                        _load_answered, resumed_item_indexes, chat_batch_id
+                    )
+                )
+            )
+            resumed_item_indexes = []
+
+    try:
+        async for line in iterate_lines(chunks):
+            if not line.strip():
+                continue
+            item_index = item_count
+            item_count += 1
+
+            if item_index in answered_item_indexes:
+                resumed_item_indexes.append(item_index)
+                if len(resumed_item_indexes) >= micro_batch_size:
+                    submit_resumed()
+            else:
+                try:
+                    micro_batch.append(
+                        (item_index, ChatInputModel.model_validate_json(line))
+                    )
+                except ValidationError as error:
+                    failed_item_count += 1
+                    yield _render(
+                        {
+                            "index": item_index,
+                            "error": "; ".join(
+                                f"{'.'.join(map(str, detail['loc']))} - {detail['msg']}"
+                                for detail in error.errors(include_url=False)
+                            ),
+                        }
+                    )
+                    continue
+                if len(micro_batch) >= micro_batch_size:
+                    submit_micro_batch()
+
+            # results go out as soon as they are done, and reading waits while
+            # every slot is taken
+            done = {future for future in pending if future.done()}
+            if len(pending) - len(done) >= parallelism:
+                more_done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                done |= more_done
+            pending -= done
+            for result in collect(done):
+                yield _render(result)
+
+        submit_micro_batch()
+        submit_resumed()
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for result in collect(done):
+                yield _render(result)
+        finished = True
+    finally:
+        # a batch cut short, for instance by the client going away, is left
+        # incomplete and can be resumed
+        chat_batch.status = (
+            ChatBatchStatus.COMPLETED
+            if finished and failed_item_count == 0
+            else ChatBatchStatus.INCOMPLETE
+        )
+        chat_batch.item_count = item_count
+        chat_batch.failed_item_count = failed_item_count
+        data_repository.save_chat_batch(chat_batch)
+        logger.info(
+            "Completed run chat batch",
+            status=chat_batch.status,
+            item_count=item_count,
+            failed_item_count=failed_item_count,
+        )
+
+
+def _process_micro_batch(
+    micro_batch: list[tuple[int, ChatInputModel]], caller: Caller, chat_batch_id: UUID
+) -> list[dict]:
+    item_indexes = [item_index for item_index, _ in micro_batch]
+    try:
+        results = main.process_chat_batch(
+            [chat_input for _, chat_input in micro_batch],
+            caller,
+            chat_batch_id,
+            item_indexes,
+        )
+    except Exception as error:
+        # saving failed, so none of the micro batch is answered
+        results = [error] * len(micro_batch)
+    return [
+        (
+            _get_result(item_index, result)
+            if isinstance(result, Chat)
+            else {"index": item_index, "error": str(result)}
+        )
+        for item_index, result in zip(item_indexes, results)
+    ]
+
+
+def _load_answered(item_indexes: list[int], chat_batch_id: UUID) -> list[dict]:
+    chats = provider.PROVIDERS.data_repository.load_chat_batch_chats(
+        chat_batch_id, item_indexes
+    )
+    return [_get_result(chat.chat_batch_item_index, chat) for chat in chats]
+
+
+def _get_result(item_index: int, chat: Chat | ChatBatchChatRow) -> dict:
+    return {
+        "index": item_index,
+        "chat_id": str(chat.chat_id),
+        "caller_session_id": chat.caller_session_id,
+        "response_chat_text": chat.response_chat_text,
+    }
+
+
+def _render(result: dict) -> bytes:
+    return orjson.dumps(result, option=orjson.OPT_APPEND_NEWLINE)
+
+
+async def _read_file(path: str, chunk_size: int = 1 << 16) -> AsyncIterator[bytes]:
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Offline chat batch")
+    parser.add_argument("path", help="JSONL file of chat inputs")
+    parser.add_argument("--idp-id", required=True, help="Caller to run the batch as")
+    parser.add_argument("--output", required=True, help="JSONL file of results")
+    parser.add_argument("--chat-batch-id", type=UUID, help="Chat batch to resume")
+    # any other arguments configure the data repository and inference as they do
+    # for the api
+    args, sys.argv[1:] = parser.parse_known_args()
+
+    main.init()
+    caller = provider.PROVIDERS.data_repository.load_caller(args.idp_id)
+    if caller is None:
+        parser.error(f"unable to find caller - {args.idp_id}")
+    chat_batch = start_chat_batch(caller, args.chat_batch_id)
+    if chat_batch is None:
+        parser.error(f"unable to find chat batch - {args.chat_batch_id}")
+
+    async def write_results() -> None:
+        # a resumed batch writes the results of its earlier runs again, so the
+        # output is always complete
+        with open(args.output, "wb") as file:
+            async for line in run_chat_batch(_read_file(args.path), caller, chat_batch):
+                file.write(line)
+                file.flush()
+
+    asyncio.run(write_results())
+    print(
+        json.dumps(
+            {
+                "chat_batch_id": str(chat_batch.chat_batch_id),
+                "status": chat_batch.status,
+                "item_count": chat_batch.item_count,
+                "failed_item_count": chat_batch.failed_item_count,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,54 @@
+""" Module for chat compression, training dictionaries and rewriting chat texts. """
+
+import argparse
+import json
+import sys
+
+from backend.api import main, provider
+from backend.api.text_compression import DEFAULT_DICTIONARY_SIZE, train_dictionary
+
+DEFAULT_SAMPLES = 10_000
+DEFAULT_BATCH_SIZE = 1000
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Chat text compression")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser(
+        "train", help="Train a dictionary on chat texts and use it for new texts"
+    )
+    train_parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES)
+    train_parser.add_argument(
+        "--dictionary-size", type=int, default=DEFAULT_DICTIONARY_SIZE
+    )
+    rewrite_parser = subparsers.add_parser(
+        "rewrite", help="Rewrite chat texts with the newest dictionary"
+    )
+    rewrite_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    # any other arguments configure the data repository as they do for the api
+    args, sys.argv[1:] = parser.parse_known_args()
+
+    main.init()
+    data_repository = provider.PROVIDERS.data_repository
+    match args.command:
+        case "train":
+            dictionary = train_dictionary(
+                data_repository.load_chat_text_samples(args.samples),
+                args.dictionary_size,
+            )
+            data_repository.save_zstd_dictionary(
+                dictionary.dict_id(), dictionary.as_bytes()
+            )
+            result = {
+                "zstd_dictionary_id": dictionary.dict_id(),
+                "dictionary_bytes": len(dictionary.as_bytes()),
+            }
+        case "rewrite":
+            result = {"rewritten": data_repository.rewrite_chat_texts(args.batch_size)}
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    init()
@@ -2,7 +2,11 @@
 
 from pydantic.dataclasses import dataclass
 
-from backend.api.enum import DataRepositoryType, InferenceProviderType
+from backend.api.enum import (
+    DataRepositoryType,
+    InferenceProviderType,
+    TracingExporterType,
+)
 
 
 @dataclass
@@ -11,10 +15,14 @@ class Config:
 
     # cli args
     debug_mode: bool
+    async_logging: bool
+    log_sample_ratios: dict[str, float]
 
     # conversation api
+    conversation_api_host: str
     conversation_api_port: int
     conversation_api_reload: bool
+    conversation_api_workers: int
 
     # auth0
     auth0_public_key: str
@@ -28,8 +36,64 @@ class Config:
     # sqlite
     sqlite_connection_string: str
 
+    # text compression
+    text_compression_threshold_bytes: int
+
+    # shared store
+    caller_cache_ttl_seconds: float
+    session_version_ttl_seconds: float
+
+    # response compression
+    response_compression_minimum_bytes: int
+
+    # chat cancellation
+    chat_deadline_seconds: float
+    chat_cancel_on_disconnect: bool
+
+    # graceful shutdown
+    drain_delay_seconds: float
+    drain_timeout_seconds: float
+    socket_handoff_directory: str | None
+
+    # chat batch
+    chat_batch_parallelism: int
+    chat_batch_micro_batch_size: int
+
+    # chat archive
+    chat_archive_directory: str
+    chat_archive_max_age_days: float
+
     # inference
     inference_provider_type: InferenceProviderType
+    inference_routing_rules_path: str | None
+    prompt_template_name: str
+    prompt_history_max_turns: int
+
+    # session summary
+    session_summary_enabled: bool
+    session_summary_prompt_template_name: str
+    session_summary_recent_turns: int
+    session_summary_fold_turns: int
+    session_summary_parallelism: int
+
+    # caller memory
+    caller_memory_enabled: bool
+    caller_memory_prompt_template_name: str
+    caller_memory_top_k: int
+    caller_memory_min_score: float
+    caller_memory_duplicate_score: float
+    caller_memory_max_facts: int
+    caller_memory_dimensions: int
+    caller_memory_cache_size: int
+    caller_memory_parallelism: int
+
+    # metrics
+    metrics_token: str | None
+
+    # tracing
+    tracing_exporter_type: TracingExporterType
+    tracing_sample_ratio: float
+    tracing_file_path: str
 
 
 CONFIG: Config = None
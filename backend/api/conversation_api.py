@@ -1,24 +1,93 @@
 """ Module for conversation api. """
 
-from typing import Annotated
+import asyncio
+import hashlib
+import hmac
+import time
+from typing import Annotated, Callable
+from uuid import UUID
 
 import uvicorn
 from authlib.jose import JoseError, JsonWebKey, jwt
 from authlib.jose.errors import ExpiredTokenError
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import (
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
+from starlette.background import BackgroundTask
 from structlog import get_logger
 
-from backend.api import config, main
-from backend.api.entities import Caller, ChatInputModel
+from backend.api import (
+    caller_import,
+    chat_batch,
+    config,
+    graceful_shutdown,
+    json_response,
+    main,
+    metrics,
+    provider,
+    response_compression,
+    tracing,
+    worker_pool,
+)
+from backend.api.cancellation import Cancellation, ChatCancelledError
+from backend.api.entities import (
+    Caller,
+    CallerImportReportModel,
+    Chat,
+    ChatInputModel,
+    ChatSearchResultModel,
+    ChatSearchResultsModel,
+    SessionChatModel,
+    SessionChatsModel,
+)
+from backend.api.enum import (
+    CallerImportFormat,
+    CancellationReason,
+    ChatSearchOrder,
+    InferencePriority,
+    SessionChatOrder,
+)
 
+# responses are rendered with orjson, and the hot endpoints build their response
+# themselves from prebuilt serializers rather than validating a response model
 app = (
     FastAPI(
         title=f"Personalised Lawyer API",
+        default_response_class=json_response.ORJSONResponse,
     )
     if config.CONFIG
-    else FastAPI()
+    else FastAPI(default_response_class=json_response.ORJSONResponse)
 )
+app.add_middleware(response_compression.CompressionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(graceful_shutdown.DrainMiddleware)
+
+_SESSION_CHAT_SERIALIZER = json_response.RowSerializer(SessionChatModel)
+_CHAT_SEARCH_RESULT_SERIALIZER = json_response.RowSerializer(ChatSearchResultModel)
+# as nginx logs a request its client closed before the response
+_CLIENT_CLOSED_REQUEST = 499
+
+
+class _RequestStreamingResponse(StreamingResponse):
+    """Class for streaming response produced while the request body is still being
+    read. Starlette listens for a disconnect by receiving messages, which would take
+    the body chunks, so a disconnect surfaces while reading the body instead."""
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
 
 
 @app.get("/")
@@ -31,6 +100,18 @@ async def get_root() -> dict[str, str]:
     return {"msg": "Welcome to the Conversation API!"}
 
 
+@app.get("/health/ready")
+async def get_health_ready() -> json_response.ORJSONResponse:
+    """Get readiness, failing once the api is draining so load balancers stop
+    sending it new requests."""
+
+    if graceful_shutdown.is_draining():
+        return json_response.ORJSONResponse(
+            {"status": "draining"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    return json_response.ORJSONResponse({"status": "ready"})
+
+
 def decode_jwt(token: str, required_permission: str) -> str:
     """Decode JWT token."""
 
@@ -72,8 +153,16 @@ def get_caller(
 ) -> Caller:
     """Get caller from token."""
 
-    idp_id = decode_jwt(token, "access:chat")
-    caller = main.get_caller(idp_id)
+    with (
+        metrics.CHAT_STAGE_DURATION_SECONDS.labels("jwt_decode").time(),
+        tracing.start_span("decode_jwt"),
+    ):
+        idp_id = decode_jwt(token, "access:chat")
+    with (
+        metrics.CHAT_STAGE_DURATION_SECONDS.labels("caller_lookup").time(),
+        tracing.start_span("load_caller"),
+    ):
+        caller = main.get_caller(idp_id)
     if caller:
         return caller
 
@@ -84,19 +173,379 @@ def get_caller(
     )
 
 
-@app.post("/chat")
-async def post_chat(
-    chat_input: ChatInputModel, caller: Annotated[Caller, Depends(get_caller)]
+def get_cancellation(
+    x_deadline_seconds: Annotated[float | None, Header(gt=0)] = None,
+) -> Cancellation:
+    """Get cancellation of a chat request, its deadline the seconds given in the
+    x-deadline-seconds header, at most the configured chat deadline. It is tracked
+    so the chat is cancelled if still running when a drain times out."""
+
+    deadline_seconds = config.CONFIG.chat_deadline_seconds
+    if x_deadline_seconds is not None:
+        deadline_seconds = min(deadline_seconds, x_deadline_seconds)
+    return graceful_shutdown.track_chat(Cancellation.after(deadline_seconds))
+
+
+def get_priority(
+    x_priority: Annotated[InferencePriority, Header()] = InferencePriority.INTERACTIVE,
+) -> InferencePriority:
+    """Get inference priority of a chat request, interactive unless the
+    x-priority header marks it bulk, as for a client processing documents that
+    should not hold up chats a person is waiting on."""
+
+    return x_priority
+
+
+def check_metrics_token(
+    token: str = Depends(OAuth2PasswordBearer(tokenUrl="token", auto_error=False)),
+) -> None:
+    """Check bearer token of a metrics scrape against the configured metrics token.
+    Metrics are not served at all while no token is configured, as they expose
+    traffic, error counts and latencies."""
+
+    if not config.CONFIG.metrics_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if token is None or not hmac.compare_digest(
+        token.encode(), config.CONFIG.metrics_token.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+def get_callers_admin(
+    token: str = Depends(OAuth2PasswordBearer(tokenUrl="token")),
 ) -> str:
-    """Post chat."""
+    """Get idp id of a caller allowed to administer callers from token."""
+
+    return decode_jwt(token, "admin:callers")
+
+
+@app.post("/chat", response_model=str | None)
+async def post_chat(
+    request: Request,
+    chat_input: ChatInputModel,
+    caller: Annotated[Caller, Depends(get_caller)],
+    cancellation: Annotated[Cancellation, Depends(get_cancellation)],
+    priority: Annotated[InferencePriority, Depends(get_priority)],
+) -> json_response.ORJSONResponse | Response:
+    """Post chat. A chat past its deadline, or whose client went away, is cancelled
+    and its provider job stopped."""
 
     logger = get_logger()
     logger.info("Starting post chat - '/chat' from conversation api")
 
-    chat_output = main.create_job(chat_input, caller)
+    # process chat blocks on the database and the provider, so it runs on the
+    # threadpool and the time spent waiting for a free thread is the queue wait
+    submitted_at = time.perf_counter()
+
+    def process_chat() -> Chat:
+        metrics.CHAT_STAGE_DURATION_SECONDS.labels("queue_wait").observe(
+            time.perf_counter() - submitted_at
+        )
+        with tracing.start_span(
+            "process_chat", **{"session.id": chat_input.caller_session_id}
+        ):
+            return main.process_chat(chat_input, caller, cancellation, priority)
+
+    try:
+        chat_output = await _run_cancellable(request, cancellation, process_chat)
+    except ChatCancelledError as error:
+        logger.info(
+            "Completed post chat - '/chat' from conversation api",
+            cancelled=error.reason,
+        )
+        if error.reason == CancellationReason.DEADLINE_EXCEEDED:
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Chat deadline exceeded",
+            )
+        if error.reason == CancellationReason.SERVER_SHUTDOWN:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server shutting down",
+                headers={"Retry-After": "1"},
+            )
+        return Response(status_code=_CLIENT_CLOSED_REQUEST)
+    metrics.CHAT_STAGE_DURATION_SECONDS.labels("total").observe(
+        time.perf_counter() - request.state.received_at
+    )
 
     logger.info("Completed post chat - '/chat' from conversation api")
-    return chat_output
+    return json_response.ORJSONResponse(chat_output.response_chat_text)
+
+
+@app.post("/chat/stream", response_class=StreamingResponse)
+async def post_chat_stream(
+    chat_input: ChatInputModel,
+    caller: Annotated[Caller, Depends(get_caller)],
+    cancellation: Annotated[Cancellation, Depends(get_cancellation)],
+    priority: Annotated[InferencePriority, Depends(get_priority)],
+) -> StreamingResponse:
+    """Post chat, the response text is streamed back as plain text as it is decoded
+    and the chat is saved once the response is complete. A stream past its
+    deadline ends early, and one whose client went away is cancelled."""
+
+    logger = get_logger()
+    logger.info("Starting post chat stream - '/chat/stream' from conversation api")
+
+    submitted_at = time.perf_counter()
+
+    def prepare_chat() -> tuple[Chat, str]:
+        metrics.CHAT_STAGE_DURATION_SECONDS.labels("queue_wait").observe(
+            time.perf_counter() - submitted_at
+        )
+        with tracing.start_span(
+            "prepare_chat", **{"session.id": chat_input.caller_session_id}
+        ):
+            return main.prepare_chat(chat_input, caller)
+
+    chat, prompt_text = await run_in_threadpool(prepare_chat)
+    pieces = main.stream_chat(chat, prompt_text, caller, cancellation, priority)
+
+    def finish_stream() -> None:
+        # run once streaming stops, a stream left unfinished having lost its client
+        if config.CONFIG.chat_cancel_on_disconnect:
+            cancellation.cancel(CancellationReason.CLIENT_DISCONNECTED)
+            pieces.close()
+        else:
+            for _ in pieces:
+                pass
+
+    logger.info(
+        "Completed post chat stream - '/chat/stream' from conversation api",
+        chat_id=chat.chat_id,
+    )
+    # a plain iterator, so starlette takes each piece from it on the threadpool
+    return StreamingResponse(
+        pieces,
+        media_type="text/plain; charset=utf-8",
+        headers={"x-chat-id": str(chat.chat_id)},
+        background=BackgroundTask(finish_stream),
+    )
+
+
+@app.post("/chat/batch")
+async def post_chat_batch(
+    request: Request,
+    caller: Annotated[Caller, Depends(get_caller)],
+    chat_batch_id: UUID = None,
+) -> StreamingResponse:
+    """Post chat batch, the body is streamed as jsonl chat inputs and the results
+    are streamed back as jsonl. Posting the same input with the chat batch id of
+    an incomplete batch resumes it."""
+
+    logger = get_logger().bind(chat_batch_id=chat_batch_id)
+    logger.info("Starting post chat batch - '/chat/batch' from conversation api")
+
+    batch = await run_in_threadpool(chat_batch.start_chat_batch, caller, chat_batch_id)
+    if batch is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Chat batch not found"
+        )
+
+    logger.info(
+        "Completed post chat batch - '/chat/batch' from conversation api",
+        chat_batch_id=batch.chat_batch_id,
+    )
+    return _RequestStreamingResponse(
+        chat_batch.run_chat_batch(request.stream(), caller, batch),
+        media_type="application/x-ndjson",
+        headers={"x-chat-batch-id": str(batch.chat_batch_id)},
+    )
+
+
+@app.get("/sessions/{caller_session_id}/chats", response_model=SessionChatsModel)
+async def get_session_chats(
+    request: Request,
+    caller: Annotated[Caller, Depends(get_caller)],
+    caller_session_id: Annotated[
+        str, Path(max_length=Chat.caller_session_id.type.length)
+    ],
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(gt=0, le=100)] = 20,
+    order: SessionChatOrder = SessionChatOrder.OLDEST,
+) -> StreamingResponse | Response:
+    """Get answered chats of a caller session oldest or newest first, archived chats
+    included. Paging newest first loads a long session's latest turns, then older
+    ones as they are asked for. The etag changes whenever a chat of the session is
+    saved, so a page the client already holds is not modified as long as it
+    matches."""
+
+    logger = get_logger().bind(caller_session_id=caller_session_id)
+    logger.info(
+        "Starting get session chats - '/sessions/{caller_session_id}/chats' from conversation api"
+    )
+
+    version = await run_in_threadpool(
+        main.get_session_version, caller.caller_id, caller_session_id
+    )
+    etag = _get_etag(caller.caller_id, caller_session_id, offset, limit, order, version)
+    headers = {"etag": etag, "cache-control": "private, no-cache"}
+    if _is_not_modified(request, etag):
+        logger.info(
+            "Completed get session chats - '/sessions/{caller_session_id}/chats' from conversation api",
+            not_modified=True,
+        )
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # one extra chat tells whether there is a next page without counting
+    chats = await run_in_threadpool(
+        provider.PROVIDERS.data_repository.load_session_chats,
+        caller.caller_id,
+        caller_session_id,
+        offset,
+        limit + 1,
+        order,
+    )
+
+    logger.info(
+        "Completed get session chats - '/sessions/{caller_session_id}/chats' from conversation api",
+        count=len(chats),
+    )
+    # long answers are sent a chunk of chats at a time as they are serialized
+    return json_response.stream_json_page(
+        "chats",
+        chats[:limit],
+        _SESSION_CHAT_SERIALIZER,
+        {"offset": offset, "limit": limit, "has_more": len(chats) > limit},
+        headers=headers,
+    )
+
+
+@app.get("/search", response_model=ChatSearchResultsModel)
+async def get_search(
+    caller: Annotated[Caller, Depends(get_caller)],
+    q: Annotated[str, Query(min_length=1, max_length=500)],
+    order: ChatSearchOrder = ChatSearchOrder.RELEVANCE,
+    offset: Annotated[int, Query(ge=0, le=10_000)] = 0,
+    limit: Annotated[int, Query(gt=0, le=100)] = 20,
+) -> json_response.ORJSONResponse:
+    """Get caller's chats matching every word of the query, best match or newest
+    first."""
+
+    logger = get_logger()
+    logger.info("Starting get search - '/search' from conversation api")
+
+    # one extra result tells whether there is a next page without counting
+    results = await run_in_threadpool(
+        provider.PROVIDERS.data_repository.search_chats,
+        caller.caller_id,
+        q,
+        order,
+        offset,
+        limit + 1,
+    )
+
+    logger.info(
+        "Completed get search - '/search' from conversation api", count=len(results)
+    )
+    return json_response.ORJSONResponse(
+        {
+            "results": [
+                _CHAT_SEARCH_RESULT_SERIALIZER.to_dict(result)
+                for result in results[:limit]
+            ],
+            "offset": offset,
+            "limit": limit,
+            "has_more": len(results) > limit,
+        }
+    )
+
+
+@app.post("/admin/callers/import")
+async def post_admin_callers_import(
+    request: Request,
+    admin_idp_id: Annotated[str, Depends(get_callers_admin)],
+    import_format: CallerImportFormat = CallerImportFormat.JSONL,
+    chunk_size: Annotated[int, Query(gt=0, le=50_000)] = (
+        caller_import.DEFAULT_CHUNK_SIZE
+    ),
+) -> CallerImportReportModel:
+    """Post callers to import, the body is streamed as csv or jsonl lines."""
+
+    logger = get_logger().bind(admin_idp_id=admin_idp_id, import_format=import_format)
+    logger.info(
+        "Starting post admin callers import - '/admin/callers/import' from conversation api"
+    )
+
+    # the body is parsed as it arrives and each full chunk is written on the
+    # threadpool, so the input is never held in memory as a whole
+    callers = caller_import.CallerImport(import_format, chunk_size)
+    async for line in caller_import.iterate_lines(request.stream()):
+        if callers.add_line(line):
+            await run_in_threadpool(callers.flush)
+    await run_in_threadpool(callers.flush)
+
+    logger.info(
+        "Completed post admin callers import - '/admin/callers/import' from conversation api",
+        **callers.report.model_dump(exclude={"errors"}),
+    )
+    return callers.report
+
+
+@app.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(check_metrics_token)],
+)
+async def get_metrics() -> PlainTextResponse:
+    """Get metrics in prometheus text exposition format, for scrapers sending the
+    metrics token."""
+
+    return PlainTextResponse(
+        metrics.render_prometheus_text(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@app.get("/inference/tiers/metrics", dependencies=[Depends(check_metrics_token)])
+async def get_inference_tiers_metrics() -> dict[str, dict[str, int | float]]:
+    """Get per inference tier volume and latency metrics, for clients sending the
+    metrics token."""
+
+    logger = get_logger()
+    logger.info(
+        "Completed get inference tiers metrics - '/inference/tiers/metrics' from conversation api"
+    )
+
+    return provider.PROVIDERS.inference_router.get_metrics()
+
+
+async def _run_cancellable(
+    request: Request, cancellation: Cancellation, function: Callable[[], any]
+) -> any:
+    # runs on the threadpool while the event loop listens for the client going
+    # away, the request body having been read already
+    if not config.CONFIG.chat_cancel_on_disconnect:
+        return await run_in_threadpool(function)
+
+    async def cancel_on_disconnect() -> None:
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+        cancellation.cancel(CancellationReason.CLIENT_DISCONNECTED)
+
+    listener = asyncio.create_task(cancel_on_disconnect())
+    try:
+        return await run_in_threadpool(function)
+    finally:
+        listener.cancel()
+
+
+def _get_etag(*parts: any) -> str:
+    # strong etag, the response being the same byte for byte while parts are
+    return f'"{hashlib.sha256("/".join(map(str, parts)).encode()).hexdigest()[:32]}"'
+
+
+def _is_not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    return if_none_match.strip() == "*" or etag in (
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    )
 
 
 # def create_job(job_request: JobRequestModel, caller: Caller) -> Job:
@@ -158,14 +607,37 @@ def init() -> None:
         "datefmt"
     ] = "%Y-%m-%d %H:%M:%S"
 
-    # run uvicorn
-    uvicorn.run(
-        "backend.api.conversation_api:app",
-        host="localhost",
-        port=config.CONFIG.conversation_api_port,
-        reload=config.CONFIG.conversation_api_reload,
-        log_level="debug" if config.CONFIG.debug_mode else "info",
-    )
+    # run uvicorn, forking workers once config and providers are loaded, both
+    # taking over the listening socket of a running server and draining on stop
+    log_level = "debug" if config.CONFIG.debug_mode else "info"
+    if (
+        config.CONFIG.conversation_api_workers > 1
+        and not config.CONFIG.conversation_api_reload
+    ):
+        worker_pool.serve_workers(
+            app,
+            config.CONFIG.conversation_api_host,
+            config.CONFIG.conversation_api_port,
+            config.CONFIG.conversation_api_workers,
+            log_level=log_level,
+            log_config=uvicorn_log_config,
+        )
+    elif not config.CONFIG.conversation_api_reload:
+        graceful_shutdown.serve(
+            app,
+            config.CONFIG.conversation_api_host,
+            config.CONFIG.conversation_api_port,
+            log_level=log_level,
+            log_config=uvicorn_log_config,
+        )
+    else:
+        uvicorn.run(
+            "backend.api.conversation_api:app",
+            host=config.CONFIG.conversation_api_host,
+            port=config.CONFIG.conversation_api_port,
+            reload=config.CONFIG.conversation_api_reload,
+            log_level=log_level,
+        )
 
     logger.info("Completed init from conversation api")
 
@@ -1,7 +1,43 @@
 """ Module for sqlite. """
 
+import re
+from uuid import UUID, uuid4
+
+from sqlalchemy import (
+    bindparam,
+    column,
+    delete,
+    event,
+    func,
+    literal_column,
+    null,
+    select,
+    table,
+    text,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from structlog import get_logger
+
 from backend.api import config
 from backend.api.data_repository import DataRepository
+from backend.api.entities import Caller, CallerFact, Chat, ChatSearchResultModel
+from backend.api.enum import ChatSearchOrder
+from backend.api.lib import now_utc
+
+# sqlite before 3.32 allows 999 bound parameters per statement
+_MAX_BOUND_PARAMETERS = 999
+
+# fts5 table created by migration, the caller key holds the caller id as one token
+_CHAT_SEARCH = table(
+    "chat_search",
+    column("caller_chat_text"),
+    column("response_chat_text"),
+    column("caller_key"),
+    column("chat_id"),
+)
+_SEARCH_TERM = re.compile(r"\w+")
 
 
 class SQLite(DataRepository):
@@ -12,4 +48,280 @@ class SQLite(DataRepository):
             config.CONFIG.sqlite_connection_string,
             config.CONFIG.debug_mode,
             config.CONFIG.run_db_migrations,
+            config.CONFIG.chat_archive_directory,
+        )
+        event.listen(self.engine, "connect", _set_pragmas)
+
+    def vacuum(self) -> None:
+        """Vacuum data repository, reclaiming the space of deleted data."""
+
+        logger = get_logger()
+        logger.info("Starting vacuum")
+
+        # vacuum rewrites the whole file and cannot run inside a transaction
+        with self.engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as connection:
+            connection.execute(text("VACUUM"))
+
+        logger.info("Completed vacuum")
+
+    def index_chats(self, session: Session, chats: list[Chat]) -> None:
+        """Index answered chats for search, in the transaction saving them."""
+
+        rows = [
+            {
+                "caller_chat_text": chat.caller_chat_text,
+                "response_chat_text": chat.response_chat_text,
+                "caller_key": chat.caller_id.hex,
+                "chat_id": chat.chat_id.hex,
+            }
+            for chat in chats
+            if chat.response_chat_text is not None
+        ]
+        if rows:
+            session.execute(_CHAT_SEARCH.insert(), rows)
+
+    def unindex_archived_chats(self, batch_size: int) -> int:
+        """Remove archived chats from the search index a batch at a time, returning
+        the count, so they are no longer found by search."""
+
+        logger = get_logger().bind(batch_size=batch_size)
+        logger.info("Starting unindex archived chats")
+
+        # the index is walked once in rowid order, as its chat id is not indexed
+        # and each row is matched to its chat by the chat primary key instead
+        result = 0
+        last_rowid = 0
+        while True:
+            with Session(self.engine) as session:
+                rowids = list(
+                    session.scalars(
+                        select(literal_column("chat_search.rowid"))
+                        .select_from(_CHAT_SEARCH)
+                        .join(Chat, Chat.chat_id == _CHAT_SEARCH.c.chat_id)
+                        .where(
+                            literal_column("chat_search.rowid") > last_rowid,
+                            Chat.archive_path.is_not(None),
+                        )
+                        .order_by(literal_column("chat_search.rowid"))
+                        .limit(batch_size)
+                    )
+                )
+                if not rowids:
+                    break
+                for start in range(0, len(rowids), _MAX_BOUND_PARAMETERS):
+                    session.execute(
+                        text(
+                            "DELETE FROM chat_search WHERE rowid IN :rowids"
+                        ).bindparams(bindparam("rowids", expanding=True)),
+                        {"rowids": rowids[start : start + _MAX_BOUND_PARAMETERS]},
+                    )
+                session.commit()
+            result += len(rowids)
+            last_rowid = rowids[-1]
+            logger.info("Unindexed archived chats", count=result)
+
+        logger.info("Completed unindex archived chats", count=result)
+        return result
+
+    def search_chats(
+        self,
+        caller_id: UUID,
+        query: str,
+        order: ChatSearchOrder,
+        offset: int,
+        limit: int,
+    ) -> list[ChatSearchResultModel]:
+        """Search answered chats of a caller, best match or newest first."""
+
+        logger = get_logger().bind(
+            caller_id=caller_id, order=order, offset=offset, limit=limit
         )
+        logger.info("Starting search chats")
+
+        # every term is quoted, so the query is only ever a list of words that
+        # must all appear and never fts5 syntax
+        terms = _SEARCH_TERM.findall(query)
+        if not terms:
+            logger.info("Completed search chats without terms")
+            return []
+        quoted_terms = " ".join(f'"{term}"' for term in terms)
+        match_expression = f'caller_key : "{caller_id.hex}" AND ({quoted_terms})'
+
+        search = literal_column("chat_search")
+        match order:
+            case ChatSearchOrder.RELEVANCE:
+                # bm25 counts the rows holding each term across the whole index,
+                # so its cost grows with how common the terms are
+                rank = func.bm25(search, 1.0, 1.0, 0.0)
+                order_by = rank
+            case ChatSearchOrder.RECENT:
+                # rows are indexed as chats are answered, so the newest match is
+                # the first one walking the index backwards
+                rank = null()
+                order_by = literal_column("chat_search.rowid").desc()
+        with Session(self.engine) as session:
+            rows = session.execute(
+                select(
+                    Chat.chat_id,
+                    Chat.caller_session_id,
+                    Chat.first_created,
+                    func.snippet(search, -1, "**", "**", "…", 24).label("snippet"),
+                    rank.label("rank"),
+                )
+                .select_from(_CHAT_SEARCH)
+                .join(Chat, Chat.chat_id == _CHAT_SEARCH.c.chat_id)
+                .where(
+                    text("chat_search MATCH :match").bindparams(match=match_expression)
+                )
+                .order_by(order_by)
+                .offset(offset)
+                .limit(limit)
+            ).all()
+        result = [ChatSearchResultModel(**row._mapping) for row in rows]
+
+        logger.info("Completed search chats", count=len(result))
+        return result
+
+    def upsert_callers(self, callers: list[dict[str, str]]) -> tuple[int, set[str]]:
+        """Upsert callers keyed on idp id as one transaction in data repository.
+
+        Returns the count of inserted or changed callers and the idp ids skipped as
+        their email already belongs to another caller.
+        """
+
+        logger = get_logger().bind(count=len(callers))
+        logger.info("Starting upsert callers")
+
+        statement = insert(Caller)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Caller.idp_id],
+            set_={
+                "name": statement.excluded.name,
+                "email": statement.excluded.email,
+                "last_updated": statement.excluded.last_updated,
+            },
+            where=(Caller.name != statement.excluded.name)
+            | (Caller.email != statement.excluded.email),
+        )
+        now = now_utc()
+        with self.engine.begin() as connection:
+            # emails are unique too, a caller taking another caller's email is
+            # skipped rather than failing the whole chunk
+            emails = [caller["email"] for caller in callers]
+            email_owners = {}
+            for start in range(0, len(emails), _MAX_BOUND_PARAMETERS):
+                email_owners.update(
+                    connection.execute(
+                        select(Caller.email, Caller.idp_id).where(
+                            Caller.email.in_(
+                                emails[start : start + _MAX_BOUND_PARAMETERS]
+                            )
+                        )
+                    ).all()
+                )
+            conflicting_idp_ids = {
+                caller["idp_id"]
+                for caller in callers
+                if email_owners.get(caller["email"], caller["idp_id"])
+                != caller["idp_id"]
+            }
+            rows = [
+                {
+                    **caller,
+                    "caller_id": uuid4(),
+                    "first_created": now,
+                    "last_updated": now,
+                }
+                for caller in callers
+                if caller["idp_id"] not in conflicting_idp_ids
+            ]
+            # executemany runs the statement once per row inside sqlite, so the
+            # count of bound parameters stays under the limit for any chunk size
+            result = connection.execute(statement, rows) if rows else None
+
+        upserted = result.rowcount if result else 0
+        logger.info(
+            "Completed upsert callers",
+            upserted=upserted,
+            conflicting=len(conflicting_idp_ids),
+        )
+        return upserted, conflicting_idp_ids
+
+    def upsert_caller_facts(
+        self,
+        caller_id: UUID,
+        caller_facts: list[CallerFact],
+        seen_caller_fact_ids: set[UUID],
+        max_facts: int,
+    ) -> int:
+        """Upsert facts of a caller keyed on fact key and mark facts seen again as one
+        transaction in data repository.
+
+        Returns the count of facts forgotten, those not seen for longest beyond the
+        most a caller keeps.
+        """
+
+        logger = get_logger().bind(caller_id=caller_id, count=len(caller_facts))
+        logger.info("Starting upsert caller facts")
+
+        # a fact another worker saved meanwhile is marked seen rather than repeated
+        statement = insert(CallerFact)
+        statement = statement.on_conflict_do_update(
+            index_elements=[CallerFact.caller_id, CallerFact.fact_key],
+            set_={
+                "last_seen": statement.excluded.last_seen,
+                "last_updated": statement.excluded.last_updated,
+            },
+        )
+        now = now_utc()
+        with self.engine.begin() as connection:
+            if caller_facts:
+                connection.execute(
+                    statement,
+                    [
+                        {
+                            "caller_fact_id": uuid4(),
+                            "caller_id": caller_id,
+                            "prompt_template_id": caller_fact.prompt_template_id,
+                            "chat_id": caller_fact.chat_id,
+                            "fact_key": caller_fact.fact_key,
+                            "fact_text": caller_fact.fact_text,
+                            "embedding": caller_fact.embedding,
+                            "last_seen": now,
+                            "first_created": now,
+                            "last_updated": now,
+                        }
+                        for caller_fact in caller_facts
+                    ],
+                )
+            if seen_caller_fact_ids:
+                connection.execute(
+                    update(CallerFact)
+                    .where(CallerFact.caller_fact_id.in_(seen_caller_fact_ids))
+                    .values(last_seen=now, last_updated=now)
+                )
+            kept = (
+                select(CallerFact.caller_fact_id)
+                .where(CallerFact.caller_id == caller_id)
+                .order_by(CallerFact.last_seen.desc())
+                .limit(max_facts)
+            )
+            forgotten = connection.execute(
+                delete(CallerFact).where(
+                    CallerFact.caller_id == caller_id,
+                    CallerFact.caller_fact_id.not_in(kept),
+                )
+            ).rowcount
+
+        logger.info("Completed upsert caller facts", forgotten=forgotten)
+        return forgotten
+
+
+def _set_pragmas(dbapi_connection, connection_record) -> None:
+    # write ahead logging lets readers in other worker processes carry on while a
+    # chat is being written, instead of all of them queueing on the file lock
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
@@ -1,14 +1,37 @@
 """ Module for data repository. """
 
-from abc import ABC
+from abc import ABC, abstractmethod
+from datetime import datetime
+from uuid import UUID
 
-from pydantic import ValidationError
-from sqlalchemy import Engine, create_engine
-from sqlalchemy.orm import Session, exc
+from sqlalchemy import (
+    Engine,
+    bindparam,
+    case,
+    create_engine,
+    func,
+    select,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, exc, undefer_group
 from structlog import get_logger
 
 from backend.api import config
-from backend.api.entities import Caller, CallerModel
+from backend.api.chat_archive_store import ChatArchiveStore
+from backend.api.entities import (
+    Caller,
+    CallerFact,
+    Chat,
+    ChatBatch,
+    ChatBatchChatRow,
+    ChatSearchResultModel,
+    PromptTemplate,
+    SessionChatRow,
+    SessionSummary,
+    ZstdDictionary,
+)
+from backend.api.enum import ChatSearchOrder, SessionChatOrder
 from backend.api.sql_migrations import run
 
 
@@ -16,29 +39,29 @@ class DataRepository(ABC):
     """Class for data repository."""
 
     engine: Engine = None
+    chat_archive_store: ChatArchiveStore = None
 
-    def __init__(self, connection_string: str, echo: bool, run_db_migrations: bool):
-        if run_db_migrations:
-            run.run_db_migrations(connection_string, echo)
+    def __init__(
+        self,
+        connection_string: str,
+        echo: bool,
+        run_db_migrations: bool,
+        chat_archive_directory: str,
+    ):
         self.engine = create_engine(connection_string, echo=echo)
+        if run_db_migrations:
+            run.run_db_migrations(connection_string, echo, self.engine)
+        self.chat_archive_store = ChatArchiveStore(chat_archive_directory)
 
-    def load_caller(self, api_key: str) -> Caller:
+    def load_caller(self, idp_id: str) -> Caller:
         """Load caller from data repository."""
 
-        logger = get_logger().bind(api_key=api_key)
+        logger = get_logger().bind(idp_id=idp_id)
         logger.info("Starting load caller")
 
         with Session(self.engine) as session:
             try:
-                caller = session.query(Caller).filter_by(api_key=api_key).one_or_none()
-                CallerModel.model_validate(caller)
-            except ValidationError as error:
-                logger.error(
-                    error,
-                    stack_info=config.CONFIG.debug_mode,
-                    exc_info=config.CONFIG.debug_mode,
-                )
-                raise None
+                caller = session.query(Caller).filter_by(idp_id=idp_id).one_or_none()
             except exc.MultipleResultsFound as error:
                 logger.error(
                     error,
@@ -49,3 +72,501 @@ class DataRepository(ABC):
 
         logger.info("Completed load caller")
         return caller
+
+    def count_session_chats(self, caller_id: UUID, caller_session_id: str) -> int:
+        """Count completed chats of a caller session in data repository."""
+
+        logger = get_logger().bind(
+            caller_id=caller_id, caller_session_id=caller_session_id
+        )
+        logger.info("Starting count session chats")
+
+        with Session(self.engine) as session:
+            result = session.scalar(
+                select(func.count())
+                .select_from(Chat)
+                .where(
+                    Chat.caller_id == caller_id,
+                    Chat.caller_session_id == caller_session_id,
+                    Chat.response_chat_text.is_not(None),
+                )
+            )
+
+        logger.info("Completed count session chats", result=result)
+        return result
+
+    def load_session_version(
+        self, caller_id: UUID, caller_session_id: str
+    ) -> tuple[datetime | None, int]:
+        """Load when completed chats of a caller session were last updated and how
+        many there are from data repository."""
+
+        logger = get_logger().bind(
+            caller_id=caller_id, caller_session_id=caller_session_id
+        )
+        logger.info("Starting load session version")
+
+        with Session(self.engine) as session:
+            last_updated, count = session.execute(
+                select(func.max(Chat.last_updated), func.count()).where(
+                    Chat.caller_id == caller_id,
+                    Chat.caller_session_id == caller_session_id,
+                    Chat.response_chat_text.is_not(None),
+                )
+            ).one()
+
+        logger.info("Completed load session version", count=count)
+        return last_updated, count
+
+    def load_session_chats(
+        self,
+        caller_id: UUID,
+        caller_session_id: str,
+        offset: int,
+        limit: int,
+        order: SessionChatOrder = SessionChatOrder.OLDEST,
+    ) -> list[SessionChatRow]:
+        """Load completed chats of a caller session oldest or newest first from data
+        repository."""
+
+        logger = get_logger().bind(
+            caller_id=caller_id,
+            caller_session_id=caller_session_id,
+            offset=offset,
+            limit=limit,
+            order=order,
+        )
+        logger.info("Starting load session chats")
+
+        order_by = (Chat.first_created, Chat.chat_id)
+        if order == SessionChatOrder.NEWEST:
+            order_by = tuple(column.desc() for column in order_by)
+
+        # rows are fetched whole before they are built, so the statement is done
+        # and holds no lock should reading a text load a new zstd dictionary
+        with self.engine.connect() as connection:
+            result = [
+                SessionChatRow(*row)
+                for row in connection.execute(
+                    SessionChatRow.select()
+                    .where(
+                        Chat.caller_id == caller_id,
+                        Chat.caller_session_id == caller_session_id,
+                        Chat.response_chat_text.is_not(None),
+                    )
+                    .order_by(*order_by)
+                    .offset(offset)
+                    .limit(limit)
+                ).all()
+            ]
+        self.chat_archive_store.load(result)
+
+        logger.info("Completed load session chats", count=len(result))
+        return result
+
+    def load_session_summary(
+        self, caller_id: UUID, caller_session_id: str
+    ) -> SessionSummary | None:
+        """Load summary of a caller session from data repository, none if its turns
+        have not been summarized yet."""
+
+        logger = get_logger().bind(
+            caller_id=caller_id, caller_session_id=caller_session_id
+        )
+        logger.info("Starting load session summary")
+
+        with Session(self.engine) as session:
+            result = session.get(SessionSummary, (caller_id, caller_session_id))
+
+        logger.info("Completed load session summary", found=result is not None)
+        return result
+
+    def save_session_summary(
+        self, summary: SessionSummary, previous_summarized_turns: int
+    ) -> bool:
+        """Save summary of a caller session into data repository if it still covers
+        the previous summarized turns, false if another summary was saved first."""
+
+        logger = get_logger().bind(
+            caller_id=summary.caller_id,
+            caller_session_id=summary.caller_session_id,
+            summarized_turns=summary.summarized_turns,
+        )
+        logger.info("Starting save session summary")
+
+        with Session(self.engine, expire_on_commit=False) as session:
+            if previous_summarized_turns == 0:
+                session.add(summary)
+                try:
+                    session.commit()
+                except IntegrityError:
+                    logger.info("Completed save session summary, saved by another")
+                    return False
+            else:
+                # compare and set, so a stale summary never replaces a newer one
+                result = session.execute(
+                    update(SessionSummary)
+                    .where(
+                        SessionSummary.caller_id == summary.caller_id,
+                        SessionSummary.caller_session_id == summary.caller_session_id,
+                        SessionSummary.summarized_turns == previous_summarized_turns,
+                    )
+                    .values(
+                        prompt_template_id=summary.prompt_template_id,
+                        summary_text=summary.summary_text,
+                        summarized_turns=summary.summarized_turns,
+                    )
+                )
+                session.commit()
+                if result.rowcount != 1:
+                    logger.info("Completed save session summary, saved by another")
+                    return False
+
+        logger.info("Completed save session summary")
+        return True
+
+    def load_caller_facts(self, caller_id: UUID, limit: int) -> list[CallerFact]:
+        """Load facts of a caller from data repository, most recently seen first."""
+
+        logger = get_logger().bind(caller_id=caller_id)
+        logger.info("Starting load caller facts")
+
+        with Session(self.engine) as session:
+            result = list(
+                session.scalars(
+                    select(CallerFact)
+                    .where(CallerFact.caller_id == caller_id)
+                    .order_by(CallerFact.last_seen.desc())
+                    .limit(limit)
+                )
+            )
+
+        logger.info("Completed load caller facts", count=len(result))
+        return result
+
+    def save_chat(self, chat: Chat) -> None:
+        """Save chat into data repository."""
+
+        logger = get_logger().bind(chat_id=chat.chat_id)
+        logger.info("Starting save chat")
+
+        with Session(self.engine, expire_on_commit=False) as session:
+            session.add(chat)
+            self.index_chats(session, [chat])
+            session.commit()
+
+        logger.info("Completed save chat")
+
+    def save_chats(self, chats: list[Chat]) -> None:
+        """Save chats into data repository as one transaction."""
+
+        logger = get_logger().bind(count=len(chats))
+        logger.info("Starting save chats")
+
+        with Session(self.engine, expire_on_commit=False) as session:
+            session.add_all(chats)
+            self.index_chats(session, chats)
+            session.commit()
+
+        logger.info("Completed save chats")
+
+    def save_chat_batch(self, chat_batch: ChatBatch) -> ChatBatch:
+        """Save new or changed chat batch into data repository."""
+
+        logger = get_logger().bind(chat_batch_id=chat_batch.chat_batch_id)
+        logger.info("Starting save chat batch")
+
+        with Session(self.engine, expire_on_commit=False) as session:
+            chat_batch = session.merge(chat_batch)
+            session.commit()
+
+        logger.info("Completed save chat batch")
+        return chat_batch
+
+    def load_chat_batch(self, chat_batch_id: UUID, caller_id: UUID) -> ChatBatch:
+        """Load chat batch of a caller from data repository."""
+
+        logger = get_logger().bind(chat_batch_id=chat_batch_id, caller_id=caller_id)
+        logger.info("Starting load chat batch")
+
+        with Session(self.engine) as session:
+            result = session.scalars(
+                select(ChatBatch).where(
+                    ChatBatch.chat_batch_id == chat_batch_id,
+                    ChatBatch.caller_id == caller_id,
+                )
+            ).one_or_none()
+
+        logger.info("Completed load chat batch", found=result is not None)
+        return result
+
+    def load_chat_batch_item_indexes(self, chat_batch_id: UUID) -> set[int]:
+        """Load item indexes of the completed chats of a batch from data repository."""
+
+        logger = get_logger().bind(chat_batch_id=chat_batch_id)
+        logger.info("Starting load chat batch item indexes")
+
+        with Session(self.engine) as session:
+            result = set(
+                session.scalars(
+                    select(Chat.chat_batch_item_index).where(
+                        Chat.chat_batch_id == chat_batch_id,
+                        Chat.response_chat_text.is_not(None),
+                    )
+                )
+            )
+
+        logger.info("Completed load chat batch item indexes", count=len(result))
+        return result
+
+    def load_chat_batch_chats(
+        self, chat_batch_id: UUID, item_indexes: list[int]
+    ) -> list[ChatBatchChatRow]:
+        """Load chats of a batch by item index from data repository."""
+
+        logger = get_logger().bind(chat_batch_id=chat_batch_id, count=len(item_indexes))
+        logger.info("Starting load chat batch chats")
+
+        with self.engine.connect() as connection:
+            result = [
+                ChatBatchChatRow(*row)
+                for row in connection.execute(
+                    ChatBatchChatRow.select().where(
+                        Chat.chat_batch_id == chat_batch_id,
+                        Chat.chat_batch_item_index.in_(item_indexes),
+                    )
+                ).all()
+            ]
+        self.chat_archive_store.load(result)
+
+        logger.info("Completed load chat batch chats", count=len(result))
+        return result
+
+    def archive_chats(self, archived_before: datetime, batch_size: int) -> int:
+        """Archive chats created before a time down to stub rows, a caller's chats
+        at a time, returning the count of archived chats."""
+
+        logger = get_logger().bind(archived_before=archived_before)
+        logger.info("Starting archive chats")
+
+        # the index on first created finds the callers, and then the caller index
+        # their chats, so no batch sorts every chat waiting to be archived
+        archivable = Chat.archive_path.is_(None), Chat.first_created < archived_before
+        with Session(self.engine) as session:
+            caller_ids = list(
+                session.scalars(select(Chat.caller_id).where(*archivable).distinct())
+            )
+
+        result = 0
+        for caller_id in caller_ids:
+            while True:
+                with Session(self.engine) as session:
+                    chats = list(
+                        session.scalars(
+                            select(Chat)
+                            .options(undefer_group("attachments"))
+                            .where(Chat.caller_id == caller_id, *archivable)
+                            .order_by(Chat.first_created)
+                            .limit(batch_size)
+                        )
+                    )
+                    if not chats:
+                        break
+                    archive_paths = self.chat_archive_store.write(chats)
+                    chat_ids_by_path: dict[str, list[UUID]] = {}
+                    for chat in chats:
+                        chat_ids_by_path.setdefault(
+                            archive_paths[chat.chat_id], []
+                        ).append(chat.chat_id)
+                    # the stub keeps whether the chat was answered and when it was
+                    # last updated, so history and caching read it as before
+                    for archive_path, chat_ids in chat_ids_by_path.items():
+                        session.execute(
+                            update(Chat)
+                            .where(Chat.chat_id.in_(chat_ids))
+                            .values(
+                                archive_path=archive_path,
+                                caller_chat_text="",
+                                caller_attachment_bytes=None,
+                                response_chat_text=case(
+                                    (Chat.response_chat_text.is_not(None), ""),
+                                    else_=None,
+                                ),
+                                response_attachment_bytes=None,
+                                last_updated=Chat.last_updated,
+                            )
+                            .execution_options(synchronize_session=False)
+                        )
+                    session.commit()
+                result += len(chats)
+                logger.info("Archived chats", caller_id=caller_id, count=len(chats))
+
+        logger.info("Completed archive chats", count=result)
+        return result
+
+    def load_zstd_dictionaries(self) -> dict[int, bytes]:
+        """Load zstd dictionaries oldest first from data repository."""
+
+        logger = get_logger()
+        logger.info("Starting load zstd dictionaries")
+
+        with Session(self.engine) as session:
+            result = dict(
+                session.execute(
+                    select(
+                        ZstdDictionary.zstd_dictionary_id,
+                        ZstdDictionary.dictionary_bytes,
+                    ).order_by(ZstdDictionary.first_created)
+                ).all()
+            )
+
+        logger.info("Completed load zstd dictionaries", count=len(result))
+        return result
+
+    def save_zstd_dictionary(
+        self, zstd_dictionary_id: int, dictionary_bytes: bytes
+    ) -> None:
+        """Save zstd dictionary into data repository."""
+
+        logger = get_logger().bind(zstd_dictionary_id=zstd_dictionary_id)
+        logger.info("Starting save zstd dictionary")
+
+        with Session(self.engine) as session:
+            session.add(
+                ZstdDictionary(
+                    zstd_dictionary_id=zstd_dictionary_id,
+                    dictionary_bytes=dictionary_bytes,
+                )
+            )
+            session.commit()
+
+        logger.info("Completed save zstd dictionary")
+
+    def load_chat_text_samples(self, limit: int) -> list[str]:
+        """Load a random sample of chat texts from data repository, for training a
+        zstd dictionary."""
+
+        logger = get_logger().bind(limit=limit)
+        logger.info("Starting load chat text samples")
+
+        with Session(self.engine) as session:
+            rows = session.execute(
+                select(Chat.caller_chat_text, Chat.response_chat_text)
+                .where(Chat.response_chat_text.is_not(None))
+                .order_by(func.random())
+                .limit(limit)
+            ).all()
+        result = [text for row in rows for text in row if text]
+
+        logger.info("Completed load chat text samples", count=len(result))
+        return result
+
+    def rewrite_chat_texts(self, batch_size: int) -> int:
+        """Rewrite chat texts in chat id order a batch at a time, so they are all
+        stored as the text compressor currently would, returning the count."""
+
+        logger = get_logger()
+        logger.info("Starting rewrite chat texts")
+
+        # the texts are read back decompressed and compressed again on write, and
+        # last updated is kept as only the storage changes
+        statement = (
+            update(Chat)
+            .where(Chat.chat_id == bindparam("b_chat_id"))
+            .values(
+                caller_chat_text=bindparam("b_caller_chat_text"),
+                response_chat_text=bindparam("b_response_chat_text"),
+                last_updated=Chat.last_updated,
+            )
+        )
+        result = 0
+        last_chat_id = None
+        while True:
+            query = (
+                select(Chat.chat_id, Chat.caller_chat_text, Chat.response_chat_text)
+                .order_by(Chat.chat_id)
+                .limit(batch_size)
+            )
+            if last_chat_id is not None:
+                query = query.where(Chat.chat_id > last_chat_id)
+            with Session(self.engine) as session:
+                rows = session.execute(query).all()
+                if not rows:
+                    break
+                session.connection().execute(
+                    statement,
+                    [
+                        {
+                            "b_chat_id": chat_id,
+                            "b_caller_chat_text": caller_chat_text,
+                            "b_response_chat_text": response_chat_text,
+                        }
+                        for chat_id, caller_chat_text, response_chat_text in rows
+                    ],
+                )
+                session.commit()
+            result += len(rows)
+            last_chat_id = rows[-1].chat_id
+            logger.info("Rewrote chat texts", count=result)
+
+        logger.info("Completed rewrite chat texts", count=result)
+        return result
+
+    @abstractmethod
+    def vacuum(self) -> None:
+        """Vacuum data repository, reclaiming the space of deleted data."""
+
+    @abstractmethod
+    def index_chats(self, session: Session, chats: list[Chat]) -> None:
+        """Index answered chats for search, in the transaction saving them."""
+
+    @abstractmethod
+    def unindex_archived_chats(self, batch_size: int) -> int:
+        """Remove archived chats from the search index a batch at a time, returning
+        the count, so they are no longer found by search."""
+
+    @abstractmethod
+    def search_chats(
+        self,
+        caller_id: UUID,
+        query: str,
+        order: ChatSearchOrder,
+        offset: int,
+        limit: int,
+    ) -> list[ChatSearchResultModel]:
+        """Search answered chats of a caller, best match or newest first."""
+
+    @abstractmethod
+    def upsert_callers(self, callers: list[dict[str, str]]) -> tuple[int, set[str]]:
+        """Upsert callers keyed on idp id as one transaction in data repository.
+
+        Returns the count of inserted or changed callers and the idp ids skipped as
+        their email already belongs to another caller.
+        """
+
+    @abstractmethod
+    def upsert_caller_facts(
+        self,
+        caller_id: UUID,
+        caller_facts: list[CallerFact],
+        seen_caller_fact_ids: set[UUID],
+        max_facts: int,
+    ) -> int:
+        """Upsert facts of a caller keyed on fact key and mark facts seen again as one
+        transaction in data repository.
+
+        Returns the count of facts forgotten, those not seen for longest beyond the
+        most a caller keeps.
+        """
+
+    def load_prompt_templates(self) -> list[PromptTemplate]:
+        """Load all prompt template versions from data repository."""
+
+        logger = get_logger()
+        logger.info("Starting load prompt templates")
+
+        with Session(self.engine) as session:
+            result = list(session.scalars(select(PromptTemplate)))
+
+        logger.info("Completed load prompt templates", count=len(result))
+        return result
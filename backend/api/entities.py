@@ -5,12 +5,28 @@ from typing import Annotated, List, Optional, Self
 from uuid import UUID, uuid4
 
 from pydantic import BaseModel, ConfigDict, Field, StringConstraints, model_validator
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, Select, UniqueConstraint, select
 from sqlalchemy.orm import Mapped, declarative_base, mapped_column, relationship
-from sqlalchemy.types import DateTime, Enum, Float, LargeBinary, Text, Unicode, Uuid
-
-from backend.api.enum import AttachmentType, InferenceProviderType
+from sqlalchemy.types import (
+    DateTime,
+    Enum,
+    Float,
+    Integer,
+    LargeBinary,
+    Text,
+    Unicode,
+    Uuid,
+)
+
+from backend.api.enum import (
+    AttachmentType,
+    ChatBatchStatus,
+    ChatStatus,
+    InferenceProviderType,
+    InferenceTier,
+)
 from backend.api.lib import now_utc
+from backend.api.text_compression import CompressedText
 
 Base = declarative_base()
 
@@ -43,6 +59,65 @@ class Caller(Base):
         return exclude_fields
 
 
+class PromptTemplate(Base):
+    """Class for prompt template table."""
+
+    __tablename__ = "prompt_template"
+
+    # primary and foreign keys
+    prompt_template_id: Mapped[int] = mapped_column(
+        Integer(), primary_key=True, autoincrement=True
+    )
+
+    # core fields
+    name: Mapped[str] = mapped_column(Unicode(100))
+    version: Mapped[int] = mapped_column(Integer())
+    template_text: Mapped[str] = mapped_column(Text())
+
+    # time and duration fields
+    first_created: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
+
+    __table_args__ = (UniqueConstraint(name, version),)
+
+
+class ZstdDictionary(Base):
+    """Class for zstd dictionary table, dictionaries trained on chat texts."""
+
+    __tablename__ = "zstd_dictionary"
+
+    # primary and foreign keys, the id zstd writes into each compressed frame
+    zstd_dictionary_id: Mapped[int] = mapped_column(
+        Integer(), primary_key=True, autoincrement=False
+    )
+
+    # core fields
+    dictionary_bytes: Mapped[bytes] = mapped_column(LargeBinary())
+
+    # time and duration fields
+    first_created: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
+
+
+class ChatBatch(Base):
+    """Class for chat batch table, chats of an offline batch refer to it."""
+
+    __tablename__ = "chat_batch"
+
+    # primary and foreign keys
+    chat_batch_id: Mapped[UUID] = mapped_column(Uuid(), default=uuid4, primary_key=True)
+    caller_id: Mapped[UUID] = mapped_column(ForeignKey("caller.caller_id"))
+
+    # core fields
+    status: Mapped[ChatBatchStatus] = mapped_column(Enum(ChatBatchStatus))
+    item_count: Mapped[Optional[int]] = mapped_column(Integer())
+    failed_item_count: Mapped[Optional[int]] = mapped_column(Integer())
+
+    # time and duration fields
+    first_created: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
+    last_updated: Mapped[datetime] = mapped_column(
+        DateTime(), default=now_utc, onupdate=now_utc
+    )
+
+
 class Chat(Base):
     """Class for chat table."""
 
@@ -52,24 +127,46 @@ class Chat(Base):
     chat_id: Mapped[UUID] = mapped_column(Uuid(), default=uuid4, primary_key=True)
     caller_id: Mapped[UUID] = mapped_column(ForeignKey("caller.caller_id"))
     caller: Mapped[Caller] = relationship(back_populates="chats")
+    prompt_template_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("prompt_template.prompt_template_id")
+    )
+    chat_batch_id: Mapped[Optional[UUID]] = mapped_column(
+        ForeignKey("chat_batch.chat_batch_id")
+    )
 
     # core fields
     caller_session_id: Mapped[str] = mapped_column(Unicode(50))
-    caller_chat_text: Mapped[str] = mapped_column(Text())
+    # large texts are stored zstd compressed, see the text compression module
+    caller_chat_text: Mapped[str] = mapped_column(CompressedText())
     caller_attachment_type: Mapped[Optional[AttachmentType]] = mapped_column(
         Enum(AttachmentType)
     )
-    caller_attachment_bytes: Mapped[Optional[bytes]] = mapped_column(LargeBinary())
-    prompt_template: Mapped[Optional[str]] = mapped_column(Text())
+    # attachments are deferred, only queries undeferring the attachments group
+    # load them
+    caller_attachment_bytes: Mapped[Optional[bytes]] = mapped_column(
+        LargeBinary(), deferred=True, deferred_group="attachments"
+    )
     inference_provider_type: Mapped[InferenceProviderType] = mapped_column(
         Enum(InferenceProviderType)
     )
+    inference_tier: Mapped[Optional[InferenceTier]] = mapped_column(Enum(InferenceTier))
     inference_provider_request_id: Mapped[Optional[str]] = mapped_column(Unicode(50))
-    response_chat_text: Mapped[Optional[str]] = mapped_column(Text())
+    request_id: Mapped[Optional[str]] = mapped_column(Unicode(50))
+    # position of the chat in the input of its batch
+    chat_batch_item_index: Mapped[Optional[int]] = mapped_column(Integer())
+    response_chat_text: Mapped[Optional[str]] = mapped_column(CompressedText())
     response_attachment_type: Mapped[Optional[AttachmentType]] = mapped_column(
         Enum(AttachmentType)
     )
-    response_attachment_bytes: Mapped[Optional[bytes]] = mapped_column(LargeBinary())
+    response_attachment_bytes: Mapped[Optional[bytes]] = mapped_column(
+        LargeBinary(), deferred=True, deferred_group="attachments"
+    )
+    # part file of the chat archive holding the text and attachments of a chat
+    # archived down to a stub row
+    archive_path: Mapped[Optional[str]] = mapped_column(Unicode(255))
+    # a cancelled chat has no response, its client went away or its deadline
+    # passed while the provider was answering
+    status: Mapped[Optional[ChatStatus]] = mapped_column(Enum(ChatStatus))
 
     # time and duration fields
     start_time: Mapped[Optional[datetime]] = mapped_column(DateTime())
@@ -81,6 +178,17 @@ class Chat(Base):
         DateTime(), default=now_utc, onupdate=now_utc
     )
 
+    __table_args__ = (
+        Index("ix_chat_caller_id_caller_session_id", caller_id, caller_session_id),
+        Index("ix_chat_first_created", first_created),
+        Index(
+            "ix_chat_chat_batch_id_chat_batch_item_index",
+            chat_batch_id,
+            chat_batch_item_index,
+            unique=True,
+        ),
+    )
+
     @classmethod
     def get_exclude_fields_for_logging(cls) -> set[str]:
         exclude_fields = {
@@ -91,14 +199,128 @@ class Chat(Base):
         return exclude_fields
 
 
+class SessionSummary(Base):
+    """Class for session summary table, the rolling summary of the earlier turns of
+    a caller session."""
+
+    __tablename__ = "session_summary"
+
+    # primary and foreign keys
+    caller_id: Mapped[UUID] = mapped_column(
+        ForeignKey("caller.caller_id"), primary_key=True
+    )
+    caller_session_id: Mapped[str] = mapped_column(Unicode(50), primary_key=True)
+    prompt_template_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("prompt_template.prompt_template_id")
+    )
+
+    # core fields
+    summary_text: Mapped[str] = mapped_column(CompressedText())
+    # completed turns of the session folded into the summary, counted oldest first
+    summarized_turns: Mapped[int] = mapped_column(Integer())
+
+    # time and duration fields
+    first_created: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
+    last_updated: Mapped[datetime] = mapped_column(
+        DateTime(), default=now_utc, onupdate=now_utc
+    )
+
+
+class CallerFact(Base):
+    """Class for caller fact table, what a caller has said about themselves that is
+    worth remembering across sessions, such as their jurisdiction or employer."""
+
+    __tablename__ = "caller_fact"
+
+    # primary and foreign keys
+    caller_fact_id: Mapped[UUID] = mapped_column(
+        Uuid(), default=uuid4, primary_key=True
+    )
+    caller_id: Mapped[UUID] = mapped_column(ForeignKey("caller.caller_id"))
+    prompt_template_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("prompt_template.prompt_template_id")
+    )
+    # chat the fact was first extracted from, not a foreign key as chats are
+    # archived down to stub rows
+    chat_id: Mapped[Optional[UUID]] = mapped_column(Uuid())
+
+    # core fields
+    # digest of the normalised fact text, so a fact is stored once per caller
+    fact_key: Mapped[str] = mapped_column(Unicode(64))
+    fact_text: Mapped[str] = mapped_column(Text())
+    # float32 embedding of the fact text, so loading a caller's facts does not
+    # embed them again
+    embedding: Mapped[Optional[bytes]] = mapped_column(LargeBinary())
+
+    # time and duration fields
+    # when the fact was last extracted again, facts not seen for longest are the
+    # first forgotten
+    last_seen: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
+    first_created: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
+    last_updated: Mapped[datetime] = mapped_column(
+        DateTime(), default=now_utc, onupdate=now_utc
+    )
+
+    __table_args__ = (
+        Index("ix_caller_fact_caller_id_fact_key", caller_id, fact_key, unique=True),
+        Index("ix_caller_fact_caller_id_last_seen", caller_id, last_seen),
+    )
+
+
+class ChatRow:
+    """Class for chat row, the columns of the chat table a read path needs.
+
+    Rows are plain slotted objects built straight from result tuples, so list and
+    history reads skip the identity map, attribute instrumentation and every
+    column they do not name, attachments included.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def select(cls) -> Select:
+        """Select the columns of the row from the chat table."""
+
+        return select(*(getattr(Chat, name) for name in cls.__slots__))
+
+
+class SessionChatRow(ChatRow):
+    """Class for session chat row, one turn of a caller session."""
+
+    __slots__ = (
+        "chat_id",
+        "caller_chat_text",
+        "caller_attachment_type",
+        "response_chat_text",
+        "response_attachment_type",
+        "archive_path",
+        "first_created",
+    )
+
+
+class ChatBatchChatRow(ChatRow):
+    """Class for chat batch chat row, the answer to one item of a batch."""
+
+    __slots__ = (
+        "chat_id",
+        "caller_session_id",
+        "chat_batch_item_index",
+        "response_chat_text",
+        "archive_path",
+    )
+
+
 class CallerModel(BaseModel):
     """Class for caller model."""
 
-    model_config = ConfigDict(from_attributes=True, arbitrary_types_allowed=True)
+    model_config = ConfigDict(from_attributes=True)
 
     # primary and foreign keys
     caller_id: UUID
-    chats: List[Chat]
 
     # core fields
     name: Annotated[str, StringConstraints(max_length=Caller.name.type.length)]
@@ -114,6 +336,89 @@ class CallerModel(BaseModel):
         return self
 
 
+class SessionChatModel(BaseModel):
+    """Class for session chat model, one turn of a caller session."""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    chat_id: UUID
+    caller_chat_text: str
+    caller_attachment_type: AttachmentType | None
+    response_chat_text: str
+    response_attachment_type: AttachmentType | None
+    first_created: datetime
+
+
+class SessionChatsModel(BaseModel):
+    """Class for session chats model, a page of turns oldest or newest first."""
+
+    chats: List[SessionChatModel]
+    offset: int
+    limit: int
+    has_more: bool
+
+
+class ChatSearchResultModel(BaseModel):
+    """Class for chat search result model."""
+
+    chat_id: UUID
+    caller_session_id: str
+    first_created: datetime
+    # best matching fragment, matched terms are marked in bold
+    snippet: str
+    # bm25 score, lower is a better match, only when ordered by relevance
+    rank: float | None
+
+
+class ChatSearchResultsModel(BaseModel):
+    """Class for chat search results model, a page of results."""
+
+    results: List[ChatSearchResultModel]
+    offset: int
+    limit: int
+    has_more: bool
+
+
+class CallerImportModel(BaseModel):
+    """Class for caller import model, one row of a bulk caller import."""
+
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    # core fields
+    name: Annotated[
+        str, StringConstraints(min_length=1, max_length=Caller.name.type.length)
+    ]
+    idp_id: Annotated[
+        str, StringConstraints(min_length=1, max_length=Caller.idp_id.type.length)
+    ]
+    email: Annotated[
+        str,
+        StringConstraints(
+            max_length=Caller.email.type.length, pattern=r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+        ),
+    ]
+
+
+class CallerImportErrorModel(BaseModel):
+    """Class for caller import error model, a rejected input line."""
+
+    line: int
+    error: str
+
+
+class CallerImportReportModel(BaseModel):
+    """Class for caller import report model."""
+
+    # input lines holding a caller, header and blank lines are not counted
+    rows: int = 0
+    # inserted or changed callers
+    upserted: int = 0
+    unchanged: int = 0
+    rejected: int = 0
+    # only the first rejected lines are listed
+    errors: List[CallerImportErrorModel] = Field(default_factory=list)
+
+
 class ChatInputModel(BaseModel):
     """Class for chat input model."""
 
@@ -124,7 +429,7 @@ class ChatInputModel(BaseModel):
     ] = Field("<chat session id>")
     caller_chat_text: str = Field("")
     caller_attachment_type: AttachmentType | None
-    caller_attachment_bytes: bytes | None = Field("")
+    caller_attachment_bytes: bytes | None = Field(None)
 
     @model_validator(mode="after")
     def check_caller_content(self) -> Self:
@@ -133,7 +438,7 @@ class ChatInputModel(BaseModel):
 
     @classmethod
     def get_exclude_fields_for_logging(cls) -> set[str]:
-        exclude_fields = "caller_attachment_bytes"
+        exclude_fields = {"caller_attachment_bytes"}
         return exclude_fields
 
 
@@ -143,31 +448,31 @@ class ChatModel(ChatInputModel):
     # primary and foreign keys
     chat_id: UUID
     caller_id: UUID
-    caller: Caller
+    prompt_template_id: int | None
 
     # core fields
-    prompt_template: str
     inference_provider_type: InferenceProviderType
+    inference_tier: InferenceTier | None
     inference_provider_request_id: Annotated[
-        str,
+        str | None,
         StringConstraints(max_length=Chat.inference_provider_request_id.type.length),
     ]
-    response_chat_text: Annotated[
-        str,
-        StringConstraints(max_length=Chat.response_chat_text.type.length),
+    request_id: Annotated[
+        str | None,
+        StringConstraints(max_length=Chat.request_id.type.length),
     ]
+    response_chat_text: str | None
     response_attachment_type: AttachmentType | None
-    response_attachment_bytes: bytes | None
+    response_attachment_bytes: bytes | None = Field(None)
+    status: ChatStatus | None
 
     # time and duration fields
-    start_time: Mapped[Optional[datetime]] = mapped_column(DateTime())
-    end_time: Mapped[Optional[datetime]] = mapped_column(DateTime())
-    inference_duration_seconds: Mapped[Optional[float]] = mapped_column(Float())
-    total_duration_seconds: Mapped[Optional[float]] = mapped_column(Float())
-    first_created: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
-    last_updated: Mapped[datetime] = mapped_column(
-        DateTime(), default=now_utc, onupdate=now_utc
-    )
+    start_time: datetime | None
+    end_time: datetime | None
+    inference_duration_seconds: float | None
+    total_duration_seconds: float | None
+    first_created: datetime
+    last_updated: datetime
 
     @model_validator(mode="after")
     def check_caller_content(self) -> Self:
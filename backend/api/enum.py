@@ -14,6 +14,22 @@ class InferenceProviderType(StrEnum):
 
     KUBERNETES_POD = auto()
     RUNPOD_SERVERLESS_API = auto()
+    FAKE = auto()
+
+
+class InferenceTier(StrEnum):
+    """Class for storing inference tier enumeration."""
+
+    SMALL = auto()
+    LARGE = auto()
+
+
+class InferencePriority(StrEnum):
+    """Class for storing inference priority enumeration, interactive requests are
+    admitted ahead of bulk ones."""
+
+    INTERACTIVE = auto()
+    BULK = auto()
 
 
 class AttachmentType(StrEnum):
@@ -22,3 +38,55 @@ class AttachmentType(StrEnum):
     TEXT_FILE = auto()
     PDF_FILE = auto()
     AUDIO_FILE = auto()
+
+
+class TracingExporterType(StrEnum):
+    """Class for storing tracing exporter type enumeration."""
+
+    NONE = auto()
+    IN_MEMORY = auto()
+    FILE = auto()
+
+
+class CallerImportFormat(StrEnum):
+    """Class for storing caller import input format enumeration."""
+
+    CSV = auto()
+    JSONL = auto()
+
+
+class ChatBatchStatus(StrEnum):
+    """Class for storing chat batch status enumeration."""
+
+    RUNNING = auto()
+    COMPLETED = auto()
+    INCOMPLETE = auto()
+
+
+class ChatStatus(StrEnum):
+    """Class for storing chat status enumeration."""
+
+    COMPLETED = auto()
+    CANCELLED = auto()
+
+
+class CancellationReason(StrEnum):
+    """Class for storing chat cancellation reason enumeration."""
+
+    DEADLINE_EXCEEDED = auto()
+    CLIENT_DISCONNECTED = auto()
+    SERVER_SHUTDOWN = auto()
+
+
+class SessionChatOrder(StrEnum):
+    """Class for storing session chat order enumeration."""
+
+    OLDEST = auto()
+    NEWEST = auto()
+
+
+class ChatSearchOrder(StrEnum):
+    """Class for storing chat search result order enumeration."""
+
+    RELEVANCE = auto()
+    RECENT = auto()
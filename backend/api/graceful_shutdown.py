@@ -0,0 +1,295 @@
+""" Module for draining the conversation api and handing its socket to a successor. """
+
+import asyncio
+import os
+import signal
+import socket
+import threading
+import weakref
+
+import uvicorn
+from structlog import get_logger
+
+from backend.api import config, provider, tracing
+from backend.api.cancellation import Cancellation
+from backend.api.enum import CancellationReason
+
+# seconds chats cancelled at the drain deadline get to be saved and answered before
+# uvicorn drops their requests
+CANCEL_GRACE_SECONDS = 5.0
+
+_DRAINING = threading.Event()
+_CHATS_IN_FLIGHT: "weakref.WeakSet[Cancellation]" = weakref.WeakSet()
+_CHATS_IN_FLIGHT_LOCK = threading.Lock()
+
+
+def is_draining() -> bool:
+    """Check whether the api is draining, readiness failing from then on."""
+
+    return _DRAINING.is_set()
+
+
+def start_draining() -> None:
+    """Start draining."""
+
+    _DRAINING.set()
+
+
+def track_chat(cancellation: Cancellation) -> Cancellation:
+    """Track the cancellation of a chat in flight, so the chat is cancelled if it is
+    still running at the drain deadline. Finished chats drop out as their
+    cancellation is collected."""
+
+    with _CHATS_IN_FLIGHT_LOCK:
+        _CHATS_IN_FLIGHT.add(cancellation)
+    return cancellation
+
+
+def cancel_chats_in_flight() -> int:
+    """Cancel every chat still in flight, returning how many there were."""
+
+    with _CHATS_IN_FLIGHT_LOCK:
+        cancellations = list(_CHATS_IN_FLIGHT)
+    cancelled = 0
+    for cancellation in cancellations:
+        if not cancellation.is_cancelled():
+            cancellation.cancel(CancellationReason.SERVER_SHUTDOWN)
+            cancelled += 1
+    return cancelled
+
+
+class DrainMiddleware:
+    """Class for middleware closing each connection after its response once the api
+    is draining, so clients holding keep alive connections open their next one to
+    whichever process accepts it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_closing(message):
+            if message["type"] == "http.response.start" and _DRAINING.is_set():
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"connection", b"close"),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_closing)
+
+
+class DrainingServer(uvicorn.Server):
+    """Class for uvicorn server draining when asked to stop.
+
+    Readiness fails as soon as draining starts, and connections are still accepted
+    for the drain delay so a load balancer can stop sending new ones. Listening
+    then stops and requests already accepted get until the drain timeout to finish.
+    Chats still running at that point are cancelled, so they are saved as cancelled
+    and answered rather than lost with the process. A stop signal is not raised
+    again once the server has stopped, so what is pending is flushed on the way out.
+    """
+
+    def __init__(
+        self,
+        uvicorn_config: uvicorn.Config,
+        drain_delay_seconds: float,
+        drain_timeout_seconds: float,
+    ):
+        uvicorn_config.timeout_graceful_shutdown = (
+            drain_timeout_seconds + CANCEL_GRACE_SECONDS
+        )
+        super().__init__(uvicorn_config)
+        self.drain_delay_seconds = drain_delay_seconds
+        self.drain_timeout_seconds = drain_timeout_seconds
+
+    def handle_exit(self, sig: int, frame) -> None:
+        # a second interrupt from the terminal stops without waiting on requests
+        if is_draining():
+            if sig == signal.SIGINT:
+                self.should_exit = self.force_exit = True
+            return
+        self.drain()
+
+    def drain(self) -> None:
+        """Start draining, listening stops once the drain delay has passed."""
+
+        get_logger().info(
+            "Starting drain",
+            drain_delay_seconds=self.drain_delay_seconds,
+            drain_timeout_seconds=self.drain_timeout_seconds,
+        )
+        start_draining()
+        if self.drain_delay_seconds > 0:
+            timer = threading.Timer(self.drain_delay_seconds, self._stop_listening)
+            timer.daemon = True
+            timer.start()
+        else:
+            self._stop_listening()
+
+    async def shutdown(self, sockets: list[socket.socket] = None) -> None:
+        deadline = asyncio.get_running_loop().call_later(
+            self.drain_timeout_seconds, self._cancel_chats_in_flight
+        )
+        try:
+            await super().shutdown(sockets)
+        finally:
+            deadline.cancel()
+        get_logger().info("Completed drain")
+
+    def _stop_listening(self) -> None:
+        self.should_exit = True
+
+    def _cancel_chats_in_flight(self) -> None:
+        cancelled = cancel_chats_in_flight()
+        if cancelled:
+            get_logger().warning("Cancelled chats at drain deadline", count=cancelled)
+
+
+class SocketHandoff:
+    """Class for handing the listening socket to a successor over a unix socket.
+
+    A new server asks the running one for its listening socket before binding one
+    of its own, so the socket is never closed across a restart and connections
+    queued on it are accepted by whichever process accepts next. The running server
+    stops once the socket is handed over, draining the requests it has accepted.
+    """
+
+    def __init__(self, directory: str | None, port: int):
+        self.path = (
+            os.path.join(directory, f"conversation_api-{port}.sock")
+            if directory
+            else None
+        )
+        self._listener: socket.socket | None = None
+
+    def take_over(self, timeout_seconds: float = 10.0) -> socket.socket | None:
+        """Take the listening socket of the running server, none if there is none or
+        it did not hand the socket over, as when it hung or died mid handoff."""
+
+        if not self.path:
+            return None
+        fds = []
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.settimeout(timeout_seconds)
+                connection.connect(self.path)
+                _, fds, _, _ = socket.recv_fds(connection, 1, 1)
+                # closed once the running server no longer listens for successors,
+                # so the path is free to listen on
+                connection.recv(1)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+        except OSError as error:
+            # a socket already received is still ours to listen on
+            get_logger().warning(
+                "Unable to take over listening socket",
+                path=self.path,
+                error=repr(error),
+            )
+        if not fds:
+            return None
+
+        get_logger().info("Completed take over listening socket", path=self.path)
+        return socket.socket(fileno=fds[0])
+
+    def serve(self, sock: socket.socket, on_handoff) -> None:
+        """Listen for a successor in the background, handing it the socket and then
+        calling on handoff."""
+
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # left behind by a server that did not stop cleanly, as none answered on it
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        self._listener.listen(1)
+        threading.Thread(
+            target=self._hand_off,
+            args=(self._listener, sock, on_handoff),
+            name="socket-handoff",
+            daemon=True,
+        ).start()
+
+    def close(self) -> None:
+        """Stop listening for a successor."""
+
+        listener, self._listener = self._listener, None
+        if listener is None:
+            return
+        # wakes the handoff thread if it is still waiting for a successor
+        try:
+            listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        listener.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _hand_off(self, listener: socket.socket, sock: socket.socket, on_handoff):
+        try:
+            connection, _ = listener.accept()
+        except OSError:
+            return
+        with connection:
+            try:
+                socket.send_fds(connection, [b"\0"], [sock.fileno()])
+            except OSError as error:
+                # the successor binds its own socket once this one is closed
+                get_logger().warning("Unable to hand off socket", error=repr(error))
+            self.close()
+        get_logger().info("Completed hand off listening socket", path=self.path)
+        on_handoff()
+
+
+def get_listening_socket(handoff: SocketHandoff, host: str, port: int):
+    """Get the listening socket of the running server, or bind a new one."""
+
+    return handoff.take_over() or socket.create_server((host, port), backlog=2048)
+
+
+def serve(app, host: str, port: int, **uvicorn_config: any) -> None:
+    """Serve app from this process, taking over the listening socket of a running
+    server on the same port if there is one, and draining when asked to stop or
+    when a successor takes the socket over."""
+
+    logger = get_logger().bind(host=host, port=port)
+    logger.info("Starting serve")
+
+    handoff = SocketHandoff(config.CONFIG.socket_handoff_directory, port)
+    sock = get_listening_socket(handoff, host, port)
+    server = get_draining_server(app, **uvicorn_config)
+    handoff.serve(sock, lambda: os.kill(os.getpid(), signal.SIGTERM))
+    try:
+        server.run(sockets=[sock])
+    finally:
+        handoff.close()
+    flush()
+
+    logger.info("Completed serve")
+
+
+def get_draining_server(app, **uvicorn_config: any) -> DrainingServer:
+    """Get draining server for app, as configured."""
+
+    return DrainingServer(
+        uvicorn.Config(app, **uvicorn_config),
+        config.CONFIG.drain_delay_seconds,
+        config.CONFIG.drain_timeout_seconds,
+    )
+
+
+def flush() -> None:
+    """Flush what is pending once serving has stopped, finishing session summaries
+    and caller fact extractions under way, closing pooled database connections and
+    writing queued spans. Queued logs are written at exit."""
+
+    provider.PROVIDERS.session_summarizer.shutdown()
+    provider.PROVIDERS.caller_memory.shutdown()
+    provider.PROVIDERS.data_repository.engine.dispose()
+    tracing.get_exporter().shutdown()
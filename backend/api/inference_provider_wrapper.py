@@ -1,17 +1,63 @@
 """ Module for inference provider wrapper. """
 
 from abc import ABC, abstractmethod
+from typing import Iterator
+
+from backend.api.cancellation import Cancellation
 
 
 class InferenceProviderWrapper(ABC):
     """Class for inference provider wrapper."""
 
+    endpoint: str = None
+    model_name: str = None
+
+    def __init__(self, endpoint: str = None, model_name: str = None):
+        self.endpoint = endpoint
+        self.model_name = model_name
+
     @abstractmethod
     def request_for_inference(
+        self,
         job_id: str,
         content_file_urls: list[str],
         prompt_text: str,
         output_blob_container: str = None,
         output_blob_paths: list[str] = [],
-    ):
-        """Request for inference."""
+        affinity_key: str = None,
+        cancellation: Cancellation = None,
+    ) -> str:
+        """Request for inference, requests sharing an affinity key should land on
+        the same backend where the provider supports it. Once the cancellation is
+        cancelled the provider job is stopped and chat cancelled error raised."""
+
+    def request_for_inference_batch(
+        self, job_ids: list[str], prompt_texts: list[str], affinity_key: str = None
+    ) -> list[str]:
+        """Request for inference of several prompts, one response per prompt in the
+        same order. Providers able to decode prompts together override this."""
+
+        return [
+            self.request_for_inference(
+                job_id, [], prompt_text, affinity_key=affinity_key
+            )
+            for job_id, prompt_text in zip(job_ids, prompt_texts)
+        ]
+
+    def stream_for_inference(
+        self,
+        job_id: str,
+        prompt_text: str,
+        affinity_key: str = None,
+        cancellation: Cancellation = None,
+    ) -> Iterator[str]:
+        """Stream response text as it is decoded. Providers able to stream override
+        this, otherwise the whole response comes as one piece."""
+
+        yield self.request_for_inference(
+            job_id,
+            [],
+            prompt_text,
+            affinity_key=affinity_key,
+            cancellation=cancellation,
+        )
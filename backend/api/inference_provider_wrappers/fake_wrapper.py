@@ -0,0 +1,263 @@
+""" Module for fake inference wrapper. """
+
+import collections
+import dataclasses
+import math
+import random
+import threading
+import time
+import urllib.parse
+from typing import Iterator, Literal
+
+from pydantic.dataclasses import dataclass
+from structlog import get_logger
+
+from backend.api.cancellation import Cancellation, ChatCancelledError
+from backend.api.inference_provider_wrapper import InferenceProviderWrapper
+
+# as prompt tokens are estimated from prompt text
+CHARACTERS_PER_TOKEN = 4
+# how often a request queued for sequences checks whether it was cancelled
+CANCELLATION_POLL_SECONDS = 0.05
+WORDS = (
+    "you should check the terms of your agreement and keep written records of "
+    "every notice you receive before contacting the tribunal or seeking advice "
+    "from a lawyer about your options under the relevant legislation"
+).split()
+
+
+@dataclass(frozen=True)
+class FakeInferenceSettings:
+    """Class for fake inference behaviour, times are in milliseconds."""
+
+    seed: int = 0
+    latency_distribution: Literal["constant", "exponential", "lognormal"] = "lognormal"
+    # median time to first token
+    latency_ms: float = 200.0
+    # shape of the lognormal distribution
+    latency_sigma: float = 0.5
+    tokens_per_second: float = 50.0
+    # prompt tokens read before the first token, zero for prompts costing nothing
+    prefill_tokens_per_second: float = 0.0
+    output_tokens: int = 64
+    # each other request in flight slows decoding by this share, as in a batch
+    batch_cost: float = 0.1
+    # sequences decoded at once, requests past it queue in arrival order, zero for
+    # no limit
+    max_concurrency: int = 0
+    failure_rate: float = 0.0
+    cold_start_ms: float = 0.0
+    # idle time after which the next request pays the cold start again
+    cold_after_idle_seconds: float = 300.0
+    # scales every simulated delay, zero turns sleeping off entirely
+    time_scale: float = 1.0
+
+    @classmethod
+    def from_endpoint(cls, endpoint: str = None) -> "FakeInferenceSettings":
+        """Parse settings from an endpoint such as fake://?latency_ms=50&seed=1."""
+
+        query = urllib.parse.urlsplit(endpoint or "").query
+        values = dict(urllib.parse.parse_qsl(query))
+        unknown = values.keys() - {field.name for field in dataclasses.fields(cls)}
+        if unknown:
+            raise ValueError(f"unknown fake inference settings - {sorted(unknown)}")
+        return cls(**values)
+
+
+class FakeInferenceError(ConnectionError):
+    """Class for simulated inference failure."""
+
+
+class FakeWrapper(InferenceProviderWrapper):
+    """Class for fake inference wrapper simulating a model server locally.
+
+    Behaviour is configured through the endpoint query string so each routing tier
+    can simulate a different model. Every request draws from a generator seeded by
+    the settings seed and the request sequence number, so a sequential run is
+    reproducible exactly and a concurrent run statistically.
+    """
+
+    def __init__(self, endpoint: str = None, model_name: str = None):
+        super().__init__(endpoint, model_name)
+        self.settings = FakeInferenceSettings.from_endpoint(endpoint)
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._in_flight = 0
+        self._last_finished_at = None
+        self._sequences = 0
+        self._waiting: collections.deque[tuple[int, threading.Event]] = (
+            collections.deque()
+        )
+
+    def request_for_inference(
+        self,
+        job_id: str,
+        content_file_urls: list[str],
+        prompt_text: str,
+        output_blob_container: str = None,
+        output_blob_paths: list[str] = [],
+        affinity_key: str = None,
+        cancellation: Cancellation = None,
+    ) -> str:
+        """Request for inference."""
+
+        logger = get_logger().bind(job_id=job_id)
+        logger.info("Starting request for inference from fake provider")
+
+        result = "".join(
+            self.stream_for_inference(job_id, prompt_text, cancellation=cancellation)
+        )
+
+        logger.info("Completed request for inference from fake provider")
+        return result
+
+    def request_for_inference_batch(
+        self, job_ids: list[str], prompt_texts: list[str], affinity_key: str = None
+    ) -> list[str]:
+        """Request for inference of several prompts decoded together, the batch
+        waits for its first token once and every decoding step yields a token for
+        each prompt."""
+
+        logger = get_logger().bind(job_ids=job_ids)
+        logger.info("Starting request for inference batch from fake provider")
+
+        settings = self.settings
+        generator = self._start_requests(
+            len(job_ids), prompt_characters=sum(map(len, prompt_texts))
+        )
+        try:
+            if generator.random() < settings.failure_rate:
+                raise FakeInferenceError(f"Simulated inference failure - {job_ids}")
+            words = [[] for _ in job_ids]
+            for _ in range(settings.output_tokens):
+                self._sleep_for_token()
+                for prompt_words in words:
+                    prompt_words.append(generator.choice(WORDS))
+        finally:
+            self._finish_requests(len(job_ids))
+
+        logger.info("Completed request for inference batch from fake provider")
+        return [" ".join(prompt_words) for prompt_words in words]
+
+    def stream_for_inference(
+        self,
+        job_id: str,
+        prompt_text: str,
+        affinity_key: str = None,
+        cancellation: Cancellation = None,
+    ) -> Iterator[str]:
+        """Stream response tokens as they are decoded, decoding stops at the first
+        token once cancelled, as a model server aborts a request."""
+
+        settings = self.settings
+        generator = self._start_requests(1, cancellation, len(prompt_text))
+        try:
+            if generator.random() < settings.failure_rate:
+                raise FakeInferenceError(f"Simulated inference failure - {job_id}")
+
+            for index in range(settings.output_tokens):
+                self._sleep_for_token(cancellation)
+                yield ("" if index == 0 else " ") + generator.choice(WORDS)
+        finally:
+            self._finish_requests(1)
+
+    def _start_requests(
+        self, count: int, cancellation: Cancellation = None, prompt_characters: int = 0
+    ) -> random.Random:
+        # draws a generator for the requests and waits until their first token,
+        # after reading their prompts
+        settings = self.settings
+        self._wait_for_sequences(count, cancellation)
+        with self._lock:
+            generator = random.Random(f"{settings.seed}:{self._sequence}")
+            self._sequence += 1
+            cold = (
+                self._last_finished_at is None
+                or time.monotonic() - self._last_finished_at
+                > settings.cold_after_idle_seconds
+            )
+            self._in_flight += count
+
+        try:
+            delay_ms = self._draw_latency_ms(generator)
+            if cold:
+                delay_ms += settings.cold_start_ms
+            if settings.prefill_tokens_per_second:
+                delay_ms += (
+                    1e3
+                    * prompt_characters
+                    / CHARACTERS_PER_TOKEN
+                    / settings.prefill_tokens_per_second
+                )
+            self._sleep(delay_ms, cancellation)
+        except BaseException:
+            self._finish_requests(count)
+            raise
+        return generator
+
+    def _finish_requests(self, count: int) -> None:
+        with self._lock:
+            self._in_flight -= count
+            self._last_finished_at = time.monotonic()
+            if self.settings.max_concurrency:
+                self._sequences -= min(count, self.settings.max_concurrency)
+                self._admit_waiting()
+
+    def _wait_for_sequences(
+        self, count: int, cancellation: Cancellation = None
+    ) -> None:
+        # waits in arrival order until the sequences of the requests are free, as a
+        # model server queues requests past those it decodes at once
+        max_concurrency = self.settings.max_concurrency
+        if not max_concurrency:
+            return
+        waiting = (min(count, max_concurrency), threading.Event())
+        with self._lock:
+            self._waiting.append(waiting)
+            self._admit_waiting()
+        _, admitted = waiting
+        while not admitted.is_set():
+            if cancellation is None:
+                admitted.wait()
+                continue
+            admitted.wait(CANCELLATION_POLL_SECONDS)
+            if cancellation.is_cancelled():
+                with self._lock:
+                    if not admitted.is_set():
+                        self._waiting.remove(waiting)
+                        raise ChatCancelledError(cancellation.reason)
+
+    def _admit_waiting(self) -> None:
+        # called with the lock held
+        while (
+            self._waiting
+            and self._sequences + self._waiting[0][0] <= self.settings.max_concurrency
+        ):
+            count, admitted = self._waiting.popleft()
+            self._sequences += count
+            admitted.set()
+
+    def _sleep_for_token(self, cancellation: Cancellation = None) -> None:
+        settings = self.settings
+        with self._lock:
+            batch_factor = 1.0 + settings.batch_cost * (self._in_flight - 1)
+        self._sleep(1e3 * batch_factor / settings.tokens_per_second, cancellation)
+
+    def _draw_latency_ms(self, generator: random.Random) -> float:
+        settings = self.settings
+        match settings.latency_distribution:
+            case "constant":
+                return settings.latency_ms
+            case "exponential":
+                return generator.expovariate(1.0 / settings.latency_ms)
+            case "lognormal":
+                return generator.lognormvariate(
+                    math.log(settings.latency_ms), settings.latency_sigma
+                )
+
+    def _sleep(self, milliseconds: float, cancellation: Cancellation = None) -> None:
+        seconds = milliseconds * self.settings.time_scale / 1e3
+        if cancellation is not None:
+            cancellation.sleep(seconds)
+        elif seconds > 0:
+            time.sleep(seconds)
@@ -1,10 +1,93 @@
 """ Module for kubernetes pod wrapper. """
 
+import bisect
+import hashlib
+import http.client
+import json
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Iterator
+
+from structlog import get_logger
+
+from backend.api.cancellation import Cancellation
 from backend.api.inference_provider_wrapper import InferenceProviderWrapper
 
 
+class ConsistentHashRing:
+    """Class for consistent hash ring, removing a node only moves its own keys."""
+
+    def __init__(self, nodes: list[str], virtual_nodes_per_node: int = 128):
+        self.nodes = list(nodes)
+        points = sorted(
+            (_hash(f"{node}#{index}"), node)
+            for node in self.nodes
+            for index in range(virtual_nodes_per_node)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def get_nodes(self, key: str):
+        """Yield distinct nodes in ring order starting from the key position."""
+
+        start = bisect.bisect(self._hashes, _hash(key))
+        seen = set()
+        for offset in range(len(self._nodes)):
+            node = self._nodes[(start + offset) % len(self._nodes)]
+            if node not in seen:
+                seen.add(node)
+                yield node
+                if len(seen) == len(self.nodes):
+                    return
+
+
 class KubernetesPodWrapper(InferenceProviderWrapper):
-    """Class for kubernetes pod wrapper."""
+    """Class for kubernetes pod wrapper.
+
+    Endpoint is a comma separated list of pod base urls serving an OpenAI
+    compatible completions api. Requests with the same affinity key are pinned to
+    the same pod so its prefix (kv) cache can be reused across turns.
+    """
+
+    def __init__(
+        self,
+        endpoint: str = None,
+        model_name: str = None,
+        timeout_seconds: float = 300.0,
+        unhealthy_cooldown_seconds: float = 30.0,
+    ):
+        super().__init__(endpoint, model_name)
+        self.pod_urls = [url.strip().rstrip("/") for url in (endpoint or "").split(",")]
+        self.pod_urls = [url for url in self.pod_urls if url]
+        self.timeout_seconds = timeout_seconds
+        self.unhealthy_cooldown_seconds = unhealthy_cooldown_seconds
+        self._ring = ConsistentHashRing(self.pod_urls)
+        self._unhealthy_until: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get_pod_urls(self, affinity_key: str) -> list[str]:
+        """Get pod urls in preference order, healthy pods first."""
+
+        now = time.monotonic()
+        with self._lock:
+            unhealthy = {
+                url for url, until in self._unhealthy_until.items() if until > now
+            }
+        ordered = list(self._ring.get_nodes(affinity_key or ""))
+        return [url for url in ordered if url not in unhealthy] + [
+            url for url in ordered if url in unhealthy
+        ]
+
+    def mark_unhealthy(self, pod_url: str) -> None:
+        """Mark pod as unhealthy, its sessions move to the next pod on the ring."""
+
+        with self._lock:
+            self._unhealthy_until[pod_url] = (
+                time.monotonic() + self.unhealthy_cooldown_seconds
+            )
 
     def request_for_inference(
         self,
@@ -13,5 +96,202 @@ class KubernetesPodWrapper(InferenceProviderWrapper):
         prompt_text: str,
         output_blob_container: str = None,
         output_blob_paths: list[str] = [],
-    ):
-        """Request for inference."""
+        affinity_key: str = None,
+        cancellation: Cancellation = None,
+    ) -> str:
+        """Request for inference. A cancellable request is streamed, so it can be
+        stopped between tokens by closing the connection, which aborts the request
+        on the pod."""
+
+        if cancellation is not None:
+            return "".join(
+                self.stream_for_inference(
+                    job_id, prompt_text, affinity_key, cancellation
+                )
+            )
+
+        logger = get_logger().bind(job_id=job_id)
+        logger.info("Starting request for inference from kubernetes pod")
+
+        response, pod_url = self._post_completions(
+            {"model": self.model_name, "prompt": prompt_text, "user": affinity_key},
+            affinity_key or job_id,
+        )
+        result = response["choices"][0]["text"]
+
+        logger.info(
+            "Completed request for inference from kubernetes pod", pod_url=pod_url
+        )
+        return result
+
+    def request_for_inference_batch(
+        self, job_ids: list[str], prompt_texts: list[str], affinity_key: str = None
+    ) -> list[str]:
+        """Request for inference of several prompts in one completions request, so
+        the pod decodes them together in one batch."""
+
+        logger = get_logger().bind(job_ids=job_ids)
+        logger.info("Starting request for inference batch from kubernetes pod")
+
+        response, pod_url = self._post_completions(
+            {"model": self.model_name, "prompt": prompt_texts, "user": affinity_key},
+            affinity_key or job_ids[0],
+        )
+        # choices are not guaranteed to come back in prompt order
+        result = [
+            choice["text"]
+            for choice in sorted(
+                response["choices"], key=lambda choice: choice["index"]
+            )
+        ]
+
+        logger.info(
+            "Completed request for inference batch from kubernetes pod",
+            pod_url=pod_url,
+        )
+        return result
+
+    def stream_for_inference(
+        self,
+        job_id: str,
+        prompt_text: str,
+        affinity_key: str = None,
+        cancellation: Cancellation = None,
+    ) -> Iterator[str]:
+        """Stream response text as the pod decodes it, read from its server sent
+        events. The request only moves to another pod before the first event, and
+        reading stops once cancelled or past the deadline, closing the connection
+        so the pod aborts the request.
+
+        Cancelling shuts the connection down from the cancelling thread, so a read
+        blocked on a long prefill or a stalled pod returns at once rather than at
+        the first token or the socket timeout.
+        """
+
+        logger = get_logger().bind(job_id=job_id)
+        logger.info("Starting stream for inference from kubernetes pod")
+
+        response, pod_url = self._post_completions(
+            {
+                "model": self.model_name,
+                "prompt": prompt_text,
+                "user": affinity_key,
+                "stream": True,
+            },
+            affinity_key or job_id,
+            stream=True,
+            cancellation=cancellation,
+        )
+        # the lock keeps the connection from being shut down once it is closed,
+        # when its file descriptor may already belong to another connection
+        lock = threading.Lock()
+        finished = False
+
+        def shut_down() -> None:
+            with lock:
+                if not finished:
+                    _shut_down(response)
+
+        remove_callback = (
+            cancellation.add_callback(shut_down)
+            if cancellation is not None
+            else lambda: None
+        )
+        with response:
+            try:
+                for line in response:
+                    if cancellation is not None:
+                        cancellation.check()
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[len(b"data:") :].strip()
+                    if data == b"[DONE]":
+                        break
+                    text = json.loads(data)["choices"][0]["text"]
+                    if text:
+                        yield text
+                # a connection shut down by cancelling reads as ended
+                if cancellation is not None:
+                    cancellation.check()
+            except (OSError, http.client.HTTPException):
+                # the read may have timed out at the deadline, or been cut short by
+                # cancelling, rather than failed at the pod
+                if cancellation is not None:
+                    cancellation.check()
+                raise
+            finally:
+                remove_callback()
+                with lock:
+                    finished = True
+
+        logger.info(
+            "Completed stream for inference from kubernetes pod", pod_url=pod_url
+        )
+
+    def _post_completions(
+        self,
+        payload: dict,
+        affinity_key: str,
+        stream: bool = False,
+        cancellation: Cancellation = None,
+    ) -> tuple[any, str]:
+        # a streamed response is returned open, for the caller to read and close
+        logger = get_logger()
+        body = json.dumps(payload).encode()
+        last_error = None
+        for pod_url in self.get_pod_urls(affinity_key):
+            request = urllib.request.Request(
+                f"{pod_url}/v1/completions",
+                data=body,
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            timeout_seconds = self.timeout_seconds
+            if cancellation is not None:
+                cancellation.check()
+                remaining_seconds = cancellation.get_remaining_seconds()
+                if remaining_seconds is not None:
+                    # a zero timeout would make the socket non blocking
+                    timeout_seconds = max(
+                        0.001, min(timeout_seconds, remaining_seconds)
+                    )
+            try:
+                response = urllib.request.urlopen(request, timeout=timeout_seconds)
+                if stream:
+                    return response, pod_url
+                with response:
+                    return json.load(response), pod_url
+            except urllib.error.HTTPError:
+                # the pod answered, so the request itself is at fault
+                raise
+            except (urllib.error.URLError, ConnectionError, TimeoutError) as error:
+                # timed out at the deadline, which is not the pod's fault
+                if cancellation is not None:
+                    cancellation.check()
+                logger.warning(
+                    "Unable to reach kubernetes pod", pod_url=pod_url, error=str(error)
+                )
+                self.mark_unhealthy(pod_url)
+                last_error = error
+
+        raise ConnectionError(f"No kubernetes pod is reachable - {last_error}")
+
+
+def _shut_down(response) -> None:
+    # shutting the socket down wakes a read blocked on it on another thread, which
+    # closing the response does not, the socket is detached so it stays open until
+    # the response is closed
+    try:
+        sock = socket.socket(fileno=response.fileno())
+    except (OSError, ValueError):
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    finally:
+        sock.detach()
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest())
@@ -1,5 +1,6 @@
 """ Module for runpod serverless api wrapper. """
 
+from backend.api.cancellation import Cancellation
 from backend.api.inference_provider_wrapper import InferenceProviderWrapper
 
 
@@ -13,5 +14,7 @@ class RunpodServerlessAPIWrapper(InferenceProviderWrapper):
         prompt_text: str,
         output_blob_container: str = None,
         output_blob_paths: list[str] = [],
-    ):
+        affinity_key: str = None,
+        cancellation: Cancellation = None,
+    ) -> str:
         """Request for inference."""
@@ -0,0 +1,295 @@
+""" Module for inference router. """
+
+import contextlib
+import json
+import os
+import threading
+import time
+from dataclasses import field
+from typing import Callable
+
+from pydantic import TypeAdapter
+from pydantic.dataclasses import dataclass
+from structlog import get_logger
+
+from backend.api import metrics
+from backend.api.cancellation import Cancellation
+from backend.api.entities import ChatInputModel
+from backend.api.enum import (
+    AttachmentType,
+    InferencePriority,
+    InferenceProviderType,
+    InferenceTier,
+)
+from backend.api.inference_provider_wrapper import InferenceProviderWrapper
+from backend.api.inference_scheduler import InferenceScheduler
+
+
+@dataclass(frozen=True)
+class InferenceTierConfig:
+    """Class for storing inference tier configuration."""
+
+    inference_provider_type: InferenceProviderType
+    endpoint: str = None
+    model_name: str = None
+    # slots of the tier per process, none for no limit
+    max_concurrency: int = None
+    # slots only interactive requests may take
+    interactive_reserved_concurrency: int = 0
+    # bulk requests queued longer are admitted ahead of interactive ones
+    bulk_max_wait_seconds: float = 30.0
+
+    def __post_init__(self):
+        if self.max_concurrency is not None and not (
+            0 <= self.interactive_reserved_concurrency < self.max_concurrency
+        ):
+            raise ValueError(
+                "interactive reserved concurrency - "
+                f"{self.interactive_reserved_concurrency} must be below max "
+                f"concurrency - {self.max_concurrency}"
+            )
+
+
+@dataclass
+class RoutingRule:
+    """Class for storing routing rule, a chat matches when every set limit holds."""
+
+    tier: InferenceTier
+    max_text_length: int = None
+    max_attachment_bytes: int = None
+    attachment_types: list[AttachmentType] = field(default_factory=list)
+    max_session_depth: int = None
+
+    def matches(self, chat_input: ChatInputModel, session_depth: int) -> bool:
+        """Check whether chat input matches the rule."""
+
+        if (
+            self.max_text_length is not None
+            and len(chat_input.caller_chat_text) > self.max_text_length
+        ):
+            return False
+        if chat_input.caller_attachment_type is not None:
+            if chat_input.caller_attachment_type not in self.attachment_types:
+                return False
+            attachment_bytes = len(chat_input.caller_attachment_bytes or b"")
+            if (
+                self.max_attachment_bytes is not None
+                and attachment_bytes > self.max_attachment_bytes
+            ):
+                return False
+        if (
+            self.max_session_depth is not None
+            and session_depth > self.max_session_depth
+        ):
+            return False
+        return True
+
+
+@dataclass
+class RoutingPolicy:
+    """Class for storing routing policy, rules are evaluated in order."""
+
+    tiers: dict[InferenceTier, InferenceTierConfig]
+    rules: list[RoutingRule] = field(default_factory=list)
+    default_tier: InferenceTier = InferenceTier.LARGE
+    reload_interval_seconds: float = 5.0
+
+
+_ROUTING_POLICY_ADAPTER = TypeAdapter(RoutingPolicy)
+
+
+class InferenceRouter:
+    """Class for routing chats to inference tiers based on a routing policy."""
+
+    def __init__(
+        self,
+        rules_path: str,
+        default_inference_provider_type: InferenceProviderType,
+        wrapper_factory: Callable[
+            [InferenceProviderType, str, str], InferenceProviderWrapper
+        ],
+    ):
+        self.rules_path = rules_path
+        self.default_inference_provider_type = default_inference_provider_type
+        self.wrapper_factory = wrapper_factory
+        self._reload_lock = threading.Lock()
+        self._rules_mtime = None
+        self._next_reload_check = 0.0
+        # policy, wrappers and schedulers are swapped together as one tuple so
+        # readers never see a policy paired with the wrappers of another
+        self._state: tuple[
+            RoutingPolicy,
+            dict[InferenceTier, InferenceProviderWrapper],
+            dict[InferenceTier, InferenceScheduler],
+        ] = (None, {}, {})
+        self.reload(force=True)
+
+    def classify(self, chat_input: ChatInputModel, session_depth: int) -> InferenceTier:
+        """Classify chat input into an inference tier."""
+
+        self._reload_if_due()
+        policy, _, _ = self._state
+        for rule in policy.rules:
+            if rule.matches(chat_input, session_depth):
+                return rule.tier
+        return policy.default_tier
+
+    def get_tier_config(self, tier: InferenceTier) -> InferenceTierConfig:
+        """Get inference tier configuration."""
+
+        policy, _, _ = self._state
+        return policy.tiers.get(tier) or policy.tiers[policy.default_tier]
+
+    def get_wrapper(self, tier: InferenceTier) -> InferenceProviderWrapper:
+        """Get inference provider wrapper for tier."""
+
+        policy, wrappers, _ = self._state
+        return wrappers.get(tier) or wrappers[policy.default_tier]
+
+    def schedule(
+        self,
+        tier: InferenceTier,
+        priority: InferencePriority,
+        slots: int = 1,
+        cancellation: Cancellation = None,
+    ) -> contextlib.AbstractContextManager[int]:
+        """Schedule inference on tier, a context manager holding up to the given
+        slots of the tier while it is open and giving the count granted."""
+
+        policy, _, schedulers = self._state
+        scheduler = schedulers.get(tier) or schedulers[policy.default_tier]
+        return scheduler.acquire(priority, slots, cancellation)
+
+    def record(
+        self,
+        tier: InferenceTier,
+        duration_seconds: float,
+        failed: bool,
+        cancelled: bool = False,
+    ):
+        """Record inference latency and outcome for tier."""
+
+        metrics.INFERENCE_DURATION_SECONDS.labels(tier).observe(duration_seconds)
+        metrics.INFERENCE_REQUESTS_TOTAL.labels(
+            tier, "cancelled" if cancelled else "failure" if failed else "success"
+        ).inc()
+
+    def get_metrics(self) -> dict[str, dict[str, int | float]]:
+        """Get per tier metrics, percentiles are estimated from histogram buckets."""
+
+        result = {}
+        for tier in InferenceTier:
+            duration = metrics.INFERENCE_DURATION_SECONDS.labels(tier)
+            _, total_duration_seconds, request_count = duration.get()
+            result[str(tier)] = {
+                "request_count": int(request_count),
+                "error_count": int(
+                    metrics.INFERENCE_REQUESTS_TOTAL.labels(tier, "failure").get()
+                ),
+                "mean_duration_seconds": (
+                    total_duration_seconds / request_count if request_count else 0.0
+                ),
+                "p50_duration_seconds": duration.quantile(0.50),
+                "p95_duration_seconds": duration.quantile(0.95),
+                "p99_duration_seconds": duration.quantile(0.99),
+            }
+        return result
+
+    def reload(self, force: bool = False) -> None:
+        """Reload routing policy if rules file has changed."""
+
+        logger = get_logger().bind(rules_path=self.rules_path)
+
+        mtime = (
+            os.stat(self.rules_path).st_mtime_ns
+            if self.rules_path and os.path.exists(self.rules_path)
+            else None
+        )
+        if not force and mtime == self._rules_mtime:
+            return
+
+        logger.info("Starting reload routing policy")
+
+        try:
+            policy = (
+                _load_policy(self.rules_path)
+                if mtime is not None
+                else self._get_default_policy()
+            )
+            wrappers, schedulers = self._build_tiers(policy)
+        except Exception as error:
+            # keep serving with the last good policy, a wrapper failing to build
+            # for a tier leaves every tier as it was
+            logger.error("Unable to load routing policy", error=str(error))
+            if self._state[0] is None:
+                raise
+            return
+        self._state = (policy, wrappers, schedulers)
+        self._rules_mtime = mtime
+
+        logger.info("Completed reload routing policy", tiers=list(policy.tiers))
+
+    def _build_tiers(self, policy: RoutingPolicy) -> tuple[
+        dict[InferenceTier, InferenceProviderWrapper],
+        dict[InferenceTier, InferenceScheduler],
+    ]:
+        current_policy, current_wrappers, current_schedulers = self._state
+        wrappers = {}
+        schedulers = {}
+        for tier, tier_config in policy.tiers.items():
+            # reuse wrappers and schedulers for unchanged tiers so their connections
+            # stay warm and their slots stay counted
+            if (
+                current_policy is not None
+                and current_policy.tiers.get(tier) == tier_config
+                and tier in current_wrappers
+            ):
+                wrappers[tier] = current_wrappers[tier]
+                schedulers[tier] = current_schedulers[tier]
+            else:
+                wrappers[tier] = self.wrapper_factory(
+                    tier_config.inference_provider_type,
+                    tier_config.endpoint,
+                    tier_config.model_name,
+                )
+                schedulers[tier] = InferenceScheduler(
+                    tier,
+                    tier_config.max_concurrency,
+                    tier_config.interactive_reserved_concurrency,
+                    tier_config.bulk_max_wait_seconds,
+                )
+        return wrappers, schedulers
+
+    def _reload_if_due(self) -> None:
+        now = time.monotonic()
+        if now < self._next_reload_check or not self._reload_lock.acquire(
+            blocking=False
+        ):
+            return
+        try:
+            self.reload()
+        finally:
+            # set even if the reload failed, so a bad rules file is read again once
+            # per interval rather than on every chat
+            self._next_reload_check = now + self._state[0].reload_interval_seconds
+            self._reload_lock.release()
+
+    def _get_default_policy(self) -> RoutingPolicy:
+        return RoutingPolicy(
+            tiers={
+                InferenceTier.LARGE: InferenceTierConfig(
+                    inference_provider_type=self.default_inference_provider_type
+                )
+            },
+        )
+
+
+def _load_policy(rules_path: str) -> RoutingPolicy:
+    with open(rules_path, encoding="utf-8") as file:
+        policy = _ROUTING_POLICY_ADAPTER.validate_python(json.load(file))
+    if policy.default_tier not in policy.tiers:
+        raise ValueError(f"default tier - {policy.default_tier} is not configured")
+    for rule in policy.rules:
+        if rule.tier not in policy.tiers:
+            raise ValueError(f"rule tier - {rule.tier} is not configured")
+    return policy
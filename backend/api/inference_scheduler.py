@@ -0,0 +1,164 @@
+""" Module for inference scheduler. """
+
+import collections
+import contextlib
+import threading
+import time
+from typing import Iterator
+
+from backend.api import metrics
+from backend.api.cancellation import Cancellation, ChatCancelledError
+from backend.api.enum import InferencePriority, InferenceTier
+
+# how often a queued request checks whether it was cancelled
+_CANCELLATION_POLL_SECONDS = 0.05
+
+
+class _Waiter:
+    """Class for request queued for inference slots."""
+
+    __slots__ = ("priority", "slots", "queued_at", "granted", "event")
+
+    def __init__(self, priority: InferencePriority, slots: int):
+        self.priority = priority
+        self.slots = slots
+        self.queued_at = time.monotonic()
+        self.granted = 0
+        self.event = threading.Event()
+
+
+class InferenceScheduler:
+    """Class for admitting inference requests to a tier of limited concurrency
+    through a queue per priority.
+
+    Interactive requests are admitted ahead of every queued bulk request, and a
+    share of the slots is reserved for them so a bulk job never holds the whole
+    tier. Bulk requests may ask for several slots, as a micro batch does, and are
+    granted as many as are free, so the rest of the batch queues again behind
+    interactive requests arriving meanwhile. A bulk request queued longer than the
+    bulk max wait is admitted ahead of interactive requests, so it is not starved.
+
+    Slots are counted per process, a tier served by several workers allows each
+    of them its max concurrency. With no max concurrency every request is
+    admitted at once.
+    """
+
+    def __init__(
+        self,
+        tier: InferenceTier,
+        max_concurrency: int = None,
+        interactive_reserved_concurrency: int = 0,
+        bulk_max_wait_seconds: float = 30.0,
+    ):
+        self.tier = tier
+        self.max_concurrency = max_concurrency
+        self.interactive_reserved_concurrency = interactive_reserved_concurrency
+        self.bulk_max_wait_seconds = bulk_max_wait_seconds
+        self._lock = threading.Lock()
+        self._queues: dict[InferencePriority, collections.deque[_Waiter]] = {
+            priority: collections.deque() for priority in InferencePriority
+        }
+        self._in_flight = {priority: 0 for priority in InferencePriority}
+
+    @contextlib.contextmanager
+    def acquire(
+        self,
+        priority: InferencePriority,
+        slots: int = 1,
+        cancellation: Cancellation = None,
+    ) -> Iterator[int]:
+        """Acquire up to the given slots, waiting until at least one is free, and
+        yield the count granted. Raises chat cancelled error if cancelled while
+        queued."""
+
+        granted = self._wait(priority, slots, cancellation)
+        try:
+            yield granted
+        finally:
+            self._release(priority, granted)
+
+    def _wait(
+        self,
+        priority: InferencePriority,
+        slots: int,
+        cancellation: Cancellation = None,
+    ) -> int:
+        if self.max_concurrency is None:
+            metrics.INFERENCE_QUEUE_WAIT_SECONDS.labels(self.tier, priority).observe(
+                0.0
+            )
+            return slots
+
+        waiter = _Waiter(priority, slots)
+        with self._lock:
+            self._queues[priority].append(waiter)
+            self._dispatch()
+        queued = not waiter.event.is_set()
+        if queued:
+            metrics.INFERENCE_QUEUED.labels(self.tier, priority).inc()
+        try:
+            while not waiter.event.is_set():
+                if cancellation is None:
+                    waiter.event.wait()
+                    continue
+                waiter.event.wait(_CANCELLATION_POLL_SECONDS)
+                if cancellation.is_cancelled():
+                    with self._lock:
+                        if not waiter.event.is_set():
+                            self._queues[priority].remove(waiter)
+                            raise ChatCancelledError(cancellation.reason)
+        finally:
+            if queued:
+                metrics.INFERENCE_QUEUED.labels(self.tier, priority).dec()
+        metrics.INFERENCE_QUEUE_WAIT_SECONDS.labels(self.tier, priority).observe(
+            time.monotonic() - waiter.queued_at
+        )
+        return waiter.granted
+
+    def _release(self, priority: InferencePriority, slots: int) -> None:
+        if self.max_concurrency is None:
+            return
+        with self._lock:
+            self._in_flight[priority] -= slots
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        # grants free slots to queued requests, called with the lock held
+        while waiter := self._get_next_waiter():
+            self._queues[waiter.priority].popleft()
+            waiter.granted = min(waiter.slots, self._get_free_slots(waiter.priority))
+            self._in_flight[waiter.priority] += waiter.granted
+            waiter.event.set()
+
+    def _get_next_waiter(self) -> _Waiter | None:
+        bulk_queue = self._queues[InferencePriority.BULK]
+        bulk = (
+            bulk_queue[0]
+            if bulk_queue and self._get_free_slots(InferencePriority.BULK)
+            else None
+        )
+        interactive_queue = self._queues[InferencePriority.INTERACTIVE]
+        interactive = (
+            interactive_queue[0]
+            if interactive_queue and self._get_free_slots(InferencePriority.INTERACTIVE)
+            else None
+        )
+        if (
+            bulk is not None
+            and interactive is not None
+            and time.monotonic() - bulk.queued_at >= self.bulk_max_wait_seconds
+        ):
+            metrics.INFERENCE_BULK_AGED_TOTAL.labels(self.tier).inc()
+            return bulk
+        return interactive or bulk
+
+    def _get_free_slots(self, priority: InferencePriority) -> int:
+        free = self.max_concurrency - sum(self._in_flight.values())
+        if priority == InferencePriority.BULK:
+            free = min(
+                free,
+                self.max_concurrency
+                - self.interactive_reserved_concurrency
+                - self._in_flight[InferencePriority.BULK],
+            )
+        return max(0, free)
@@ -0,0 +1,79 @@
+""" Module for fast json responses. """
+
+import operator
+from typing import Any, AsyncIterator
+
+import orjson
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+# rows of a streamed array serialized per chunk
+DEFAULT_CHUNK_SIZE = 20
+# utc datetimes end in z, as pydantic writes them
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+class ORJSONResponse(JSONResponse):
+    """Class for json response rendered by orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+class RowSerializer:
+    """Class for serializer of flat rows into json, built once per api model.
+
+    The fields of the model are read straight off each row, be it an entity, a chat
+    row or a model instance, so the output has the model's shape while no row is
+    validated or walked by the json encoder. Values are left to orjson, which writes
+    uuids, datetimes and enums itself.
+    """
+
+    def __init__(self, model: type[BaseModel]):
+        self.fields = tuple(model.model_fields)
+        self._get_values = operator.attrgetter(*self.fields)
+
+    def to_dict(self, row: Any) -> dict[str, Any]:
+        """Get the fields of a row as a dict."""
+
+        return dict(zip(self.fields, self._get_values(row)))
+
+    def dumps(self, rows: list[Any]) -> bytes:
+        """Serialize rows into a json array."""
+
+        return orjson.dumps([self.to_dict(row) for row in rows], option=ORJSON_OPTIONS)
+
+
+async def iterate_json_page(
+    key: str,
+    rows: list[Any],
+    serializer: RowSerializer,
+    fields: dict[str, Any],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> AsyncIterator[bytes]:
+    """Iterate a json object holding rows as an array under key followed by the
+    other fields, a chunk of rows at a time."""
+
+    yield b'{"' + key.encode() + b'":['
+    for start in range(0, len(rows), chunk_size):
+        # the brackets of each chunk's array are cut so the chunks join into one
+        chunk = serializer.dumps(rows[start : start + chunk_size])[1:-1]
+        yield chunk if start == 0 else b"," + chunk
+    yield b"]," + orjson.dumps(fields, option=ORJSON_OPTIONS)[1:] if fields else b"]}"
+
+
+def stream_json_page(
+    key: str,
+    rows: list[Any],
+    serializer: RowSerializer,
+    fields: dict[str, Any],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    headers: dict[str, str] = None,
+) -> StreamingResponse:
+    """Stream a page of rows as a json object, see iterate json page."""
+
+    return StreamingResponse(
+        iterate_json_page(key, rows, serializer, fields, chunk_size),
+        media_type="application/json",
+        headers=headers,
+    )
@@ -9,11 +9,16 @@ from datetime import UTC, datetime
 from enum import StrEnum
 
 import structlog
+from pydantic import Field
 from pydantic.dataclasses import dataclass
 from structlog import get_logger
 
-from backend.api import config
-from backend.api.enum import DataRepositoryType, InferenceProviderType
+from backend.api import config, logging_pipeline
+from backend.api.enum import (
+    DataRepositoryType,
+    InferenceProviderType,
+    TracingExporterType,
+)
 
 
 @dataclass
@@ -21,13 +26,18 @@ class CLIArgs:
     """Class for command line interface (cli) arguments."""
 
     debug_mode: bool = False
+    async_logging: bool = True
+    conversation_api_host: str = "localhost"
     conversation_api_port: int = 8001
     conversation_api_reload: bool = False
+    conversation_api_workers: int = 1
     data_repository_type: DataRepositoryType = DataRepositoryType.SQLITE
     run_db_migrations: bool = True
     inference_provider_type: InferenceProviderType = (
         InferenceProviderType.KUBERNETES_POD
     )
+    tracing_exporter_type: TracingExporterType = TracingExporterType.NONE
+    tracing_sample_ratio: float = 0.01
 
 
 def parse_cli_args_with_defaults() -> CLIArgs:
@@ -40,12 +50,23 @@ def parse_cli_args_with_defaults() -> CLIArgs:
     parser.add_argument(
         "--debug-mode", help="Enable debug mode logging: false (default)"
     )
+    parser.add_argument(
+        "--async-logging",
+        help="Render and write logs on a background thread: true (default)",
+    )
+    parser.add_argument(
+        "--conversation-api-host", help="Conversation api host: 'localhost' (default)"
+    )
     parser.add_argument(
         "--conversation-api-port", help="Conversation api port: 8001 (default)"
     )
     parser.add_argument(
         "--conversation-api-reload", help="Conversation api reload: false (default)"
     )
+    parser.add_argument(
+        "--conversation-api-workers",
+        help="Conversation api worker processes: 1 (default)",
+    )
     parser.add_argument(
         "--data-repository-type",
         help="Data repository type: 'sqlite' (default)",
@@ -53,13 +74,27 @@ def parse_cli_args_with_defaults() -> CLIArgs:
     parser.add_argument("--run-db-migrations", help="Run db migrations: true (default)")
     parser.add_argument(
         "--inference-provider-type",
-        help="Inference provider type: 'kubernetes_pod' (default)",
+        help="Inference provider type: 'kubernetes_pod' (default), 'runpod_serverless_api' or 'fake'",
+    )
+    parser.add_argument(
+        "--tracing-exporter-type",
+        help="Tracing exporter type: 'none' (default), 'in_memory' or 'file'",
+    )
+    parser.add_argument(
+        "--tracing-sample-ratio",
+        help="Ratio of requests traced: 0.01 (default)",
     )
     args = parser.parse_args()
     logger.info("Passed cli arguments", args=args)
 
     cli_args = {
         "debug_mode": json.loads(args.debug_mode) if args.debug_mode else None,
+        "async_logging": (
+            json.loads(args.async_logging) if args.async_logging else None
+        ),
+        "conversation_api_host": (
+            args.conversation_api_host if args.conversation_api_host else None
+        ),
         "conversation_api_port": (
             args.conversation_api_port if args.conversation_api_port else None
         ),
@@ -68,6 +103,9 @@ def parse_cli_args_with_defaults() -> CLIArgs:
             if args.conversation_api_reload
             else None
         ),
+        "conversation_api_workers": (
+            args.conversation_api_workers if args.conversation_api_workers else None
+        ),
         "data_repository_type": (
             parse_strenum_from_string(DataRepositoryType, args.data_repository_type)
             if args.data_repository_type
@@ -83,6 +121,14 @@ def parse_cli_args_with_defaults() -> CLIArgs:
             if args.inference_provider_type
             else None
         ),
+        "tracing_exporter_type": (
+            parse_strenum_from_string(TracingExporterType, args.tracing_exporter_type)
+            if args.tracing_exporter_type
+            else None
+        ),
+        "tracing_sample_ratio": (
+            args.tracing_sample_ratio if args.tracing_sample_ratio else None
+        ),
     }
     result = CLIArgs(
         **{arg: value for arg, value in cli_args.items() if value is not None}
@@ -96,12 +142,59 @@ def parse_cli_args_with_defaults() -> CLIArgs:
 class EnvVars:
     """Class for environment variables."""
 
+    log_sample_ratios: dict[str, float] = Field(default_factory=dict)
+
     auth0_public_key: str = None
     auth0_issuer: str = None
     auth0_audience: str = None
 
     sqlite_connection_string: str = "sqlite+pysqlite:///local/local.sqlite3"
 
+    text_compression_threshold_bytes: int = 256
+
+    caller_cache_ttl_seconds: float = 60.0
+    session_version_ttl_seconds: float = 60.0
+
+    response_compression_minimum_bytes: int = 1024
+
+    chat_deadline_seconds: float = 300.0
+    chat_cancel_on_disconnect: bool = True
+
+    drain_delay_seconds: float = 0.0
+    drain_timeout_seconds: float = 60.0
+    socket_handoff_directory: str = "local"
+
+    chat_batch_parallelism: int = 4
+    chat_batch_micro_batch_size: int = 8
+
+    chat_archive_directory: str = "local/chat_archive"
+    chat_archive_max_age_days: float = 365.0
+
+    inference_routing_rules_path: str = None
+    prompt_template_name: str = "legal_assistant"
+    prompt_history_max_turns: int = 20
+
+    session_summary_enabled: bool = True
+    session_summary_prompt_template_name: str = "session_summary"
+    session_summary_recent_turns: int = 4
+    session_summary_fold_turns: int = 8
+    session_summary_parallelism: int = 2
+
+    caller_memory_enabled: bool = True
+    caller_memory_prompt_template_name: str = "caller_fact_extraction"
+    caller_memory_top_k: int = 5
+    caller_memory_min_score: float = 0.1
+    caller_memory_duplicate_score: float = 0.9
+    caller_memory_max_facts: int = 100
+    caller_memory_dimensions: int = 256
+    caller_memory_cache_size: int = 256
+    caller_memory_parallelism: int = 2
+
+    # bearer token scrapers send for the metrics endpoints, served only once set
+    metrics_token: str = None
+
+    tracing_file_path: str = "local/traces.jsonl"
+
 
 def parse_env_vars_with_defaults() -> EnvVars:
     """Parse environment variables with defaults"""
@@ -110,10 +203,55 @@ def parse_env_vars_with_defaults() -> EnvVars:
     logger.info("Starting parse environment variables with defaults")
 
     env_vars = {
+        "log_sample_ratios": (
+            json.loads(os.getenv("LOG_SAMPLE_RATIOS"))
+            if os.getenv("LOG_SAMPLE_RATIOS")
+            else None
+        ),
         "auth0_public_key": os.getenv("AUTH0_PUBLIC_KEY"),
         "auth0_issuer": os.getenv("AUTH0_ISSUER"),
         "auth0_audience": os.getenv("AUTH0_AUDIENCE"),
         "sqlite_connection_string": os.getenv("SQLITE_CONNECTION_STRING"),
+        "text_compression_threshold_bytes": os.getenv(
+            "TEXT_COMPRESSION_THRESHOLD_BYTES"
+        ),
+        "caller_cache_ttl_seconds": os.getenv("CALLER_CACHE_TTL_SECONDS"),
+        "session_version_ttl_seconds": os.getenv("SESSION_VERSION_TTL_SECONDS"),
+        "response_compression_minimum_bytes": os.getenv(
+            "RESPONSE_COMPRESSION_MINIMUM_BYTES"
+        ),
+        "chat_deadline_seconds": os.getenv("CHAT_DEADLINE_SECONDS"),
+        "chat_cancel_on_disconnect": os.getenv("CHAT_CANCEL_ON_DISCONNECT"),
+        "drain_delay_seconds": os.getenv("DRAIN_DELAY_SECONDS"),
+        "drain_timeout_seconds": os.getenv("DRAIN_TIMEOUT_SECONDS"),
+        "socket_handoff_directory": os.getenv("SOCKET_HANDOFF_DIRECTORY"),
+        "chat_batch_parallelism": os.getenv("CHAT_BATCH_PARALLELISM"),
+        "chat_batch_micro_batch_size": os.getenv("CHAT_BATCH_MICRO_BATCH_SIZE"),
+        "chat_archive_directory": os.getenv("CHAT_ARCHIVE_DIRECTORY"),
+        "chat_archive_max_age_days": os.getenv("CHAT_ARCHIVE_MAX_AGE_DAYS"),
+        "inference_routing_rules_path": os.getenv("INFERENCE_ROUTING_RULES_PATH"),
+        "prompt_template_name": os.getenv("PROMPT_TEMPLATE_NAME"),
+        "prompt_history_max_turns": os.getenv("PROMPT_HISTORY_MAX_TURNS"),
+        "session_summary_enabled": os.getenv("SESSION_SUMMARY_ENABLED"),
+        "session_summary_prompt_template_name": os.getenv(
+            "SESSION_SUMMARY_PROMPT_TEMPLATE_NAME"
+        ),
+        "session_summary_recent_turns": os.getenv("SESSION_SUMMARY_RECENT_TURNS"),
+        "session_summary_fold_turns": os.getenv("SESSION_SUMMARY_FOLD_TURNS"),
+        "session_summary_parallelism": os.getenv("SESSION_SUMMARY_PARALLELISM"),
+        "caller_memory_enabled": os.getenv("CALLER_MEMORY_ENABLED"),
+        "caller_memory_prompt_template_name": os.getenv(
+            "CALLER_MEMORY_PROMPT_TEMPLATE_NAME"
+        ),
+        "caller_memory_top_k": os.getenv("CALLER_MEMORY_TOP_K"),
+        "caller_memory_min_score": os.getenv("CALLER_MEMORY_MIN_SCORE"),
+        "caller_memory_duplicate_score": os.getenv("CALLER_MEMORY_DUPLICATE_SCORE"),
+        "caller_memory_max_facts": os.getenv("CALLER_MEMORY_MAX_FACTS"),
+        "caller_memory_dimensions": os.getenv("CALLER_MEMORY_DIMENSIONS"),
+        "caller_memory_cache_size": os.getenv("CALLER_MEMORY_CACHE_SIZE"),
+        "caller_memory_parallelism": os.getenv("CALLER_MEMORY_PARALLELISM"),
+        "metrics_token": os.getenv("METRICS_TOKEN"),
+        "tracing_file_path": os.getenv("TRACING_FILE_PATH"),
     }
     result = EnvVars(
         **{env: value for env, value in env_vars.items() if value is not None}
@@ -156,27 +294,61 @@ def parse_strenum_from_string(enum_type: StrEnum, value: str) -> any:
     return result
 
 
-def configure_global_logging_level(debug_mode: bool) -> logging.Logger:
-    """Configure global logging level."""
+def configure_global_logging_level(
+    debug_mode: bool,
+    async_logging: bool = False,
+    log_sample_ratios: dict[str, float] = None,
+) -> logging.Logger:
+    """Configure global logging level.
 
-    logger = get_logger().bind(debug_mode=debug_mode)
+    In async mode events are handed unrendered to a queue backed sink, which
+    timestamps, renders and writes them on a background thread. Sample ratios by
+    level, such as {"info": 0.1}, keep the Starting/Completed lines of that share of
+    requests.
+    """
+
+    logger = get_logger().bind(
+        debug_mode=debug_mode,
+        async_logging=async_logging,
+        log_sample_ratios=log_sample_ratios,
+    )
     logger.info("Starting configure global logging level")
 
     logging_level = logging.DEBUG if debug_mode else logging.INFO
-    structlog.configure_once(
-        wrapper_class=structlog.make_filtering_bound_logger(logging_level),
-        processors=(
-            [
+    sampler = (
+        [logging_pipeline.StartingCompletedSampler(log_sample_ratios)]
+        if log_sample_ratios
+        else []
+    )
+    if debug_mode:
+        structlog.configure_once(
+            wrapper_class=structlog.make_filtering_bound_logger(logging_level),
+        )
+    elif async_logging:
+        structlog.configure_once(
+            wrapper_class=structlog.make_filtering_bound_logger(logging_level),
+            processors=[
+                structlog.contextvars.merge_contextvars,
+                *sampler,
+                logging_pipeline.add_raw_timestamp,
+            ],
+            context_class=dict,
+            logger_factory=logging_pipeline.QueueSinkFactory(),
+            cache_logger_on_first_use=True,
+        )
+    else:
+        structlog.configure_once(
+            wrapper_class=structlog.make_filtering_bound_logger(logging_level),
+            processors=[
                 # structlog.stdlib.filter_by_level,
+                structlog.contextvars.merge_contextvars,
+                *sampler,
                 structlog.processors.TimeStamper(fmt="iso"),
                 structlog.processors.JSONRenderer(),
-            ]
-            if not debug_mode
-            else None
-        ),
-        context_class=dict if not debug_mode else None,
-        # logger_factory=structlog.stdlib.LoggerFactory(),
-    )
+            ],
+            context_class=dict,
+            # logger_factory=structlog.stdlib.LoggerFactory(),
+        )
     if debug_mode:
         logger.debug("Global logging level is set as DEBUG")
     else:
@@ -192,6 +364,8 @@ def log_config_settings(conf: config.Config) -> None:
     logger.debug("Starting log configuration settings in debug mode")
 
     for key, value in dataclasses.asdict(conf).items():
+        if key.endswith("_token") and value is not None:
+            value = "<redacted>"
         logger.debug(key, value=str(value))
 
     logger.debug("Completed log configuration settings in debug mode")
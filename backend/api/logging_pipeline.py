@@ -0,0 +1,160 @@
+""" Module for structured logging pipeline. """
+
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import zlib
+from datetime import UTC, datetime
+
+import structlog
+
+_UNSET = object()
+
+
+class LazyValue:
+    """Class for log value computed only when the event is rendered.
+
+    Rendering happens on the background sink thread in async mode and not at all
+    for events that are filtered or sampled out, so building the value never costs
+    the request. The value is computed once and shared by every event it is bound to.
+    """
+
+    __slots__ = ("_function", "_value")
+
+    def __init__(self, function):
+        self._function = function
+        self._value = _UNSET
+
+    def __structlog__(self) -> any:
+        if self._value is _UNSET:
+            self._value = self._function()
+        return self._value
+
+    def __repr__(self) -> str:
+        return repr(self.__structlog__())
+
+
+class StartingCompletedSampler:
+    """Class for processor sampling Starting/Completed event pairs per level.
+
+    The decision is made from the request id, so both lines of a pair and every pair
+    of the same request are kept or dropped together. Events outside a request, and
+    levels without a ratio, are always kept.
+    """
+
+    def __init__(self, sample_ratios: dict[str, float]):
+        self._thresholds = {
+            level: int(max(0.0, min(1.0, ratio)) * 2**32)
+            for level, ratio in sample_ratios.items()
+        }
+
+    def __call__(self, logger, method_name: str, event_dict: dict) -> dict:
+        threshold = self._thresholds.get(method_name)
+        if threshold is None:
+            return event_dict
+        request_id = event_dict.get("request_id")
+        if request_id is None:
+            return event_dict
+        event = event_dict.get("event")
+        if (
+            isinstance(event, str)
+            and event.startswith(("Starting ", "Completed "))
+            and zlib.crc32(request_id.encode()) >= threshold
+        ):
+            raise structlog.DropEvent
+        return event_dict
+
+
+class QueueSink:
+    """Class for logger handing event dicts to a background thread that renders and
+    writes them, so requests never wait on serialisation or the output stream."""
+
+    def __init__(self, file=None):
+        self._file = file or sys.stdout
+        self._renderer = structlog.processors.JSONRenderer()
+        self._start()
+        atexit.register(self.shutdown)
+        # a forked worker inherits the queue but not the thread draining it, events
+        # queued before the fork are left to the parent
+        os.register_at_fork(after_in_child=self._start_after_fork)
+
+    def msg(self, **event_dict: any) -> None:
+        self._queue.put(event_dict)
+
+    log = debug = info = warn = warning = msg
+    fatal = failure = err = error = critical = exception = msg
+
+    def shutdown(self) -> None:
+        """Write pending events and stop the background thread."""
+
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _start_after_fork(self) -> None:
+        if not self._closed:
+            self._start()
+
+    def _start(self) -> None:
+        self._closed = False
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._write, name="logging-queue-sink", daemon=True
+        )
+        self._thread.start()
+
+    def _write(self) -> None:
+        while True:
+            event_dict = self._queue.get()
+            # drain whatever else is queued before paying for a flush
+            while event_dict is not None:
+                try:
+                    event_dict["timestamp"] = datetime.fromtimestamp(
+                        event_dict["timestamp"], UTC
+                    ).isoformat()
+                    line = self._renderer(None, None, event_dict)
+                except Exception as error:
+                    line = json.dumps(
+                        {"event": "Unable to render log event", "error": str(error)}
+                    )
+                self._file.write(line + "\n")
+                if self._queue.empty():
+                    break
+                event_dict = self._queue.get()
+            self._file.flush()
+            if event_dict is None:
+                return
+
+
+class QueueSinkFactory:
+    """Class for structlog logger factory sharing one queue sink."""
+
+    def __init__(self, file=None):
+        self.sink = QueueSink(file)
+
+    def __call__(self, *args: any) -> QueueSink:
+        return self.sink
+
+
+def shutdown_sink() -> None:
+    """Write pending events if logging goes through a queue sink."""
+
+    logger_factory = structlog.get_config()["logger_factory"]
+    if isinstance(logger_factory, QueueSinkFactory):
+        logger_factory.sink.shutdown()
+
+
+def add_raw_timestamp(logger, method_name: str, event_dict: dict) -> dict:
+    """Add unix timestamp, formatted by the sink off the hot path.
+
+    As the last processor it also hands the event dict to the sink unrendered, as
+    keyword arguments.
+    """
+
+    event_dict["timestamp"] = time.time()
+    return event_dict
@@ -1,66 +1,550 @@
 """ Module for command line interface (cli). """
 
+import contextlib
 import dataclasses
+import time
+from typing import Iterator
+from uuid import UUID, uuid4
 
 from structlog import get_logger
 
-from backend.api import config, provider
+from backend.api import config, metrics, provider, tracing
+from backend.api.caller_memory import render_caller_facts
+from backend.api.cancellation import Cancellation, ChatCancelledError
 from backend.api.data_repository import Caller
 from backend.api.entities import Chat, ChatInputModel
+from backend.api.enum import (
+    CancellationReason,
+    ChatStatus,
+    InferencePriority,
+    InferenceTier,
+)
 from backend.api.lib import (
     configure_global_logging_level,
     log_config_settings,
+    now_utc,
     parse_cli_args_with_defaults,
     parse_env_vars_with_defaults,
 )
+from backend.api.logging_pipeline import LazyValue
 from backend.api.provider import configure_providers
+from backend.api.session_summary import render_chat_history, render_session_summary
 
 
 def get_caller(sub: str):
-    """Get caller."""
+    """Get caller, from the shared store when another request or worker has
+    recently loaded it."""
 
     logger = get_logger().bind(sub=sub)
     logger.info("Starting get caller")
 
+    shared_store = provider.PROVIDERS.shared_store
+    key = f"caller:{sub}"
+    try:
+        caller_fields = shared_store.get(key)
+    except OSError as error:
+        logger.warning("Unable to get caller from shared store", error=str(error))
+        caller_fields = None
+    if caller_fields is not None:
+        logger.info("Completed get caller from shared store")
+        return Caller(**caller_fields)
+
     caller = provider.PROVIDERS.data_repository.load_caller(sub)
+    if caller:
+        try:
+            shared_store.set(
+                key,
+                {
+                    column.key: getattr(caller, column.key)
+                    for column in Caller.__table__.columns
+                },
+                config.CONFIG.caller_cache_ttl_seconds,
+            )
+        except OSError as error:
+            logger.warning("Unable to set caller in shared store", error=str(error))
 
     logger.info("Completed get caller")
     return caller
 
 
-def process_chat(chat_input: ChatInputModel, caller: Caller) -> Chat:
-    """Process chat."""
+def get_session_version(caller_id: UUID, caller_session_id: str) -> str:
+    """Get version of the completed chats of a caller session, from the shared
+    store when known, changing whenever a chat of the session is saved."""
+
+    logger = get_logger().bind(caller_id=caller_id, caller_session_id=caller_session_id)
+    logger.info("Starting get session version")
+
+    shared_store = provider.PROVIDERS.shared_store
+    key = f"session_version:{caller_id}:{caller_session_id}"
+    try:
+        version = shared_store.get(key)
+    except OSError as error:
+        logger.warning(
+            "Unable to get session version from shared store", error=str(error)
+        )
+        version = None
+    if version is not None:
+        logger.info("Completed get session version from shared store")
+        return version
+
+    # a version loaded just as a chat is saved may outlive the save's expiry, so
+    # it is only kept for the ttl
+    last_updated, count = provider.PROVIDERS.data_repository.load_session_version(
+        caller_id, caller_session_id
+    )
+    version = f"{count}/{last_updated.isoformat() if last_updated else ''}"
+    try:
+        shared_store.set(key, version, config.CONFIG.session_version_ttl_seconds)
+    except OSError as error:
+        logger.warning(
+            "Unable to set session version in shared store", error=str(error)
+        )
+
+    logger.info("Completed get session version")
+    return version
+
+
+def submit_session_summaries(caller_id: UUID, caller_session_ids: set[str]) -> None:
+    """Queue sessions whose chats have completed to have their older turns folded
+    into their summary in the background."""
+
+    if not config.CONFIG.session_summary_enabled:
+        return
+    for caller_session_id in caller_session_ids:
+        provider.PROVIDERS.session_summarizer.submit(caller_id, caller_session_id)
+
+
+def submit_caller_facts(caller_id: UUID, chats: list[Chat]) -> None:
+    """Queue the messages of completed chats to have facts about their caller
+    extracted in the background."""
+
+    if not config.CONFIG.caller_memory_enabled:
+        return
+    for chat in chats:
+        provider.PROVIDERS.caller_memory.submit(
+            caller_id, chat.chat_id, chat.caller_chat_text
+        )
+
+
+def expire_session_versions(caller_id: UUID, caller_session_ids: set[str]) -> None:
+    """Expire versions of caller sessions, their chats having been saved."""
 
+    for caller_session_id in caller_session_ids:
+        try:
+            provider.PROVIDERS.shared_store.delete(
+                f"session_version:{caller_id}:{caller_session_id}"
+            )
+        except OSError as error:
+            get_logger().warning(
+                "Unable to expire session version in shared store",
+                caller_session_id=caller_session_id,
+                error=str(error),
+            )
+
+
+def process_chat(
+    chat_input: ChatInputModel,
+    caller: Caller,
+    cancellation: Cancellation = None,
+    priority: InferencePriority = InferencePriority.INTERACTIVE,
+) -> Chat:
+    """Process chat. Once the cancellation is cancelled the provider job is stopped,
+    the chat saved as cancelled and chat cancelled error raised.
+
+    The chat waits for a slot of its tier in the queue of its priority, its
+    inference duration only counts the time after it was admitted."""
+
+    # bound values are lazy so they are only built if the log lines are rendered
     logger = get_logger().bind(
-        job_request=(
-            chat_input.model_dump(
-                exclude=chat_input.get_exclude_fields_for_logging(
-                    chat_input.request_content_type
+        job_request=LazyValue(
+            lambda: (
+                chat_input.model_dump(
+                    exclude=chat_input.get_exclude_fields_for_logging()
                 )
+                if chat_input
+                else None
             )
-            if chat_input
-            else None
         ),
-        caller=(
-            {
-                k: str(v)
-                for k, v in caller.__dict__.items()
-                if k not in Caller.get_exclude_fields_for_logging()
-            }
-            if caller
-            else None
+        caller=LazyValue(
+            lambda: (
+                {
+                    k: str(v)
+                    for k, v in caller.__dict__.items()
+                    if k not in Caller.get_exclude_fields_for_logging()
+                }
+                if caller
+                else None
+            )
         ),
     )
     logger.info("Starting process chat")
 
-    chat_input = Chat(**chat_input.model_dump())
-    chat_input.caller_id = caller.caller_id
-    chat_output = provider.PROVIDERS.inference_provider_wrapper.request_for_inference()
+    process_start = time.perf_counter()
+    chat, prompt_text = prepare_chat(chat_input, caller)
+    router = provider.PROVIDERS.inference_router
+
+    inference_start = None
+    failed = True
+    cancelled_error = None
+    try:
+        with router.schedule(chat.inference_tier, priority, cancellation=cancellation):
+            inference_start = time.perf_counter()
+            with (
+                metrics.INFERENCE_REQUESTS_IN_FLIGHT.labels(
+                    chat.inference_tier
+                ).track_inprogress(),
+                tracing.start_span(
+                    "request_for_inference",
+                    **{
+                        "inference.tier": chat.inference_tier,
+                        "inference.provider_type": chat.inference_provider_type,
+                        "inference.priority": priority,
+                    },
+                ),
+            ):
+                chat.response_chat_text = router.get_wrapper(
+                    chat.inference_tier
+                ).request_for_inference(
+                    str(chat.chat_id),
+                    [],
+                    prompt_text,
+                    affinity_key=f"{chat.caller_id}/{chat.caller_session_id}",
+                    cancellation=cancellation,
+                )
+        failed = False
+    except ChatCancelledError as error:
+        cancelled_error = error
+    finally:
+        # a chat cancelled while queued took no provider time
+        chat.inference_duration_seconds = (
+            time.perf_counter() - inference_start if inference_start else 0.0
+        )
+        router.record(
+            chat.inference_tier,
+            chat.inference_duration_seconds,
+            failed,
+            cancelled=cancelled_error is not None,
+        )
+        metrics.CHAT_STAGE_DURATION_SECONDS.labels("inference").observe(
+            chat.inference_duration_seconds
+        )
+    if cancelled_error is not None:
+        save_cancelled_chat(chat, cancelled_error.reason)
+        raise cancelled_error
 
-    # provider.PROVIDERS.data_repository.save_job(chat_output, caller=caller)
+    chat.status = ChatStatus.COMPLETED
+    chat.end_time = now_utc()
+    chat.total_duration_seconds = time.perf_counter() - process_start
+    with (
+        metrics.CHAT_STAGE_DURATION_SECONDS.labels("db_write").time(),
+        tracing.start_span("save_chat"),
+    ):
+        provider.PROVIDERS.data_repository.save_chat(chat)
+    expire_session_versions(caller.caller_id, {chat.caller_session_id})
+    submit_session_summaries(caller.caller_id, {chat.caller_session_id})
+    submit_caller_facts(caller.caller_id, [chat])
 
     logger.info("Completed process chat")
-    return chat_output
+    return chat
+
+
+def stream_chat(
+    chat: Chat,
+    prompt_text: str,
+    caller: Caller,
+    cancellation: Cancellation = None,
+    priority: InferencePriority = InferencePriority.INTERACTIVE,
+) -> Iterator[str]:
+    """Stream response text of a prepared chat as it is decoded, the chat is saved
+    once the response is complete. The slot of its tier is held until the stream
+    ends.
+
+    Pieces may each be produced on a different thread, so no span is held open
+    across them. A stream cancelled, or closed before the response is complete as
+    when its client went away, stops the provider job and saves the chat as
+    cancelled. A cancelled stream ends early rather than raising, as its response
+    has already begun.
+    """
+
+    logger = get_logger().bind(chat_id=chat.chat_id)
+    logger.info("Starting stream chat")
+
+    router = provider.PROVIDERS.inference_router
+    inference_start = None
+    failed = True
+    cancelled_error = None
+    pieces = []
+    try:
+        with router.schedule(chat.inference_tier, priority, cancellation=cancellation):
+            inference_start = time.perf_counter()
+            with (
+                metrics.INFERENCE_REQUESTS_IN_FLIGHT.labels(
+                    chat.inference_tier
+                ).track_inprogress(),
+                contextlib.closing(
+                    router.get_wrapper(chat.inference_tier).stream_for_inference(
+                        str(chat.chat_id),
+                        prompt_text,
+                        affinity_key=f"{chat.caller_id}/{chat.caller_session_id}",
+                        cancellation=cancellation,
+                    )
+                ) as stream,
+            ):
+                for piece in stream:
+                    pieces.append(piece)
+                    yield piece
+        failed = False
+    except ChatCancelledError as error:
+        cancelled_error = error
+    except GeneratorExit:
+        cancelled_error = ChatCancelledError(CancellationReason.CLIENT_DISCONNECTED)
+    finally:
+        chat.inference_duration_seconds = (
+            time.perf_counter() - inference_start if inference_start else 0.0
+        )
+        router.record(
+            chat.inference_tier,
+            chat.inference_duration_seconds,
+            failed,
+            cancelled=cancelled_error is not None,
+        )
+        metrics.CHAT_STAGE_DURATION_SECONDS.labels("inference").observe(
+            chat.inference_duration_seconds
+        )
+    if cancelled_error is not None:
+        save_cancelled_chat(chat, cancelled_error.reason)
+        # the response status is sent before the first piece is asked for, so
+        # raising would only break the body off, and a closed generator must not
+        # raise as nobody is left to read it
+        logger.info("Completed stream chat", cancelled=cancelled_error.reason)
+        return
+
+    chat.status = ChatStatus.COMPLETED
+    chat.response_chat_text = "".join(pieces)
+    chat.end_time = now_utc()
+    chat.total_duration_seconds = (chat.end_time - chat.start_time).total_seconds()
+    with (
+        metrics.CHAT_STAGE_DURATION_SECONDS.labels("db_write").time(),
+        tracing.start_span("save_chat"),
+    ):
+        provider.PROVIDERS.data_repository.save_chat(chat)
+    expire_session_versions(caller.caller_id, {chat.caller_session_id})
+    submit_session_summaries(caller.caller_id, {chat.caller_session_id})
+    submit_caller_facts(caller.caller_id, [chat])
+
+    logger.info("Completed stream chat")
+
+
+def process_chat_batch(
+    chat_inputs: list[ChatInputModel],
+    caller: Caller,
+    chat_batch_id: UUID,
+    item_indexes: list[int],
+) -> list[Chat | Exception]:
+    """Process a micro batch of chats, returning the chat or the error of each.
+
+    Chats routed to the same tier go to inference as one batch request per slots
+    of the tier granted at bulk priority, so chats left over queue again behind
+    interactive ones, and every answered chat is saved in one transaction. A chat
+    only sees chats of earlier micro batches in its session history.
+    """
+
+    logger = get_logger().bind(chat_batch_id=chat_batch_id, item_indexes=item_indexes)
+    logger.info("Starting process chat batch")
+
+    process_start = time.perf_counter()
+    router = provider.PROVIDERS.inference_router
+    results: list[Chat | Exception] = [None] * len(chat_inputs)
+    tier_items: dict[InferenceTier, list[tuple[int, Chat, str]]] = {}
+    for position, (chat_input, item_index) in enumerate(zip(chat_inputs, item_indexes)):
+        try:
+            chat, prompt_text = prepare_chat(chat_input, caller)
+        except Exception as error:
+            results[position] = error
+            continue
+        chat.chat_batch_id = chat_batch_id
+        chat.chat_batch_item_index = item_index
+        tier_items.setdefault(chat.inference_tier, []).append(
+            (position, chat, prompt_text)
+        )
+
+    for tier, pending_items in tier_items.items():
+        while pending_items:
+            with router.schedule(
+                tier, InferencePriority.BULK, len(pending_items)
+            ) as slots:
+                items, pending_items = pending_items[:slots], pending_items[slots:]
+                inference_start = time.perf_counter()
+                failed = True
+                try:
+                    with tracing.start_span(
+                        "request_for_inference_batch",
+                        **{"inference.tier": tier, "inference.batch_size": len(items)},
+                    ):
+                        responses = router.get_wrapper(
+                            tier
+                        ).request_for_inference_batch(
+                            [str(chat.chat_id) for _, chat, _ in items],
+                            [prompt_text for _, _, prompt_text in items],
+                            affinity_key=str(caller.caller_id),
+                        )
+                        # responses are matched to chats by position, so a short
+                        # reply leaves no way to tell which chats went unanswered
+                        if len(responses) != len(items):
+                            raise ValueError(
+                                f"expected {len(items)} responses from inference "
+                                f"batch, got {len(responses)}"
+                            )
+                    failed = False
+                except Exception as error:
+                    logger.warning(
+                        "Unable to request for inference batch",
+                        tier=tier,
+                        error=str(error),
+                    )
+                    for position, _, _ in items:
+                        results[position] = error
+                    continue
+                finally:
+                    inference_duration_seconds = time.perf_counter() - inference_start
+                    for _ in items:
+                        router.record(tier, inference_duration_seconds, failed)
+
+            for (position, chat, _), response_chat_text in zip(items, responses):
+                chat.response_chat_text = response_chat_text
+                chat.inference_duration_seconds = inference_duration_seconds
+                chat.end_time = now_utc()
+                chat.total_duration_seconds = time.perf_counter() - process_start
+                results[position] = chat
+
+    chats = [result for result in results if isinstance(result, Chat)]
+    for chat in chats:
+        chat.status = ChatStatus.COMPLETED
+    if chats:
+        with tracing.start_span("save_chats"):
+            provider.PROVIDERS.data_repository.save_chats(chats)
+        caller_session_ids = {chat.caller_session_id for chat in chats}
+        expire_session_versions(caller.caller_id, caller_session_ids)
+        submit_session_summaries(caller.caller_id, caller_session_ids)
+        submit_caller_facts(caller.caller_id, chats)
+
+    logger.info("Completed process chat batch", answered=len(chats))
+    return results
+
+
+def save_cancelled_chat(chat: Chat, reason: CancellationReason) -> None:
+    """Save chat as cancelled, with no response but the provider time it took, so it
+    is left out of history and search."""
+
+    logger = get_logger().bind(chat_id=chat.chat_id, reason=reason)
+    logger.info("Starting save cancelled chat")
+
+    chat.status = ChatStatus.CANCELLED
+    chat.response_chat_text = None
+    chat.end_time = now_utc()
+    chat.total_duration_seconds = (chat.end_time - chat.start_time).total_seconds()
+    metrics.CHATS_CANCELLED_TOTAL.labels(reason).inc()
+    with (
+        metrics.CHAT_STAGE_DURATION_SECONDS.labels("db_write").time(),
+        tracing.start_span("save_chat"),
+    ):
+        provider.PROVIDERS.data_repository.save_chat(chat)
+
+    logger.info("Completed save cancelled chat")
+
+
+def prepare_chat(chat_input: ChatInputModel, caller: Caller) -> tuple[Chat, str]:
+    """Prepare chat and its prompt text, routed to an inference tier."""
+
+    chat = Chat(**chat_input.model_dump())
+    chat.chat_id = uuid4()
+    logger = get_logger().bind(chat_id=chat.chat_id)
+    chat.caller_id = caller.caller_id
+    chat.start_time = now_utc()
+    chat.request_id = tracing.get_request_id()
+
+    prompt_template = provider.PROVIDERS.prompt_template_registry.get(
+        config.CONFIG.prompt_template_name
+    )
+    chat.prompt_template_id = prompt_template.prompt_template_id
+
+    # history is laid out oldest first with fixed formatting so every turn of a
+    # session shares the previous prompt as its prefix. Turns folded into the
+    # session summary are replaced by it, and the window still bounds the turns a
+    # summarizer running behind has not folded yet
+    data_repository = provider.PROVIDERS.data_repository
+    with (
+        metrics.CHAT_STAGE_DURATION_SECONDS.labels("history_lookup").time(),
+        tracing.start_span("load_session_history") as span,
+    ):
+        session_depth = data_repository.count_session_chats(
+            caller.caller_id, chat.caller_session_id
+        )
+        summary = None
+        if (
+            config.CONFIG.session_summary_enabled
+            and "session_summary" in prompt_template.field_names
+        ):
+            summary = data_repository.load_session_summary(
+                caller.caller_id, chat.caller_session_id
+            )
+        history_offset = max(
+            summary.summarized_turns if summary else 0,
+            get_history_offset(session_depth, config.CONFIG.prompt_history_max_turns),
+        )
+        history_chats = data_repository.load_session_chats(
+            caller.caller_id,
+            chat.caller_session_id,
+            history_offset,
+            session_depth - history_offset,
+        )
+        span.set_attribute("session.depth", session_depth)
+
+    # facts go after the history, so varying with each question they do not break
+    # the prefix turns of a session share
+    caller_facts = []
+    if (
+        config.CONFIG.caller_memory_enabled
+        and "caller_facts" in prompt_template.field_names
+    ):
+        with (
+            metrics.CHAT_STAGE_DURATION_SECONDS.labels("memory_lookup").time(),
+            tracing.start_span("retrieve_caller_facts") as span,
+        ):
+            caller_facts = provider.PROVIDERS.caller_memory.retrieve(
+                caller.caller_id, chat.caller_chat_text
+            )
+            span.set_attribute("caller_facts.count", len(caller_facts))
+    prompt_text = prompt_template.render(
+        caller_name=caller.name,
+        session_summary=render_session_summary(summary),
+        chat_history=render_chat_history(history_chats),
+        caller_facts=render_caller_facts(caller_facts),
+        caller_chat_text=chat.caller_chat_text,
+    )
+
+    # route to an inference tier based on prompt size and session depth
+    router = provider.PROVIDERS.inference_router
+    chat.inference_tier = router.classify(chat_input, session_depth)
+    chat.inference_provider_type = router.get_tier_config(
+        chat.inference_tier
+    ).inference_provider_type
+    logger.info("Routed chat", inference_tier=chat.inference_tier)
+
+    return chat, prompt_text
+
+
+def get_history_offset(session_depth: int, max_turns: int) -> int:
+    """Get offset of the first history turn included in the prompt.
+
+    The window slides in steps of half its size rather than one turn at a time, so
+    the prompt prefix stays identical for several consecutive turns.
+    """
+
+    if session_depth <= max_turns:
+        return 0
+    step = max(1, max_turns // 2)
+    return -(-(session_depth - max_turns) // step) * step
 
 
 def init() -> None:
@@ -74,8 +558,17 @@ def init() -> None:
     env_vars = parse_env_vars_with_defaults()
     all_values = dataclasses.asdict(env_vars) | dataclasses.asdict(cli_args)
     config.CONFIG = config.Config(**all_values)
-    configure_global_logging_level(config.CONFIG.debug_mode)
+    configure_global_logging_level(
+        config.CONFIG.debug_mode,
+        config.CONFIG.async_logging,
+        config.CONFIG.log_sample_ratios,
+    )
     log_config_settings(config.CONFIG)
+    tracing.configure_tracing(
+        config.CONFIG.tracing_exporter_type,
+        config.CONFIG.tracing_sample_ratio,
+        config.CONFIG.tracing_file_path,
+    )
 
     # configure providers based on the above configuration
     configure_providers()
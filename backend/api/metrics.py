@@ -0,0 +1,398 @@
+""" Module for prometheus metrics. """
+
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+
+
+class _Shards:
+    """Class for per thread value arrays.
+
+    Each thread only ever writes its own array, so updates need no lock and never
+    contend; a scrape sums the arrays of all threads. The lock is only taken the
+    first time a thread writes.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def get(self) -> list[float]:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = [0.0] * self._size
+            with self._lock:
+                self._shards.append(values)
+            self._local.values = values
+            return values
+
+    def sum(self) -> list[float]:
+        with self._lock:
+            shards = list(self._shards)
+        return (
+            [sum(column) for column in zip(*shards)] if shards else [0.0] * self._size
+        )
+
+
+class _Timer:
+    """Class for timing a block into a histogram."""
+
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: "_HistogramChild"):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class _InProgress:
+    """Class for tracking a block in a gauge."""
+
+    __slots__ = ("_gauge",)
+
+    def __init__(self, gauge: "_GaugeChild"):
+        self._gauge = gauge
+
+    def __enter__(self):
+        self._gauge.inc()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._gauge.dec()
+
+
+class _CounterChild:
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._shards.get()[0] += amount
+
+    def get(self) -> float:
+        return self._shards.sum()[0]
+
+    def samples(self, name: str, labels: str):
+        yield f"{name}{labels}", self.get()
+
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount: float = 1.0) -> None:
+        self._shards.get()[0] -= amount
+
+    def track_inprogress(self) -> _InProgress:
+        return _InProgress(self)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: tuple[float]):
+        self._buckets = buckets
+        # one count per bucket plus the +Inf bucket, then sum and count
+        self._shards = _Shards(len(buckets) + 3)
+
+    def observe(self, value: float) -> None:
+        values = self._shards.get()
+        values[bisect.bisect_left(self._buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def get(self) -> tuple[list[float], float, float]:
+        """Get non cumulative bucket counts, sum and count."""
+
+        values = self._shards.sum()
+        return values[:-2], values[-2], values[-1]
+
+    def quantile(self, quantile: float) -> float:
+        """Estimate quantile by linear interpolation within its bucket."""
+
+        counts, _, count = self.get()
+        if not count:
+            return 0.0
+        rank = quantile * count
+        cumulative = 0.0
+        for index, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self._buckets[index - 1] if index else 0.0
+                if index == len(self._buckets):
+                    return lower
+                upper = self._buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self._buckets[-1]
+
+    def samples(self, name: str, labels: str):
+        counts, total, count = self.get()
+        prefix = labels[:-1] + "," if labels else "{"
+        cumulative = 0.0
+        for bucket, bucket_count in zip(self._buckets + ("+Inf",), counts):
+            cumulative += bucket_count
+            yield f'{name}_bucket{prefix}le="{bucket}"}}', cumulative
+        yield f"{name}_sum{labels}", total
+        yield f"{name}_count{labels}", count
+
+
+class _Metric(ABC):
+    """Class for metric family with optional labels."""
+
+    type_name: str = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._unlabelled = self.labels()
+        REGISTRY.append(self)
+
+    def labels(self, *labelvalues: str):
+        """Get child metric for label values."""
+
+        child = self._children.get(labelvalues)
+        if child is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError(
+                    f"metric - {self.name} expects labels - {self.labelnames}"
+                )
+            with self._lock:
+                child = self._children.setdefault(labelvalues, self._new_child())
+        return child
+
+    def collect(self):
+        """Yield prometheus text exposition lines."""
+
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type_name}"
+        for labelvalues, child in list(self._children.items()):
+            labels = (
+                "{"
+                + ",".join(
+                    f'{name}="{_escape(str(value))}"'
+                    for name, value in zip(self.labelnames, labelvalues)
+                )
+                + "}"
+                if labelvalues
+                else ""
+            )
+            for sample_name, value in child.samples(self.name, labels):
+                yield f"{sample_name} {_format_value(value)}"
+
+    @abstractmethod
+    def _new_child(self):
+        """Create child metric for one set of label values."""
+
+
+class Counter(_Metric):
+    """Class for monotonically increasing counter."""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._unlabelled.inc(amount)
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+
+class Gauge(_Metric):
+    """Class for gauge that goes up and down, such as in flight requests."""
+
+    type_name = "gauge"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._unlabelled.inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._unlabelled.dec(amount)
+
+    def track_inprogress(self) -> _InProgress:
+        return self._unlabelled.track_inprogress()
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+
+class Histogram(_Metric):
+    """Class for histogram with fixed buckets."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str] = (),
+        buckets: tuple[float] = DEFAULT_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float) -> None:
+        self._unlabelled.observe(value)
+
+    def time(self) -> _Timer:
+        return self._unlabelled.time()
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+
+class MetricsMiddleware:
+    """Class for asgi middleware counting http requests, kept as plain asgi to avoid
+    the per request overhead of starlette base http middleware."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["received_at"] = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with HTTP_REQUESTS_IN_FLIGHT.track_inprogress():
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                endpoint = scope.get("endpoint")
+                HTTP_REQUESTS_TOTAL.labels(
+                    scope["method"],
+                    endpoint.__name__ if endpoint else "unmatched",
+                    str(status_code),
+                ).inc()
+
+
+def render_prometheus_text() -> str:
+    """Render all registered metrics in prometheus text exposition format."""
+
+    return "\n".join(line for metric in REGISTRY for line in metric.collect()) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+REGISTRY: list[_Metric] = []
+
+HTTP_REQUESTS_TOTAL = Counter(
+    "http_requests_total",
+    "Count of http requests by method, handler and status code.",
+    ("method", "handler", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Count of http requests being served."
+)
+CHAT_STAGE_DURATION_SECONDS = Histogram(
+    "chat_stage_duration_seconds",
+    "Duration of each stage of a chat request in seconds.",
+    ("stage",),
+)
+INFERENCE_REQUESTS_TOTAL = Counter(
+    "inference_requests_total",
+    "Count of inference requests by tier and outcome.",
+    ("tier", "outcome"),
+)
+INFERENCE_REQUESTS_IN_FLIGHT = Gauge(
+    "inference_requests_in_flight",
+    "Count of inference requests waiting on a provider by tier.",
+    ("tier",),
+)
+INFERENCE_QUEUED = Gauge(
+    "inference_queued",
+    "Count of inference requests queued for a slot by tier and priority.",
+    ("tier", "priority"),
+)
+INFERENCE_QUEUE_WAIT_SECONDS = Histogram(
+    "inference_queue_wait_seconds",
+    "Duration of waiting for an inference slot by tier and priority in seconds.",
+    ("tier", "priority"),
+)
+INFERENCE_BULK_AGED_TOTAL = Counter(
+    "inference_bulk_aged_total",
+    "Count of bulk inference requests admitted ahead of interactive ones by tier, "
+    "having waited past the bulk max wait.",
+    ("tier",),
+)
+CHATS_CANCELLED_TOTAL = Counter(
+    "chats_cancelled_total",
+    "Count of chats cancelled before their response was complete by reason.",
+    ("reason",),
+)
+SESSION_SUMMARIES_TOTAL = Counter(
+    "session_summaries_total",
+    "Count of session summaries by outcome.",
+    ("outcome",),
+)
+SESSION_SUMMARY_DURATION_SECONDS = Histogram(
+    "session_summary_duration_seconds",
+    "Duration of inference for session summaries in seconds.",
+)
+CALLER_FACT_EXTRACTIONS_TOTAL = Counter(
+    "caller_fact_extractions_total",
+    "Count of caller fact extractions by outcome.",
+    ("outcome",),
+)
+CALLER_FACT_EXTRACTION_DURATION_SECONDS = Histogram(
+    "caller_fact_extraction_duration_seconds",
+    "Duration of inference for caller fact extractions in seconds.",
+)
+CALLER_FACTS_TOTAL = Counter(
+    "caller_facts_total",
+    "Count of caller facts extracted by outcome, new or a duplicate of a known fact.",
+    ("outcome",),
+)
+CALLER_MEMORY_LOOKUPS_TOTAL = Counter(
+    "caller_memory_lookups_total",
+    "Count of caller memory lookups by cache result.",
+    ("cache",),
+)
+INFERENCE_DURATION_SECONDS = Histogram(
+    "inference_duration_seconds",
+    "Duration of inference requests by tier in seconds.",
+    ("tier",),
+)
@@ -0,0 +1,87 @@
+""" Module for prompt template registry. """
+
+from string import Formatter
+
+from structlog import get_logger
+
+from backend.api.entities import PromptTemplate
+
+_CONVERSIONS = {None: lambda value: value, "s": str, "r": repr, "a": ascii}
+
+
+class CompiledPromptTemplate:
+    """Class for prompt template compiled once into literal and field segments."""
+
+    def __init__(self, prompt_template: PromptTemplate):
+        self.prompt_template_id = prompt_template.prompt_template_id
+        self.name = prompt_template.name
+        self.version = prompt_template.version
+
+        segments = []
+        for literal_text, field_name, format_spec, conversion in Formatter().parse(
+            prompt_template.template_text
+        ):
+            if literal_text:
+                segments.append(literal_text)
+            if field_name is not None:
+                if not field_name.isidentifier():
+                    raise ValueError(
+                        f"prompt template - {self.name} v{self.version} has unsupported field - {field_name}"
+                    )
+                segments.append((field_name, format_spec, _CONVERSIONS[conversion]))
+
+        # everything before the first field is identical for every render
+        self.static_prefix = ""
+        while segments and isinstance(segments[0], str):
+            self.static_prefix += segments.pop(0)
+        self._segments = tuple(segments)
+        self.field_names = frozenset(
+            segment[0] for segment in segments if isinstance(segment, tuple)
+        )
+
+    def render(self, **values: any) -> str:
+        """Render prompt template with values."""
+
+        parts = [self.static_prefix]
+        for segment in self._segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+            else:
+                field_name, format_spec, conversion = segment
+                parts.append(format(conversion(values[field_name]), format_spec))
+        return "".join(parts)
+
+
+class PromptTemplateRegistry:
+    """Class for registry of compiled prompt templates."""
+
+    def __init__(self, prompt_templates: list[PromptTemplate]):
+        logger = get_logger()
+        logger.info("Starting compile prompt templates")
+
+        self._by_id: dict[int, CompiledPromptTemplate] = {}
+        self._latest_by_name: dict[str, CompiledPromptTemplate] = {}
+        for prompt_template in prompt_templates:
+            compiled = CompiledPromptTemplate(prompt_template)
+            self._by_id[compiled.prompt_template_id] = compiled
+            latest = self._latest_by_name.get(compiled.name)
+            if latest is None or compiled.version > latest.version:
+                self._latest_by_name[compiled.name] = compiled
+
+        logger.info(
+            "Completed compile prompt templates",
+            latest_versions={
+                name: compiled.version
+                for name, compiled in self._latest_by_name.items()
+            },
+        )
+
+    def get(self, name: str) -> CompiledPromptTemplate:
+        """Get latest version of prompt template by name."""
+
+        return self._latest_by_name[name]
+
+    def get_by_id(self, prompt_template_id: int) -> CompiledPromptTemplate:
+        """Get prompt template by id."""
+
+        return self._by_id[prompt_template_id]
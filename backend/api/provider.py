@@ -4,17 +4,15 @@ from pydantic import ConfigDict
 from pydantic.dataclasses import dataclass
 from structlog import get_logger
 
-from backend.api import config
-from backend.api.data_repositories.sqlite import SQLite
+from backend.api import config, text_compression
+from backend.api.caller_memory import CallerMemory
 from backend.api.data_repository import DataRepository
 from backend.api.enum import DataRepositoryType, InferenceProviderType
 from backend.api.inference_provider_wrapper import InferenceProviderWrapper
-from backend.api.inference_provider_wrappers.kubernetes_pod_wrapper import (
-    KubernetesPodWrapper,
-)
-from backend.api.inference_provider_wrappers.runpod_serverless_api_wrapper import (
-    RunpodServerlessAPIWrapper,
-)
+from backend.api.inference_router import InferenceRouter
+from backend.api.prompt_template_registry import PromptTemplateRegistry
+from backend.api.session_summary import SessionSummarizer
+from backend.api.shared_store import LocalSharedStore, SharedStore
 
 
 @dataclass(config=ConfigDict(arbitrary_types_allowed=True))
@@ -22,7 +20,12 @@ class Providers:
     """Class for storing providers."""
 
     data_repository: DataRepository
-    inference_provider_wrapper: InferenceProviderWrapper
+    inference_router: InferenceRouter
+    prompt_template_registry: PromptTemplateRegistry
+    session_summarizer: SessionSummarizer
+    caller_memory: CallerMemory
+    # replaced by a socket client in each worker when serving with several
+    shared_store: SharedStore
 
 
 PROVIDERS: Providers = None
@@ -38,27 +41,85 @@ def configure_providers() -> None:
     logger.info("Starting configure providers")
 
     global PROVIDERS
+    data_repository = _get_data_repository(config.CONFIG.data_repository_type)
+    # chat texts are compressed from here on, with the newest trained dictionary
+    text_compression.configure_text_compression(
+        config.CONFIG.text_compression_threshold_bytes,
+        data_repository.load_zstd_dictionaries,
+    )
+    # the router builds the wrapper of each tier, so only the provider types the
+    # routing rules use are imported
+    inference_router = InferenceRouter(
+        config.CONFIG.inference_routing_rules_path,
+        config.CONFIG.inference_provider_type,
+        _get_inference_provider_wrapper,
+    )
+    # templates are compiled once here rather than parsed on every chat
+    prompt_template_registry = PromptTemplateRegistry(
+        data_repository.load_prompt_templates()
+    )
     PROVIDERS = Providers(
-        data_repository=_get_data_repository(config.CONFIG.data_repository_type),
-        inference_provider_wrapper=_get_inference_provider_wrapper(
-            config.CONFIG.inference_provider_type
+        data_repository=data_repository,
+        inference_router=inference_router,
+        prompt_template_registry=prompt_template_registry,
+        session_summarizer=SessionSummarizer(
+            data_repository,
+            inference_router,
+            prompt_template_registry,
+            config.CONFIG.session_summary_prompt_template_name,
+            config.CONFIG.session_summary_recent_turns,
+            config.CONFIG.session_summary_fold_turns,
+            config.CONFIG.session_summary_parallelism,
+        ),
+        caller_memory=CallerMemory(
+            data_repository,
+            inference_router,
+            prompt_template_registry,
+            lambda: PROVIDERS.shared_store,
+            config.CONFIG.caller_memory_prompt_template_name,
+            config.CONFIG.caller_memory_top_k,
+            config.CONFIG.caller_memory_min_score,
+            config.CONFIG.caller_memory_duplicate_score,
+            config.CONFIG.caller_memory_max_facts,
+            config.CONFIG.caller_memory_dimensions,
+            config.CONFIG.caller_memory_cache_size,
+            config.CONFIG.caller_memory_parallelism,
         ),
+        shared_store=LocalSharedStore(),
     )
 
     logger.info("Completed configure providers")
 
 
 def _get_data_repository(enum_type: DataRepositoryType) -> DataRepository:
+    # implementations are imported in their match case, so startup only pays for
+    # the ones that are configured
     match enum_type:
         case DataRepositoryType.SQLITE:
+            from backend.api.data_repositories.sqlite import SQLite
+
             return SQLite()
 
 
 def _get_inference_provider_wrapper(
-    enum_type: InferenceProviderType,
+    enum_type: InferenceProviderType, endpoint: str = None, model_name: str = None
 ) -> InferenceProviderWrapper:
     match enum_type:
         case InferenceProviderType.KUBERNETES_POD:
-            return KubernetesPodWrapper()
+            from backend.api.inference_provider_wrappers.kubernetes_pod_wrapper import (
+                KubernetesPodWrapper,
+            )
+
+            return KubernetesPodWrapper(endpoint, model_name)
         case InferenceProviderType.RUNPOD_SERVERLESS_API:
-            return RunpodServerlessAPIWrapper()
+            from backend.api.inference_provider_wrappers.runpod_serverless_api_wrapper import (
+                RunpodServerlessAPIWrapper,
+            )
+
+            return RunpodServerlessAPIWrapper(endpoint, model_name)
+        case InferenceProviderType.FAKE:
+            from backend.api.inference_provider_wrappers.fake_wrapper import (
+                FakeWrapper,
+            )
+
+            return FakeWrapper(endpoint, model_name)
@@ -0,0 +1,194 @@
+""" Module for rolling summaries of caller sessions. """
+
+import os
+import queue
+import threading
+import time
+from uuid import UUID
+
+from structlog import get_logger
+
+from backend.api import metrics
+from backend.api.data_repository import DataRepository
+from backend.api.entities import SessionChatRow, SessionSummary
+from backend.api.enum import InferencePriority, InferenceTier
+from backend.api.inference_router import InferenceRouter
+from backend.api.prompt_template_registry import PromptTemplateRegistry
+
+
+class SessionSummarizer:
+    """Class for summarizer folding the older turns of caller sessions into a
+    rolling summary, off the request path.
+
+    A session is queued once one of its chats completes and is summarized by a
+    background thread, a session queued again while it waits being queued once.
+    Only turns after those already summarized are sent, along with the summary so
+    far, so each turn is summarized once however long the session grows. Turns are
+    folded a batch at a time and the most recent are left verbatim, so prompts
+    share their prefix between folds. A summary is saved only if no other worker
+    has moved it on meanwhile.
+    """
+
+    def __init__(
+        self,
+        data_repository: DataRepository,
+        inference_router: InferenceRouter,
+        prompt_template_registry: PromptTemplateRegistry,
+        prompt_template_name: str,
+        recent_turns: int,
+        fold_turns: int,
+        parallelism: int,
+    ):
+        self.data_repository = data_repository
+        self.inference_router = inference_router
+        self.prompt_template_registry = prompt_template_registry
+        self.prompt_template_name = prompt_template_name
+        self.recent_turns = recent_turns
+        self.fold_turns = fold_turns
+        self.parallelism = parallelism
+        self._start()
+        # a forked worker inherits the queue but not the threads draining it,
+        # sessions queued before the fork are left to the parent
+        os.register_at_fork(after_in_child=self._start_after_fork)
+
+    def submit(self, caller_id: UUID, caller_session_id: str) -> None:
+        """Queue a session to be summarized."""
+
+        key = (caller_id, caller_session_id)
+        with self._lock:
+            if self._closed or key in self._pending:
+                return
+            self._pending.add(key)
+        self._queue.put(key)
+
+    def summarize(self, caller_id: UUID, caller_session_id: str) -> bool:
+        """Fold the turns of a session not yet summarized, bar the recent ones, into
+        its summary once there are enough of them, true if the summary moved on."""
+
+        logger = get_logger().bind(
+            caller_id=caller_id, caller_session_id=caller_session_id
+        )
+        logger.info("Starting summarize session")
+
+        summary = self.data_repository.load_session_summary(
+            caller_id, caller_session_id
+        )
+        summarized_turns = summary.summarized_turns if summary else 0
+        session_depth = self.data_repository.count_session_chats(
+            caller_id, caller_session_id
+        )
+        fold_end = session_depth - self.recent_turns
+        if fold_end - summarized_turns < self.fold_turns:
+            logger.info("Completed summarize session, too few new turns")
+            return False
+
+        turns = self.data_repository.load_session_chats(
+            caller_id,
+            caller_session_id,
+            summarized_turns,
+            fold_end - summarized_turns,
+        )
+        prompt_template = self.prompt_template_registry.get(self.prompt_template_name)
+        prompt_text = prompt_template.render(
+            session_summary=summary.summary_text if summary else "None yet.",
+            chat_history=render_chat_history(turns),
+        )
+        with self.inference_router.schedule(
+            InferenceTier.SMALL, InferencePriority.BULK
+        ):
+            start = time.perf_counter()
+            summary_text = self.inference_router.get_wrapper(
+                InferenceTier.SMALL
+            ).request_for_inference(
+                f"session-summary-{caller_id}-{caller_session_id}-{fold_end}",
+                [],
+                prompt_text,
+                affinity_key=f"{caller_id}/{caller_session_id}/summary",
+            )
+        metrics.SESSION_SUMMARY_DURATION_SECONDS.observe(time.perf_counter() - start)
+
+        saved = self.data_repository.save_session_summary(
+            SessionSummary(
+                caller_id=caller_id,
+                caller_session_id=caller_session_id,
+                prompt_template_id=prompt_template.prompt_template_id,
+                summary_text=summary_text.strip(),
+                summarized_turns=summarized_turns + len(turns),
+            ),
+            summarized_turns,
+        )
+        metrics.SESSION_SUMMARIES_TOTAL.labels("success" if saved else "conflict").inc()
+
+        logger.info(
+            "Completed summarize session",
+            summarized_turns=summarized_turns + len(turns),
+            saved=saved,
+        )
+        return saved
+
+    def shutdown(self) -> None:
+        """Stop the background threads once the sessions they are summarizing are
+        done, sessions still queued are summarized after their next chat."""
+
+        with self._lock:
+            self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _start_after_fork(self) -> None:
+        if not self._closed:
+            self._start()
+
+    def _start(self) -> None:
+        self._closed = False
+        self._lock = threading.Lock()
+        self._pending: set[tuple[UUID, str]] = set()
+        self._queue = queue.SimpleQueue()
+        self._threads = [
+            threading.Thread(
+                target=self._work, name=f"session-summarizer-{index}", daemon=True
+            )
+            for index in range(self.parallelism)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self) -> None:
+        while True:
+            key = self._queue.get()
+            if key is None:
+                return
+            # dropped before summarizing, so a chat completing meanwhile queues the
+            # session again
+            with self._lock:
+                self._pending.discard(key)
+            try:
+                self.summarize(*key)
+            except Exception as error:
+                metrics.SESSION_SUMMARIES_TOTAL.labels("failure").inc()
+                get_logger().warning(
+                    "Unable to summarize session",
+                    caller_id=key[0],
+                    caller_session_id=key[1],
+                    error=repr(error),
+                )
+
+
+def render_chat_history(chats: list[SessionChatRow]) -> str:
+    """Render chat history oldest first with fixed formatting."""
+
+    return "".join(
+        f"Client: {chat.caller_chat_text.strip()}\nLawyer: {chat.response_chat_text.strip()}\n\n"
+        for chat in chats
+    )
+
+
+def render_session_summary(summary: SessionSummary | None) -> str:
+    """Render the summary of a session's earlier turns for a chat prompt, nothing
+    if there is none yet."""
+
+    if summary is None:
+        return ""
+    return f"Summary of the conversation before the recent turns:\n{summary.summary_text}\n\n"
@@ -0,0 +1,202 @@
+""" Module for key value store shared by conversation api workers. """
+
+import os
+import pickle
+import socket
+import socketserver
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from structlog import get_logger
+
+_LENGTH = struct.Struct("!I")
+_METHODS = frozenset({"get", "set", "delete", "incr"})
+
+
+class SharedStore(ABC):
+    """Class for key value store with per key expiry, for hot state such as cached
+    callers and counters."""
+
+    @abstractmethod
+    def get(self, key: str) -> any:
+        """Get value, none if missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: any, ttl_seconds: float = None) -> None:
+        """Set value, expiring after ttl seconds if given."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Delete value."""
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl_seconds: float = None) -> int:
+        """Increment counter and return its new value, a new counter expires after
+        ttl seconds if given, as for a fixed window rate limit bucket."""
+
+
+class LocalSharedStore(SharedStore):
+    """Class for in process store, used by a single worker and behind the socket
+    server when there are several."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._values: dict[str, tuple[any, float | None]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> any:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            return None
+        return value
+
+    def set(self, key: str, value: any, ttl_seconds: float = None) -> None:
+        with self._lock:
+            self._evict_if_full()
+            self._values[key] = (value, _expires_at(ttl_seconds))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: float = None) -> int:
+        with self._lock:
+            value = self.get(key)
+            if value is None:
+                self._evict_if_full()
+                value, expires_at = 0, _expires_at(ttl_seconds)
+            else:
+                expires_at = self._values[key][1]
+            value += amount
+            self._values[key] = (value, expires_at)
+            return value
+
+    def _evict_if_full(self) -> None:
+        if len(self._values) < self.max_keys:
+            return
+        now = time.monotonic()
+        for key in [
+            key
+            for key, (_, expires_at) in self._values.items()
+            if expires_at is not None and expires_at <= now
+        ]:
+            del self._values[key]
+        # dicts keep insertion order, so this drops the oldest keys
+        while len(self._values) >= self.max_keys:
+            del self._values[next(iter(self._values))]
+
+
+class SharedStoreServer(socketserver.ThreadingUnixStreamServer):
+    """Class for unix socket server exposing a local store to worker processes.
+
+    Messages are length prefixed pickles. The socket is only accessible to the user
+    running the server, which is the same user running the workers.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, store: LocalSharedStore = None):
+        self.socket_path = socket_path
+        self.store = store or LocalSharedStore()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        previous_umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _SharedStoreHandler)
+        finally:
+            os.umask(previous_umask)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class _SharedStoreHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        logger = get_logger()
+        store = self.server.store
+        while True:
+            try:
+                method, args = _receive(self.request)
+            except (ConnectionError, EOFError):
+                return
+            try:
+                if method not in _METHODS:
+                    raise ValueError(f"unknown method - {method}")
+                response = (True, getattr(store, method)(*args))
+            except Exception as error:
+                logger.error("Unable to serve shared store request", error=str(error))
+                response = (False, str(error))
+            _send(self.request, response)
+
+
+class SocketSharedStore(SharedStore):
+    """Class for store client talking to the shared store server, each thread keeps
+    its own connection."""
+
+    def __init__(self, socket_path: str, timeout_seconds: float = 1.0):
+        self.socket_path = socket_path
+        self.timeout_seconds = timeout_seconds
+        self._local = threading.local()
+
+    def get(self, key: str) -> any:
+        return self._call("get", key)
+
+    def set(self, key: str, value: any, ttl_seconds: float = None) -> None:
+        self._call("set", key, value, ttl_seconds)
+
+    def delete(self, key: str) -> None:
+        self._call("delete", key)
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: float = None) -> int:
+        return self._call("incr", key, amount, ttl_seconds)
+
+    def _call(self, method: str, *args: any) -> any:
+        connection = getattr(self._local, "connection", None)
+        try:
+            if connection is None:
+                connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                connection.settimeout(self.timeout_seconds)
+                connection.connect(self.socket_path)
+                self._local.connection = connection
+            _send(connection, (method, args))
+            succeeded, result = _receive(connection)
+        except (OSError, EOFError):
+            # drop the connection so the next call reconnects
+            if connection is not None:
+                connection.close()
+            self._local.connection = None
+            raise
+        if not succeeded:
+            raise RuntimeError(f"shared store {method} failed - {result}")
+        return result
+
+
+def _expires_at(ttl_seconds: float | None) -> float | None:
+    return time.monotonic() + ttl_seconds if ttl_seconds is not None else None
+
+
+def _send(connection: socket.socket, message: any) -> None:
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    connection.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def _receive(connection: socket.socket) -> any:
+    (length,) = _LENGTH.unpack(_receive_exactly(connection, _LENGTH.size))
+    return pickle.loads(_receive_exactly(connection, length))
+
+
+def _receive_exactly(connection: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = connection.recv(size - len(buffer))
+        if not chunk:
+            raise EOFError("shared store connection closed")
+        buffer += chunk
+    return bytes(buffer)
@@ -3,12 +3,13 @@
 from datetime import UTC, datetime
 from uuid import UUID
 
-from api.entities import Caller
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from sqlalchemy import Engine
+from sqlalchemy.dialects.sqlite import insert
 
+from backend.api.entities import Caller
 
-def insert_callers(connection_string: str, debug_mode: bool) -> None:
+
+def insert_callers(engine: Engine) -> None:
     """Insert caller data into the database."""
 
     callers = [
@@ -22,14 +23,20 @@ def insert_callers(connection_string: str, debug_mode: bool) -> None:
         }
     ]
 
-    engine = create_engine(connection_string, echo=debug_mode)
-    with Session(engine) as session:
-        for caller in callers:
-            if (
-                session.query(Caller)
-                .filter_by(caller_id=caller["caller_id"])
-                .one_or_none()
-            ):
-                continue
-            session.add(Caller(**caller))
-        session.commit()
+    # a single upsert keyed on the caller id, seeded callers keep their first
+    # created time
+    statement = insert(Caller).values(callers)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Caller.caller_id],
+        set_={
+            "name": statement.excluded.name,
+            "idp_id": statement.excluded.idp_id,
+            "email": statement.excluded.email,
+            "last_updated": statement.excluded.last_updated,
+        },
+        where=(Caller.name != statement.excluded.name)
+        | (Caller.idp_id != statement.excluded.idp_id)
+        | (Caller.email != statement.excluded.email),
+    )
+    with engine.begin() as connection:
+        connection.execute(statement)
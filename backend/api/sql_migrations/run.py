@@ -1,18 +1,84 @@
 import os
+import re
 
-from alembic.command import upgrade
-from alembic.config import Config
+from sqlalchemy import Engine, create_engine, exc, text
 from structlog import get_logger
 
-from backend.api.sql_migrations.insert_scripts import caller
+from backend.api.sql_migrations.insert_scripts import caller, prompt_template
 
+REVISION_PATTERN = re.compile(r'^revision: str = "(\w+)"', re.MULTILINE)
+DOWN_REVISION_PATTERN = re.compile(
+    r'^down_revision: Union\[str, None\] = (?:"(\w+)"|None)', re.MULTILINE
+)
 
-def run_db_migrations(connection_string: str, debug_mode: bool) -> None:
+
+def run_db_migrations(
+    connection_string: str, debug_mode: bool, engine: Engine = None
+) -> None:
     """Run db migrations"""
 
     logger = get_logger()
     logger.info("Starting run db migrations")
 
+    engine = engine or create_engine(connection_string, echo=debug_mode)
+    current_revision = get_current_revision(engine)
+    head_revision = get_head_revision()
+    if current_revision == head_revision:
+        # alembic is slow to import and configure, so it is skipped entirely when
+        # there is nothing to upgrade
+        logger.info("Database is at head revision", revision=head_revision)
+    else:
+        logger.info(
+            "Upgrading database",
+            current_revision=current_revision,
+            head_revision=head_revision,
+        )
+        _upgrade(connection_string)
+
+    # insert data into the database
+    caller.insert_callers(engine)
+    prompt_template.insert_prompt_templates(engine)
+
+    logger.info("Completed run db migrations")
+
+
+def get_current_revision(engine: Engine) -> str | None:
+    """Get revision the database is at, none if it has never been migrated."""
+
+    try:
+        with engine.connect() as connection:
+            return connection.execute(
+                text("SELECT version_num FROM alembic_version")
+            ).scalar_one_or_none()
+    except exc.OperationalError:
+        return None
+
+
+def get_head_revision() -> str:
+    """Get head revision by reading the revision ids in the versions directory,
+    without importing alembic or the migration scripts."""
+
+    versions_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "versions")
+    revisions = set()
+    down_revisions = set()
+    for file_name in os.listdir(versions_dir):
+        if not file_name.endswith(".py"):
+            continue
+        with open(os.path.join(versions_dir, file_name), encoding="utf-8") as file:
+            source = file.read()
+        revisions.update(REVISION_PATTERN.findall(source))
+        down_revisions.update(DOWN_REVISION_PATTERN.findall(source))
+
+    heads = revisions - down_revisions
+    if len(heads) != 1:
+        raise ValueError(f"expected a single head revision - {sorted(heads)}")
+    return heads.pop()
+
+
+def _upgrade(connection_string: str) -> None:
+    from alembic.command import upgrade
+    from alembic.config import Config
+
     # retrieves the directory that *this* file is in
     migrations_dir = os.path.dirname(os.path.realpath(__file__))
     # this assumes the alembic.ini is also contained in this same directory
@@ -23,8 +89,3 @@ def run_db_migrations(connection_string: str, debug_mode: bool) -> None:
 
     # upgrade the database to the latest revision
     upgrade(config, "head")
-
-    # insert data into the database
-    caller.insert_callers(connection_string, debug_mode)
-
-    logger.info("Completed run db migrations")
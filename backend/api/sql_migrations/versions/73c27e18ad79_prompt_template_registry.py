@@ -0,0 +1,100 @@
+"""prompt template registry
+
+Revision ID: 73c27e18ad79
+Revises: 8a28805a0b85
+Create Date: 2026-10-19 03:41:09.228154+00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "73c27e18ad79"
+down_revision: Union[str, None] = "8a28805a0b85"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LEGACY_TEMPLATE_NAME = "legacy"
+
+
+def upgrade() -> None:
+    op.create_table(
+        "prompt_template",
+        sa.Column(
+            "prompt_template_id", sa.Integer(), autoincrement=True, nullable=False
+        ),
+        sa.Column("name", sa.Unicode(length=100), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("template_text", sa.Text(), nullable=False),
+        sa.Column("first_created", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("prompt_template_id"),
+        sa.UniqueConstraint("name", "version"),
+    )
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.add_column(
+            sa.Column("prompt_template_id", sa.Integer(), nullable=True)
+        )
+        batch_op.create_foreign_key(
+            "fk_chat_prompt_template_id_prompt_template",
+            "prompt_template",
+            ["prompt_template_id"],
+            ["prompt_template_id"],
+        )
+
+    # move each distinct free text template into the registry once and point the
+    # chats at it, so the text is stored once instead of on every row
+    connection = op.get_bind()
+    template_texts = connection.execute(
+        sa.text(
+            "SELECT DISTINCT prompt_template FROM chat WHERE prompt_template IS NOT NULL"
+        )
+    ).scalars()
+    for version, template_text in enumerate(template_texts, start=1):
+        connection.execute(
+            sa.text(
+                "INSERT INTO prompt_template (name, version, template_text, first_created)"
+                " VALUES (:name, :version, :template_text, CURRENT_TIMESTAMP)"
+            ),
+            {
+                "name": LEGACY_TEMPLATE_NAME,
+                "version": version,
+                "template_text": template_text,
+            },
+        )
+    connection.execute(
+        sa.text(
+            "UPDATE chat SET prompt_template_id = ("
+            " SELECT prompt_template_id FROM prompt_template"
+            " WHERE prompt_template.name = :name"
+            " AND prompt_template.template_text = chat.prompt_template"
+            ") WHERE prompt_template IS NOT NULL"
+        ),
+        {"name": LEGACY_TEMPLATE_NAME},
+    )
+
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.drop_column("prompt_template")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.add_column(sa.Column("prompt_template", sa.Text(), nullable=True))
+
+    op.get_bind().execute(
+        sa.text(
+            "UPDATE chat SET prompt_template = ("
+            " SELECT template_text FROM prompt_template"
+            " WHERE prompt_template.prompt_template_id = chat.prompt_template_id"
+            ")"
+        )
+    )
+
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.drop_constraint(
+            "fk_chat_prompt_template_id_prompt_template", type_="foreignkey"
+        )
+        batch_op.drop_column("prompt_template_id")
+    op.drop_table("prompt_template")
@@ -0,0 +1,44 @@
+"""session summary
+
+Revision ID: a6d3f9c27e54
+Revises: f4c1a8e62d39
+Create Date: 2026-10-19 16:21:48.307915+00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a6d3f9c27e54"
+down_revision: Union[str, None] = "f4c1a8e62d39"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "session_summary",
+        sa.Column("caller_id", sa.Uuid(), nullable=False),
+        sa.Column("caller_session_id", sa.Unicode(length=50), nullable=False),
+        sa.Column("prompt_template_id", sa.Integer(), nullable=True),
+        sa.Column("summary_text", sa.Text(), nullable=False),
+        sa.Column("summarized_turns", sa.Integer(), nullable=False),
+        sa.Column("first_created", sa.DateTime(), nullable=False),
+        sa.Column("last_updated", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["caller_id"],
+            ["caller.caller_id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["prompt_template_id"],
+            ["prompt_template.prompt_template_id"],
+        ),
+        sa.PrimaryKeyConstraint("caller_id", "caller_session_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("session_summary")
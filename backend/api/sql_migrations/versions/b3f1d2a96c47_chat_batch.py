@@ -0,0 +1,65 @@
+"""chat batch
+
+Revision ID: b3f1d2a96c47
+Revises: 5c0e9a4b7d21
+Create Date: 2026-10-19 09:41:27.518390+00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b3f1d2a96c47"
+down_revision: Union[str, None] = "5c0e9a4b7d21"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "chat_batch",
+        sa.Column("chat_batch_id", sa.Uuid(), nullable=False),
+        sa.Column("caller_id", sa.Uuid(), nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum("RUNNING", "COMPLETED", "INCOMPLETE", name="chatbatchstatus"),
+            nullable=False,
+        ),
+        sa.Column("item_count", sa.Integer(), nullable=True),
+        sa.Column("failed_item_count", sa.Integer(), nullable=True),
+        sa.Column("first_created", sa.DateTime(), nullable=False),
+        sa.Column("last_updated", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["caller_id"],
+            ["caller.caller_id"],
+        ),
+        sa.PrimaryKeyConstraint("chat_batch_id"),
+    )
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.add_column(sa.Column("chat_batch_id", sa.Uuid(), nullable=True))
+        batch_op.add_column(
+            sa.Column("chat_batch_item_index", sa.Integer(), nullable=True)
+        )
+        batch_op.create_foreign_key(
+            "fk_chat_chat_batch_id_chat_batch",
+            "chat_batch",
+            ["chat_batch_id"],
+            ["chat_batch_id"],
+        )
+        batch_op.create_index(
+            "ix_chat_chat_batch_id_chat_batch_item_index",
+            ["chat_batch_id", "chat_batch_item_index"],
+            unique=True,
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.drop_index("ix_chat_chat_batch_id_chat_batch_item_index")
+        batch_op.drop_constraint("fk_chat_chat_batch_id_chat_batch", type_="foreignkey")
+        batch_op.drop_column("chat_batch_item_index")
+        batch_op.drop_column("chat_batch_id")
+    op.drop_table("chat_batch")
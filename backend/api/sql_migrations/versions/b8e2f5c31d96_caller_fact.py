@@ -0,0 +1,61 @@
+"""caller fact
+
+Revision ID: b8e2f5c31d96
+Revises: a6d3f9c27e54
+Create Date: 2026-10-19 18:02:11.514093+00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b8e2f5c31d96"
+down_revision: Union[str, None] = "a6d3f9c27e54"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "caller_fact",
+        sa.Column("caller_fact_id", sa.Uuid(), nullable=False),
+        sa.Column("caller_id", sa.Uuid(), nullable=False),
+        sa.Column("prompt_template_id", sa.Integer(), nullable=True),
+        sa.Column("chat_id", sa.Uuid(), nullable=True),
+        sa.Column("fact_key", sa.Unicode(length=64), nullable=False),
+        sa.Column("fact_text", sa.Text(), nullable=False),
+        sa.Column("embedding", sa.LargeBinary(), nullable=True),
+        sa.Column("last_seen", sa.DateTime(), nullable=False),
+        sa.Column("first_created", sa.DateTime(), nullable=False),
+        sa.Column("last_updated", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["caller_id"],
+            ["caller.caller_id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["prompt_template_id"],
+            ["prompt_template.prompt_template_id"],
+        ),
+        sa.PrimaryKeyConstraint("caller_fact_id"),
+    )
+    op.create_index(
+        "ix_caller_fact_caller_id_fact_key",
+        "caller_fact",
+        ["caller_id", "fact_key"],
+        unique=True,
+    )
+    op.create_index(
+        "ix_caller_fact_caller_id_last_seen",
+        "caller_fact",
+        ["caller_id", "last_seen"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_caller_fact_caller_id_last_seen", table_name="caller_fact")
+    op.drop_index("ix_caller_fact_caller_id_fact_key", table_name="caller_fact")
+    op.drop_table("caller_fact")
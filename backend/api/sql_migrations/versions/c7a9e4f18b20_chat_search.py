@@ -0,0 +1,62 @@
+"""chat search
+
+Revision ID: c7a9e4f18b20
+Revises: b3f1d2a96c47
+Create Date: 2026-10-19 11:02:45.730142+00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c7a9e4f18b20"
+down_revision: Union[str, None] = "b3f1d2a96c47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10_000
+
+
+def upgrade() -> None:
+    # the index keeps its own copy of the text, so snippets do not depend on how
+    # the chat table stores it, and the caller id is an indexed column so a
+    # search only intersects with that caller's rows
+    op.execute(
+        "CREATE VIRTUAL TABLE chat_search USING fts5("
+        "caller_chat_text, response_chat_text, caller_key, chat_id UNINDEXED,"
+        " tokenize = 'porter unicode61')"
+    )
+
+    # backfill answered chats in rowid order a batch at a time, so memory stays
+    # flat however many chats there are
+    connection = op.get_bind()
+    last_rowid = 0
+    while True:
+        last_rowid_in_batch = connection.execute(
+            sa.text(
+                "SELECT max(rowid) FROM ("
+                " SELECT rowid FROM chat WHERE rowid > :last_rowid"
+                " ORDER BY rowid LIMIT :batch_size)"
+            ),
+            {"last_rowid": last_rowid, "batch_size": BACKFILL_BATCH_SIZE},
+        ).scalar()
+        if last_rowid_in_batch is None:
+            break
+        connection.execute(
+            sa.text(
+                "INSERT INTO chat_search"
+                " (caller_chat_text, response_chat_text, caller_key, chat_id)"
+                " SELECT caller_chat_text, response_chat_text, caller_id, chat_id"
+                " FROM chat WHERE rowid > :last_rowid AND rowid <= :last_rowid_in_batch"
+                " AND response_chat_text IS NOT NULL"
+            ),
+            {"last_rowid": last_rowid, "last_rowid_in_batch": last_rowid_in_batch},
+        )
+        last_rowid = last_rowid_in_batch
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE chat_search")
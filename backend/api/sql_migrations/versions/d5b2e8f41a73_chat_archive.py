@@ -0,0 +1,32 @@
+"""chat archive
+
+Revision ID: d5b2e8f41a73
+Revises: c7a9e4f18b20
+Create Date: 2026-10-19 10:12:48.204615+00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d5b2e8f41a73"
+down_revision: Union[str, None] = "c7a9e4f18b20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.add_column(
+            sa.Column("archive_path", sa.Unicode(length=255), nullable=True)
+        )
+        batch_op.create_index("ix_chat_first_created", ["first_created"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.drop_index("ix_chat_first_created")
+        batch_op.drop_column("archive_path")
@@ -0,0 +1,98 @@
+"""chat text compression
+
+Revision ID: e2a7c9d4f615
+Revises: d5b2e8f41a73
+Create Date: 2026-10-19 12:26:09.631874+00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import zstandard
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e2a7c9d4f615"
+down_revision: Union[str, None] = "d5b2e8f41a73"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+REWRITE_BATCH_SIZE = 1000
+# as configured by default when this revision was written, texts from this size
+# up are compressed
+THRESHOLD_BYTES = 256
+COMPRESSION_LEVEL = 3
+
+
+def upgrade() -> None:
+    op.create_table(
+        "zstd_dictionary",
+        sa.Column("zstd_dictionary_id", sa.Integer(), autoincrement=False),
+        sa.Column("dictionary_bytes", sa.LargeBinary(), nullable=False),
+        sa.Column("first_created", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("zstd_dictionary_id"),
+    )
+
+    # no dictionary is trained yet, so existing texts are compressed without one
+    compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+
+    def compress(value: str | bytes | None) -> str | bytes | None:
+        if isinstance(value, str) and len(value.encode("utf-8")) >= THRESHOLD_BYTES:
+            return compressor.compress(value.encode("utf-8"))
+        return value
+
+    _rewrite_chat_texts(compress)
+
+
+def downgrade() -> None:
+    dictionaries = {
+        zstd_dictionary_id: zstandard.ZstdCompressionDict(dictionary_bytes)
+        for zstd_dictionary_id, dictionary_bytes in op.get_bind().execute(
+            sa.text("SELECT zstd_dictionary_id, dictionary_bytes FROM zstd_dictionary")
+        )
+    }
+
+    def decompress(value: str | bytes | None) -> str | bytes | None:
+        if isinstance(value, bytes):
+            dictionary_id = zstandard.get_frame_parameters(value).dict_id
+            decompressor = zstandard.ZstdDecompressor(
+                dict_data=dictionaries.get(dictionary_id)
+            )
+            return decompressor.decompress(value).decode("utf-8")
+        return value
+
+    _rewrite_chat_texts(decompress)
+    op.drop_table("zstd_dictionary")
+
+
+def _rewrite_chat_texts(rewrite) -> None:
+    # rewrite in rowid order a batch at a time, so memory stays flat however many
+    # chats there are
+    connection = op.get_bind()
+    last_rowid = 0
+    while True:
+        rows = connection.execute(
+            sa.text(
+                "SELECT rowid, caller_chat_text, response_chat_text FROM chat"
+                " WHERE rowid > :last_rowid ORDER BY rowid LIMIT :batch_size"
+            ),
+            {"last_rowid": last_rowid, "batch_size": REWRITE_BATCH_SIZE},
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            sa.text(
+                "UPDATE chat SET caller_chat_text = :caller_chat_text,"
+                " response_chat_text = :response_chat_text WHERE rowid = :rowid"
+            ),
+            [
+                {
+                    "rowid": rowid,
+                    "caller_chat_text": rewrite(caller_chat_text),
+                    "response_chat_text": rewrite(response_chat_text),
+                }
+                for rowid, caller_chat_text, response_chat_text in rows
+            ],
+        )
+        last_rowid = rows[-1].rowid
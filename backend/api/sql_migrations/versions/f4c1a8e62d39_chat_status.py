@@ -0,0 +1,38 @@
+"""chat status
+
+Revision ID: f4c1a8e62d39
+Revises: e2a7c9d4f615
+Create Date: 2026-10-19 14:03:27.518406+00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f4c1a8e62d39"
+down_revision: Union[str, None] = "e2a7c9d4f615"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "status",
+                sa.Enum("COMPLETED", "CANCELLED", name="chatstatus"),
+                nullable=True,
+            )
+        )
+    # every chat saved so far was saved once answered
+    op.execute(
+        "UPDATE chat SET status = 'COMPLETED' WHERE response_chat_text IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.drop_column("status")
@@ -0,0 +1,148 @@
+""" Module for transparent compression of large text columns. """
+
+import threading
+from typing import Callable
+
+import zstandard
+from sqlalchemy.types import Text, TypeDecorator
+from structlog import get_logger
+
+DEFAULT_THRESHOLD_BYTES = 256
+COMPRESSION_LEVEL = 3
+# size zstd itself trains to by default
+DEFAULT_DICTIONARY_SIZE = 112_640
+
+
+class TextCompressor:
+    """Class for zstd compression of texts from a size threshold up.
+
+    Shorter texts are kept as they are, so they cost nothing and rows written
+    before compression read back unchanged, as are texts compression would not
+    make smaller, and compressed texts are kept as bytes, which is how a read
+    tells the two apart. Texts are compressed with the newest
+    trained dictionary if there is one. A dictionary is named by id in each frame
+    and one not seen yet is loaded when first read, so a process started before a
+    dictionary was trained still reads the rows written with it.
+    """
+
+    def __init__(
+        self,
+        threshold_bytes: int = DEFAULT_THRESHOLD_BYTES,
+        load_dictionaries: Callable[[], dict[int, bytes]] = None,
+    ):
+        self.threshold_bytes = threshold_bytes
+        self._load_dictionaries = load_dictionaries
+        self._dictionaries: dict[int, zstandard.ZstdCompressionDict] = {}
+        self._lock = threading.Lock()
+        # zstd contexts are reused across calls but cannot be shared by threads
+        self._local = threading.local()
+        if load_dictionaries:
+            self.reload_dictionaries()
+
+    def reload_dictionaries(self) -> None:
+        """Reload dictionaries, oldest first, the newest being used to compress."""
+
+        dictionaries = {
+            dictionary_id: zstandard.ZstdCompressionDict(dictionary_bytes)
+            for dictionary_id, dictionary_bytes in self._load_dictionaries().items()
+        }
+        with self._lock:
+            self._dictionaries = dictionaries
+            self._local = threading.local()
+
+    def compress(self, text: str | None) -> str | bytes | None:
+        """Compress text if it is at least the threshold in size and compresses to
+        fewer bytes."""
+
+        if text is None:
+            return None
+        data = text.encode("utf-8")
+        if len(data) < self.threshold_bytes:
+            return text
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            dictionaries = list(self._dictionaries.values())
+            compressor = self._local.compressor = zstandard.ZstdCompressor(
+                level=COMPRESSION_LEVEL,
+                dict_data=dictionaries[-1] if dictionaries else None,
+            )
+        compressed = compressor.compress(data)
+        if len(compressed) >= len(data):
+            return text
+        return compressed
+
+    def decompress(self, value: str | bytes | None) -> str | None:
+        """Decompress value if it was compressed."""
+
+        if not isinstance(value, bytes):
+            return value
+        dictionary_id = zstandard.get_frame_parameters(value).dict_id
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        decompressor = decompressors.get(dictionary_id)
+        if decompressor is None:
+            if dictionary_id and dictionary_id not in self._dictionaries:
+                self.reload_dictionaries()
+                if dictionary_id not in self._dictionaries:
+                    raise ValueError(f"unknown zstd dictionary - {dictionary_id}")
+            decompressor = zstandard.ZstdDecompressor(
+                dict_data=self._dictionaries.get(dictionary_id)
+            )
+            decompressors[dictionary_id] = decompressor
+        return decompressor.decompress(value).decode("utf-8")
+
+
+class CompressedText(TypeDecorator):
+    """Class for text column compressed by the configured text compressor.
+
+    SQLite only. Compressed values are bytes bound into a column declared text,
+    which works because SQLite keeps the storage class of each value whatever
+    the column type. Other backends would coerce or reject the bytes, so such a
+    column would first have to become binary with plain texts stored encoded.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value: str | None, dialect) -> str | bytes | None:
+        return _COMPRESSOR.compress(value)
+
+    def process_result_value(self, value: str | bytes | None, dialect) -> str | None:
+        return _COMPRESSOR.decompress(value)
+
+
+def configure_text_compression(
+    threshold_bytes: int, load_dictionaries: Callable[[], dict[int, bytes]]
+) -> None:
+    """Configure text compression threshold and dictionaries."""
+
+    logger = get_logger().bind(threshold_bytes=threshold_bytes)
+    logger.info("Starting configure text compression")
+
+    global _COMPRESSOR
+    _COMPRESSOR = TextCompressor(threshold_bytes, load_dictionaries)
+
+    logger.info(
+        "Completed configure text compression",
+        dictionaries=len(_COMPRESSOR._dictionaries),
+    )
+
+
+def get_compressor() -> TextCompressor:
+    """Get configured text compressor."""
+
+    return _COMPRESSOR
+
+
+def train_dictionary(
+    texts: list[str], dictionary_size: int = DEFAULT_DICTIONARY_SIZE
+) -> zstandard.ZstdCompressionDict:
+    """Train zstd dictionary on sample texts."""
+
+    return zstandard.train_dictionary(
+        dictionary_size, [text.encode("utf-8") for text in texts]
+    )
+
+
+_COMPRESSOR: TextCompressor = TextCompressor()
@@ -0,0 +1,305 @@
+""" Module for request tracing. """
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from uuid import uuid4
+
+import structlog
+from structlog import get_logger
+
+from backend.api.enum import TracingExporterType
+
+
+class Span:
+    """Class for span, fields follow the opentelemetry (otlp json) span model."""
+
+    __slots__ = (
+        "trace_id",
+        "span_id",
+        "parent_span_id",
+        "name",
+        "start_time_unix_nano",
+        "end_time_unix_nano",
+        "attributes",
+        "status_code",
+        "status_message",
+    )
+
+    def __init__(self, trace_id: str, parent_span_id: str, name: str, attributes):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.attributes = attributes
+        self.start_time_unix_nano = time.time_ns()
+        self.end_time_unix_nano = None
+        self.status_code = "STATUS_CODE_UNSET"
+        self.status_message = None
+
+    def set_attribute(self, key: str, value: any) -> None:
+        """Set span attribute."""
+
+        self.attributes[key] = value
+
+    def to_otlp_json(self) -> dict:
+        """Convert span to otlp json representation."""
+
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_time_unix_nano),
+            "endTimeUnixNano": str(self.end_time_unix_nano),
+            "attributes": [
+                {"key": key, "value": _to_otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": {
+                "code": self.status_code,
+                **({"message": self.status_message} if self.status_message else {}),
+            },
+        }
+
+
+class _NoopSpan:
+    """Class for span of an unsampled request, every operation does nothing."""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: any) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _SpanScope:
+    """Class for making a span current for the duration of a block."""
+
+    __slots__ = ("_span", "_token")
+
+    def __init__(self, span: Span):
+        self._span = span
+
+    def __enter__(self) -> Span:
+        self._token = _CURRENT_SPAN.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        span = self._span
+        span.end_time_unix_nano = time.time_ns()
+        if exc_type is not None:
+            span.status_code = "STATUS_CODE_ERROR"
+            span.status_message = f"{exc_type.__name__}: {exc_value}"
+        _CURRENT_SPAN.reset(self._token)
+        _EXPORTER.export(span)
+        return False
+
+
+class SpanExporter:
+    """Class for span exporter that drops spans."""
+
+    def export(self, span: Span) -> None:
+        """Export finished span."""
+
+    def shutdown(self) -> None:
+        """Flush pending spans and release resources."""
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Class for span exporter keeping the most recent spans in memory."""
+
+    def __init__(self, max_spans: int = 10_000):
+        self.spans = deque(maxlen=max_spans)
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+
+class FileSpanExporter(SpanExporter):
+    """Class for span exporter appending otlp json lines to a file.
+
+    Spans are queued and written by a background thread, so requests never wait on
+    serialisation or disk.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._start()
+        # a forked worker inherits the queue but not the thread draining it
+        os.register_at_fork(after_in_child=self._start_after_fork)
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def shutdown(self) -> None:
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _start_after_fork(self) -> None:
+        if not self._closed:
+            self._start()
+
+    def _start(self) -> None:
+        self._closed = False
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._write, name="file-span-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def _write(self) -> None:
+        with open(self.file_path, "a", encoding="utf-8") as file:
+            while True:
+                span = self._queue.get()
+                # drain whatever else is queued before paying for a flush
+                while span is not None:
+                    file.write(json.dumps(span.to_otlp_json()) + "\n")
+                    if self._queue.empty():
+                        break
+                    span = self._queue.get()
+                file.flush()
+                if span is None:
+                    return
+
+
+def configure_tracing(
+    exporter_type: TracingExporterType, sample_ratio: float, file_path: str = None
+) -> None:
+    """Configure tracing exporter and sampling."""
+
+    logger = get_logger().bind(
+        exporter_type=exporter_type, sample_ratio=sample_ratio, file_path=file_path
+    )
+    logger.info("Starting configure tracing")
+
+    global _EXPORTER, _SAMPLE_THRESHOLD
+    _EXPORTER.shutdown()
+    match exporter_type:
+        case TracingExporterType.IN_MEMORY:
+            _EXPORTER = InMemorySpanExporter()
+        case TracingExporterType.FILE:
+            _EXPORTER = FileSpanExporter(file_path)
+        case _:
+            _EXPORTER = SpanExporter()
+    _SAMPLE_THRESHOLD = (
+        int(max(0.0, min(1.0, sample_ratio)) * 2**64)
+        if exporter_type != TracingExporterType.NONE
+        else 0
+    )
+
+    logger.info("Completed configure tracing")
+
+
+def get_exporter() -> SpanExporter:
+    """Get configured span exporter."""
+
+    return _EXPORTER
+
+
+def get_request_id() -> str | None:
+    """Get request id of the current request."""
+
+    return _REQUEST_ID.get()
+
+
+def start_span(name: str, **attributes: any) -> _SpanScope | _NoopSpan:
+    """Start span as child of the current span, does nothing if the request is not
+    sampled."""
+
+    parent = _CURRENT_SPAN.get()
+    if parent is None:
+        return _NOOP_SPAN
+    return _SpanScope(Span(parent.trace_id, parent.span_id, name, attributes))
+
+
+class TracingMiddleware:
+    """Class for asgi middleware assigning a request id and starting the root span.
+
+    The request id is taken from the x-request-id header when present, bound into
+    structlog context and echoed back on the response. Sampling is decided once per
+    request from the trace id, so an unsampled request costs one random draw.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:50]
+                break
+        request_id = request_id or uuid4().hex
+        status_code = None
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", []).append(
+                    (b"x-request-id", request_id.encode("latin-1"))
+                )
+            await send(message)
+
+        request_id_token = _REQUEST_ID.set(request_id)
+        structlog_tokens = structlog.contextvars.bind_contextvars(request_id=request_id)
+        try:
+            trace_id = random.getrandbits(128)
+            if (trace_id & 0xFFFFFFFFFFFFFFFF) >= _SAMPLE_THRESHOLD:
+                await self.app(scope, receive, send_with_request_id)
+                return
+
+            span = Span(
+                f"{trace_id:032x}",
+                None,
+                f"{scope['method']} {scope['path']}",
+                {"http.method": scope["method"], "request.id": request_id},
+            )
+            with _SpanScope(span):
+                try:
+                    await self.app(scope, receive, send_with_request_id)
+                finally:
+                    endpoint = scope.get("endpoint")
+                    if endpoint:
+                        span.set_attribute("http.handler", endpoint.__name__)
+                    if status_code is not None:
+                        span.set_attribute("http.status_code", status_code)
+        finally:
+            structlog.contextvars.reset_contextvars(**structlog_tokens)
+            _REQUEST_ID.reset(request_id_token)
+
+
+def _to_otlp_value(value: any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+_CURRENT_SPAN: ContextVar[Span | None] = ContextVar("current_span", default=None)
+_REQUEST_ID: ContextVar[str | None] = ContextVar("request_id", default=None)
+_EXPORTER: SpanExporter = SpanExporter()
+_SAMPLE_THRESHOLD: int = 0
@@ -0,0 +1,142 @@
+""" Module for serving the conversation api from several worker processes. """
+
+import os
+import signal
+import socket
+import tempfile
+import time
+
+from structlog import get_logger
+
+from backend.api import config, graceful_shutdown, provider, tracing
+from backend.api.logging_pipeline import shutdown_sink
+from backend.api.shared_store import SharedStoreServer, SocketSharedStore
+
+
+def serve_workers(
+    app, host: str, port: int, workers: int, **uvicorn_config: any
+) -> None:
+    """Serve app from pre-forked worker processes accepting on one socket.
+
+    Config and providers are loaded before this is called, so workers share that
+    memory copy on write instead of each loading their own. Hot state such as the
+    caller cache lives in a shared store process the workers reach over a unix
+    socket. Workers that die are replaced until the server is asked to stop.
+
+    The listening socket is taken over from a running server on the same port if
+    there is one, and handed to a successor in turn, the workers draining as they
+    would when asked to stop, see socket handoff.
+    """
+
+    logger = get_logger().bind(host=host, port=port, workers=workers)
+    logger.info("Starting serve workers")
+
+    handoff = graceful_shutdown.SocketHandoff(
+        config.CONFIG.socket_handoff_directory, port
+    )
+    sock = graceful_shutdown.get_listening_socket(handoff, host, port)
+    socket_path = os.path.join(
+        tempfile.gettempdir(), f"conversation-api-{os.getpid()}.sock"
+    )
+    store_pid = _fork(lambda: _run_shared_store(socket_path))
+    _wait_for_path(socket_path)
+
+    # pooled database connections must never be shared between processes
+    provider.PROVIDERS.data_repository.engine.dispose()
+
+    def fork_worker() -> int:
+        return _fork(lambda: _run_worker(app, sock, socket_path, uvicorn_config))
+
+    worker_pids = {fork_worker() for _ in range(workers)}
+    stopping = False
+
+    def stop(signal_number, frame):
+        nonlocal stopping
+        logger.info("Stopping workers", signal=signal.Signals(signal_number).name)
+        stopping = True
+        for pid in worker_pids:
+            _kill(pid, signal.SIGTERM)
+
+    previous_handlers = {
+        signal_number: signal.signal(signal_number, stop)
+        for signal_number in (signal.SIGINT, signal.SIGTERM)
+    }
+    handoff.serve(sock, lambda: os.kill(os.getpid(), signal.SIGTERM))
+    try:
+        while worker_pids:
+            pid, status = os.wait()
+            if pid == store_pid:
+                store_pid = None
+                if not stopping:
+                    logger.warning("Shared store exited, restarting it", status=status)
+                    store_pid = _fork(lambda: _run_shared_store(socket_path))
+            elif pid in worker_pids:
+                worker_pids.remove(pid)
+                if not stopping:
+                    logger.warning("Worker exited, restarting it", pid=pid)
+                    worker_pids.add(fork_worker())
+    finally:
+        handoff.close()
+        for signal_number, handler in previous_handlers.items():
+            signal.signal(signal_number, handler)
+        if store_pid:
+            _kill(store_pid, signal.SIGTERM)
+            os.waitpid(store_pid, 0)
+        sock.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+    logger.info("Completed serve workers")
+
+
+def _run_shared_store(socket_path: str) -> None:
+    # interrupts from the terminal reach the whole process group, the store is only
+    # stopped by the parent once every worker has exited
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    SharedStoreServer(socket_path).serve_forever()
+
+
+def _run_worker(app, sock: socket.socket, socket_path: str, uvicorn_config) -> None:
+    logger = get_logger().bind(pid=os.getpid())
+    logger.info("Starting worker")
+
+    provider.PROVIDERS.shared_store = SocketSharedStore(socket_path)
+    graceful_shutdown.get_draining_server(app, **uvicorn_config).run(sockets=[sock])
+    graceful_shutdown.flush()
+
+    logger.info("Completed worker")
+
+
+def _fork(target) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # the child never returns into the caller, it exits once the target is done
+    exit_code = 0
+    try:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        target()
+    except BaseException as error:
+        get_logger().error("Worker process failed", error=repr(error))
+        exit_code = 1
+    finally:
+        tracing.get_exporter().shutdown()
+        shutdown_sink()
+        os._exit(exit_code)
+
+
+def _kill(pid: int, signal_number: int) -> None:
+    try:
+        os.kill(pid, signal_number)
+    except ProcessLookupError:
+        pass
+
+
+def _wait_for_path(path: str, timeout_seconds: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout_seconds
+    while not os.path.exists(path):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"shared store did not start - {path}")
+        time.sleep(0.01)
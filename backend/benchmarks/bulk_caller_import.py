@@ -0,0 +1,146 @@
+""" Module for benchmarking bulk caller import throughput. """
+
+import argparse
+import csv
+import dataclasses
+import json
+import os
+import platform
+import tempfile
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.api import config, provider
+from backend.api.caller_import import DEFAULT_CHUNK_SIZE, import_callers_from_file
+from backend.api.entities import Caller
+from backend.api.enum import CallerImportFormat, InferenceProviderType
+from backend.api.lib import CLIArgs, EnvVars
+from backend.benchmarks.lib import configure_benchmark_logging
+from backend.benchmarks.load_test import get_git_commit
+
+
+def write_callers(path: str, import_format: CallerImportFormat, rows: int) -> None:
+    """Write synthetic callers to a csv or jsonl file."""
+
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        if import_format == CallerImportFormat.CSV:
+            writer = csv.writer(file)
+            writer.writerow(("name", "idp_id", "email"))
+            for index in range(rows):
+                writer.writerow(_get_caller_values(index))
+        else:
+            for index in range(rows):
+                name, idp_id, email = _get_caller_values(index)
+                file.write(
+                    json.dumps({"name": name, "idp_id": idp_id, "email": email}) + "\n"
+                )
+
+
+def configure_repository(directory: str, name: str) -> None:
+    """Configure providers against a fresh temp sqlite database."""
+
+    values = dataclasses.asdict(EnvVars()) | dataclasses.asdict(CLIArgs())
+    values.update(
+        auth0_public_key="",
+        auth0_issuer="",
+        auth0_audience="",
+        sqlite_connection_string=f"sqlite+pysqlite:///{directory}/{name}.sqlite3",
+        inference_provider_type=InferenceProviderType.FAKE,
+        async_logging=False,
+    )
+    config.CONFIG = config.Config(**values)
+    provider.configure_providers()
+
+
+def import_row_at_a_time(rows: int, offset: int) -> None:
+    """Insert callers one at a time with a select per row to check existence, the
+    way callers were seeded before bulk import."""
+
+    engine = provider.PROVIDERS.data_repository.engine
+    for index in range(offset, offset + rows):
+        name, idp_id, email = _get_caller_values(index)
+        with Session(engine) as session:
+            if session.scalars(select(Caller).filter_by(idp_id=idp_id)).first():
+                continue
+            session.add(Caller(name=name, idp_id=idp_id, email=email))
+            session.commit()
+
+
+def measure(function, rows: int) -> dict:
+    """Run function once and report its throughput."""
+
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "rows_per_second": rows / elapsed,
+        **({"report": result.model_dump(exclude={"errors"})} if result else {}),
+    }
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Bulk caller import benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--baseline-rows",
+        type=int,
+        default=10_000,
+        help="Rows inserted one at a time for comparison, zero to skip",
+    )
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for import_format in CallerImportFormat:
+            path = f"{directory}/callers.{import_format}"
+            write_callers(path, import_format, args.rows)
+            configure_repository(directory, import_format)
+
+            def run_import():
+                return import_callers_from_file(path, import_format, args.chunk_size)
+
+            results[import_format] = {
+                "file_megabytes": os.path.getsize(path) / 1e6,
+                # every row is new, then every row is already there unchanged
+                "insert": measure(run_import, args.rows),
+                "reimport": measure(run_import, args.rows),
+            }
+            provider.PROVIDERS.data_repository.engine.dispose()
+
+        if args.baseline_rows:
+            configure_repository(directory, "baseline")
+            results["row_at_a_time"] = measure(
+                lambda: import_row_at_a_time(args.baseline_rows, 0),
+                args.baseline_rows,
+            )
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+def _get_caller_values(index: int) -> tuple[str, str, str]:
+    return (
+        f"Caller {index}",
+        f"bulk-import|{index:08d}",
+        f"caller-{index}@bulk-import.local",
+    )
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,191 @@
+""" Module for benchmarking caller fact lookup latency. """
+
+import argparse
+import dataclasses
+import heapq
+import itertools
+import json
+import platform
+import random
+import tempfile
+
+import numpy as np
+
+from backend.api import config, metrics, provider
+from backend.api.caller_memory import CallerFactIndex, embed_texts, get_fact_key
+from backend.api.entities import CallerFact
+from backend.api.enum import InferenceProviderType
+from backend.api.lib import CLIArgs, EnvVars
+from backend.benchmarks.chat_search import get_texts, get_vocabulary, measure
+from backend.benchmarks.lib import configure_benchmark_logging
+from backend.benchmarks.load_test import get_git_commit, insert_callers
+
+
+def configure(directory: str, args: argparse.Namespace, max_facts: int) -> None:
+    """Configure providers against a fresh sqlite database."""
+
+    values = dataclasses.asdict(EnvVars()) | dataclasses.asdict(CLIArgs())
+    values.update(
+        auth0_public_key="",
+        auth0_issuer="",
+        auth0_audience="",
+        sqlite_connection_string=f"sqlite+pysqlite:///{directory}/caller_memory.sqlite3",
+        chat_archive_directory=f"{directory}/chat_archive",
+        inference_provider_type=InferenceProviderType.FAKE,
+        async_logging=False,
+        caller_memory_max_facts=max_facts,
+        caller_memory_cache_size=args.cache_size,
+    )
+    config.CONFIG = config.Config(**values)
+    provider.configure_providers()
+
+
+def insert_caller_facts(
+    generator: random.Random, vocabulary: list[str], callers: int, facts: int
+) -> list:
+    """Insert synthetic callers with facts of zipf distributed words."""
+
+    data_repository = provider.PROVIDERS.data_repository
+    caller_ids = [
+        data_repository.load_caller(idp_id).caller_id
+        for idp_id in insert_callers(data_repository.engine, callers)
+    ]
+    dimensions = provider.PROVIDERS.caller_memory.dimensions
+    for caller_id in caller_ids:
+        fact_texts = get_texts(generator, vocabulary, facts)
+        data_repository.upsert_caller_facts(
+            caller_id,
+            [
+                CallerFact(
+                    fact_key=get_fact_key(fact_text),
+                    fact_text=fact_text,
+                    embedding=embedding.tobytes(),
+                )
+                for fact_text, embedding in zip(
+                    fact_texts, embed_texts(fact_texts, dimensions)
+                )
+            ],
+            set(),
+            facts,
+        )
+    return caller_ids
+
+
+def get_sparse_rows(matrix: np.ndarray) -> list[dict[int, float]]:
+    """Get the non zero buckets of each row of an embedding matrix."""
+
+    return [
+        {int(column): float(row[column]) for column in np.flatnonzero(row)}
+        for row in matrix
+    ]
+
+
+def top_k_loop(
+    sparse_facts: list[dict[int, float]], query: dict[int, float], k: int
+) -> list[int]:
+    """Score facts one at a time in python, the alternative to the matrix."""
+
+    return heapq.nlargest(
+        k,
+        range(len(sparse_facts)),
+        key=lambda row: sum(
+            weight * query.get(column, 0.0)
+            for column, weight in sparse_facts[row].items()
+        ),
+    )
+
+
+def run_scenario(args: argparse.Namespace, facts: int) -> dict:
+    """Look up the facts of callers drawn by zipf popularity, loading them from the
+    database on every lookup, through the cache, and scored in a python loop."""
+
+    generator = random.Random(args.seed)
+    vocabulary = get_vocabulary(5_000)
+    with tempfile.TemporaryDirectory() as directory:
+        configure(directory, args, facts)
+        caller_memory = provider.PROVIDERS.caller_memory
+        caller_ids = insert_caller_facts(generator, vocabulary, args.callers, facts)
+
+        popularity = list(
+            itertools.accumulate(1.0 / (rank + 1) for rank in range(len(caller_ids)))
+        )
+        queries = [
+            (caller_id, query_text)
+            for caller_id, query_text in zip(
+                generator.choices(caller_ids, cum_weights=popularity, k=args.lookups),
+                get_texts(generator, vocabulary, args.lookups),
+            )
+        ]
+
+        def load_index(caller_id):
+            return CallerFactIndex(
+                provider.PROVIDERS.data_repository.load_caller_facts(caller_id, facts),
+                caller_memory.dimensions,
+                None,
+            )
+
+        def lookup_from_database(caller_id, query_text):
+            return load_index(caller_id).top_k(
+                embed_texts([query_text], caller_memory.dimensions)[0],
+                caller_memory.top_k,
+                caller_memory.min_score,
+            )
+
+        sparse_facts = {
+            caller_id: get_sparse_rows(load_index(caller_id).matrix)
+            for caller_id in set(caller_id for caller_id, _ in queries)
+        }
+
+        def lookup_loop(caller_id, query_text):
+            query = get_sparse_rows(
+                embed_texts([query_text], caller_memory.dimensions)
+            )[0]
+            return top_k_loop(sparse_facts[caller_id], query, caller_memory.top_k)
+
+        database = measure(lookup_from_database, queries)
+        loop = measure(lookup_loop, queries)
+        # the cache starts empty, so its misses are part of the measure
+        hits = metrics.CALLER_MEMORY_LOOKUPS_TOTAL.labels("hit").get()
+        cached = measure(caller_memory.retrieve, queries)
+        cached["hit_ratio"] = (
+            metrics.CALLER_MEMORY_LOOKUPS_TOTAL.labels("hit").get() - hits
+        ) / len(queries)
+
+        provider.PROVIDERS.session_summarizer.shutdown()
+        caller_memory.shutdown()
+        provider.PROVIDERS.data_repository.engine.dispose()
+
+    return {"database": database, "lru_cache": cached, "python_loop": loop}
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Caller memory benchmark")
+    parser.add_argument("--callers", type=int, default=500)
+    parser.add_argument(
+        "--facts", type=int, nargs="+", default=[10, 100, 500], help="Per caller"
+    )
+    parser.add_argument("--lookups", type=int, default=5_000)
+    parser.add_argument("--cache-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    results = {f"{facts}_facts": run_scenario(args, facts) for facts in args.facts}
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,286 @@
+""" Module for benchmarking chat archive size, history latency and read speed. """
+
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+from datetime import timedelta
+from uuid import UUID, uuid4
+
+import zstandard
+from sqlalchemy import text
+
+from backend.api import chat_archive, config, provider
+from backend.api.enum import InferenceProviderType
+from backend.api.lib import CLIArgs, EnvVars, now_utc
+from backend.benchmarks.lib import configure_benchmark_logging
+from backend.benchmarks.load_test import get_git_commit
+
+SENTENCES = [
+    f"{subject} {verb} {detail}."
+    for subject in (
+        "Your landlord",
+        "The tenancy agreement",
+        "Your employer",
+        "The tribunal",
+        "The council",
+        "Under the legislation, the dealer",
+        "The executor of the estate",
+        "Your insurer",
+    )
+    for verb in (
+        "must give written notice of",
+        "is generally required to provide",
+        "may be ordered to refund",
+        "should be asked in writing about",
+        "cannot lawfully withhold",
+    )
+    for detail in (
+        "the bond within fourteen days of the end of the lease",
+        "any wages owed under the award and your contract",
+        "the repair costs unless the damage is fair wear and tear",
+        "a copy of the documents you rely on before the hearing",
+        "the reasons for the decision and your options to appeal",
+        "the consumer guarantees that apply to the goods",
+    )
+]
+SESSIONS_PER_CALLER_MONTH = 2
+
+
+def get_text(generator: random.Random, sentences: int) -> str:
+    """Get text of legal sounding sentences."""
+
+    return " ".join(generator.choices(SENTENCES, k=sentences))
+
+
+def insert_chats(engine, args: argparse.Namespace) -> list[tuple[UUID, str, bool]]:
+    """Insert answered chats spread over the months and their search entries, and
+    return each caller session with whether it is older than the max age."""
+
+    generator = random.Random(args.seed)
+    now = now_utc()
+    caller_ids = [UUID(int=generator.getrandbits(128)) for _ in range(args.callers)]
+    sessions = {}
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.executemany(
+            "INSERT INTO caller VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
+            [
+                (
+                    caller_id.hex,
+                    f"Caller {index}",
+                    caller_id.hex,
+                    f"{index}@archive.local",
+                )
+                for index, caller_id in enumerate(caller_ids)
+            ],
+        )
+        for start in range(0, args.chats, args.batch_size):
+            rows = []
+            for _ in range(min(args.batch_size, args.chats - start)):
+                caller_id = generator.choice(caller_ids)
+                age_days = generator.uniform(0, args.months * 30)
+                session_id = (
+                    f"{int(age_days // 30)}-"
+                    f"{generator.randrange(SESSIONS_PER_CALLER_MONTH)}"
+                )
+                sessions[caller_id, session_id] = max(
+                    age_days, sessions.get((caller_id, session_id), 0.0)
+                )
+                attachment = (
+                    get_text(generator, 200).encode()
+                    if generator.random() < args.attachment_ratio
+                    else None
+                )
+                rows.append(
+                    (
+                        uuid4().hex,
+                        caller_id.hex,
+                        session_id,
+                        get_text(generator, generator.randint(2, 5)),
+                        "TEXT_FILE" if attachment else None,
+                        attachment,
+                        get_text(generator, generator.randint(10, 30)),
+                        (now - timedelta(days=age_days)).isoformat(" "),
+                    )
+                )
+            cursor.executemany(
+                "INSERT INTO chat (chat_id, caller_id, caller_session_id,"
+                " caller_chat_text, caller_attachment_type, caller_attachment_bytes,"
+                " response_chat_text, inference_provider_type, first_created,"
+                " last_updated) VALUES (?, ?, ?, ?, ?, ?, ?, 'FAKE', ?, ?)",
+                [(*row, row[-1]) for row in rows],
+            )
+            cursor.executemany(
+                "INSERT INTO chat_search"
+                " (chat_id, caller_key, caller_chat_text, response_chat_text)"
+                " VALUES (?, ?, ?, ?)",
+                [(row[0], row[1], row[3], row[6]) for row in rows],
+            )
+            connection.commit()
+    finally:
+        connection.close()
+    # a session is archived whole once its newest chat is past the max age
+    return [
+        (caller_id, session_id, newest_age_days > args.max_age_days)
+        for (caller_id, session_id), newest_age_days in sessions.items()
+    ]
+
+
+def get_sizes(engine, path: str) -> dict:
+    """Get database file size and the size of the chat and search tables."""
+
+    with engine.connect() as connection:
+        connection.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        tables = dict(
+            connection.execute(
+                text(
+                    "SELECT CASE WHEN name LIKE 'chat_search%' THEN 'chat_search'"
+                    " ELSE name END, sum(pgsize) FROM dbstat"
+                    " WHERE name = 'chat' OR name LIKE 'chat_search%'"
+                    " OR name LIKE 'ix_chat_%' GROUP BY 1"
+                )
+            ).all()
+        )
+    return {
+        "file_megabytes": os.path.getsize(path) / 1e6,
+        "chat_table_megabytes": tables.get("chat", 0) / 1e6,
+        "chat_search_megabytes": tables.get("chat_search", 0) / 1e6,
+    }
+
+
+def measure_history(sessions: list[tuple[UUID, str, bool]], clear_cache: bool) -> dict:
+    """Load a page of history for each session and report latency percentiles."""
+
+    data_repository = provider.PROVIDERS.data_repository
+    latencies = []
+    for caller_id, session_id, _ in sessions:
+        if clear_cache:
+            data_repository.chat_archive_store._read_part.cache_clear()
+        start = time.perf_counter()
+        data_repository.load_session_chats(caller_id, session_id, 0, 20)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "p50_ms": latencies[len(latencies) // 2] * 1e3,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1e3,
+    }
+
+
+def measure_archive_read(directory: str) -> dict:
+    """Read every part file of the archive and report read speed."""
+
+    compressed = uncompressed = records = 0
+    start = time.perf_counter()
+    for root, _, names in os.walk(directory):
+        for name in names:
+            with open(os.path.join(root, name), "rb") as file:
+                data = file.read()
+            text_data = zstandard.ZstdDecompressor().decompress(data)
+            records += sum(1 for _ in map(json.loads, text_data.splitlines()))
+            compressed += len(data)
+            uncompressed += len(text_data)
+    elapsed = time.perf_counter() - start
+    return {
+        "archive_megabytes": compressed / 1e6,
+        "compression_ratio": uncompressed / compressed,
+        "records_per_second": records / elapsed,
+        "uncompressed_megabytes_per_second": uncompressed / 1e6 / elapsed,
+    }
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Chat archive benchmark")
+    parser.add_argument("--chats", type=int, default=200_000)
+    parser.add_argument("--callers", type=int, default=1000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--max-age-days", type=float, default=365.0)
+    parser.add_argument("--attachment-ratio", type=float, default=0.02)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = f"{directory}/chat_archive.sqlite3"
+        values = dataclasses.asdict(EnvVars()) | dataclasses.asdict(CLIArgs())
+        values.update(
+            auth0_public_key="",
+            auth0_issuer="",
+            auth0_audience="",
+            sqlite_connection_string=f"sqlite+pysqlite:///{path}",
+            chat_archive_directory=f"{directory}/chat_archive",
+            inference_provider_type=InferenceProviderType.FAKE,
+            async_logging=False,
+        )
+        config.CONFIG = config.Config(**values)
+        provider.configure_providers()
+        data_repository = provider.PROVIDERS.data_repository
+
+        sessions = insert_chats(data_repository.engine, args)
+        generator = random.Random(args.seed)
+        live_sessions = generator.sample(
+            [session for session in sessions if not session[2]], args.sessions
+        )
+        archived_sessions = generator.sample(
+            [session for session in sessions if session[2]], args.sessions
+        )
+
+        before = {
+            **get_sizes(data_repository.engine, path),
+            "live_history": measure_history(live_sessions, False),
+            "old_history": measure_history(archived_sessions, False),
+        }
+
+        start = time.perf_counter()
+        archived = chat_archive.archive_chats(args.max_age_days)
+        archive_seconds = time.perf_counter() - start
+        data_repository.vacuum()
+
+        after = {
+            **get_sizes(data_repository.engine, path),
+            "live_history": measure_history(live_sessions, False),
+            # every page read and parsed from its archive part files
+            "archived_history": measure_history(archived_sessions, True),
+        }
+        archive = {
+            "archived_chats": archived,
+            "archive_chats_per_second": archived / archive_seconds,
+            **measure_archive_read(config.CONFIG.chat_archive_directory),
+        }
+
+        # archived chats dropped from search too, as with chat archive --unindex
+        unindexed = data_repository.unindex_archived_chats(args.batch_size)
+        data_repository.vacuum()
+        after_unindex = {
+            "unindexed_chats": unindexed,
+            **get_sizes(data_repository.engine, path),
+        }
+        data_repository.engine.dispose()
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "before": before,
+                "after": after,
+                "archive": archive,
+                "after_unindex": after_unindex,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
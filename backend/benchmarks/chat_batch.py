@@ -0,0 +1,111 @@
+""" Module for benchmarking chat batch throughput by parallelism and micro batch. """
+
+import argparse
+import json
+import platform
+import tempfile
+import time
+import urllib.request
+
+from backend.api import config
+from backend.benchmarks.lib import configure_benchmark_logging
+from backend.benchmarks.load_test import (
+    QUESTIONS,
+    get_git_commit,
+    start_conversation_api,
+)
+
+
+def post_chat_batch(url: str, token: str, body: bytes) -> dict:
+    """Post chat batch and time the first and the last result line."""
+
+    request = urllib.request.Request(
+        f"{url}/chat/batch",
+        data=body,
+        headers={"Authorization": f"Bearer {token}"},
+        method="POST",
+    )
+    start = time.perf_counter()
+    first_result_seconds = None
+    results = errors = 0
+    with urllib.request.urlopen(request) as response:
+        for line in response:
+            if first_result_seconds is None:
+                first_result_seconds = time.perf_counter() - start
+            results += 1
+            errors += "error" in json.loads(line)
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "items_per_second": results / elapsed,
+        "first_result_seconds": first_result_seconds,
+        "results": results,
+        "errors": errors,
+    }
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Chat batch benchmark")
+    parser.add_argument("--items", type=int, default=64)
+    parser.add_argument(
+        "--settings",
+        nargs="+",
+        default=["1x1", "4x1", "1x8", "4x8"],
+        help="Parallelism x micro batch size pairs to compare",
+    )
+    parser.add_argument(
+        "--inference-endpoint",
+        default="fake://?latency_ms=200&tokens_per_second=200&output_tokens=32",
+        help="Fake inference provider endpoint, settings as query parameters",
+    )
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    body = "".join(
+        json.dumps(
+            {
+                "caller_session_id": f"document-{index}",
+                "caller_chat_text": QUESTIONS[index % len(QUESTIONS)],
+                "caller_attachment_type": None,
+            }
+        )
+        + "\n"
+        for index in range(args.items)
+    ).encode()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        api = start_conversation_api(directory, 1, args.inference_endpoint)
+        try:
+            for setting in args.settings:
+                parallelism, micro_batch_size = map(int, setting.split("x"))
+                # read by each batch as it starts, so one server serves every run
+                config.CONFIG.chat_batch_parallelism = parallelism
+                config.CONFIG.chat_batch_micro_batch_size = micro_batch_size
+                results.append(
+                    {
+                        "parallelism": parallelism,
+                        "micro_batch_size": micro_batch_size,
+                        **post_chat_batch(api.url, api.tokens[0], body),
+                    }
+                )
+        finally:
+            api.stop()
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,127 @@
+""" Module for benchmarking provider time saved by cancelling abandoned chats. """
+
+import argparse
+import json
+import platform
+import tempfile
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from backend.api import metrics, provider
+from backend.api.entities import Chat
+from backend.benchmarks.lib import configure_benchmark_logging
+from backend.benchmarks.load_test import (
+    add_load_arguments,
+    get_arrival_times,
+    get_git_commit,
+    run_load,
+    start_conversation_api,
+)
+
+
+def wait_for_requests(timeout_seconds: float) -> None:
+    """Wait until the api has finished every request, answers of abandoned
+    requests still being decoded after their clients left when not cancelled."""
+
+    deadline = time.monotonic() + timeout_seconds
+    while (
+        metrics.HTTP_REQUESTS_IN_FLIGHT.labels().get() > 0
+        and time.monotonic() < deadline
+    ):
+        time.sleep(0.1)
+
+
+def get_provider_usage() -> dict:
+    """Get provider seconds spent on chats by status.
+
+    The fake provider stands in for a model server, so the time each chat held it
+    stands in for the gpu seconds spent on it.
+    """
+
+    with Session(provider.PROVIDERS.data_repository.engine) as session:
+        rows = session.execute(
+            select(
+                Chat.status,
+                func.count(),
+                func.coalesce(func.sum(Chat.inference_duration_seconds), 0.0),
+            ).group_by(Chat.status)
+        ).all()
+    return {
+        "chats_by_status": {str(status): count for status, count, _ in rows},
+        "provider_seconds": sum(seconds for _, _, seconds in rows),
+    }
+
+
+def run_scenario(args: argparse.Namespace, cancel_on_disconnect: bool) -> dict:
+    """Run the load against a fresh api, cancelling abandoned chats or not."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        api = start_conversation_api(
+            directory,
+            args.callers,
+            args.inference_endpoint,
+            chat_cancel_on_disconnect=cancel_on_disconnect,
+        )
+        try:
+            report = run_load(api.url, api.tokens, args, get_arrival_times(args))
+            wait_for_requests(args.drain_seconds)
+            report |= get_provider_usage()
+        finally:
+            api.stop()
+            provider.PROVIDERS.data_repository.engine.dispose()
+    return report
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Chat cancellation benchmark")
+    add_load_arguments(parser)
+    parser.add_argument(
+        "--inference-endpoint",
+        default=(
+            "fake://?latency_ms=300&tokens_per_second=40&output_tokens=200"
+            "&batch_cost=0.02"
+        ),
+        help="Fake inference provider endpoint, settings as query parameters",
+    )
+    parser.add_argument("--drain-seconds", type=float, default=120.0)
+    parser.set_defaults(
+        rate=4.0,
+        duration_seconds=30.0,
+        callers=20,
+        timeout=120.0,
+        abandon_ratio=0.3,
+        abandon_after_seconds=2.0,
+    )
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    results = {
+        "not_cancelled": run_scenario(args, False),
+        "cancelled": run_scenario(args, True),
+    }
+    provider_seconds = results["not_cancelled"]["provider_seconds"]
+    saved_seconds = provider_seconds - results["cancelled"]["provider_seconds"]
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "results": results,
+                "provider_seconds_saved": saved_seconds,
+                "provider_seconds_saved_ratio": (
+                    saved_seconds / provider_seconds if provider_seconds else 0.0
+                ),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,169 @@
+""" Module for benchmarking chat loading speed and memory by read path. """
+
+import argparse
+import gc
+import json
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+from uuid import uuid4
+
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import Session, undefer_group
+
+from backend.api import provider
+from backend.api.entities import Chat, SessionChatModel, SessionChatRow
+from backend.benchmarks.chat_archive import get_text
+from backend.benchmarks.lib import configure_benchmark_logging
+from backend.benchmarks.load_test import get_git_commit, insert_callers
+from backend.benchmarks.text_compression import configure_repository
+
+
+def insert_chats(engine: Engine, args: argparse.Namespace) -> None:
+    """Insert answered chats of one caller, some with an attachment."""
+
+    generator = random.Random(args.seed)
+    caller_id = provider.PROVIDERS.data_repository.load_caller(
+        insert_callers(engine, 1)[0]
+    ).caller_id
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for start in range(0, args.chats, args.batch_size):
+            rows = []
+            for index in range(start, min(start + args.batch_size, args.chats)):
+                attachment = (
+                    get_text(generator, args.attachment_sentences).encode()
+                    if generator.random() < args.attachment_ratio
+                    else None
+                )
+                rows.append(
+                    (
+                        uuid4().hex,
+                        caller_id.hex,
+                        f"session-{index % args.sessions}",
+                        get_text(generator, generator.randint(1, 3)),
+                        "TEXT_FILE" if attachment else None,
+                        attachment,
+                        get_text(generator, generator.randint(5, 15)),
+                    )
+                )
+            # inserted directly, so texts are stored uncompressed and every read
+            # path decodes them the same
+            cursor.executemany(
+                "INSERT INTO chat (chat_id, caller_id, caller_session_id,"
+                " caller_chat_text, caller_attachment_type, caller_attachment_bytes,"
+                " response_chat_text, inference_provider_type, first_created,"
+                " last_updated) VALUES (?, ?, ?, ?, ?, ?, ?, 'FAKE',"
+                " CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
+                rows,
+            )
+            connection.commit()
+    finally:
+        connection.close()
+
+
+def load_entities_with_attachments(engine: Engine) -> list:
+    """Load chat entities with their attachments, as before they were deferred."""
+
+    with Session(engine) as session:
+        return list(session.scalars(select(Chat).options(undefer_group("attachments"))))
+
+
+def load_entities(engine: Engine) -> list:
+    """Load chat entities, attachments deferred."""
+
+    with Session(engine) as session:
+        return list(session.scalars(select(Chat)))
+
+
+def load_rows(engine: Engine) -> list:
+    """Load session chat rows, only the columns history needs."""
+
+    with engine.connect() as connection:
+        return [
+            SessionChatRow(*row)
+            for row in connection.execute(SessionChatRow.select()).all()
+        ]
+
+
+def load_models(engine: Engine) -> list:
+    """Load session chat rows and validate each into the api model, the cost of
+    validating every row rather than only at the api boundary."""
+
+    return [SessionChatModel.model_validate(row) for row in load_rows(engine)]
+
+
+LOADERS: dict[str, Callable[[Engine], list]] = {
+    "entities_with_attachments": load_entities_with_attachments,
+    "entities": load_entities,
+    "rows": load_rows,
+    "rows_validated": load_models,
+}
+
+
+def measure(engine: Engine, load: Callable[[Engine], list], repeats: int) -> dict:
+    """Time loading every chat, best of the repeats, then trace the memory of one
+    more load, the peak while loading and what the loaded chats hold."""
+
+    seconds = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        count = len(load(engine))
+        seconds.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    result = load(engine)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {
+        "rows_per_second": count / min(seconds),
+        "peak_megabytes": peak / 1e6,
+        "retained_megabytes": current / 1e6,
+    }
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Chat loading benchmark")
+    parser.add_argument("--chats", type=int, default=100_000)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--attachment-ratio", type=float, default=0.05)
+    parser.add_argument("--attachment-sentences", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure_repository(directory, "chat_loading")
+        engine = provider.PROVIDERS.data_repository.engine
+        insert_chats(engine, args)
+        results = {
+            name: measure(engine, load, args.repeats) for name, load in LOADERS.items()
+        }
+        engine.dispose()
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
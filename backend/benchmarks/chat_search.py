@@ -0,0 +1,265 @@
+""" Module for benchmarking chat search latency. """
+
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+from uuid import UUID, uuid4
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend.api import config, provider
+from backend.api.enum import ChatSearchOrder, InferenceProviderType
+from backend.api.lib import CLIArgs, EnvVars
+from backend.benchmarks.lib import configure_benchmark_logging
+from backend.benchmarks.load_test import get_git_commit
+
+LEGAL_WORDS = (
+    "tenancy landlord bond lease rent notice tribunal employer roster contract "
+    "dismissal wages neighbour fence boundary council will estate executor "
+    "probate warranty dealer refund consumer insurance claim injury negligence "
+    "custody separation property mortgage debt loan guarantor strata levy"
+).split()
+
+# words are drawn by rank from a zipf distribution, queries are drawn from bands
+# of ranks so common, medium and rare words are measured separately
+QUERY_BANDS = {"common": (0, 50), "medium": (500, 2000), "rare": (10_000, 20_000)}
+
+
+def get_vocabulary(size: int) -> list[str]:
+    """Get vocabulary ordered by rank, legal words being the most common."""
+
+    return LEGAL_WORDS + [f"term{rank}" for rank in range(size - len(LEGAL_WORDS))]
+
+
+def get_texts(generator: random.Random, vocabulary: list[str], count: int):
+    """Get distinct texts of zipf distributed words."""
+
+    cum_weights = []
+    total = 0.0
+    for rank in range(len(vocabulary)):
+        total += 1.0 / (rank + 1)
+        cum_weights.append(total)
+    return [
+        " ".join(
+            generator.choices(
+                vocabulary, cum_weights=cum_weights, k=generator.randint(8, 40)
+            )
+        )
+        for _ in range(count)
+    ]
+
+
+def insert_chats(engine, chats: int, callers: int, seed: int, batch_size: int):
+    """Insert answered chats and their search entries straight into sqlite."""
+
+    generator = random.Random(seed)
+    texts = get_texts(generator, get_vocabulary(20_000), 50_000)
+    caller_ids = [UUID(int=generator.getrandbits(128)).hex for _ in range(callers)]
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.executemany(
+            "INSERT INTO caller VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
+            [
+                (caller_id, f"Caller {index}", caller_id, f"{caller_id}@search.local")
+                for index, caller_id in enumerate(caller_ids)
+            ],
+        )
+        for start in range(0, chats, batch_size):
+            rows = [
+                (
+                    uuid4().hex,
+                    generator.choice(caller_ids),
+                    f"session-{generator.randrange(20)}",
+                    generator.choice(texts),
+                    generator.choice(texts),
+                )
+                for _ in range(min(batch_size, chats - start))
+            ]
+            cursor.executemany(
+                "INSERT INTO chat (chat_id, caller_id, caller_session_id,"
+                " caller_chat_text, response_chat_text, inference_provider_type,"
+                " first_created, last_updated)"
+                " VALUES (?, ?, ?, ?, ?, 'FAKE', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
+                rows,
+            )
+            cursor.executemany(
+                "INSERT INTO chat_search"
+                " (chat_id, caller_key, caller_chat_text, response_chat_text)"
+                " VALUES (?, ?, ?, ?)",
+                rows_without_session(rows),
+            )
+            connection.commit()
+        cursor.execute("INSERT INTO chat_search(chat_search) VALUES ('optimize')")
+        connection.commit()
+    finally:
+        connection.close()
+    return [UUID(caller_id) for caller_id in caller_ids]
+
+
+def rows_without_session(rows: list[tuple]) -> list[tuple]:
+    """Get search entries of chat rows."""
+
+    return [
+        (chat_id, caller_id, caller_chat_text, response_chat_text)
+        for chat_id, caller_id, _, caller_chat_text, response_chat_text in rows
+    ]
+
+
+def search_like(engine, caller_id: UUID, terms: list[str], limit: int) -> list:
+    """Search with like over the caller's chats, the alternative to fts5."""
+
+    conditions = " AND ".join(
+        f"(caller_chat_text LIKE :term{index} OR response_chat_text LIKE :term{index})"
+        for index in range(len(terms))
+    )
+    with Session(engine) as session:
+        return session.execute(
+            text(
+                f"SELECT chat_id FROM chat WHERE caller_id = :caller_id AND {conditions}"
+                " ORDER BY first_created DESC LIMIT :limit"
+            ),
+            {
+                "caller_id": caller_id.hex,
+                "limit": limit,
+                **{f"term{index}": f"%{term}%" for index, term in enumerate(terms)},
+            },
+        ).all()
+
+
+def measure(function, queries: list) -> dict:
+    """Run function for each query and report latency percentiles."""
+
+    latencies = []
+    results = 0
+    for query in queries:
+        start = time.perf_counter()
+        results += len(function(*query))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "queries": len(latencies),
+        "mean_results": results / len(latencies),
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) * 1e3,
+            "p50": latencies[len(latencies) // 2] * 1e3,
+            "p95": latencies[int(len(latencies) * 0.95)] * 1e3,
+            "max": latencies[-1] * 1e3,
+        },
+    }
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Chat search benchmark")
+    parser.add_argument("--chats", type=int, default=10_000_000)
+    parser.add_argument("--callers", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--database",
+        help="Sqlite file to reuse across runs, built when it does not exist yet",
+    )
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.database or f"{directory}/chat_search.sqlite3"
+        build = not os.path.exists(path)
+        values = dataclasses.asdict(EnvVars()) | dataclasses.asdict(CLIArgs())
+        values.update(
+            auth0_public_key="",
+            auth0_issuer="",
+            auth0_audience="",
+            sqlite_connection_string=f"sqlite+pysqlite:///{path}",
+            inference_provider_type=InferenceProviderType.FAKE,
+            async_logging=False,
+        )
+        config.CONFIG = config.Config(**values)
+        provider.configure_providers()
+        data_repository = provider.PROVIDERS.data_repository
+
+        build_seconds = None
+        if build:
+            start = time.perf_counter()
+            insert_chats(
+                data_repository.engine,
+                args.chats,
+                args.callers,
+                args.seed,
+                args.batch_size,
+            )
+            build_seconds = time.perf_counter() - start
+        with data_repository.engine.connect() as connection:
+            chat_count = connection.execute(text("SELECT count(*) FROM chat")).scalar()
+            caller_ids = [
+                UUID(caller_id)
+                for caller_id in connection.execute(
+                    text("SELECT DISTINCT caller_id FROM chat")
+                ).scalars()
+            ]
+
+        generator = random.Random(args.seed)
+        vocabulary = get_vocabulary(20_000)
+        results = {}
+        for band, (first_rank, last_rank) in QUERY_BANDS.items():
+            for term_count in (1, 2):
+                queries = [
+                    (
+                        generator.choice(caller_ids),
+                        [
+                            vocabulary[generator.randrange(first_rank, last_rank)]
+                            for _ in range(term_count)
+                        ],
+                    )
+                    for _ in range(args.queries)
+                ]
+                results[f"{band}_{term_count}_terms"] = {
+                    **{
+                        f"fts5_{order}": measure(
+                            lambda caller_id, terms: data_repository.search_chats(
+                                caller_id, " ".join(terms), order, 0, args.limit
+                            ),
+                            queries,
+                        )
+                        for order in ChatSearchOrder
+                    },
+                    "like": measure(
+                        lambda caller_id, terms: search_like(
+                            data_repository.engine, caller_id, terms, args.limit
+                        ),
+                        queries,
+                    ),
+                }
+
+        database_megabytes = os.path.getsize(path) / 1e6
+        data_repository.engine.dispose()
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "chats": chat_count,
+                "callers": len(caller_ids),
+                "build_seconds": build_seconds,
+                "database_megabytes": database_megabytes,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,212 @@
+""" Module for benchmarking streamlit rerun latency of token verification and api calls. """
+
+import argparse
+import json
+import platform
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+from requests.adapters import HTTPAdapter
+
+from backend.benchmarks.load_test import get_git_commit
+from frontend.app.streamlit_auth0_component import JwksCache, LoginButtonManager
+
+KEY_ID = "benchmark-key"
+
+
+class AuthAndApiServer(ThreadingHTTPServer):
+    """Class for stand-in auth0 domain and conversation api in one server.
+
+    Every request waits a round trip, and every new connection a further setup
+    delay, standing in for the tls handshake to a remote host.
+    """
+
+    def __init__(self, jwks: dict, latency_ms: float, connect_latency_ms: float):
+        super().__init__(("127.0.0.1", 0), _AuthAndApiHandler)
+        self.jwks = json.dumps(jwks).encode()
+        self.latency_ms = latency_ms
+        self.connect_latency_ms = connect_latency_ms
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.jwks_requests = 0
+        self.chat_requests = 0
+
+
+class _AuthAndApiHandler(BaseHTTPRequestHandler):
+    # keeps connections alive for clients that can, without the headers and body
+    # written apart waiting on a delayed ack
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        time.sleep(self.server.connect_latency_ms / 1000)
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.jwks_requests += 1
+        self._respond(self.server.jwks)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.chat_requests += 1
+        self._respond(json.dumps("You should check your lease.").encode())
+
+    def _respond(self, response: bytes):
+        time.sleep(self.server.latency_ms / 1000)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def get_signing_key() -> tuple[bytes, dict]:
+    """Get a new rsa private key in pem and its public key set."""
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_key = jwk.construct(public_pem, "RS256").to_dict()
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    return private_pem, {"keys": [public_key | {"kid": KEY_ID, "use": "sig"}]}
+
+
+def get_user_info(private_pem: bytes, audience: str) -> dict:
+    """Get user info as the login component returns it, with a token valid for an
+    hour."""
+
+    sub = "auth0|benchmark"
+    token = jwt.encode(
+        {"sub": sub, "aud": audience, "exp": int(time.time()) + 3600},
+        private_pem,
+        algorithm="RS256",
+        headers={"kid": KEY_ID},
+    )
+    return {"sub": sub, "token": token}
+
+
+def get_http_session() -> requests.Session:
+    """Get a pooled http session as the chat app shares one."""
+
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter())
+    return session
+
+
+def measure(
+    server: AuthAndApiServer,
+    user_info: dict,
+    cached: bool,
+    reruns: int,
+    question_every: int,
+) -> dict:
+    """Rerun the app's auth check, and every so many reruns ask a question, either
+    fetching keys, verifying and connecting afresh every time, as before, or through
+    the caches and the pooled session."""
+
+    manager = LoginButtonManager(
+        client_id="benchmark",
+        domain="127.0.0.1",
+        jwks_url=f"{server.url}/.well-known/jwks.json",
+        jwks_cache=JwksCache() if cached else JwksCache(0, 0),
+    )
+    post = get_http_session().post if cached else requests.post
+    with server.lock:
+        server.connections = server.jwks_requests = server.chat_requests = 0
+
+    rerun_ms = []
+    question_ms = []
+    for index in range(reruns):
+        if not cached:
+            manager.verified_tokens.clear()
+        start = time.perf_counter()
+        assert manager.is_auth(user_info)
+        if index % question_every == 0:
+            response = post(
+                f"{server.url}/chat",
+                headers={"Authorization": f"Bearer {user_info['token']}"},
+                json={"caller_chat_text": "Can my landlord keep the bond?"},
+                timeout=10,
+            )
+            response.raise_for_status()
+            question_ms.append((time.perf_counter() - start) * 1000)
+        else:
+            rerun_ms.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "rerun": get_summary(rerun_ms),
+        "question": get_summary(question_ms),
+        "connections": server.connections,
+        "jwks_requests": server.jwks_requests,
+        "chat_requests": server.chat_requests,
+    }
+
+
+def get_summary(milliseconds: list[float]) -> dict:
+    """Summarise latencies in milliseconds."""
+
+    if not milliseconds:
+        return {}
+    ordered = sorted(milliseconds)
+    return {
+        "mean_ms": statistics.fmean(ordered),
+        "p50_ms": ordered[len(ordered) // 2],
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+    }
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Frontend rerun latency benchmark")
+    parser.add_argument("--reruns", type=int, default=200)
+    parser.add_argument("--question-every", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--connect-latency-ms", type=float, default=40.0)
+    args = parser.parse_args()
+
+    private_pem, jwks = get_signing_key()
+    server = AuthAndApiServer(jwks, args.latency_ms, args.connect_latency_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    user_info = get_user_info(private_pem, LoginButtonManager("", "").audience)
+
+    results = {
+        name: measure(server, user_info, cached, args.reruns, args.question_every)
+        for name, cached in (("uncached", False), ("cached", True))
+    }
+    server.shutdown()
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
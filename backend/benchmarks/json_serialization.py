@@ -0,0 +1,207 @@
+""" Module for benchmarking json serialization of chat and history responses. """
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable
+from uuid import uuid4
+
+from fastapi._compat import ModelField
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from backend.api import json_response
+from backend.api.entities import (
+    ChatSearchResultModel,
+    ChatSearchResultsModel,
+    SessionChatModel,
+    SessionChatRow,
+    SessionChatsModel,
+)
+from backend.api.lib import now_utc
+from backend.benchmarks.chat_archive import get_text
+from backend.benchmarks.load_test import get_git_commit
+
+SESSION_CHAT_SERIALIZER = json_response.RowSerializer(SessionChatModel)
+CHAT_SEARCH_RESULT_SERIALIZER = json_response.RowSerializer(ChatSearchResultModel)
+
+
+def get_session_chats(generator: random.Random, count: int) -> list[SessionChatRow]:
+    """Get session chat rows with questions of a few sentences and long answers."""
+
+    now = now_utc()
+    return [
+        SessionChatRow(
+            uuid4(),
+            get_text(generator, generator.randint(1, 4)),
+            None,
+            get_text(generator, generator.randint(10, 60)),
+            None,
+            None,
+            now - timedelta(minutes=count - index),
+        )
+        for index in range(count)
+    ]
+
+
+def get_search_results(
+    generator: random.Random, count: int
+) -> list[ChatSearchResultModel]:
+    """Get search results with snippets of a sentence or two."""
+
+    now = now_utc()
+    return [
+        ChatSearchResultModel(
+            chat_id=uuid4(),
+            caller_session_id=f"session-{index}",
+            first_created=now - timedelta(minutes=index),
+            snippet=get_text(generator, 2),
+            rank=-generator.random() * 10,
+        )
+        for index in range(count)
+    ]
+
+
+async def render_default(field: ModelField, content: Any) -> bytes:
+    """Render as fastapi does for a handler returning content: validate against the
+    response model, encode to json compatible python and dump with json."""
+
+    return JSONResponse(
+        await serialize_response(field=field, response_content=content)
+    ).body
+
+
+def get_renderers(payload: str, rows: list) -> dict[str, Callable[[], Awaitable]]:
+    """Get each way of rendering a payload, the way the endpoint did before first."""
+
+    if payload == "chat_answer":
+        answer = rows[0].response_chat_text
+        answer_field = create_model_field("response", str | None, mode="serialization")
+
+        async def default() -> bytes:
+            return await render_default(answer_field, answer)
+
+        async def orjson() -> bytes:
+            return json_response.ORJSONResponse(answer).body
+
+        return {"default": default, "orjson": orjson}
+
+    if payload.startswith("history_page"):
+        model, key, serializer = SessionChatsModel, "chats", SESSION_CHAT_SERIALIZER
+        page_model = SessionChatModel
+    else:
+        model, key, serializer = (
+            ChatSearchResultsModel,
+            "results",
+            CHAT_SEARCH_RESULT_SERIALIZER,
+        )
+        page_model = ChatSearchResultModel
+    fields = {"offset": 0, "limit": len(rows), "has_more": True}
+    # fastapi builds the response field once per route
+    field = create_model_field("response", model, mode="serialization")
+
+    def get_model():
+        return model(
+            **{key: [page_model.model_validate(row) for row in rows]}, **fields
+        )
+
+    async def default() -> bytes:
+        return await render_default(field, get_model())
+
+    async def pydantic_json() -> bytes:
+        return get_model().model_dump_json().encode()
+
+    async def orjson() -> bytes:
+        return json_response.ORJSONResponse(
+            {key: [serializer.to_dict(row) for row in rows], **fields}
+        ).body
+
+    async def orjson_streamed() -> bytes:
+        return b"".join(
+            [
+                chunk
+                async for chunk in json_response.iterate_json_page(
+                    key, rows, serializer, fields
+                )
+            ]
+        )
+
+    return {
+        "default": default,
+        "pydantic_json": pydantic_json,
+        "orjson": orjson,
+        "orjson_streamed": orjson_streamed,
+    }
+
+
+async def measure(render: Callable[[], Awaitable], seconds: float) -> dict:
+    """Render repeatedly for about the given seconds and report speed."""
+
+    body = await render()
+    count = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < seconds:
+        for _ in range(10):
+            await render()
+        count += 10
+    return {
+        "us_per_response": elapsed / count * 1e6,
+        "megabytes_per_second": len(body) * count / elapsed / 1e6,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    """Measure every renderer of every payload, checking they agree."""
+
+    generator = random.Random(args.seed)
+    payloads = {
+        "chat_answer": get_session_chats(generator, 1),
+        "history_page_20": get_session_chats(generator, 20),
+        "history_page_100": get_session_chats(generator, 100),
+        "search_page_20": get_search_results(generator, 20),
+    }
+    results = {}
+    for payload, rows in payloads.items():
+        renderers = get_renderers(payload, rows)
+        bodies = [json.loads(await render()) for render in renderers.values()]
+        assert all(body == bodies[0] for body in bodies), payload
+        results[payload] = {
+            "response_bytes": len(await renderers["orjson"]()),
+            **{
+                name: await measure(render, args.seconds)
+                for name, render in renderers.items()
+            },
+        }
+    return results
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Json serialization benchmark")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,15 @@
+""" Module for benchmark library functions. """
+
+import logging
+import sys
+
+import structlog
+
+
+def configure_benchmark_logging(logging_level: int = logging.WARNING) -> None:
+    """Send application logs to stderr so stdout only carries benchmark results."""
+
+    structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(logging_level),
+        logger_factory=structlog.PrintLoggerFactory(sys.stderr),
+    )
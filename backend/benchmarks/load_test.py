@@ -0,0 +1,359 @@
+""" Module for load testing the conversation api. """
+
+import argparse
+import dataclasses
+import json
+import platform
+import random
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from uuid import NAMESPACE_URL, uuid5
+
+import uvicorn
+from authlib.jose import JsonWebKey, jwt
+from sqlalchemy.orm import Session
+
+from backend.api import config, provider
+from backend.api.entities import Caller
+from backend.api.enum import InferenceProviderType, InferenceTier
+from backend.api.lib import CLIArgs, EnvVars
+from backend.benchmarks.lib import configure_benchmark_logging
+
+ISSUER = "https://load-test.local/"
+AUDIENCE = "https://conversation-api.local"
+QUESTIONS = (
+    "My landlord is keeping my bond after I moved out, what can I do?",
+    "Can my employer change my roster without notice?",
+    "My neighbour built a fence on my side of the boundary.",
+    "How do I contest a will if I was left out of it?",
+    "The car I bought has a fault the dealer refuses to fix.",
+)
+
+
+@dataclasses.dataclass
+class ConversationAPI:
+    """Class for conversation api booted in process for load testing."""
+
+    url: str
+    tokens: list[str]
+    server: uvicorn.Server
+    thread: threading.Thread
+
+    def stop(self) -> None:
+        """Stop uvicorn and wait for it to exit."""
+
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def start_conversation_api(
+    directory: str,
+    callers: int,
+    inference_endpoint: str,
+    tier_settings: dict = None,
+    **config_values: any,
+) -> ConversationAPI:
+    """Boot the conversation api on a free local port against a temp sqlite
+    database, with synthetic callers and a signed token for each of them.
+
+    Every chat is routed to the fake inference provider configured by the endpoint,
+    its tier configured with the tier settings given.
+    """
+
+    rules_path = f"{directory}/inference_routing_rules.json"
+    write_routing_rules(rules_path, inference_endpoint, tier_settings)
+
+    key = JsonWebKey.generate_key("RSA", 2048, is_private=True)
+    values = dataclasses.asdict(EnvVars()) | dataclasses.asdict(CLIArgs())
+    values.update(
+        auth0_public_key=key.as_pem(is_private=False).decode(),
+        auth0_issuer=ISSUER,
+        auth0_audience=AUDIENCE,
+        sqlite_connection_string=f"sqlite+pysqlite:///{directory}/load_test.sqlite3",
+        chat_archive_directory=f"{directory}/chat_archive",
+        inference_provider_type=InferenceProviderType.FAKE,
+        inference_routing_rules_path=rules_path,
+        async_logging=False,
+    )
+    values.update(config_values)
+    config.CONFIG = config.Config(**values)
+    provider.configure_providers()
+
+    tokens = sign_tokens(
+        key, insert_callers(provider.PROVIDERS.data_repository.engine, callers)
+    )
+
+    # imported late as the app is built from the configuration
+    from backend.api.conversation_api import app
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(
+        uvicorn.Config(app, log_level="warning", access_log=False, backlog=4096)
+    )
+    thread = threading.Thread(
+        target=server.run, kwargs={"sockets": [sock]}, daemon=True
+    )
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    return ConversationAPI(
+        f"http://127.0.0.1:{sock.getsockname()[1]}", tokens, server, thread
+    )
+
+
+def write_routing_rules(
+    path: str, inference_endpoint: str, tier_settings: dict = None
+) -> None:
+    """Write routing rules sending every chat to the fake inference provider."""
+
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "tiers": {
+                    InferenceTier.LARGE: {
+                        "inference_provider_type": InferenceProviderType.FAKE,
+                        "endpoint": inference_endpoint,
+                        **(tier_settings or {}),
+                    }
+                }
+            },
+            file,
+        )
+
+
+def insert_callers(engine, callers: int) -> list[str]:
+    """Insert synthetic callers and return their idp ids."""
+
+    idp_ids = [f"load-test|{index:08d}" for index in range(callers)]
+    with Session(engine) as session:
+        session.add_all(
+            Caller(
+                caller_id=uuid5(NAMESPACE_URL, idp_id),
+                name=f"Caller {index}",
+                idp_id=idp_id,
+                email=f"caller-{index}@load-test.local",
+            )
+            for index, idp_id in enumerate(idp_ids)
+        )
+        session.commit()
+    return idp_ids
+
+
+def sign_tokens(key, idp_ids: list[str]) -> list[str]:
+    """Sign a chat access token for each caller."""
+
+    expires_at = int(time.time()) + 24 * 60 * 60
+    return [
+        jwt.encode(
+            {"alg": "RS256"},
+            {
+                "iss": ISSUER,
+                "aud": AUDIENCE,
+                "sub": idp_id,
+                "exp": expires_at,
+                "permissions": ["access:chat"],
+            },
+            key,
+        ).decode()
+        for idp_id in idp_ids
+    ]
+
+
+def get_arrival_times(args) -> list[float]:
+    """Get seeded poisson arrival offsets in seconds for the load profile."""
+
+    generator = random.Random(args.seed)
+    arrival_times = []
+    now = 0.0
+    while True:
+        rate = args.rate
+        if (
+            args.profile == "burst"
+            and now % args.burst_interval_seconds < args.burst_seconds
+        ):
+            rate = args.burst_rate
+        now += generator.expovariate(rate)
+        if now >= args.duration_seconds:
+            return arrival_times
+        arrival_times.append(now)
+
+
+def post_chat(url: str, token: str, session_id: str, text: str, timeout: float):
+    """Post chat and return status code, zero when the request did not complete."""
+
+    request = urllib.request.Request(
+        f"{url}/chat",
+        data=json.dumps(
+            {
+                "caller_session_id": session_id,
+                "caller_chat_text": text,
+                "caller_attachment_type": None,
+            }
+        ).encode(),
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        },
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return 0
+
+
+def run_load(url: str, tokens: list[str], args, arrival_times: list[float]) -> dict:
+    """Drive open loop load, latency is measured from the scheduled arrival so a
+    slow server cannot hide queueing by slowing the client down.
+
+    A share of clients abandon their request, closing the connection once they
+    have waited the abandon seconds, as a user closing the browser mid answer.
+    Abandoned requests are counted apart from errors.
+    """
+
+    generator = random.Random(args.seed)
+    requests = [
+        (
+            generator.randrange(len(tokens)),
+            generator.randrange(args.sessions_per_caller),
+            generator.choice(QUESTIONS),
+        )
+        for _ in arrival_times
+    ]
+    # drawn apart so the requests are the same whatever the abandon ratio
+    abandon_generator = random.Random(f"{args.seed}:abandon")
+    abandoned = [abandon_generator.random() < args.abandon_ratio for _ in requests]
+    results = [None] * len(arrival_times)
+
+    def send(index: int, scheduled_at: float) -> None:
+        caller, session, text = requests[index]
+        status = post_chat(
+            url,
+            tokens[caller],
+            f"session-{session}",
+            text,
+            args.abandon_after_seconds if abandoned[index] else args.timeout,
+        )
+        results[index] = (status, time.perf_counter() - scheduled_at)
+
+    late_dispatches = 0
+    with ThreadPoolExecutor(max_workers=args.client_threads) as executor:
+        start = time.perf_counter()
+        for index, arrival_time in enumerate(arrival_times):
+            scheduled_at = start + arrival_time
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.01:
+                late_dispatches += 1
+            executor.submit(send, index, scheduled_at)
+    elapsed = time.perf_counter() - start
+
+    kept = [result for result, left in zip(results, abandoned) if not left]
+    latencies = sorted(latency for status, latency in kept if status == 200)
+    errors = {}
+    for status, _ in kept:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+
+    def percentile(quantile: float) -> float | None:
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * quantile))] * 1e3
+
+    return {
+        "requests": len(results),
+        "abandoned": len(results) - len(kept),
+        "succeeded": len(latencies),
+        "error_rate": (len(kept) - len(latencies)) / len(kept) if kept else 0,
+        "errors_by_status": errors,
+        "offered_rate_per_second": len(results) / args.duration_seconds,
+        "throughput_per_second": len(latencies) / elapsed,
+        "late_dispatches": late_dispatches,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) * 1e3 if latencies else None,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": latencies[-1] * 1e3 if latencies else None,
+        },
+    }
+
+
+def get_git_commit() -> str | None:
+    """Get current git commit so results can be compared across commits."""
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def add_load_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add load profile arguments shared by the load driven benchmarks."""
+
+    parser.add_argument("--profile", choices=("constant", "burst"), default="constant")
+    parser.add_argument("--rate", type=float, default=50.0)
+    parser.add_argument("--duration-seconds", type=float, default=30.0)
+    parser.add_argument("--burst-rate", type=float, default=200.0)
+    parser.add_argument("--burst-seconds", type=float, default=2.0)
+    parser.add_argument("--burst-interval-seconds", type=float, default=10.0)
+    parser.add_argument("--callers", type=int, default=100)
+    parser.add_argument("--sessions-per-caller", type=int, default=3)
+    parser.add_argument("--client-threads", type=int, default=512)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--abandon-ratio", type=float, default=0.0)
+    parser.add_argument("--abandon-after-seconds", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Conversation api load test")
+    add_load_arguments(parser)
+    parser.add_argument(
+        "--inference-endpoint",
+        default="fake://?latency_ms=200&tokens_per_second=400&output_tokens=64",
+        help="Fake inference provider endpoint, settings as query parameters",
+    )
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    with tempfile.TemporaryDirectory() as directory:
+        api = start_conversation_api(directory, args.callers, args.inference_endpoint)
+        try:
+            report = run_load(api.url, api.tokens, args, get_arrival_times(args))
+        finally:
+            api.stop()
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                **report,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
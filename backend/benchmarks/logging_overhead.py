@@ -0,0 +1,139 @@
+""" Module for benchmarking logging cost per chat request. """
+
+import argparse
+import contextlib
+import json
+import os
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from uuid import UUID, uuid4
+
+import structlog
+from structlog import get_logger
+
+from backend.api.entities import ChatInputModel
+from backend.api.lib import configure_global_logging_level
+from backend.api.logging_pipeline import LazyValue
+
+
+def log_chat_request(
+    request_id: str, chat_id: UUID, chat_input: ChatInputModel, caller, lazy: bool
+) -> None:
+    """Emit the log lines a chat request emits, in order, without the work."""
+
+    structlog.contextvars.bind_contextvars(request_id=request_id)
+
+    def job_request():
+        return chat_input.model_dump(
+            exclude=chat_input.get_exclude_fields_for_logging()
+        )
+
+    def caller_fields():
+        return {k: str(v) for k, v in caller.__dict__.items()}
+
+    get_logger().info("Starting post chat - '/chat' from conversation api")
+    logger = get_logger().bind(sub=caller.idp_id)
+    logger.info("Starting get caller")
+    repository_logger = get_logger().bind(idp_id=caller.idp_id)
+    repository_logger.info("Starting load caller")
+    repository_logger.info("Completed load caller")
+    logger.info("Completed get caller")
+
+    logger = get_logger().bind(
+        job_request=LazyValue(job_request) if lazy else job_request(),
+        caller=LazyValue(caller_fields) if lazy else caller_fields(),
+    )
+    logger.info("Starting process chat")
+    repository_logger = get_logger().bind(
+        caller_id=caller.caller_id, caller_session_id=chat_input.caller_session_id
+    )
+    repository_logger.info("Starting count session chats")
+    repository_logger.info("Completed count session chats", result=12)
+    repository_logger = get_logger().bind(
+        caller_id=caller.caller_id,
+        caller_session_id=chat_input.caller_session_id,
+        offset=0,
+        limit=12,
+    )
+    repository_logger.info("Starting load session chats")
+    repository_logger.info("Completed load session chats", count=12)
+    logger.info("Routed chat", inference_tier="large")
+    wrapper_logger = get_logger().bind(job_id=str(chat_id))
+    wrapper_logger.info("Starting request for inference from kubernetes pod")
+    wrapper_logger.info(
+        "Completed request for inference from kubernetes pod",
+        pod_url="http://10.0.0.1:8000",
+    )
+    repository_logger = get_logger().bind(chat_id=chat_id)
+    repository_logger.info("Starting save chat")
+    repository_logger.info("Completed save chat")
+    logger.info("Completed process chat")
+    get_logger().info("Completed post chat - '/chat' from conversation api")
+
+    structlog.contextvars.clear_contextvars()
+
+
+def run_mode(args, async_logging: bool, lazy: bool, log_sample_ratios: dict) -> dict:
+    """Run chat requests with one logging configuration, writing to devnull."""
+
+    chat_input = ChatInputModel(
+        caller_session_id="session-1",
+        caller_chat_text="My landlord is keeping my bond, what can I do? " * 4,
+        caller_attachment_type=None,
+    )
+    caller = SimpleNamespace(
+        caller_id=uuid4(),
+        name="Jane Citizen",
+        idp_id="google-oauth2|103311653287323190363",
+        email="jane@example.com",
+        first_created=datetime(2026, 1, 1),
+        last_updated=datetime(2026, 1, 1),
+    )
+
+    # ids are generated up front, uuid4 is slow enough to blur the comparison
+    chat_ids = [uuid4() for _ in range(args.requests)]
+    request_ids = [chat_id.hex for chat_id in chat_ids]
+
+    with (
+        open(os.devnull, "w") as devnull,
+        contextlib.redirect_stdout(devnull),
+    ):
+        structlog.reset_defaults()
+        configure_global_logging_level(False, async_logging, log_sample_ratios)
+        start = time.perf_counter()
+        for request_id, chat_id in zip(request_ids, chat_ids):
+            log_chat_request(request_id, chat_id, chat_input, caller, lazy)
+        hot_path_seconds = time.perf_counter() - start
+        if async_logging:
+            structlog.get_config()["logger_factory"].sink.shutdown()
+        total_seconds = time.perf_counter() - start
+    structlog.reset_defaults()
+
+    return {
+        "async_logging": async_logging,
+        "lazy_values": lazy,
+        "log_sample_ratios": log_sample_ratios,
+        "hot_path_microseconds_per_request": hot_path_seconds / args.requests * 1e6,
+        "including_sink_microseconds_per_request": total_seconds / args.requests * 1e6,
+    }
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Logging overhead benchmark")
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+
+    modes = [
+        (False, False, {}),
+        (False, True, {}),
+        (True, True, {}),
+        (True, True, {"info": 0.1}),
+    ]
+    print(json.dumps([run_mode(args, *mode) for mode in modes], indent=2))
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,95 @@
+""" Module for benchmarking metrics overhead per chat request. """
+
+import argparse
+import json
+import threading
+import time
+
+from backend.api import metrics
+
+STAGES = (
+    "jwt_decode",
+    "caller_lookup",
+    "queue_wait",
+    "history_lookup",
+    "inference",
+    "db_write",
+    "total",
+)
+
+
+def record_chat_request() -> None:
+    """Record every metric a chat request records on the hot path."""
+
+    with metrics.HTTP_REQUESTS_IN_FLIGHT.track_inprogress():
+        for stage in STAGES:
+            metrics.CHAT_STAGE_DURATION_SECONDS.labels(stage).observe(0.0123)
+        with metrics.INFERENCE_REQUESTS_IN_FLIGHT.labels("large").track_inprogress():
+            pass
+        metrics.INFERENCE_DURATION_SECONDS.labels("large").observe(1.23)
+        metrics.INFERENCE_REQUESTS_TOTAL.labels("large", "success").inc()
+    metrics.HTTP_REQUESTS_TOTAL.labels("POST", "post_chat", "200").inc()
+
+
+def benchmark_threads(threads: int, requests_per_thread: int) -> dict[str, float]:
+    """Benchmark recording from several threads at once."""
+
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for _ in range(requests_per_thread):
+            record_chat_request()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    requests = threads * requests_per_thread
+    return {
+        "threads": threads,
+        "requests": requests,
+        "microseconds_per_request": elapsed / requests * 1e6,
+    }
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Metrics overhead benchmark")
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    single = benchmark_threads(1, args.requests)
+    contended = benchmark_threads(args.threads, args.requests // args.threads)
+    expected = args.requests * 2
+    count = metrics.HTTP_REQUESTS_TOTAL.labels("POST", "post_chat", "200").get()
+    assert count == expected, f"lost updates - {count} of {expected}"
+
+    start = time.perf_counter()
+    text = metrics.render_prometheus_text()
+    render_seconds = time.perf_counter() - start
+
+    print(
+        json.dumps(
+            {
+                "single_thread": single,
+                "contended": contended,
+                "scrape": {
+                    "milliseconds": render_seconds * 1e3,
+                    "bytes": len(text),
+                },
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
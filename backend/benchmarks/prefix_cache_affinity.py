@@ -0,0 +1,223 @@
+""" Module for benchmarking prompt prefix reuse and session affinity. """
+
+import argparse
+import hashlib
+import itertools
+import json
+import random
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from backend.api.inference_provider_wrappers.kubernetes_pod_wrapper import (
+    KubernetesPodWrapper,
+)
+from backend.api.main import get_history_offset, render_chat_history
+from backend.api.prompt_template_registry import CompiledPromptTemplate
+from backend.api.sql_migrations.insert_scripts.prompt_template import (
+    LEGAL_ASSISTANT_V2,
+)
+from backend.benchmarks.lib import configure_benchmark_logging
+
+BLOCK_TOKENS = 16
+WORDS = (
+    "tenancy lease bond landlord notice tribunal employer contract termination "
+    "unfair dismissal property boundary fence neighbour council permit will estate "
+    "executor probate custody agreement debt invoice warranty refund consumer"
+).split()
+
+
+class PrefixCachingPod(ThreadingHTTPServer):
+    """Class for stand-in inference pod that simulates a block level prefix cache.
+
+    Time to first token is simulated as a fixed overhead plus prefill cost for every
+    prompt token not covered by cached prefix blocks, nothing actually sleeps.
+    """
+
+    def __init__(self, cache_blocks: int, base_ms: float, prefill_ms_per_token: float):
+        super().__init__(("127.0.0.1", 0), _PrefixCachingPodHandler)
+        self.cache_blocks = cache_blocks
+        self.base_ms = base_ms
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.ttft_ms = []
+
+    def complete(self, prompt: str) -> None:
+        """Simulate prefill of prompt against the prefix cache."""
+
+        tokens = prompt.split()
+        block_hashes = []
+        digest = hashlib.blake2b(digest_size=8)
+        for start in range(0, len(tokens) - BLOCK_TOKENS + 1, BLOCK_TOKENS):
+            # each block hash chains over every token before it, as in vllm
+            digest.update(" ".join(tokens[start : start + BLOCK_TOKENS]).encode())
+            block_hashes.append(digest.copy().digest())
+
+        with self.lock:
+            cached_blocks = 0
+            for block_hash in block_hashes:
+                if block_hash not in self.cache:
+                    break
+                cached_blocks += 1
+            for block_hash in block_hashes:
+                self.cache[block_hash] = True
+                self.cache.move_to_end(block_hash)
+            while len(self.cache) > self.cache_blocks:
+                self.cache.popitem(last=False)
+
+            cached_tokens = cached_blocks * BLOCK_TOKENS
+            self.prompt_tokens += len(tokens)
+            self.cached_tokens += cached_tokens
+            self.ttft_ms.append(
+                self.base_ms + (len(tokens) - cached_tokens) * self.prefill_ms_per_token
+            )
+
+
+class _PrefixCachingPodHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.complete(body["prompt"])
+        response = json.dumps(
+            {"choices": [{"text": "You should check your lease. " * 12}]}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RandomPodWrapper(KubernetesPodWrapper):
+    """Class for pod wrapper picking a random pod per request, as a baseline."""
+
+    def __init__(self, endpoint: str, seed: int):
+        super().__init__(endpoint)
+        self._generator = random.Random(seed)
+
+    def get_pod_urls(self, affinity_key: str) -> list[str]:
+        return self._generator.sample(self.pod_urls, len(self.pod_urls))
+
+
+def render_unstable_prompt(template, caller_name, history, caller_chat_text) -> str:
+    """Render prompt newest turn first, so the prefix changes every turn."""
+
+    return template.render(
+        caller_name=caller_name,
+        chat_history=render_chat_history(list(reversed(history))),
+        caller_chat_text=caller_chat_text,
+    )
+
+
+def render_stable_prompt(template, caller_name, history, caller_chat_text) -> str:
+    """Render prompt the way process chat does."""
+
+    return template.render(
+        caller_name=caller_name,
+        chat_history=render_chat_history(history),
+        caller_chat_text=caller_chat_text,
+    )
+
+
+def run_scenario(args, affinity: bool, stable_layout: bool, lose_pod: bool) -> dict:
+    """Run one scenario of interleaved multi turn sessions against fresh pods."""
+
+    pods = [
+        PrefixCachingPod(args.cache_blocks, args.base_ms, args.prefill_ms_per_token)
+        for _ in range(args.pods)
+    ]
+    for pod in pods:
+        threading.Thread(target=pod.serve_forever, daemon=True).start()
+    endpoint = ",".join(pod.url for pod in pods)
+    wrapper = (
+        KubernetesPodWrapper(endpoint)
+        if affinity
+        else RandomPodWrapper(endpoint, args.seed)
+    )
+    template = CompiledPromptTemplate(
+        SimpleNamespace(
+            prompt_template_id=2,
+            name="legal_assistant",
+            version=2,
+            template_text=LEGAL_ASSISTANT_V2,
+        )
+    )
+    render = render_stable_prompt if stable_layout else render_unstable_prompt
+    generator = random.Random(args.seed)
+    histories = {session: [] for session in range(args.sessions)}
+
+    try:
+        for turn in range(args.turns):
+            if lose_pod and turn == args.turns // 2:
+                pods[0].shutdown()
+                pods[0].server_close()
+            for session, history in histories.items():
+                question = " ".join(
+                    generator.choice(WORDS) for _ in range(generator.randint(10, 60))
+                )
+                offset = get_history_offset(len(history), args.max_turns)
+                prompt = render(
+                    template, f"Caller {session}", history[offset:], question
+                )
+                answer = wrapper.request_for_inference(
+                    f"{session}-{turn}", [], prompt, affinity_key=f"session-{session}"
+                )
+                history.append(
+                    SimpleNamespace(
+                        caller_chat_text=question, response_chat_text=answer
+                    )
+                )
+    finally:
+        for pod in pods[1:] if lose_pod else pods:
+            pod.shutdown()
+            pod.server_close()
+
+    prompt_tokens = sum(pod.prompt_tokens for pod in pods)
+    ttft_ms = sorted(itertools.chain.from_iterable(pod.ttft_ms for pod in pods))
+    return {
+        "affinity": affinity,
+        "stable_layout": stable_layout,
+        "lose_pod": lose_pod,
+        "requests": len(ttft_ms),
+        "prefix_reuse_ratio": sum(pod.cached_tokens for pod in pods) / prompt_tokens,
+        "mean_ttft_ms": sum(ttft_ms) / len(ttft_ms),
+        "p95_ttft_ms": ttft_ms[int(len(ttft_ms) * 0.95)],
+    }
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Prefix cache affinity benchmark")
+    parser.add_argument("--pods", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--max-turns", type=int, default=20)
+    parser.add_argument("--cache-blocks", type=int, default=4096)
+    parser.add_argument("--base-ms", type=float, default=20.0)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    scenarios = [
+        (False, False, False),
+        (False, True, False),
+        (True, False, False),
+        (True, True, False),
+        (True, True, True),
+    ]
+    print(
+        json.dumps([run_scenario(args, *scenario) for scenario in scenarios], indent=2)
+    )
+
+
+if __name__ == "__main__":
+    init()
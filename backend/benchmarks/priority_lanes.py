@@ -0,0 +1,169 @@
+""" Module for benchmarking interactive chat latency while a bulk job saturates inference. """
+
+import argparse
+import json
+import platform
+import tempfile
+import threading
+import time
+
+from backend.api import provider
+from backend.benchmarks.chat_batch import post_chat_batch
+from backend.benchmarks.lib import configure_benchmark_logging
+from backend.benchmarks.load_test import (
+    QUESTIONS,
+    add_load_arguments,
+    get_arrival_times,
+    get_git_commit,
+    run_load,
+    start_conversation_api,
+)
+
+
+def get_scenarios(args: argparse.Namespace) -> dict[str, tuple[dict, bool]]:
+    """Get tier settings of each scenario and whether a bulk job runs in it."""
+
+    return {
+        # the latency interactive chats get from the provider on its own
+        "interactive_only": ({}, False),
+        # every request goes straight to the provider and queues there in order
+        "shared": ({}, True),
+        "lanes": (
+            {
+                "max_concurrency": args.max_concurrency,
+                "interactive_reserved_concurrency": args.interactive_reserved,
+                "bulk_max_wait_seconds": args.bulk_max_wait_seconds,
+            },
+            True,
+        ),
+    }
+
+
+def run_bulk_job(url: str, token: str, args, stop: threading.Event) -> dict:
+    """Post chat batches one after the other until stopped, each item a document
+    session of its own."""
+
+    start = time.perf_counter()
+    batches = items = errors = 0
+    while not stop.is_set():
+        body = "".join(
+            json.dumps(
+                {
+                    "caller_session_id": f"document-{batches}-{index}",
+                    "caller_chat_text": QUESTIONS[index % len(QUESTIONS)],
+                    "caller_attachment_type": None,
+                }
+            )
+            + "\n"
+            for index in range(args.bulk_items)
+        ).encode()
+        result = post_chat_batch(url, token, body)
+        batches += 1
+        items += result["results"] - result["errors"]
+        errors += result["errors"]
+    elapsed = time.perf_counter() - start
+    return {
+        "batches": batches,
+        "items": items,
+        "errors": errors,
+        "items_per_second": items / elapsed,
+    }
+
+
+def run_scenario(args: argparse.Namespace, tier_settings: dict, bulk: bool) -> dict:
+    """Drive interactive chats against a fresh api, with a bulk job posting chat
+    batches alongside them for the whole run or not."""
+
+    endpoint = f"{args.inference_endpoint}&max_concurrency={args.max_concurrency}"
+    with tempfile.TemporaryDirectory() as directory:
+        # background inference is left out, so the bulk job is the only other load
+        api = start_conversation_api(
+            directory,
+            args.callers + 1,
+            endpoint,
+            tier_settings,
+            session_summary_enabled=False,
+            caller_memory_enabled=False,
+            chat_batch_parallelism=args.bulk_parallelism,
+            chat_batch_micro_batch_size=args.bulk_micro_batch_size,
+        )
+        stop = threading.Event()
+        bulk_report = {}
+        bulk_thread = threading.Thread(
+            target=lambda: bulk_report.update(
+                run_bulk_job(api.url, api.tokens[-1], args, stop)
+            )
+        )
+        try:
+            if bulk:
+                bulk_thread.start()
+                # the provider is saturated before the first interactive chat
+                time.sleep(args.warmup_seconds)
+            report = run_load(api.url, api.tokens[:-1], args, get_arrival_times(args))
+        finally:
+            stop.set()
+            if bulk:
+                bulk_thread.join()
+            api.stop()
+            provider.PROVIDERS.data_repository.engine.dispose()
+
+    p99_ms = report["latency_ms"]["p99"]
+    return {
+        "interactive": report,
+        "interactive_p99_within_budget": (
+            p99_ms is not None and p99_ms <= args.interactive_p99_budget_ms
+        ),
+        "bulk": bulk_report or None,
+    }
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Priority lanes benchmark")
+    add_load_arguments(parser)
+    parser.set_defaults(rate=3.0, duration_seconds=30.0, callers=20)
+    parser.add_argument("--interactive-p99-budget-ms", type=float, default=1500.0)
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=8,
+        help="Sequences the fake provider decodes at once, and slots of the tier",
+    )
+    parser.add_argument("--interactive-reserved", type=int, default=3)
+    parser.add_argument("--bulk-max-wait-seconds", type=float, default=30.0)
+    parser.add_argument("--bulk-items", type=int, default=64)
+    parser.add_argument("--bulk-parallelism", type=int, default=8)
+    parser.add_argument("--bulk-micro-batch-size", type=int, default=8)
+    parser.add_argument("--warmup-seconds", type=float, default=2.0)
+    parser.add_argument(
+        "--inference-endpoint",
+        default=(
+            "fake://?latency_distribution=constant&latency_ms=100"
+            "&tokens_per_second=100&output_tokens=40&batch_cost=0"
+        ),
+        help="Fake inference provider endpoint, settings as query parameters",
+    )
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    results = {
+        name: run_scenario(args, tier_settings, bulk)
+        for name, (tier_settings, bulk) in get_scenarios(args).items()
+    }
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
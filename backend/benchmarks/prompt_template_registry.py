@@ -0,0 +1,114 @@
+""" Module for benchmarking prompt template registry. """
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import timeit
+from types import SimpleNamespace
+
+from backend.api.prompt_template_registry import CompiledPromptTemplate
+from backend.api.sql_migrations.insert_scripts.prompt_template import (
+    LEGAL_ASSISTANT_V1,
+)
+
+RENDER_VALUES = {
+    "caller_name": "Jane Citizen",
+    "caller_chat_text": "My landlord is keeping my bond because of a stained carpet. "
+    * 4,
+}
+RESPONSE_CHAT_TEXT = "Under the residential tenancies legislation in your state, " * 80
+
+
+def benchmark_render(iterations: int) -> dict[str, float]:
+    """Benchmark free text format per chat against compiled template render."""
+
+    compiled = CompiledPromptTemplate(
+        SimpleNamespace(
+            prompt_template_id=1,
+            name="legal_assistant",
+            version=1,
+            template_text=LEGAL_ASSISTANT_V1,
+        )
+    )
+    assert compiled.render(**RENDER_VALUES) == LEGAL_ASSISTANT_V1.format(
+        **RENDER_VALUES
+    )
+
+    before = timeit.timeit(
+        lambda: LEGAL_ASSISTANT_V1.format(**RENDER_VALUES), number=iterations
+    )
+    after = timeit.timeit(lambda: compiled.render(**RENDER_VALUES), number=iterations)
+    return {
+        "iterations": iterations,
+        "before_microseconds_per_render": before / iterations * 1e6,
+        "after_microseconds_per_render": after / iterations * 1e6,
+        "static_prefix_characters": len(compiled.static_prefix),
+        "template_characters": len(LEGAL_ASSISTANT_V1),
+    }
+
+
+def benchmark_table_size(rows: int) -> dict[str, int | float]:
+    """Benchmark chat table size storing template text against template id."""
+
+    layouts = {
+        "before": (
+            "CREATE TABLE chat (chat_id BLOB PRIMARY KEY, caller_chat_text TEXT,"
+            " prompt_template TEXT, response_chat_text TEXT)",
+            LEGAL_ASSISTANT_V1,
+        ),
+        "after": (
+            "CREATE TABLE chat (chat_id BLOB PRIMARY KEY, caller_chat_text TEXT,"
+            " prompt_template_id INTEGER, response_chat_text TEXT)",
+            1,
+        ),
+    }
+    result = {"rows": rows}
+    with tempfile.TemporaryDirectory() as directory:
+        for layout, (create_table, prompt_template) in layouts.items():
+            # same seeded answer lengths for both layouts, as row size drives paging
+            generator = random.Random(0)
+            path = os.path.join(directory, f"{layout}.sqlite3")
+            with sqlite3.connect(path) as connection:
+                connection.execute(create_table)
+                connection.executemany(
+                    "INSERT INTO chat VALUES (?, ?, ?, ?)",
+                    (
+                        (
+                            os.urandom(16),
+                            RENDER_VALUES["caller_chat_text"],
+                            prompt_template,
+                            RESPONSE_CHAT_TEXT[: generator.randint(200, 4000)],
+                        )
+                        for _ in range(rows)
+                    ),
+                )
+            connection.close()
+            result[f"{layout}_bytes"] = os.path.getsize(path)
+    result["saved_ratio"] = 1 - result["after_bytes"] / result["before_bytes"]
+    return result
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Prompt template registry benchmark")
+    parser.add_argument("--iterations", type=int, default=100_000)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(
+        json.dumps(
+            {
+                "render": benchmark_render(args.iterations),
+                "table_size": benchmark_table_size(args.rows),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,210 @@
+""" Module for benchmarking response compression and etag revalidation. """
+
+import argparse
+import asyncio
+import json
+import platform
+import tempfile
+import time
+from uuid import uuid4
+
+from sqlalchemy import event
+
+from backend.api import provider
+from backend.api.entities import Chat
+from backend.api.enum import InferenceProviderType
+from backend.benchmarks.lib import configure_benchmark_logging
+from backend.benchmarks.load_test import get_git_commit, start_conversation_api
+from backend.benchmarks.text_compression import get_chat_texts
+
+ENCODINGS = ("identity", "gzip", "br", "zstd")
+
+
+async def call_app(app, path: str, headers: dict[str, str]) -> tuple[int, dict, int]:
+    """Call the asgi app with a get request, returning the status, headers and
+    bytes on the wire, the body and the headers as http/1.1 would write them."""
+
+    path, _, query_string = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "root_path": "",
+        "headers": [
+            (name.lower().encode(), value.encode()) for name, value in headers.items()
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 80),
+    }
+    disconnected = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    status, response_headers, wire_bytes = None, {}, 0
+
+    async def send(message):
+        nonlocal status, response_headers, wire_bytes
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = {
+                name.decode(): value.decode() for name, value in message["headers"]
+            }
+            wire_bytes += len(f"HTTP/1.1 {status} \r\n\r\n") + sum(
+                len(name) + len(value) + 4 for name, value in message["headers"]
+            )
+        elif message["type"] == "http.response.body":
+            wire_bytes += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    disconnected.set()
+    return status, response_headers, wire_bytes
+
+
+async def measure(app, paths: list[str], headers: dict[str, str], repeats: int) -> dict:
+    """Get every path repeatedly and report bytes on the wire, the process cpu time
+    per request and the count of database queries."""
+
+    queries = 0
+
+    def count_query(*_) -> None:
+        nonlocal queries
+        queries += 1
+
+    engine = provider.PROVIDERS.data_repository.engine
+    event.listen(engine, "before_cursor_execute", count_query)
+    statuses = set()
+    wire_bytes = 0
+    start = time.process_time()
+    for _ in range(repeats):
+        for path in paths:
+            status, _, size = await call_app(app, path, headers)
+            statuses.add(status)
+            wire_bytes += size
+    cpu_seconds = time.process_time() - start
+    event.remove(engine, "before_cursor_execute", count_query)
+
+    requests = repeats * len(paths)
+    return {
+        "statuses": sorted(statuses),
+        "wire_bytes_per_request": wire_bytes / requests,
+        "cpu_us_per_request": cpu_seconds / requests * 1e6,
+        "queries_per_request": queries / requests,
+    }
+
+
+async def run(app, token: str, args: argparse.Namespace) -> dict:
+    """Measure a history page of each size in every encoding, then revalidating it
+    with the etag of the last response."""
+
+    authorization = {"Authorization": f"Bearer {token}"}
+    results = {}
+    for limit in args.limits:
+        paths = [
+            f"/sessions/session-{index}/chats?limit={limit}"
+            for index in range(args.sessions)
+        ]
+        page = {}
+        for encoding in ENCODINGS:
+            headers = authorization | {"Accept-Encoding": encoding}
+            page[encoding] = await measure(app, paths, headers, args.repeats)
+
+        # every session's etag, as the client would hold it from its last fetch
+        etags = {}
+        for path in paths:
+            _, response_headers, _ = await call_app(
+                app, path, authorization | {"Accept-Encoding": "zstd"}
+            )
+            etags[path] = response_headers["etag"]
+        not_modified = []
+        for path in paths:
+            not_modified.append(
+                await measure(
+                    app,
+                    [path],
+                    authorization
+                    | {"Accept-Encoding": "zstd", "If-None-Match": etags[path]},
+                    args.repeats,
+                )
+            )
+        page["zstd_not_modified"] = {
+            "statuses": sorted(
+                {s for result in not_modified for s in result["statuses"]}
+            ),
+            **{
+                key: sum(result[key] for result in not_modified) / len(not_modified)
+                for key in (
+                    "wire_bytes_per_request",
+                    "cpu_us_per_request",
+                    "queries_per_request",
+                )
+            },
+        }
+        results[f"history_page_{limit}"] = page
+    return results
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Response compression benchmark")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--chats-per-session", type=int, default=100)
+    parser.add_argument("--limits", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    with tempfile.TemporaryDirectory() as directory:
+        api = start_conversation_api(directory, 1, "fake://?time_scale=0")
+        data_repository = provider.PROVIDERS.data_repository
+        caller_id = data_repository.load_caller("load-test|00000000").caller_id
+        texts = get_chat_texts(args.seed, args.sessions * args.chats_per_session)
+        data_repository.save_chats(
+            [
+                Chat(
+                    chat_id=uuid4(),
+                    caller_id=caller_id,
+                    caller_session_id=f"session-{index % args.sessions}",
+                    caller_chat_text=caller_chat_text,
+                    response_chat_text=response_chat_text,
+                    inference_provider_type=InferenceProviderType.FAKE,
+                )
+                for index, (caller_chat_text, response_chat_text) in enumerate(texts)
+            ]
+        )
+
+        # imported late as the app is built from the configuration
+        from backend.api.conversation_api import app
+
+        results = asyncio.run(run(app, api.tokens[0], args))
+        api.stop()
+        data_repository.engine.dispose()
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,160 @@
+""" Module for benchmarking requests dropped by restarting the conversation api under load. """
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+
+from authlib.jose import JsonWebKey
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from backend.api.entities import Chat
+from backend.api.sql_migrations.run import run_db_migrations
+from backend.benchmarks.lib import configure_benchmark_logging
+from backend.benchmarks.load_test import (
+    AUDIENCE,
+    ISSUER,
+    add_load_arguments,
+    get_arrival_times,
+    get_git_commit,
+    insert_callers,
+    run_load,
+    sign_tokens,
+    write_routing_rules,
+)
+from backend.benchmarks.worker_scaling import (
+    get_free_port,
+    spawn_server,
+    start_server,
+    stop_server,
+)
+
+
+def restart_by_stop_then_start(
+    process: subprocess.Popen, workers: int, port: int, env: dict[str, str]
+) -> subprocess.Popen:
+    """Restart as a deploy replacing the process does, stopping the running server
+    and starting its successor once it has exited."""
+
+    stop_server(process)
+    return start_server(workers, port, env)
+
+
+def restart_by_handoff(
+    process: subprocess.Popen, workers: int, port: int, env: dict[str, str]
+) -> subprocess.Popen:
+    """Restart by starting the successor alongside the running server, which hands
+    it the listening socket and drains once the successor has loaded."""
+
+    successor = spawn_server(workers, port, env)
+    try:
+        process.wait(timeout=120)
+    except subprocess.TimeoutExpired:
+        successor.kill()
+        raise
+    return successor
+
+
+def run_scenario(
+    args: argparse.Namespace, env: dict[str, str], tokens: list[str], restart
+) -> dict:
+    """Run the load against a server restarted evenly through the run."""
+
+    port = get_free_port()
+    process = start_server(args.workers, port, env)
+    restart_seconds = []
+
+    def restart_during_load() -> None:
+        nonlocal process
+        start = time.perf_counter()
+        for index in range(args.restarts):
+            delay = (
+                start
+                + args.duration_seconds * (index + 1) / (args.restarts + 1)
+                - time.perf_counter()
+            )
+            time.sleep(max(0.0, delay))
+            restart_start = time.perf_counter()
+            process = restart(process, args.workers, port, env)
+            restart_seconds.append(time.perf_counter() - restart_start)
+
+    restarter = threading.Thread(target=restart_during_load)
+    restarter.start()
+    try:
+        report = run_load(
+            f"http://127.0.0.1:{port}", tokens, args, get_arrival_times(args)
+        )
+    finally:
+        restarter.join()
+        stop_server(process)
+    return report | {"restart_seconds": restart_seconds}
+
+
+def count_chats(connection_string: str) -> int:
+    """Count chats saved."""
+
+    with Session(create_engine(connection_string)) as session:
+        return session.scalar(select(func.count()).select_from(Chat))
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Restart under load benchmark")
+    add_load_arguments(parser)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--restarts", type=int, default=2)
+    parser.add_argument(
+        "--inference-endpoint",
+        default="fake://?latency_ms=200&tokens_per_second=400&output_tokens=64",
+        help="Fake inference provider endpoint, settings as query parameters",
+    )
+    parser.set_defaults(rate=20.0, duration_seconds=30.0, callers=20)
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        key = JsonWebKey.generate_key("RSA", 2048, is_private=True)
+        rules_path = f"{directory}/inference_routing_rules.json"
+        write_routing_rules(rules_path, args.inference_endpoint)
+        for name, restart in (
+            ("stop_then_start", restart_by_stop_then_start),
+            ("handoff", restart_by_handoff),
+        ):
+            connection_string = f"sqlite+pysqlite:///{directory}/{name}.sqlite3"
+            run_db_migrations(connection_string, False)
+            tokens = sign_tokens(
+                key, insert_callers(create_engine(connection_string), args.callers)
+            )
+            env = os.environ | {
+                "AUTH0_PUBLIC_KEY": key.as_pem(is_private=False).decode(),
+                "AUTH0_ISSUER": ISSUER,
+                "AUTH0_AUDIENCE": AUDIENCE,
+                "SQLITE_CONNECTION_STRING": connection_string,
+                "INFERENCE_ROUTING_RULES_PATH": rules_path,
+                "SOCKET_HANDOFF_DIRECTORY": directory,
+            }
+            report = run_scenario(args, env, tokens, restart)
+            results[name] = report | {"chats_saved": count_chats(connection_string)}
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
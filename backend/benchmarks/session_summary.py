@@ -0,0 +1,169 @@
+""" Module for benchmarking prompt size and latency by turn with rolling session summaries. """
+
+import argparse
+import json
+import platform
+import statistics
+import tempfile
+import threading
+import time
+
+from backend.api import provider
+from backend.api.enum import InferenceTier
+from backend.benchmarks.lib import configure_benchmark_logging
+from backend.benchmarks.load_test import (
+    QUESTIONS,
+    get_git_commit,
+    post_chat,
+    start_conversation_api,
+)
+
+SCENARIOS = {
+    # every earlier turn verbatim, as a consultation grows without bound
+    "full_history": {"session_summary_enabled": False, "prompt_history_max_turns": 0},
+    # the sliding window of recent turns alone
+    "window": {"session_summary_enabled": False},
+    "summary": {"session_summary_enabled": True},
+}
+
+
+def record_prompts(prompt_characters: dict[str, list[int]]) -> None:
+    """Record the prompt size of every inference request by affinity key, which is
+    the caller session of a chat and the session and summary of a summary."""
+
+    wrapper = provider.PROVIDERS.inference_router.get_wrapper(InferenceTier.LARGE)
+    request_for_inference = wrapper.request_for_inference
+    lock = threading.Lock()
+
+    def recording_request_for_inference(
+        job_id, content_file_urls, prompt_text, *args, affinity_key=None, **kwargs
+    ):
+        with lock:
+            prompt_characters.setdefault(affinity_key, []).append(len(prompt_text))
+        return request_for_inference(
+            job_id, content_file_urls, prompt_text, *args, affinity_key=affinity_key
+        )
+
+    wrapper.request_for_inference = recording_request_for_inference
+
+
+def run_scenario(args: argparse.Namespace, config_values: dict) -> dict:
+    """Hold sessions of many turns against a fresh api, each session asking its
+    next question once the last is answered."""
+
+    if config_values.get("prompt_history_max_turns") == 0:
+        config_values = config_values | {"prompt_history_max_turns": args.turns}
+    with tempfile.TemporaryDirectory() as directory:
+        # caller facts are left out, so prompts only differ by their history
+        api = start_conversation_api(
+            directory,
+            1,
+            args.inference_endpoint,
+            caller_memory_enabled=False,
+            **config_values,
+        )
+        prompt_characters: dict[str, list[int]] = {}
+        record_prompts(prompt_characters)
+        latencies = [[] for _ in range(args.turns)]
+
+        def hold_session(session: int) -> None:
+            for turn in range(args.turns):
+                start = time.perf_counter()
+                status = post_chat(
+                    api.url,
+                    api.tokens[0],
+                    f"session-{session}",
+                    f"{QUESTIONS[(session + turn) % len(QUESTIONS)]} ({turn})",
+                    args.timeout,
+                )
+                if status == 200:
+                    latencies[turn].append(time.perf_counter() - start)
+                time.sleep(args.think_seconds)
+
+        threads = [
+            threading.Thread(target=hold_session, args=(session,))
+            for session in range(args.sessions)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        provider.PROVIDERS.session_summarizer.shutdown()
+        api.stop()
+        provider.PROVIDERS.data_repository.engine.dispose()
+
+    chat_prompts = [
+        characters
+        for key, characters in prompt_characters.items()
+        if not key.endswith("/summary")
+    ]
+    summary_prompts = [
+        characters
+        for key, characters in prompt_characters.items()
+        if key.endswith("/summary")
+    ]
+    by_turn = {}
+    for start in range(0, args.turns, args.turns_per_bucket):
+        turns = range(start, min(args.turns, start + args.turns_per_bucket))
+        by_turn[f"turns_{turns[0] + 1}_{turns[-1] + 1}"] = {
+            "prompt_characters_mean": statistics.fmean(
+                characters[turn]
+                for characters in chat_prompts
+                for turn in turns
+                if turn < len(characters)
+            ),
+            "latency_ms_mean": statistics.fmean(
+                latency for turn in turns for latency in latencies[turn]
+            )
+            * 1e3,
+        }
+    return {
+        "chats_answered": sum(map(len, latencies)),
+        "by_turn": by_turn,
+        "summaries": sum(map(len, summary_prompts)),
+        "summary_prompt_characters_total": sum(map(sum, summary_prompts)),
+        "chat_prompt_characters_total": sum(map(sum, chat_prompts)),
+    }
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Session summary benchmark")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--turns-per-bucket", type=int, default=10)
+    parser.add_argument("--think-seconds", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--inference-endpoint",
+        default=(
+            "fake://?latency_distribution=constant&latency_ms=50"
+            "&prefill_tokens_per_second=2000&tokens_per_second=400"
+            "&output_tokens=60&batch_cost=0"
+        ),
+        help="Fake inference provider endpoint, settings as query parameters",
+    )
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    results = {
+        name: run_scenario(args, config_values)
+        for name, config_values in SCENARIOS.items()
+    }
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
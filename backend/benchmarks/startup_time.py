@@ -0,0 +1,113 @@
+""" Module for benchmarking conversation api startup time. """
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from authlib.jose import JsonWebKey
+
+from backend.benchmarks.load_test import (
+    AUDIENCE,
+    ISSUER,
+    get_git_commit,
+    write_routing_rules,
+)
+from backend.benchmarks.worker_scaling import get_free_port, start_server, stop_server
+
+
+def get_import_times(module: str, top: int) -> dict:
+    """Get import time of module and its slowest imports, as -X importtime
+    reports them."""
+
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, self_us, cumulative_us, name = (
+            part.strip() for part in line.replace(":", "|", 1).split("|")
+        )
+        imports.append((name, int(self_us), int(cumulative_us)))
+
+    total_us = next(
+        cumulative_us for name, _, cumulative_us in imports if name == module
+    )
+    return {
+        "total_milliseconds": total_us / 1e3,
+        "slowest_imports_milliseconds": {
+            name: cumulative_us / 1e3
+            for name, _, cumulative_us in sorted(
+                imports, key=lambda entry: entry[2], reverse=True
+            )[:top]
+        },
+    }
+
+
+def time_to_first_request(env: dict[str, str], *extra_args: str) -> float:
+    """Start the conversation api and return seconds until it served a request."""
+
+    port = get_free_port()
+    start = time.perf_counter()
+    process = start_server(1, port, env, *extra_args)
+    elapsed = time.perf_counter() - start
+    stop_server(process)
+    return elapsed
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Startup time benchmark")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        rules_path = f"{directory}/inference_routing_rules.json"
+        write_routing_rules(rules_path, "fake://?time_scale=0")
+        env = os.environ | {
+            "AUTH0_PUBLIC_KEY": JsonWebKey.generate_key("RSA", 2048, is_private=True)
+            .as_pem(is_private=False)
+            .decode(),
+            "AUTH0_ISSUER": ISSUER,
+            "AUTH0_AUDIENCE": AUDIENCE,
+            "SQLITE_CONNECTION_STRING": (
+                f"sqlite+pysqlite:///{directory}/startup_time.sqlite3"
+            ),
+            "INFERENCE_ROUTING_RULES_PATH": rules_path,
+        }
+        first_start = time_to_first_request(env, "--run-db-migrations", "true")
+        starts_at_head = sorted(
+            time_to_first_request(env, "--run-db-migrations", "true")
+            for _ in range(args.repeats)
+        )
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "imports": get_import_times("backend.api.conversation_api", args.top),
+                "time_to_first_request_seconds": {
+                    "empty_database": first_start,
+                    "database_at_head_median": starts_at_head[len(starts_at_head) // 2],
+                    "database_at_head_min": starts_at_head[0],
+                },
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
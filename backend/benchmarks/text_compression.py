@@ -0,0 +1,205 @@
+""" Module for benchmarking chat text compression storage and overhead. """
+
+import argparse
+import dataclasses
+import json
+import platform
+import random
+import tempfile
+import time
+from uuid import uuid4
+
+from sqlalchemy import text
+
+from backend.api import config, provider, text_compression
+from backend.api.entities import Chat
+from backend.api.enum import InferenceProviderType
+from backend.api.lib import CLIArgs, EnvVars
+from backend.benchmarks.chat_archive import SENTENCES
+from backend.benchmarks.chat_search import get_texts, get_vocabulary
+from backend.benchmarks.lib import configure_benchmark_logging
+from backend.benchmarks.load_test import get_git_commit, insert_callers
+
+# texts never reach this size, so nothing is compressed
+UNCOMPRESSED_THRESHOLD_BYTES = 2**31
+
+
+def get_chat_texts(seed: int, chats: int) -> list[tuple[str, str]]:
+    """Get question and answer texts, legal sentences each followed by a clause of
+    zipf distributed words so no two texts are alike."""
+
+    generator = random.Random(seed)
+    clauses = get_texts(generator, get_vocabulary(20_000), 20_000)
+
+    def get_text(sentences: int) -> str:
+        return " ".join(
+            f"{generator.choice(SENTENCES)} {generator.choice(clauses)[:60]}."
+            for _ in range(sentences)
+        )
+
+    return [
+        (get_text(generator.randint(1, 4)), get_text(generator.randint(8, 24)))
+        for _ in range(chats)
+    ]
+
+
+def configure_repository(directory: str, name: str) -> None:
+    """Configure providers against a fresh temp sqlite database."""
+
+    values = dataclasses.asdict(EnvVars()) | dataclasses.asdict(CLIArgs())
+    values.update(
+        auth0_public_key="",
+        auth0_issuer="",
+        auth0_audience="",
+        sqlite_connection_string=f"sqlite+pysqlite:///{directory}/{name}.sqlite3",
+        inference_provider_type=InferenceProviderType.FAKE,
+        async_logging=False,
+    )
+    config.CONFIG = config.Config(**values)
+    provider.configure_providers()
+
+
+def measure_storage(
+    texts: list[tuple[str, str]], batch_size: int, session_size: int
+) -> dict:
+    """Save chats through the data repository and load them back a session page at
+    a time, reporting throughput and the size of the chat table."""
+
+    data_repository = provider.PROVIDERS.data_repository
+    caller = data_repository.load_caller(insert_callers(data_repository.engine, 1)[0])
+    sessions = [f"session-{index}" for index in range(len(texts) // session_size)]
+
+    start = time.perf_counter()
+    for batch_start in range(0, len(texts), batch_size):
+        data_repository.save_chats(
+            [
+                Chat(
+                    chat_id=uuid4(),
+                    caller_id=caller.caller_id,
+                    caller_session_id=sessions[index % len(sessions)],
+                    caller_chat_text=caller_chat_text,
+                    response_chat_text=response_chat_text,
+                    inference_provider_type=InferenceProviderType.FAKE,
+                )
+                for index, (caller_chat_text, response_chat_text) in enumerate(
+                    texts[batch_start : batch_start + batch_size], batch_start
+                )
+            ]
+        )
+    write_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded = 0
+    for session_id in sessions:
+        loaded += len(
+            data_repository.load_session_chats(
+                caller.caller_id, session_id, 0, session_size
+            )
+        )
+    read_seconds = time.perf_counter() - start
+
+    with data_repository.engine.connect() as connection:
+        chat_table_bytes = connection.execute(
+            text("SELECT sum(pgsize) FROM dbstat WHERE name = 'chat'")
+        ).scalar()
+    data_repository.engine.dispose()
+    return {
+        "chat_table_megabytes": chat_table_bytes / 1e6,
+        "write_rows_per_second": len(texts) / write_seconds,
+        "read_rows_per_second": loaded / read_seconds,
+    }
+
+
+def measure_codec(texts: list[tuple[str, str]]) -> dict:
+    """Time compressing and decompressing answers with the configured compressor."""
+
+    compressor = text_compression.get_compressor()
+    answers = [response_chat_text for _, response_chat_text in texts]
+    start = time.perf_counter()
+    values = [compressor.compress(answer) for answer in answers]
+    compress_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for value in values:
+        compressor.decompress(value)
+    decompress_seconds = time.perf_counter() - start
+    text_bytes = sum(len(answer.encode()) for answer in answers)
+    stored_bytes = sum(
+        len(value) if isinstance(value, bytes) else len(value.encode())
+        for value in values
+    )
+    return {
+        "answer_compression_ratio": text_bytes / stored_bytes,
+        "compress_us_per_answer": compress_seconds / len(answers) * 1e6,
+        "decompress_us_per_answer": decompress_seconds / len(answers) * 1e6,
+    }
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Text compression benchmark")
+    parser.add_argument("--chats", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--session-size", type=int, default=20)
+    parser.add_argument("--threshold-bytes", type=int, default=256)
+    parser.add_argument("--dictionary-samples", type=int, default=10_000)
+    parser.add_argument(
+        "--dictionary-size", type=int, default=text_compression.DEFAULT_DICTIONARY_SIZE
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    texts = get_chat_texts(args.seed, args.chats)
+    average_bytes = sum(
+        len(caller_chat_text.encode()) + len(response_chat_text.encode())
+        for caller_chat_text, response_chat_text in texts
+    ) / len(texts)
+    # trained on texts other than the ones stored, as it would be in production
+    dictionary = text_compression.train_dictionary(
+        [
+            sample
+            for pair in get_chat_texts(args.seed + 1, args.dictionary_samples // 2)
+            for sample in pair
+        ],
+        args.dictionary_size,
+    )
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ("uncompressed", "zstd", "zstd_dictionary"):
+            configure_repository(directory, name)
+            data_repository = provider.PROVIDERS.data_repository
+            if name == "zstd_dictionary":
+                data_repository.save_zstd_dictionary(
+                    dictionary.dict_id(), dictionary.as_bytes()
+                )
+            text_compression.configure_text_compression(
+                (
+                    UNCOMPRESSED_THRESHOLD_BYTES
+                    if name == "uncompressed"
+                    else args.threshold_bytes
+                ),
+                data_repository.load_zstd_dictionaries,
+            )
+            results[name] = {
+                **measure_codec(texts),
+                **measure_storage(texts, args.batch_size, args.session_size),
+            }
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "arguments": vars(args),
+                "average_chat_text_bytes": average_bytes,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,96 @@
+""" Module for benchmarking tracing overhead per chat request. """
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from backend.api import tracing
+from backend.api.enum import TracingExporterType
+from backend.benchmarks.lib import configure_benchmark_logging
+
+SPANS = (
+    "decode_jwt",
+    "load_caller",
+    "process_chat",
+    "load_session_history",
+    "request_for_inference",
+    "save_chat",
+)
+
+
+async def chat_app(scope, receive, send) -> None:
+    """Asgi app opening the spans a chat request opens, with no work inside."""
+
+    for name in SPANS:
+        with tracing.start_span(name) as span:
+            span.set_attribute("stage", name)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def run_requests(app, requests: int) -> float:
+    """Run requests through app and return seconds taken."""
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/chat",
+        "headers": [(b"content-type", b"application/json")],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return time.perf_counter() - start
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Tracing overhead benchmark")
+    parser.add_argument("--requests", type=int, default=100_000)
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    # warm up before taking the untraced baseline
+    asyncio.run(run_requests(tracing.TracingMiddleware(chat_app), args.requests))
+    baseline = asyncio.run(run_requests(chat_app, args.requests))
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for exporter_type, sample_ratio in (
+            (TracingExporterType.NONE, 0.0),
+            (TracingExporterType.FILE, 0.01),
+            (TracingExporterType.FILE, 0.1),
+            (TracingExporterType.FILE, 1.0),
+            (TracingExporterType.IN_MEMORY, 1.0),
+        ):
+            tracing.configure_tracing(
+                exporter_type, sample_ratio, f"{directory}/traces.jsonl"
+            )
+            elapsed = asyncio.run(
+                run_requests(tracing.TracingMiddleware(chat_app), args.requests)
+            )
+            results.append(
+                {
+                    "exporter_type": exporter_type,
+                    "sample_ratio": sample_ratio,
+                    "overhead_microseconds_per_request": (elapsed - baseline)
+                    / args.requests
+                    * 1e6,
+                }
+            )
+        tracing.configure_tracing(TracingExporterType.NONE, 0.0)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    init()
@@ -0,0 +1,161 @@
+""" Module for benchmarking conversation api throughput by worker count. """
+
+import argparse
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from authlib.jose import JsonWebKey
+from sqlalchemy import create_engine
+
+from backend.api.sql_migrations.run import run_db_migrations
+from backend.benchmarks.lib import configure_benchmark_logging
+from backend.benchmarks.load_test import (
+    AUDIENCE,
+    ISSUER,
+    add_load_arguments,
+    get_arrival_times,
+    get_git_commit,
+    insert_callers,
+    run_load,
+    sign_tokens,
+    write_routing_rules,
+)
+
+
+def start_server(
+    workers: int, port: int, env: dict[str, str], *extra_args: str
+) -> subprocess.Popen:
+    """Start the conversation api as its own process and wait until it answers,
+    extra arguments override the defaults."""
+
+    process = spawn_server(workers, port, env, *extra_args)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1):
+                return process
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.01)
+    process.kill()
+    raise TimeoutError("conversation api did not start")
+
+
+def spawn_server(
+    workers: int, port: int, env: dict[str, str], *extra_args: str
+) -> subprocess.Popen:
+    """Start the conversation api as its own process without waiting for it."""
+
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "backend.api.conversation_api",
+            "--conversation-api-host",
+            "127.0.0.1",
+            "--conversation-api-port",
+            str(port),
+            "--conversation-api-workers",
+            str(workers),
+            "--inference-provider-type",
+            "fake",
+            "--run-db-migrations",
+            "false",
+            *extra_args,
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    """Stop the conversation api and every worker it forked."""
+
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def get_free_port() -> int:
+    """Get a free local port."""
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Worker scaling benchmark")
+    add_load_arguments(parser)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--inference-endpoint",
+        default="fake://?latency_ms=50&tokens_per_second=1000&output_tokens=32",
+        help="Fake inference provider endpoint, settings as query parameters",
+    )
+    parser.set_defaults(rate=400.0, duration_seconds=15.0)
+    args = parser.parse_args()
+    configure_benchmark_logging()
+
+    worker_counts = sorted(
+        {1, args.max_workers}
+        | {2**power for power in range(8)} & set(range(1, args.max_workers + 1))
+    )
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        connection_string = f"sqlite+pysqlite:///{directory}/worker_scaling.sqlite3"
+        run_db_migrations(connection_string, False)
+        idp_ids = insert_callers(create_engine(connection_string), args.callers)
+        key = JsonWebKey.generate_key("RSA", 2048, is_private=True)
+        tokens = sign_tokens(key, idp_ids)
+        rules_path = f"{directory}/inference_routing_rules.json"
+        write_routing_rules(rules_path, args.inference_endpoint)
+        env = os.environ | {
+            "AUTH0_PUBLIC_KEY": key.as_pem(is_private=False).decode(),
+            "AUTH0_ISSUER": ISSUER,
+            "AUTH0_AUDIENCE": AUDIENCE,
+            "SQLITE_CONNECTION_STRING": connection_string,
+            "INFERENCE_ROUTING_RULES_PATH": rules_path,
+        }
+
+        for workers in worker_counts:
+            port = get_free_port()
+            process = start_server(workers, port, env)
+            try:
+                report = run_load(
+                    f"http://127.0.0.1:{port}", tokens, args, get_arrival_times(args)
+                )
+            finally:
+                stop_server(process)
+            results.append({"workers": workers, **report})
+
+    print(
+        json.dumps(
+            {
+                "git_commit": get_git_commit(),
+                "python": platform.python_version(),
+                "cpu_count": os.cpu_count(),
+                "arguments": vars(args),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    init()
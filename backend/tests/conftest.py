@@ -0,0 +1,66 @@
+""" Module for test fixtures shared across test modules. """
+
+import dataclasses
+
+import pytest
+
+from backend.api import config, provider
+from backend.api.entities import Caller
+from backend.api.enum import InferenceProviderType
+from backend.api.lib import CLIArgs, EnvVars
+from backend.benchmarks.load_test import insert_callers, write_routing_rules
+
+# answers at once, so tests never wait on simulated inference
+INFERENCE_ENDPOINT = "fake://?time_scale=0"
+
+
+def configure_test_providers(
+    directory: str, inference_endpoint: str = INFERENCE_ENDPOINT, **config_values: any
+) -> provider.Providers:
+    """Configure providers against a temp sqlite database, every chat routed to the
+    fake inference provider configured by the endpoint. Background summaries and
+    caller facts are off unless turned on in the config values."""
+
+    rules_path = f"{directory}/inference_routing_rules.json"
+    write_routing_rules(rules_path, inference_endpoint)
+    values = dataclasses.asdict(EnvVars()) | dataclasses.asdict(CLIArgs())
+    values.update(
+        # no request is authenticated, tests call the api modules directly
+        auth0_public_key="",
+        auth0_issuer="",
+        auth0_audience="",
+        sqlite_connection_string=f"sqlite+pysqlite:///{directory}/test.sqlite3",
+        chat_archive_directory=f"{directory}/chat_archive",
+        inference_provider_type=InferenceProviderType.FAKE,
+        inference_routing_rules_path=rules_path,
+        async_logging=False,
+        session_summary_enabled=False,
+        caller_memory_enabled=False,
+    )
+    values.update(config_values)
+    config.CONFIG = config.Config(**values)
+    provider.configure_providers()
+    return provider.PROVIDERS
+
+
+def stop_test_providers(providers: provider.Providers) -> None:
+    """Stop the background threads of providers and close their database."""
+
+    providers.session_summarizer.shutdown()
+    providers.caller_memory.shutdown()
+    providers.data_repository.engine.dispose()
+
+
+@pytest.fixture
+def providers(tmp_path) -> provider.Providers:
+    providers = configure_test_providers(str(tmp_path))
+    yield providers
+    stop_test_providers(providers)
+
+
+@pytest.fixture
+def callers(providers) -> list[Caller]:
+    return [
+        providers.data_repository.load_caller(idp_id)
+        for idp_id in insert_callers(providers.data_repository.engine, 2)
+    ]
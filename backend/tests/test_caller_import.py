@@ -0,0 +1,88 @@
+""" Module for bulk caller import tests. """
+
+from backend.api.caller_import import CallerImport
+from backend.api.enum import CallerImportFormat
+
+
+def run_import(lines: list[str], chunk_size: int = 100) -> CallerImport:
+    caller_import = CallerImport(CallerImportFormat.CSV, chunk_size)
+    for line in ["name,idp_id,email", *lines]:
+        if caller_import.add_line(line.encode()):
+            caller_import.flush()
+    caller_import.flush()
+    return caller_import
+
+
+def get_errors(caller_import: CallerImport) -> list[tuple[int, str]]:
+    return [(error.line, error.error) for error in caller_import.report.errors]
+
+
+def test_import_inserts_new_callers_and_skips_unchanged_ones(providers):
+    lines = ["Ada,import|1,ada@example.com", "Ben,import|2,ben@example.com"]
+    first = run_import(lines)
+
+    second = run_import([lines[0], "Benjamin,import|2,ben@example.com"], chunk_size=1)
+
+    assert (first.report.upserted, first.report.unchanged) == (2, 0)
+    assert (second.report.upserted, second.report.unchanged) == (1, 1)
+    caller = providers.data_repository.load_caller("import|2")
+    assert (caller.name, caller.email) == ("Benjamin", "ben@example.com")
+
+
+def test_later_rows_win_for_the_same_idp_id(providers):
+    caller_import = run_import(
+        ["Ada,import|1,ada@example.com", "Ada Lovelace,import|1,ada@example.com"]
+    )
+
+    assert caller_import.report.upserted == 1
+    # the superseded row is never written
+    assert caller_import.report.unchanged == 1
+    assert providers.data_repository.load_caller("import|1").name == "Ada Lovelace"
+
+
+def test_email_duplicated_in_a_chunk_is_rejected(providers):
+    caller_import = run_import(
+        ["Ada,import|1,shared@example.com", "Ben,import|2,shared@example.com"]
+    )
+
+    assert caller_import.report.upserted == 1
+    assert get_errors(caller_import) == [(3, "email duplicated in input")]
+    assert providers.data_repository.load_caller("import|2") is None
+
+
+def test_email_of_another_saved_caller_is_rejected(providers, callers):
+    caller_import = run_import(
+        [
+            f"Ada,import|1,{callers[0].email}",
+            "Ben,import|2,ben@example.com",
+            "bad line",
+        ]
+    )
+
+    assert caller_import.report.rows == 3
+    assert caller_import.report.upserted == 1
+    assert caller_import.report.rejected == 2
+    assert get_errors(caller_import) == [
+        (4, "unable to parse line - expected 3 values, got 1"),
+        (2, "email belongs to another caller"),
+    ]
+    assert providers.data_repository.load_caller("import|1") is None
+    assert providers.data_repository.load_caller("import|2") is not None
+
+
+def test_upsert_callers_skips_callers_taking_another_callers_email(providers, callers):
+    upserted, conflicting_idp_ids = providers.data_repository.upsert_callers(
+        [
+            # a caller may keep its own email
+            {"name": "Renamed", "idp_id": callers[0].idp_id, "email": callers[0].email},
+            {"name": "Taken", "idp_id": callers[1].idp_id, "email": callers[0].email},
+        ]
+    )
+
+    assert upserted == 1
+    assert conflicting_idp_ids == {callers[1].idp_id}
+    assert providers.data_repository.load_caller(callers[0].idp_id).name == "Renamed"
+    assert (
+        providers.data_repository.load_caller(callers[1].idp_id).email
+        == callers[1].email
+    )
@@ -0,0 +1,144 @@
+""" Module for caller memory tests. """
+
+from uuid import uuid4
+
+import pytest
+
+from backend.api.caller_memory import CallerMemory, get_fact_key
+from backend.api.entities import CallerFact
+from backend.api.enum import InferenceTier
+
+
+class Extractions:
+    """Class for inference answering fact extractions with the lines queued."""
+
+    def __init__(self):
+        self.responses = []
+
+    def __call__(self, job_id, content_file_urls, prompt_text, **kwargs):
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def extractions(providers, monkeypatch) -> Extractions:
+    extractions = Extractions()
+    wrapper = providers.inference_router.get_wrapper(InferenceTier.SMALL)
+    monkeypatch.setattr(wrapper, "request_for_inference", extractions)
+    return extractions
+
+
+@pytest.fixture
+def caller_memory(providers) -> CallerMemory:
+    caller_memory = CallerMemory(
+        providers.data_repository,
+        providers.inference_router,
+        providers.prompt_template_registry,
+        lambda: providers.shared_store,
+        "caller_fact_extraction",
+        top_k=5,
+        min_score=0.1,
+        duplicate_score=0.9,
+        max_facts=3,
+        dimensions=256,
+        cache_size=8,
+        parallelism=1,
+    )
+    yield caller_memory
+    caller_memory.shutdown()
+
+
+def extract(caller_memory, extractions, caller, response_text: str) -> int:
+    extractions.responses.append(response_text)
+    return caller_memory.extract(caller.caller_id, [(uuid4(), "A question")])
+
+
+def load_fact_texts(providers, caller) -> list[str]:
+    return sorted(
+        caller_fact.fact_text
+        for caller_fact in providers.data_repository.load_caller_facts(
+            caller.caller_id, 10
+        )
+    )
+
+
+def test_facts_are_saved_once(providers, callers, caller_memory, extractions):
+    caller = callers[0]
+
+    first = extract(
+        caller_memory,
+        extractions,
+        caller,
+        "- Lives in Sydney.\n- Rents a flat.\n- lives in sydney\n- None",
+    )
+    # repeated word for word bar case and punctuation, or by every word that is
+    # not a stop word
+    second = extract(
+        caller_memory,
+        extractions,
+        caller,
+        "1. LIVES IN SYDNEY!\n2. They rent a flat.\n3. The client rents a flat.",
+    )
+
+    assert (first, second) == (2, 1)
+    assert load_fact_texts(providers, caller) == [
+        "Lives in Sydney.",
+        "Rents a flat.",
+        "They rent a flat.",
+    ]
+
+
+def test_facts_are_kept_per_caller(providers, callers, caller_memory, extractions):
+    for caller in callers:
+        extract(caller_memory, extractions, caller, "- Lives in Sydney.")
+
+    assert [load_fact_texts(providers, caller) for caller in callers] == [
+        ["Lives in Sydney."],
+        ["Lives in Sydney."],
+    ]
+
+
+def test_facts_seen_again_are_kept_over_older_ones(
+    providers, callers, caller_memory, extractions
+):
+    caller = callers[0]
+    extract(caller_memory, extractions, caller, "- Lives in Sydney.\n- Rents a flat.")
+    extract(caller_memory, extractions, caller, "- Works as a nurse.")
+
+    extract(caller_memory, extractions, caller, "- Lives in Sydney.\n- Has two dogs.")
+
+    # at most three facts are kept, those not seen for longest are forgotten
+    assert load_fact_texts(providers, caller) == [
+        "Has two dogs.",
+        "Lives in Sydney.",
+        "Works as a nurse.",
+    ]
+
+
+def test_fact_saved_by_another_worker_is_not_repeated(providers, callers):
+    caller_id = callers[0].caller_id
+
+    for _ in range(2):
+        providers.data_repository.upsert_caller_facts(
+            caller_id,
+            [
+                CallerFact(
+                    fact_key=get_fact_key("Lives in Sydney."),
+                    fact_text="Lives in Sydney.",
+                )
+            ],
+            set(),
+            10,
+        )
+
+    assert load_fact_texts(providers, callers[0]) == ["Lives in Sydney."]
+
+
+def test_retrieve_finds_the_facts_relevant_to_a_question(
+    callers, caller_memory, extractions
+):
+    caller = callers[0]
+    extract(caller_memory, extractions, caller, "- Lives in Sydney.\n- Has two dogs.")
+
+    facts = caller_memory.retrieve(caller.caller_id, "Can my dogs stay in the flat?")
+
+    assert [caller_fact.fact_text for caller_fact in facts] == ["Has two dogs."]
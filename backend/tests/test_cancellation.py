@@ -0,0 +1,46 @@
+""" Module for cancellation tests. """
+
+import pytest
+
+from backend.api.cancellation import Cancellation, ChatCancelledError
+from backend.api.enum import CancellationReason
+
+
+def test_first_reason_is_kept():
+    cancellation = Cancellation()
+
+    cancellation.cancel(CancellationReason.CLIENT_DISCONNECTED)
+    cancellation.cancel(CancellationReason.SERVER_SHUTDOWN)
+
+    with pytest.raises(ChatCancelledError) as error:
+        cancellation.check()
+    assert error.value.reason == CancellationReason.CLIENT_DISCONNECTED
+
+
+def test_deadline_cancels_once_passed():
+    assert Cancellation.after(0).is_cancelled()
+    assert not Cancellation.after(60).is_cancelled()
+    assert Cancellation().get_remaining_seconds() is None
+
+
+def test_callbacks_are_called_once_on_cancel():
+    cancellation = Cancellation()
+    calls = []
+    cancellation.add_callback(lambda: calls.append("kept"))
+    remove = cancellation.add_callback(lambda: calls.append("removed"))
+
+    remove()
+    cancellation.cancel(CancellationReason.CLIENT_DISCONNECTED)
+    cancellation.cancel(CancellationReason.CLIENT_DISCONNECTED)
+
+    assert calls == ["kept"]
+
+
+def test_callback_added_once_cancelled_is_called_at_once():
+    cancellation = Cancellation()
+    cancellation.cancel(CancellationReason.SERVER_SHUTDOWN)
+    calls = []
+
+    cancellation.add_callback(lambda: calls.append("called"))
+
+    assert calls == ["called"]
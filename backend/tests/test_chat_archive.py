@@ -0,0 +1,109 @@
+""" Module for chat archive tests. """
+
+from datetime import timedelta
+from uuid import uuid4
+
+from sqlalchemy.orm import Session
+
+from backend.api import chat_archive
+from backend.api.entities import Chat
+from backend.api.enum import (
+    AttachmentType,
+    ChatSearchOrder,
+    ChatStatus,
+    InferenceProviderType,
+)
+from backend.api.lib import now_utc
+
+
+def save_chat(
+    data_repository, caller, caller_chat_text, response_chat_text, age_days: float
+) -> Chat:
+    chat = Chat(
+        chat_id=uuid4(),
+        caller_id=caller.caller_id,
+        caller_session_id="session-0",
+        caller_chat_text=caller_chat_text,
+        caller_attachment_type=AttachmentType.TEXT_FILE,
+        caller_attachment_bytes=caller_chat_text.encode(),
+        inference_provider_type=InferenceProviderType.FAKE,
+        response_chat_text=response_chat_text,
+        status=(
+            ChatStatus.COMPLETED
+            if response_chat_text is not None
+            else ChatStatus.CANCELLED
+        ),
+        first_created=now_utc() - timedelta(days=age_days),
+    )
+    data_repository.save_chat(chat)
+    return chat
+
+
+def load_session_texts(data_repository, caller) -> list[tuple[str, str]]:
+    return [
+        (chat.caller_chat_text, chat.response_chat_text)
+        for chat in data_repository.load_session_chats(
+            caller.caller_id, "session-0", 0, 10
+        )
+    ]
+
+
+def search(data_repository, caller, query: str) -> list:
+    return [
+        result.chat_id
+        for result in data_repository.search_chats(
+            caller.caller_id, query, ChatSearchOrder.RECENT, 0, 10
+        )
+    ]
+
+
+def test_archived_chats_load_back_as_they_were(providers, callers):
+    data_repository = providers.data_repository
+    for caller in callers:
+        for index in range(3):
+            save_chat(
+                data_repository, caller, f"Old bond {index}", f"Answer {index}", 400
+            )
+        save_chat(data_repository, caller, "Old cancelled", None, 400)
+        save_chat(data_repository, caller, "New bond", "New answer", 1)
+    before = [load_session_texts(data_repository, caller) for caller in callers]
+
+    archived = chat_archive.archive_chats(max_age_days=365, batch_size=2)
+
+    assert archived == 8
+    assert [load_session_texts(data_repository, caller) for caller in callers] == (
+        before
+    )
+    with Session(data_repository.engine) as session:
+        chats = session.query(Chat).filter(Chat.archive_path.is_not(None)).all()
+        # the stub row keeps only what history and caching need
+        assert {
+            (chat.caller_chat_text, chat.response_chat_text, chat.status)
+            for chat in chats
+        } == {("", "", ChatStatus.COMPLETED), ("", None, ChatStatus.CANCELLED)}
+        assert {chat.caller_attachment_bytes for chat in chats} == {None}
+        data_repository.chat_archive_store.load(chats)
+    assert sorted(chat.caller_attachment_bytes for chat in chats) == sorted(
+        f"Old {text}".encode()
+        for text in ("bond 0", "bond 1", "bond 2", "cancelled") * 2
+    )
+
+
+def test_archiving_again_skips_archived_chats(providers, callers):
+    save_chat(providers.data_repository, callers[0], "Old bond", "Answer", 400)
+
+    assert chat_archive.archive_chats(max_age_days=365) == 1
+    assert chat_archive.archive_chats(max_age_days=365) == 0
+
+
+def test_unindexed_archived_chats_are_no_longer_found(providers, callers):
+    data_repository = providers.data_repository
+    save_chat(data_repository, callers[0], "Old bond", "Answer", 400)
+    new = save_chat(data_repository, callers[0], "New bond", "Answer", 1)
+    chat_archive.archive_chats(max_age_days=365)
+
+    # archived chats are found by search until they are unindexed
+    assert len(search(data_repository, callers[0], "bond")) == 2
+    assert data_repository.unindex_archived_chats(batch_size=1) == 1
+    assert search(data_repository, callers[0], "bond") == [new.chat_id]
+    assert data_repository.unindex_archived_chats(batch_size=1) == 0
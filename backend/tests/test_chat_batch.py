@@ -0,0 +1,142 @@
+""" Module for chat batch tests. """
+
+import asyncio
+import json
+
+import pytest
+
+from backend.api.chat_batch import run_chat_batch, start_chat_batch
+from backend.api.enum import ChatBatchStatus, InferenceTier
+from backend.api.inference_provider_wrappers.fake_wrapper import FakeInferenceError
+
+
+class FlakyBatches:
+    """Class for inference batch requests failing for prompts holding a marker,
+    and recording the chat texts of every prompt sent."""
+
+    def __init__(self, request_for_inference_batch):
+        self.request_for_inference_batch = request_for_inference_batch
+        self.failing_marker = None
+        self.short_reply = False
+        self.prompt_texts = []
+
+    def __call__(self, job_ids, prompt_texts, affinity_key=None):
+        self.prompt_texts.extend(prompt_texts)
+        if self.failing_marker and any(
+            self.failing_marker in prompt_text for prompt_text in prompt_texts
+        ):
+            raise FakeInferenceError("Simulated inference failure")
+        responses = self.request_for_inference_batch(
+            job_ids, prompt_texts, affinity_key
+        )
+        return responses[:-1] if self.short_reply else responses
+
+
+@pytest.fixture
+def flaky_batches(providers, monkeypatch) -> FlakyBatches:
+    wrapper = providers.inference_router.get_wrapper(InferenceTier.LARGE)
+    flaky_batches = FlakyBatches(wrapper.request_for_inference_batch)
+    monkeypatch.setattr(wrapper, "request_for_inference_batch", flaky_batches)
+    return flaky_batches
+
+
+def get_body(texts: list[str]) -> bytes:
+    return "".join(
+        json.dumps(
+            {
+                "caller_session_id": f"document-{index}",
+                "caller_chat_text": text,
+                "caller_attachment_type": None,
+            }
+        )
+        + "\n"
+        for index, text in enumerate(texts)
+    ).encode()
+
+
+def run_batch(caller, chat_batch, body: bytes, micro_batch_size: int = 1):
+    async def chunks():
+        # split mid line, as a request body arrives
+        yield body[:50]
+        yield body[50:]
+
+    async def collect() -> list[dict]:
+        return [
+            json.loads(line)
+            async for line in run_chat_batch(
+                chunks(), caller, chat_batch, 2, micro_batch_size
+            )
+        ]
+
+    return sorted(asyncio.run(collect()), key=lambda result: result["index"])
+
+
+def test_resumed_batch_only_sends_unanswered_items(callers, flaky_batches):
+    caller = callers[0]
+    texts = ["First clause", "Second clause", "Flaky clause", "Fourth clause"]
+    body = get_body(texts) + b"\n\n"
+    flaky_batches.failing_marker = "Flaky"
+    chat_batch = start_chat_batch(caller)
+
+    first = run_batch(caller, chat_batch, body)
+
+    assert chat_batch.status == ChatBatchStatus.INCOMPLETE
+    assert (chat_batch.item_count, chat_batch.failed_item_count) == (4, 1)
+    assert [result["index"] for result in first] == [0, 1, 2, 3]
+    assert first[2] == {"index": 2, "error": "Simulated inference failure"}
+
+    flaky_batches.failing_marker = None
+    flaky_batches.prompt_texts.clear()
+    resumed_chat_batch = start_chat_batch(caller, chat_batch.chat_batch_id)
+    second = run_batch(caller, resumed_chat_batch, body)
+
+    assert resumed_chat_batch.status == ChatBatchStatus.COMPLETED
+    assert (resumed_chat_batch.item_count, resumed_chat_batch.failed_item_count) == (
+        4,
+        0,
+    )
+    assert len(flaky_batches.prompt_texts) == 1
+    assert "Flaky clause" in flaky_batches.prompt_texts[0]
+    # answers of the first run are given again rather than asked for again
+    for index in (0, 1, 3):
+        assert second[index] == first[index]
+    assert second[2]["caller_session_id"] == "document-2"
+    assert second[2]["response_chat_text"]
+
+
+def test_batch_of_another_caller_is_not_resumed(callers):
+    chat_batch = start_chat_batch(callers[0])
+
+    assert start_chat_batch(callers[1], chat_batch.chat_batch_id) is None
+
+
+def test_invalid_items_are_reported_without_stopping_the_batch(callers):
+    caller = callers[0]
+    body = get_body(["First clause"]) + b'{"caller_session_id": 1}\n'
+    chat_batch = start_chat_batch(caller)
+
+    results = run_batch(caller, chat_batch, body)
+
+    assert results[0]["response_chat_text"]
+    assert results[1]["index"] == 1
+    assert "caller_attachment_type" in results[1]["error"]
+    assert chat_batch.status == ChatBatchStatus.INCOMPLETE
+
+
+def test_short_inference_batch_reply_fails_every_item_of_it(callers, flaky_batches):
+    caller = callers[0]
+    flaky_batches.short_reply = True
+    chat_batch = start_chat_batch(caller)
+
+    results = run_batch(
+        caller, chat_batch, get_body(["First clause", "Second clause"]), 2
+    )
+
+    assert results == [
+        {
+            "index": index,
+            "error": "expected 2 responses from inference batch, got 1",
+        }
+        for index in (0, 1)
+    ]
+    assert chat_batch.failed_item_count == 2
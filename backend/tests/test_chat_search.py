@@ -0,0 +1,91 @@
+""" Module for chat search tests. """
+
+from uuid import uuid4
+
+from backend.api.entities import Chat
+from backend.api.enum import ChatSearchOrder, ChatStatus, InferenceProviderType
+
+RELEVANCE = ChatSearchOrder.RELEVANCE
+RECENT = ChatSearchOrder.RECENT
+
+
+def save_chat(data_repository, caller, caller_chat_text, response_chat_text) -> Chat:
+    chat = Chat(
+        chat_id=uuid4(),
+        caller_id=caller.caller_id,
+        caller_session_id="session-0",
+        caller_chat_text=caller_chat_text,
+        inference_provider_type=InferenceProviderType.FAKE,
+        response_chat_text=response_chat_text,
+        status=(
+            ChatStatus.COMPLETED
+            if response_chat_text is not None
+            else ChatStatus.CANCELLED
+        ),
+    )
+    data_repository.save_chat(chat)
+    return chat
+
+
+def search(data_repository, caller, query: str, order=RELEVANCE) -> list:
+    return [
+        result.chat_id
+        for result in data_repository.search_chats(
+            caller.caller_id, query, order, 0, 10
+        )
+    ]
+
+
+def test_search_only_finds_chats_of_the_caller(providers, callers):
+    data_repository = providers.data_repository
+    own = save_chat(data_repository, callers[0], "My landlord kept my bond", "Apply")
+    save_chat(data_repository, callers[1], "My landlord kept my bond", "Apply")
+
+    assert search(data_repository, callers[0], "landlord bond") == [own.chat_id]
+
+
+def test_search_matches_every_term_in_question_or_answer(providers, callers):
+    data_repository = providers.data_repository
+    chat = save_chat(
+        data_repository, callers[0], "My landlord kept my bond", "Apply to the tribunal"
+    )
+    save_chat(data_repository, callers[0], "My landlord raised the rent", "Negotiate")
+
+    assert search(data_repository, callers[0], "bond tribunal") == [chat.chat_id]
+    assert search(data_repository, callers[0], "bond fence") == []
+
+
+def test_search_syntax_in_queries_is_matched_as_words(providers, callers):
+    data_repository = providers.data_repository
+    chat = save_chat(data_repository, callers[0], "My landlord kept my bond", "Apply")
+    other = callers[1].caller_id.hex
+
+    # none of these is read as fts5 syntax, which would fail or widen the match
+    assert search(data_repository, callers[0], 'bond* "landlord') == [chat.chat_id]
+    assert search(data_repository, callers[0], "bond OR fence") == []
+    assert search(data_repository, callers[0], "NEAR(bond landlord)") == []
+    assert search(data_repository, callers[0], f"caller_key : {other}") == []
+    assert search(data_repository, callers[0], '"*" ( -') == []
+
+
+def test_cancelled_chats_are_not_found(providers, callers):
+    data_repository = providers.data_repository
+    save_chat(data_repository, callers[0], "My landlord kept my bond", None)
+
+    assert search(data_repository, callers[0], "landlord") == []
+
+
+def test_recent_order_finds_newest_first(providers, callers):
+    data_repository = providers.data_repository
+    chat_ids = [
+        save_chat(
+            data_repository, callers[0], f"Bond question {index}", "Apply"
+        ).chat_id
+        for index in range(3)
+    ]
+
+    assert search(data_repository, callers[0], "bond", RECENT) == chat_ids[::-1]
+    results = data_repository.search_chats(callers[0].caller_id, "bond", RECENT, 1, 1)
+    assert [result.chat_id for result in results] == [chat_ids[1]]
+    assert results[0].rank is None
+    assert results[0].snippet == "**Bond** question 1"
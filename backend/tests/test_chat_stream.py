@@ -0,0 +1,109 @@
+""" Module for streamed chat tests, against the api served on a local port. """
+
+import json
+import logging
+import time
+import urllib.request
+from uuid import UUID
+
+import pytest
+from sqlalchemy.orm import Session
+
+from backend.api import provider
+from backend.api.entities import Chat
+from backend.api.enum import ChatStatus
+from backend.benchmarks.load_test import start_conversation_api
+
+# decodes fifty tokens a second, so a whole answer takes two seconds
+SLOW_INFERENCE_ENDPOINT = (
+    "fake://?latency_distribution=constant&latency_ms=0&tokens_per_second=50"
+    "&output_tokens=100&batch_cost=0"
+)
+
+
+class RecordingHandler(logging.Handler):
+    """Class for logging handler keeping the records it is given."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def conversation_api(tmp_path):
+    api = start_conversation_api(
+        str(tmp_path),
+        1,
+        SLOW_INFERENCE_ENDPOINT,
+        session_summary_enabled=False,
+        caller_memory_enabled=False,
+    )
+    errors = RecordingHandler()
+    logging.getLogger("uvicorn.error").addHandler(errors)
+    api.errors = errors.records
+    yield api
+    logging.getLogger("uvicorn.error").removeHandler(errors)
+    api.stop()
+    provider.PROVIDERS.data_repository.engine.dispose()
+
+
+def post_chat_stream(api, headers: dict) -> tuple[int, str, UUID]:
+    request = urllib.request.Request(
+        f"{api.url}/chat/stream",
+        data=json.dumps(
+            {
+                "caller_session_id": "session-0",
+                "caller_chat_text": "My landlord kept my bond.",
+                "caller_attachment_type": None,
+            }
+        ).encode(),
+        headers={
+            "Authorization": f"Bearer {api.tokens[0]}",
+            "Content-Type": "application/json",
+            **headers,
+        },
+        method="POST",
+    )
+    # reading raises incomplete read should the body be broken off
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return (
+            response.status,
+            response.read().decode(),
+            UUID(response.headers["x-chat-id"]),
+        )
+
+
+def load_chat(chat_id: UUID) -> Chat:
+    with Session(provider.PROVIDERS.data_repository.engine) as session:
+        return session.get(Chat, chat_id)
+
+
+def test_stream_past_its_deadline_ends_early(conversation_api):
+    start = time.perf_counter()
+
+    status, body, chat_id = post_chat_stream(
+        conversation_api, {"x-deadline-seconds": "0.5"}
+    )
+
+    assert status == 200
+    assert time.perf_counter() - start < 1.5
+    assert 0 < len(body.split()) < 100
+    chat = load_chat(chat_id)
+    assert chat.status == ChatStatus.CANCELLED
+    assert chat.response_chat_text is None
+    assert conversation_api.errors == []
+
+
+def test_stream_within_its_deadline_saves_the_chat(conversation_api):
+    status, body, chat_id = post_chat_stream(
+        conversation_api, {"x-deadline-seconds": "30"}
+    )
+
+    assert status == 200
+    assert len(body.split()) == 100
+    chat = load_chat(chat_id)
+    assert chat.status == ChatStatus.COMPLETED
+    assert chat.response_chat_text == body
@@ -0,0 +1,138 @@
+""" Module for inference router tests. """
+
+import json
+import os
+import time
+
+import pytest
+
+from backend.api.entities import ChatInputModel
+from backend.api.enum import AttachmentType, InferenceProviderType, InferenceTier
+from backend.api.inference_router import InferenceRouter
+
+FAKE = InferenceProviderType.FAKE
+SMALL = InferenceTier.SMALL
+LARGE = InferenceTier.LARGE
+
+
+class WrapperFactory:
+    """Class for wrapper factory recording the endpoint of each wrapper built."""
+
+    def __init__(self):
+        self.endpoints = []
+        self.failing_endpoints = set()
+
+    def __call__(self, inference_provider_type, endpoint, model_name):
+        if endpoint in self.failing_endpoints:
+            raise ValueError(f"unable to build wrapper - {endpoint}")
+        self.endpoints.append(endpoint)
+        return endpoint
+
+
+def write_rules(path, rules, mtime_ns: int) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(rules, file)
+    # set apart, so each write is seen as a change however quickly they follow
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def get_rules(small_endpoint: str = "fake://small") -> dict:
+    return {
+        "tiers": {
+            SMALL: {"inference_provider_type": FAKE, "endpoint": small_endpoint},
+            LARGE: {"inference_provider_type": FAKE, "endpoint": "fake://large"},
+        },
+        "rules": [
+            {
+                "tier": SMALL,
+                "max_text_length": 20,
+                "attachment_types": [AttachmentType.TEXT_FILE],
+                "max_session_depth": 2,
+            }
+        ],
+        "reload_interval_seconds": 60.0,
+    }
+
+
+def get_chat_input(text: str, attachment_type: AttachmentType = None):
+    return ChatInputModel(
+        caller_chat_text=text,
+        caller_attachment_type=attachment_type,
+        caller_attachment_bytes=b"attached" if attachment_type else None,
+    )
+
+
+@pytest.fixture
+def rules_path(tmp_path) -> str:
+    path = str(tmp_path / "inference_routing_rules.json")
+    write_rules(path, get_rules(), 1_000_000_000)
+    return path
+
+
+def test_chats_are_routed_by_the_first_matching_rule(rules_path):
+    router = InferenceRouter(rules_path, FAKE, WrapperFactory())
+
+    assert router.classify(get_chat_input("short question"), 0) == SMALL
+    assert router.classify(get_chat_input("a question well past the limit"), 0) == LARGE
+    assert router.classify(get_chat_input("short question"), 3) == LARGE
+    assert (
+        router.classify(get_chat_input("short", AttachmentType.TEXT_FILE), 0) == SMALL
+    )
+    assert router.classify(get_chat_input("short", AttachmentType.PDF_FILE), 0) == LARGE
+    assert router.get_wrapper(SMALL) == "fake://small"
+
+
+def test_missing_rules_file_routes_every_chat_to_the_default_provider(tmp_path):
+    router = InferenceRouter(str(tmp_path / "missing.json"), FAKE, WrapperFactory())
+
+    assert router.classify(get_chat_input("short question"), 0) == LARGE
+    assert router.get_tier_config(SMALL).inference_provider_type == FAKE
+
+
+def test_reload_rebuilds_only_changed_tiers(rules_path):
+    factory = WrapperFactory()
+    router = InferenceRouter(rules_path, FAKE, factory)
+    large_wrapper = router.get_wrapper(LARGE)
+
+    write_rules(rules_path, get_rules("fake://small-2"), 2_000_000_000)
+    router.reload()
+
+    assert factory.endpoints == ["fake://small", "fake://large", "fake://small-2"]
+    assert router.get_wrapper(SMALL) == "fake://small-2"
+    assert router.get_wrapper(LARGE) is large_wrapper
+
+
+def test_malformed_rules_file_keeps_the_last_good_policy(rules_path):
+    router = InferenceRouter(rules_path, FAKE, WrapperFactory())
+
+    # a list is valid json but not a routing policy
+    write_rules(rules_path, [get_rules()], 2_000_000_000)
+    router._next_reload_check = 0.0
+    tier = router.classify(get_chat_input("short question"), 0)
+
+    assert tier == SMALL
+    assert router.get_wrapper(SMALL) == "fake://small"
+    # the bad file is read again only once the reload interval has passed
+    assert router._next_reload_check > time.monotonic() + 50
+
+
+def test_failing_wrapper_keeps_the_last_good_policy(rules_path):
+    factory = WrapperFactory()
+    factory.failing_endpoints.add("fake://broken")
+    router = InferenceRouter(rules_path, FAKE, factory)
+
+    write_rules(rules_path, get_rules("fake://broken"), 2_000_000_000)
+    router._next_reload_check = 0.0
+    tier = router.classify(get_chat_input("short question"), 0)
+
+    assert tier == SMALL
+    assert router.get_wrapper(SMALL) == "fake://small"
+    assert router._next_reload_check > time.monotonic() + 50
+
+
+def test_malformed_rules_file_fails_the_first_load(tmp_path):
+    path = str(tmp_path / "inference_routing_rules.json")
+    write_rules(path, {"tiers": {}, "default_tier": LARGE}, 1_000_000_000)
+
+    with pytest.raises(ValueError):
+        InferenceRouter(path, FAKE, WrapperFactory())
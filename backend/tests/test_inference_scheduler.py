@@ -0,0 +1,136 @@
+""" Module for inference scheduler tests. """
+
+import contextlib
+import threading
+import time
+
+import pytest
+
+from backend.api.cancellation import Cancellation, ChatCancelledError
+from backend.api.enum import CancellationReason, InferencePriority, InferenceTier
+from backend.api.inference_scheduler import InferenceScheduler
+
+INTERACTIVE = InferencePriority.INTERACTIVE
+BULK = InferencePriority.BULK
+
+
+class QueuedAcquire:
+    """Class for an acquire made on another thread, held until released."""
+
+    def __init__(self, scheduler: InferenceScheduler, priority, slots: int = 1):
+        self.granted = None
+        self._granted = threading.Event()
+        self._release = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(scheduler, priority, slots), daemon=True
+        )
+        # returns once the acquire is queued or granted, so requests queue in the
+        # order they are made
+        queued = len(scheduler._queues[priority])
+        self._thread.start()
+        wait_until(
+            lambda: self._granted.is_set() or len(scheduler._queues[priority]) > queued
+        )
+
+    def is_granted(self) -> bool:
+        return self._granted.is_set()
+
+    def wait_granted(self, timeout_seconds: float = 2.0) -> int:
+        assert self._granted.wait(timeout_seconds), "acquire was never granted"
+        return self.granted
+
+    def release(self) -> None:
+        self._release.set()
+        self._thread.join(2.0)
+
+    def _run(self, scheduler, priority, slots) -> None:
+        with scheduler.acquire(priority, slots) as granted:
+            self.granted = granted
+            self._granted.set()
+            self._release.wait()
+
+
+def wait_until(condition, timeout_seconds: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout_seconds
+    while not condition():
+        assert time.monotonic() < deadline, "condition never held"
+        time.sleep(0.001)
+
+
+def test_unlimited_admits_every_slot_at_once():
+    scheduler = InferenceScheduler(InferenceTier.LARGE)
+
+    with scheduler.acquire(BULK, 100) as granted:
+        assert granted == 100
+
+
+def test_reserved_slots_are_never_granted_to_bulk():
+    scheduler = InferenceScheduler(InferenceTier.LARGE, 4, 1)
+
+    with contextlib.ExitStack() as stack:
+        assert stack.enter_context(scheduler.acquire(BULK, 10)) == 3
+        queued = QueuedAcquire(scheduler, BULK)
+        assert not queued.is_granted()
+        # the reserved slot is still free for an interactive request
+        assert stack.enter_context(scheduler.acquire(INTERACTIVE)) == 1
+        assert not queued.is_granted()
+    assert queued.wait_granted() == 1
+    queued.release()
+
+
+def test_interactive_is_admitted_ahead_of_queued_bulk():
+    scheduler = InferenceScheduler(InferenceTier.LARGE, 2, 0, 60.0)
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(scheduler.acquire(INTERACTIVE, 2))
+        bulk = QueuedAcquire(scheduler, BULK)
+        interactive = QueuedAcquire(scheduler, INTERACTIVE)
+    assert interactive.wait_granted() == 1
+    assert bulk.wait_granted() == 1
+    interactive.release()
+    bulk.release()
+
+
+def test_aged_bulk_is_admitted_ahead_of_interactive():
+    scheduler = InferenceScheduler(InferenceTier.LARGE, 2, 1, 0.05)
+
+    with contextlib.ExitStack() as stack:
+        holding = stack.enter_context(contextlib.ExitStack())
+        holding.enter_context(scheduler.acquire(INTERACTIVE))
+        stack.enter_context(scheduler.acquire(INTERACTIVE))
+        bulk = QueuedAcquire(scheduler, BULK)
+        interactive = QueuedAcquire(scheduler, INTERACTIVE)
+        time.sleep(0.1)
+        holding.close()
+        assert bulk.wait_granted() == 1
+        assert not interactive.is_granted()
+        bulk.release()
+        assert interactive.wait_granted() == 1
+        interactive.release()
+
+
+def test_bulk_is_granted_at_most_the_free_unreserved_slots():
+    scheduler = InferenceScheduler(InferenceTier.LARGE, 4, 1)
+
+    with scheduler.acquire(INTERACTIVE):
+        with scheduler.acquire(BULK, 8) as granted:
+            assert granted == 3
+        with scheduler.acquire(BULK, 5) as granted:
+            assert granted == 3
+
+
+def test_cancellation_while_queued_releases_nothing():
+    scheduler = InferenceScheduler(InferenceTier.LARGE, 1)
+
+    with scheduler.acquire(INTERACTIVE):
+        cancellation = Cancellation.after(0.05)
+        with pytest.raises(ChatCancelledError) as error:
+            with scheduler.acquire(INTERACTIVE, cancellation=cancellation):
+                pytest.fail("cancelled acquire was granted")
+        assert error.value.reason == CancellationReason.DEADLINE_EXCEEDED
+        assert scheduler._in_flight == {INTERACTIVE: 1, BULK: 0}
+        assert not any(scheduler._queues.values())
+
+    assert scheduler._in_flight == {INTERACTIVE: 0, BULK: 0}
+    with scheduler.acquire(INTERACTIVE) as granted:
+        assert granted == 1
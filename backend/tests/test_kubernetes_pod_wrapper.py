@@ -0,0 +1,51 @@
+""" Module for kubernetes pod wrapper tests. """
+
+from backend.api.inference_provider_wrappers.kubernetes_pod_wrapper import (
+    ConsistentHashRing,
+    KubernetesPodWrapper,
+)
+
+PODS = [f"http://pod-{index}:8000" for index in range(5)]
+KEYS = [f"caller-{index}/session" for index in range(2000)]
+
+
+def test_get_nodes_yields_every_node_once():
+    ring = ConsistentHashRing(PODS)
+
+    for key in KEYS[:50]:
+        nodes = list(ring.get_nodes(key))
+        assert sorted(nodes) == sorted(PODS)
+
+
+def test_get_nodes_is_stable_across_rings():
+    first = ConsistentHashRing(PODS)
+    second = ConsistentHashRing(list(reversed(PODS)))
+
+    for key in KEYS[:200]:
+        assert list(first.get_nodes(key)) == list(second.get_nodes(key))
+
+
+def test_removing_a_node_only_moves_its_own_keys():
+    ring = ConsistentHashRing(PODS)
+    removed = PODS[2]
+    smaller = ConsistentHashRing([pod for pod in PODS if pod != removed])
+
+    moved = 0
+    for key in KEYS:
+        nodes = list(ring.get_nodes(key))
+        # a key moves to the next node it would have failed over to
+        assert next(smaller.get_nodes(key)) == next(
+            node for node in nodes if node != removed
+        )
+        moved += nodes[0] == removed
+    # virtual nodes spread each node's share of keys evenly
+    assert 0.1 < moved / len(KEYS) < 0.3
+
+
+def test_unhealthy_pods_are_tried_last():
+    wrapper = KubernetesPodWrapper(",".join(PODS))
+    preferred = wrapper.get_pod_urls("caller/session")
+
+    wrapper.mark_unhealthy(preferred[0])
+
+    assert wrapper.get_pod_urls("caller/session") == preferred[1:] + preferred[:1]
@@ -0,0 +1,70 @@
+""" Module for prompt template registry tests. """
+
+import pytest
+
+from backend.api.entities import PromptTemplate
+from backend.api.prompt_template_registry import (
+    CompiledPromptTemplate,
+    PromptTemplateRegistry,
+)
+
+
+def get_prompt_template(
+    template_text: str, name: str = "test", version: int = 1, prompt_template_id=1
+) -> PromptTemplate:
+    return PromptTemplate(
+        prompt_template_id=prompt_template_id,
+        name=name,
+        version=version,
+        template_text=template_text,
+    )
+
+
+@pytest.mark.parametrize(
+    "template_text, values",
+    [
+        ("Question: {question}\nAnswer:", {"question": "Can I?"}),
+        ("{a}{b} and {a} again", {"a": "x", "b": "y"}),
+        ("Turns: {turns:>4} {name!r} {{literal}}", {"turns": 7, "name": "Sam"}),
+        ("No fields at all", {}),
+        ("", {}),
+    ],
+)
+def test_render_matches_str_format(template_text, values):
+    compiled = CompiledPromptTemplate(get_prompt_template(template_text))
+
+    assert compiled.render(**values) == template_text.format(**values)
+
+
+def test_static_prefix_and_field_names():
+    compiled = CompiledPromptTemplate(
+        get_prompt_template("You are a lawyer.\n{history}Client: {question}")
+    )
+
+    assert compiled.static_prefix == "You are a lawyer.\n"
+    assert compiled.field_names == {"history", "question"}
+
+
+def test_render_requires_every_field():
+    compiled = CompiledPromptTemplate(get_prompt_template("{question}"))
+
+    with pytest.raises(KeyError):
+        compiled.render()
+
+
+@pytest.mark.parametrize("template_text", ["{0}", "{}", "{a.b}", "{a[0]}"])
+def test_unsupported_fields_are_rejected(template_text):
+    with pytest.raises(ValueError):
+        CompiledPromptTemplate(get_prompt_template(template_text))
+
+
+def test_registry_gets_latest_version_by_name():
+    registry = PromptTemplateRegistry(
+        [
+            get_prompt_template("v2 {x}", version=2, prompt_template_id=2),
+            get_prompt_template("v1 {x}", version=1, prompt_template_id=1),
+        ]
+    )
+
+    assert registry.get("test").render(x=1) == "v2 1"
+    assert registry.get_by_id(1).render(x=1) == "v1 1"
@@ -0,0 +1,61 @@
+""" Module for response compression tests. """
+
+import pytest
+from starlette.datastructures import Headers
+
+from backend.api.response_compression import (
+    ENCODINGS,
+    _add_etag_encoding,
+    _strip_etag_encodings,
+    choose_encoding,
+)
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("gzip, deflate, br, zstd", "zstd"),
+        ("gzip, br", "br"),
+        ("gzip", "gzip"),
+        ("GZIP", "gzip"),
+        ("br;q=0.5, gzip;q=0.8", "gzip"),
+        ("zstd;q=0, gzip", "gzip"),
+        ("*", "zstd"),
+        ("*;q=0.1, br;q=0.5", "br"),
+        ("br;q=oops, gzip", "gzip"),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding) == expected
+
+
+def test_strip_etag_encodings_round_trips_added_encodings():
+    etags = ['"abc"', '"def"', '"ghi"']
+    encoded = [
+        _add_etag_encoding(etag, encoding) for etag, encoding in zip(etags, ENCODINGS)
+    ]
+    scope = {
+        "headers": [
+            (b"accept", b"application/json"),
+            (b"if-none-match", ", ".join(encoded).encode("latin-1")),
+        ]
+    }
+
+    etag_encodings = _strip_etag_encodings(scope, Headers(scope=scope))
+
+    assert etag_encodings == dict(zip(etags, ENCODINGS))
+    headers = Headers(scope=scope)
+    assert headers["if-none-match"] == ", ".join(etags)
+    assert headers["accept"] == "application/json"
+    assert len(headers.getlist("if-none-match")) == 1
+
+
+def test_strip_etag_encodings_keeps_etags_without_encoding():
+    scope = {"headers": [(b"if-none-match", b'"abc", "def-gzip", *')]}
+
+    etag_encodings = _strip_etag_encodings(scope, Headers(scope=scope))
+
+    assert etag_encodings == {'"def"': "gzip"}
+    assert Headers(scope=scope)["if-none-match"] == '"abc", "def", *'
@@ -0,0 +1,93 @@
+""" Module for session summary tests. """
+
+from uuid import uuid4
+
+import pytest
+
+from backend.api.entities import Chat, SessionSummary
+from backend.api.enum import ChatStatus, InferenceProviderType
+from backend.api.session_summary import SessionSummarizer
+
+
+def get_summary(caller, summary_text: str, summarized_turns: int) -> SessionSummary:
+    return SessionSummary(
+        caller_id=caller.caller_id,
+        caller_session_id="session-0",
+        summary_text=summary_text,
+        summarized_turns=summarized_turns,
+    )
+
+
+def save_chats(data_repository, caller, count: int) -> None:
+    data_repository.save_chats(
+        [
+            Chat(
+                chat_id=uuid4(),
+                caller_id=caller.caller_id,
+                caller_session_id="session-0",
+                caller_chat_text=f"Question {index}",
+                inference_provider_type=InferenceProviderType.FAKE,
+                response_chat_text=f"Answer {index}",
+                status=ChatStatus.COMPLETED,
+            )
+            for index in range(count)
+        ]
+    )
+
+
+@pytest.fixture
+def summarizer(providers) -> SessionSummarizer:
+    summarizer = SessionSummarizer(
+        providers.data_repository,
+        providers.inference_router,
+        providers.prompt_template_registry,
+        "session_summary",
+        recent_turns=2,
+        fold_turns=2,
+        parallelism=1,
+    )
+    yield summarizer
+    summarizer.shutdown()
+
+
+def test_first_summary_is_saved_once(providers, callers):
+    data_repository = providers.data_repository
+
+    assert data_repository.save_session_summary(get_summary(callers[0], "A", 2), 0)
+    assert not data_repository.save_session_summary(get_summary(callers[0], "B", 2), 0)
+    assert (
+        data_repository.load_session_summary(
+            callers[0].caller_id, "session-0"
+        ).summary_text
+        == "A"
+    )
+
+
+def test_stale_summary_never_replaces_a_newer_one(providers, callers):
+    data_repository = providers.data_repository
+    data_repository.save_session_summary(get_summary(callers[0], "A", 2), 0)
+
+    moved_on = data_repository.save_session_summary(get_summary(callers[0], "B", 4), 2)
+    stale = data_repository.save_session_summary(get_summary(callers[0], "C", 4), 2)
+
+    assert (moved_on, stale) == (True, False)
+    summary = data_repository.load_session_summary(callers[0].caller_id, "session-0")
+    assert (summary.summary_text, summary.summarized_turns) == ("B", 4)
+
+
+def test_summarize_folds_turns_bar_the_recent_ones(providers, callers, summarizer):
+    data_repository = providers.data_repository
+    caller_id = callers[0].caller_id
+    save_chats(data_repository, callers[0], 5)
+
+    assert summarizer.summarize(caller_id, "session-0")
+    # one new turn is fewer than a fold
+    save_chats(data_repository, callers[0], 1)
+    assert not summarizer.summarize(caller_id, "session-0")
+
+    summary = data_repository.load_session_summary(caller_id, "session-0")
+    assert summary.summarized_turns == 3
+    assert summary.summary_text
+    assert summary.prompt_template_id == (
+        providers.prompt_template_registry.get("session_summary").prompt_template_id
+    )
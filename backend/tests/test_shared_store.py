@@ -0,0 +1,49 @@
+""" Module for shared store tests. """
+
+import time
+
+from backend.api.shared_store import LocalSharedStore
+
+
+def test_values_expire_after_their_ttl():
+    store = LocalSharedStore()
+    store.set("kept", 1)
+    store.set("expiring", 2, ttl_seconds=0.01)
+
+    time.sleep(0.02)
+
+    assert store.get("kept") == 1
+    assert store.get("expiring") is None
+
+
+def test_incr_keeps_the_ttl_of_the_first_increment():
+    store = LocalSharedStore()
+
+    assert store.incr("count", ttl_seconds=0.05) == 1
+    time.sleep(0.03)
+    assert store.incr("count", ttl_seconds=60) == 2
+    time.sleep(0.03)
+    assert store.get("count") is None
+    assert store.incr("count") == 1
+
+
+def test_expired_keys_are_evicted_before_live_ones_when_full():
+    store = LocalSharedStore(max_keys=3)
+    store.set("live-1", 1)
+    store.set("expired", 2, ttl_seconds=0.01)
+    store.set("live-2", 3)
+    time.sleep(0.02)
+
+    store.set("live-3", 4)
+
+    assert [store.get(key) for key in ("live-1", "live-2", "live-3")] == [1, 3, 4]
+
+
+def test_oldest_keys_are_evicted_when_full_of_live_keys():
+    store = LocalSharedStore(max_keys=2)
+    for index in range(3):
+        store.set(f"key-{index}", index)
+
+    assert store.get("key-0") is None
+    assert store.get("key-1") == 1
+    assert store.get("key-2") == 2
@@ -0,0 +1,58 @@
+""" Module for text compression tests. """
+
+from backend.api.text_compression import TextCompressor, train_dictionary
+
+ANSWER = (
+    "You should check the terms of your lease and keep written records of every "
+    "notice you receive before applying to the tribunal. "
+) * 8
+
+
+def test_texts_below_threshold_are_kept_plain():
+    compressor = TextCompressor(threshold_bytes=1024)
+
+    assert compressor.compress("short") == "short"
+    assert compressor.compress(None) is None
+
+
+def test_compressed_texts_round_trip():
+    compressor = TextCompressor(threshold_bytes=16)
+
+    compressed = compressor.compress(ANSWER)
+
+    assert isinstance(compressed, bytes)
+    assert len(compressed) < len(ANSWER.encode("utf-8"))
+    assert compressor.decompress(compressed) == ANSWER
+
+
+def test_texts_compression_would_not_shrink_are_kept_plain():
+    compressor = TextCompressor(threshold_bytes=8)
+    text = "qwertyuiopasdfg"
+
+    assert compressor.compress(text) == text
+    assert compressor.decompress(text) == text
+
+
+def test_texts_compressed_with_a_dictionary_round_trip():
+    dictionary = train_dictionary(
+        [
+            f"{ANSWER} Question {index} about clause {index * 7}."
+            for index in range(200)
+        ],
+        dictionary_size=4096,
+    )
+    compressor = TextCompressor(
+        threshold_bytes=16,
+        load_dictionaries=lambda: {dictionary.dict_id(): dictionary.as_bytes()},
+    )
+
+    compressed = compressor.compress(ANSWER)
+
+    assert compressor.decompress(compressed) == ANSWER
+    # a compressor not yet aware of the dictionary loads it when first read
+    assert (
+        TextCompressor(
+            load_dictionaries=lambda: {dictionary.dict_id(): dictionary.as_bytes()}
+        ).decompress(compressed)
+        == ANSWER
+    )
@@ -1,42 +1,138 @@
+import dataclasses
+from typing import Iterator
+from uuid import uuid4
+
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
 from streamlit_auth0_component import login_button
 
 from frontend.app import config
 
+# connections kept alive to the api, shared by every session of the process
+HTTP_POOL_SIZE = 10
+API_TIMEOUT_SECONDS = 300
+# turns loaded per history page, and rendered on a rerun until older are asked for
+HISTORY_PAGE_SIZE = 20
+
+
+@dataclasses.dataclass
+class ChatHistory:
+    """Class for turns of a caller session held by a streamlit session, newest last.
+
+    Only the latest turns are rendered, so a rerun costs the same however long the
+    conversation grows, and older turns are loaded from the api a page at a time
+    when asked for rather than the whole session being fetched again.
+    """
+
+    caller_session_id: str
+    turns: list[tuple[str, str]] = dataclasses.field(default_factory=list)
+    # turns saved by the api and held here, the offset of the next older page
+    saved_turns: int = 0
+    has_older_turns: bool = True
+    rendered_turns: int = HISTORY_PAGE_SIZE
+
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Get the http session shared by every streamlit session, so reruns and
+    questions reuse keep alive connections instead of connecting again each time."""
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_headers(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def load_older_turns(history: ChatHistory, token: str) -> None:
+    """Load the page of turns before the oldest held."""
+
+    try:
+        response = get_http_session().get(
+            f"{config.CONFIG.conversation_api_url}/sessions/"
+            f"{history.caller_session_id}/chats",
+            headers=get_headers(token),
+            params={
+                "offset": history.saved_turns,
+                "limit": HISTORY_PAGE_SIZE,
+                "order": "newest",
+            },
+            timeout=API_TIMEOUT_SECONDS,
+        )
+        response.raise_for_status()
+    except requests.exceptions.RequestException as error:
+        st.error(f"Unable to load older turns - {error}")
+        return
+
+    page = response.json()
+    history.turns[:0] = [
+        (chat["caller_chat_text"], chat["response_chat_text"])
+        for chat in reversed(page["chats"])
+    ]
+    history.saved_turns += len(page["chats"])
+    history.has_older_turns = page["has_more"]
+
+
+def stream_answer(history: ChatHistory, token: str, question: str) -> Iterator[str]:
+    """Stream the answer to a question as the api decodes it."""
+
+    with get_http_session().post(
+        f"{config.CONFIG.conversation_api_url}/chat/stream",
+        headers=get_headers(token),
+        json={
+            "caller_session_id": history.caller_session_id,
+            "caller_chat_text": question,
+            "caller_attachment_type": None,
+        },
+        stream=True,
+        timeout=API_TIMEOUT_SECONDS,
+    ) as response:
+        response.raise_for_status()
+        for piece in response.iter_content(chunk_size=None, decode_unicode=True):
+            if piece:
+                yield piece
+
+
 user_info = login_button(
     config.CONFIG.auth0_client_id,
     domain=config.CONFIG.auth0_domain,
     audience="personal-ai-assistant",
 )
-st.write(user_info)
 
 if user_info:
-    st.title("Secure API Client")
-
-    api_url = st.text_input("API URL", value="https://api.remember2.co:8001/chat")
-    query_text = st.text_input("Query Text", value="Hello, how are you?")
-
-    def call_api(api_url, token, query_text):
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-        }
-        try:
-            response = requests.post(
-                api_url,
-                headers=headers,
-                json={"caller_chat_text": f"{query_text}"},
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as err:
-            return {"error": str(err)}
-
-    if st.button("Call API"):
-        if not api_url or not user_info:
-            st.error("API URL and Bearer Token are required")
-        else:
-            token = user_info.get("token", "")
-            result = call_api(api_url, token, query_text)
-            st.write(result)
+    st.title("Personalised Lawyer")
+    token = user_info.get("token", "")
+
+    caller_session_id = st.sidebar.text_input(
+        "Session", value=st.session_state.setdefault("new_session_id", str(uuid4()))
+    )
+    history = st.session_state.get("chat_history")
+    if history is None or history.caller_session_id != caller_session_id:
+        history = st.session_state.chat_history = ChatHistory(caller_session_id)
+        load_older_turns(history, token)
+
+    if len(history.turns) > history.rendered_turns or history.has_older_turns:
+        if st.button("Show older turns"):
+            history.rendered_turns += HISTORY_PAGE_SIZE
+            if len(history.turns) < history.rendered_turns:
+                load_older_turns(history, token)
+
+    for question, answer in history.turns[-history.rendered_turns :]:
+        st.chat_message("user").markdown(question)
+        st.chat_message("assistant").markdown(answer)
+
+    if question := st.chat_input("Ask a question"):
+        st.chat_message("user").markdown(question)
+        with st.chat_message("assistant"):
+            try:
+                answer = st.write_stream(stream_answer(history, token, question))
+            except requests.exceptions.RequestException as error:
+                st.error(f"Unable to answer the question - {error}")
+            else:
+                history.turns.append((question, answer))
+                history.saved_turns += 1
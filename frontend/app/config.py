@@ -18,5 +18,8 @@ class Config:
     auth0_client_id: str
     auth0_domain: str
 
+    # conversation api
+    conversation_api_url: str
+
 
 CONFIG: Config = None
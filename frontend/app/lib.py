@@ -63,6 +63,7 @@ class EnvVars:
 
     auth0_client_id: str = None
     auth0_domain: str = None
+    conversation_api_url: str = "https://api.remember2.co:8001"
 
 
 def parse_env_vars_with_defaults() -> EnvVars:
@@ -74,6 +75,7 @@ def parse_env_vars_with_defaults() -> EnvVars:
     env_vars = {
         "auth0_client_id": os.getenv("AUTH0_CLIENT_ID"),
         "auth0_domain": os.getenv("AUTH0_DOMAIN"),
+        "conversation_api_url": os.getenv("CONVERSATION_API_URL"),
     }
     result = EnvVars(
         **{env: value for env, value in env_vars.items() if value is not None}
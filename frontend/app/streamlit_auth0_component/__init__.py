@@ -1,4 +1,7 @@
 import os
+import threading
+import time
+import streamlit as st
 import streamlit.components.v1 as components
 import urllib.request as req
 import json
@@ -18,14 +21,76 @@ else:
     build_dir = os.path.join(parent_dir, "frontend/dist")
     _login_button = components.declare_component("auth0_login_button", path=build_dir)
 
+JWKS_TTL_SECONDS = 600
+# a token naming a key id missing from the cached keys refreshes them, at most
+# this often so tokens with made up key ids cannot hammer the domain
+JWKS_MIN_REFRESH_SECONDS = 30
+JWKS_TIMEOUT_SECONDS = 10
+
+
+class JwksCache:
+    """Process wide cache of the json web key sets of auth0 domains.
+
+    Keys are fetched again once the ttl has passed, or early when a token names a
+    key id the cached set does not have, as after auth0 rotates its signing key.
+    Streamlit runs every session on its own thread, so fetching is serialised and a
+    session waiting on another's fetch uses its result.
+    """
+
+    def __init__(
+        self, ttl_seconds=JWKS_TTL_SECONDS, min_refresh_seconds=JWKS_MIN_REFRESH_SECONDS
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        # jwks url to the keys by key id and when they were fetched
+        self._jwks = {}
+        self._lock = threading.Lock()
+
+    def get_key(self, jwks_url, kid):
+        keys, fetched_at = self._jwks.get(jwks_url, ({}, None))
+        if self._is_stale(keys, fetched_at, kid):
+            with self._lock:
+                keys, fetched_at = self._jwks.get(jwks_url, ({}, None))
+                if self._is_stale(keys, fetched_at, kid):
+                    keys = {key["kid"]: key for key in fetch_jwks(jwks_url)["keys"]}
+                    self._jwks[jwks_url] = keys, time.monotonic()
+        return keys.get(kid)
+
+    def _is_stale(self, keys, fetched_at, kid):
+        if fetched_at is None:
+            return True
+        age = time.monotonic() - fetched_at
+        return age >= self.ttl_seconds or (
+            kid not in keys and age >= self.min_refresh_seconds
+        )
+
+
+JWKS_CACHE = JwksCache()
+
+
+def fetch_jwks(jwks_url):
+    with req.urlopen(jwks_url, timeout=JWKS_TIMEOUT_SECONDS) as response:
+        return json.loads(response.read())
+
 
 class LoginButtonManager:
-    def __init__(self, client_id, domain):
+    def __init__(
+        self, client_id, domain, jwks_url=None, jwks_cache=None, verified_tokens=None
+    ):
         self.client_id = client_id
         self.domain = domain
         self.audience = f"personalised-lawyer"
+        self.jwks_url = jwks_url or f"https://{domain}/.well-known/jwks.json"
+        self.jwks_cache = jwks_cache or JWKS_CACHE
+        # token verified for the session to its sub and expiry, so a rerun does
+        # not verify the same token again
+        self.verified_tokens = verified_tokens if verified_tokens is not None else {}
 
     def get_verified_sub(self, token):
+        verified = self.verified_tokens.get(token)
+        if verified is not None and verified[1] > time.time():
+            return verified[0]
+
         rsa_key = self.get_public_key(token)
 
         try:
@@ -43,31 +108,24 @@ class LoginButtonManager:
         except Exception:
             raise
 
+        # only the session's current token is kept
+        self.verified_tokens.clear()
+        self.verified_tokens[token] = payload["sub"], payload.get("exp", 0)
         return payload["sub"]
 
-    def get_jwks(self):
-        jwks_url = f"https://{self.domain}/.well-known/jwks.json"
-        jwks = req.urlopen(jwks_url).read()
-        jwks = json.loads(jwks)
-        return jwks
-
     def get_public_key(self, token):
-        jwks = self.get_jwks()
         unverified_header = jwt.get_unverified_header(token)
-        rsa_key = {}
         if "kid" not in unverified_header:
             raise ValueError("Authorization malformed.")
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                rsa_key = {
-                    "kty": key["kty"],
-                    "kid": key["kid"],
-                    "use": key["use"],
-                    "n": key["n"],
-                    "e": key["e"],
-                }
-        if rsa_key:
-            return rsa_key
+        key = self.jwks_cache.get_key(self.jwks_url, unverified_header["kid"])
+        if key:
+            return {
+                "kty": key["kty"],
+                "kid": key["kid"],
+                "use": key["use"],
+                "n": key["n"],
+                "e": key["e"],
+            }
         raise ValueError("Public key not found.")
 
     def is_auth(self, response):
@@ -92,7 +150,11 @@ def login_button(clientId, domain, key=None, **kwargs):
     dict
         User info
     """
-    manager = LoginButtonManager(client_id=clientId, domain=domain)
+    manager = LoginButtonManager(
+        client_id=clientId,
+        domain=domain,
+        verified_tokens=st.session_state.setdefault("_auth0_verified_tokens", {}),
+    )
     user_info = _login_button(
         client_id=clientId, domain=domain, key=key, audience=manager.audience, default=0
     )